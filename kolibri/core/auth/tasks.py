@@ -31,6 +31,8 @@ from kolibri.core.discovery.utils.network.errors import NetworkLocationNotFound
 from kolibri.core.discovery.utils.network.errors import ResourceGoneError
 from kolibri.core.error_constants import DEVICE_LIMITATIONS
 from kolibri.core.serializers import HexOnlyUUIDField
+from kolibri.core.tasks.constants import Execution
+from kolibri.core.tasks.constants import Resource
 from kolibri.core.tasks.decorators import register_task
 from kolibri.core.tasks.exceptions import JobNotFound
 from kolibri.core.tasks.exceptions import JobRunning
@@ -41,6 +43,7 @@ from kolibri.core.tasks.main import job_storage
 from kolibri.core.tasks.permissions import IsAdminForJob
 from kolibri.core.tasks.permissions import IsSuperAdmin
 from kolibri.core.tasks.permissions import NotProvisioned
+from kolibri.core.tasks.utils import arguments_batch_key
 from kolibri.core.tasks.utils import get_current_job
 from kolibri.core.tasks.validation import JobValidator
 from kolibri.utils.time_utils import naive_utc_datetime
@@ -165,6 +168,8 @@ class ImportUsersFromCSVValidator(JobValidator):
     validator=ImportUsersFromCSVValidator,
     track_progress=True,
     permission_classes=[IsAdminForJob],
+    execution=Execution.PROCESS,
+    resources=[Resource.CPU, Resource.DB_WRITE],
 )
 def importusersfromcsv(
     filepath, facility=None, userid=None, locale=None, dryrun=False, delete=False
@@ -224,6 +229,8 @@ class ExportUsersToCSVValidator(JobValidator):
     validator=ExportUsersToCSVValidator,
     track_progress=True,
     permission_classes=[IsAdminForJob],
+    execution=Execution.PROCESS,
+    resources=[Resource.CPU],
 )
 def exportuserstocsv(facility=None, locale=None):
     """
@@ -295,6 +302,7 @@ facility_task_queue = "facility_task"
     queue=facility_task_queue,
     long_running=True,
     status_fn=status_fn,
+    resources=[Resource.NETWORK, Resource.DB_WRITE],
 )
 def dataportalsync(command, **kwargs):
     """
@@ -369,6 +377,7 @@ class PeerFacilitySyncJobValidator(PeerSyncJobValidator):
     queue=facility_task_queue,
     long_running=True,
     status_fn=status_fn,
+    resources=[Resource.NETWORK, Resource.DB_WRITE],
 )
 def peerfacilitysync(command, **kwargs):
     """
@@ -402,6 +411,7 @@ class PeerFacilityImportJobValidator(PeerFacilitySyncJobValidator):
     queue=facility_task_queue,
     long_running=True,
     status_fn=status_fn,
+    resources=[Resource.NETWORK, Resource.DB_WRITE],
 )
 def peerfacilityimport(command, **kwargs):
     """
@@ -488,8 +498,29 @@ def enqueue_soud_sync_processing():
         logger.info("Skipping enqueue of SoUD sync processing: already running")
 
 
+def _soud_sync_cleanup_batch_key(**filters):
+    # Cleanups of specific sync sessions are merged into one cleanup of all of them.
+    if set(filters) == {"pk__in"}:
+        return "pk__in"
+    return arguments_batch_key(**filters)
+
+
+def _merge_soud_sync_cleanup(queued_job, job):
+    if set(queued_job.kwargs) != {"pk__in"}:
+        return queued_job.args, queued_job.kwargs
+    sync_session_ids = list(queued_job.kwargs["pk__in"])
+    sync_session_ids.extend(
+        sync_session_id
+        for sync_session_id in job.kwargs["pk__in"]
+        if sync_session_id not in sync_session_ids
+    )
+    return queued_job.args, {"pk__in": sync_session_ids}
+
+
 @register_task(
     queue=soud_sync_queue,
+    batch_key=_soud_sync_cleanup_batch_key,
+    merge_fn=_merge_soud_sync_cleanup,
 )
 def soud_sync_cleanup(**filters):
     """
@@ -607,6 +638,7 @@ class PeerImportSingleSyncJobValidator(PeerSyncJobValidator):
     permission_classes=[IsSuperAdmin() | NotProvisioned()],
     status_fn=status_fn,
     long_running=True,
+    resources=[Resource.NETWORK, Resource.DB_WRITE],
 )
 def peeruserimport(command, **kwargs):
     call_command(command, **kwargs)
@@ -618,6 +650,7 @@ def peeruserimport(command, **kwargs):
     track_progress=True,
     cancellable=False,
     queue=facility_task_queue,
+    resources=[Resource.DB_WRITE],
 )
 def deletefacility(facility):
     """
@@ -671,6 +704,7 @@ class CleanUpSyncsValidator(JobValidator):
     cancellable=False,
     long_running=True,
     status_fn=status_fn,
+    batch_key=arguments_batch_key,
 )
 def cleanupsync(**kwargs):
     # ensure arguments are valid, even outside of task API
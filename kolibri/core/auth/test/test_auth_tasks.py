@@ -27,6 +27,8 @@ from kolibri.core.auth.tasks import CleanUpSyncsValidator
 from kolibri.core.auth.tasks import enqueue_soud_sync_processing
 from kolibri.core.auth.tasks import PeerFacilityImportJobValidator
 from kolibri.core.auth.tasks import PeerFacilitySyncJobValidator
+from kolibri.core.auth.tasks import queue_soud_server_sync_cleanup
+from kolibri.core.auth.tasks import queue_soud_sync_cleanup
 from kolibri.core.auth.tasks import soud_sync_processing
 from kolibri.core.auth.tasks import SyncJobValidator
 from kolibri.core.device.models import DevicePermissions
@@ -37,6 +39,7 @@ from kolibri.core.discovery.utils.network.errors import ResourceGoneError
 from kolibri.core.tasks.exceptions import JobRunning
 from kolibri.core.tasks.job import Job
 from kolibri.core.tasks.job import State
+from kolibri.core.tasks.main import job_storage
 from kolibri.utils.time_utils import naive_utc_datetime
 
 
@@ -797,6 +800,27 @@ class SoudTasksTestCase(TestCase):
         mock_job.retry_in.assert_not_called()
 
 
+class SoudSyncCleanupBatchingTestCase(TestCase):
+    def tearDown(self):
+        job_storage.clear(force=True)
+
+    def test_queue_soud_sync_cleanup__merged(self):
+        job_ids = {
+            queue_soud_sync_cleanup("a"),
+            queue_soud_sync_cleanup("b"),
+            queue_soud_sync_cleanup("a", "c"),
+        }
+        self.assertEqual(len(job_ids), 1)
+        job = job_storage.get_job(job_ids.pop())
+        self.assertEqual(job.kwargs, {"pk__in": ["a", "b", "c"]})
+
+    def test_queue_soud_server_sync_cleanup__deduplicated(self):
+        job_id = queue_soud_server_sync_cleanup("a")
+        self.assertEqual(queue_soud_server_sync_cleanup("a"), job_id)
+        self.assertNotEqual(queue_soud_server_sync_cleanup("b"), job_id)
+        self.assertNotEqual(queue_soud_sync_cleanup("a"), job_id)
+
+
 class CleanUpSyncsTaskValidatorTestCase(TestCase):
     def setUp(self):
         self.kwargs = dict(
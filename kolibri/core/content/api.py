@@ -1,8 +1,10 @@
 import hashlib
 import logging
 import re
+import zlib
 from base64 import urlsafe_b64decode
 from collections import OrderedDict
+from functools import partial
 from functools import reduce
 from random import sample
 from uuid import UUID
@@ -33,6 +35,7 @@ from django_filters.rest_framework import DjangoFilterBackend
 from django_filters.rest_framework import FilterSet
 from django_filters.rest_framework import NumberFilter
 from django_filters.rest_framework import UUIDFilter
+from django_filters.widgets import BooleanWidget
 from le_utils.constants import content_kinds
 from le_utils.constants import languages
 from rest_framework import filters
@@ -76,7 +79,14 @@ from kolibri.core.content.utils.importability_annotation import (
 from kolibri.core.content.utils.paths import get_channel_lookup_url
 from kolibri.core.content.utils.paths import get_local_content_storage_file_url
 from kolibri.core.content.utils.search import get_available_metadata_labels
+from kolibri.core.content.utils.search_index import get_search_terms
+from kolibri.core.content.utils.search_index import is_search_index_ready
+from kolibri.core.content.utils.search_index import ranked_search
+from kolibri.core.content.utils.search_index import search_queryset
+from kolibri.core.content.utils.search_text import get_search_words
 from kolibri.core.content.utils.stopwords import stopwords_set
+from kolibri.core.content.utils.tree_pages import NUM_CHILDREN
+from kolibri.core.content.utils.tree_pages import NUM_GRANDCHILDREN_PER_CHILD
 from kolibri.core.decorators import query_params_required
 from kolibri.core.device.models import ContentCacheKey
 from kolibri.core.discovery.utils.network.client import NetworkClient
@@ -90,6 +100,9 @@ from kolibri.core.logger.models import ContentSessionLog
 from kolibri.core.logger.models import ContentSummaryLog
 from kolibri.core.logger.models import MasteryLog
 from kolibri.core.query import SQSum
+from kolibri.core.utils.cache import get_contentnode_cache
+from kolibri.core.utils.cache import get_metadata_cache
+from kolibri.core.utils.cache import process_cache
 from kolibri.core.utils.pagination import ValuesViewsetCursorPagination
 from kolibri.core.utils.pagination import ValuesViewsetLimitOffsetPagination
 from kolibri.core.utils.pagination import ValuesViewsetPageNumberPagination
@@ -103,68 +116,218 @@ REMOTE_ETAG_CACHE_KEY = "remote_content_etag_{}"
 
 REMOTE_URL_PARAM = "baseurl"
 
+CONTENTNODE_CACHE_KEY_PREFIX = "contentnode_serialized_{}_{}_"
+
+CONTENTNODE_CACHE_BATCH_SIZE = 10000
+
+
+CONTENTNODE_CHANNEL_CACHE_KEY = "contentnode_channel_{}"
+
+METADATA_CACHE_STATS_CACHE_KEY = "metadata_cache_{}"
+
+METADATA_CACHE_STATS = ("hits", "misses", "not_modified")
+
 
 def get_cache_key(*args, **kwargs):
     return str(ContentCacheKey.get_cache_key())
 
 
+def get_channel_cache_key(channel_id):
+    """
+    Returns the cache key of the content metadata of a channel, or the cache key of
+    all content metadata if channel_id is not a valid channel id.
+    """
+    try:
+        channel_id = UUID(channel_id).hex
+    except (AttributeError, TypeError, ValueError):
+        return get_cache_key()
+    return ContentCacheKey.get_channel_cache_key(channel_id)
+
+
+def _get_contentnode_channel_id(node_id):
+    try:
+        node_id = UUID(node_id).hex
+    except (AttributeError, TypeError, ValueError):
+        return None
+    # The channel of a ContentNode never changes, so it is cached for as long as the
+    # cache keeps it.
+    contentnode_cache = get_contentnode_cache()
+    cache_key = CONTENTNODE_CHANNEL_CACHE_KEY.format(node_id)
+    channel_id = contentnode_cache.get(cache_key)
+    if channel_id is None:
+        channel_id = (
+            models.ContentNode.objects.filter(id=node_id)
+            .values_list("channel_id", flat=True)
+            .first()
+        )
+        if channel_id is not None:
+            contentnode_cache.set(cache_key, channel_id)
+    return channel_id
+
+
+def get_contentnode_cache_key(request, *args, **kwargs):
+    """
+    Returns the cache key of the channel of the requested ContentNode, or of the
+    ContentNodes requested by their parent or channel, so that a change to the content
+    of one channel does not invalidate the responses for the content of another.
+    """
+    node_id = kwargs.get("pk") or request.GET.get("parent")
+    if node_id:
+        return get_channel_cache_key(_get_contentnode_channel_id(node_id))
+    return get_channel_cache_key(request.GET.get("channel_id"))
+
+
+def get_channel_metadata_cache_key(request, *args, **kwargs):
+    return get_channel_cache_key(kwargs.get("pk"))
+
+
+def _record_metadata_cache_stat(name):
+    cache_key = METADATA_CACHE_STATS_CACHE_KEY.format(name)
+    try:
+        if not process_cache.add(cache_key, 1, None):
+            process_cache.incr(cache_key)
+    except ValueError:
+        # The count was deleted since it was added, so start it again.
+        process_cache.set(cache_key, 1, None)
+
+
+def get_metadata_cache_stats():
+    """
+    Returns the number of requests to the content metadata endpoints that have been
+    returned from the cache, rendered by the view, or answered with 304 Not Modified.
+    """
+    counts = process_cache.get_many(
+        [METADATA_CACHE_STATS_CACHE_KEY.format(name) for name in METADATA_CACHE_STATS]
+    )
+    stats = {
+        name: counts.get(METADATA_CACHE_STATS_CACHE_KEY.format(name), 0)
+        for name in METADATA_CACHE_STATS
+    }
+    total = sum(stats.values())
+    stats["hit_rate"] = (
+        (stats["hits"] + stats["not_modified"]) / float(total) if total else None
+    )
+    return stats
+
+
+def reset_metadata_cache_stats():
+    process_cache.delete_many(
+        [METADATA_CACHE_STATS_CACHE_KEY.format(name) for name in METADATA_CACHE_STATS]
+    )
+
+
+def _serialize_cached_response(response):
+    return {
+        "status": response.status_code,
+        "headers": list(response.items()),
+        "content": zlib.compress(response.content),
+    }
+
+
+def _deserialize_cached_response(cached):
+    response = HttpResponse(zlib.decompress(cached["content"]), status=cached["status"])
+    for header, value in cached["headers"]:
+        response[header] = value
+    return response
+
+
+def _get_metadata_cache_key(cache_key_func, request, *args, **kwargs):
+    # The cache key is used both for the ETag and the cache, so only look it up once
+    # per request.
+    key_prefix = getattr(request, "_metadata_cache_key", None)
+    if key_prefix is None:
+        key_prefix = cache_key_func(request, *args, **kwargs)
+        request._metadata_cache_key = key_prefix
+    return key_prefix
+
+
+def _get_request(*args, **kwargs):
+    try:
+        request = args[0]
+        return kwargs.get("request", request)
+    except IndexError:
+        return kwargs.get("request", None)
+
+
+def _cache_response(response, cache_key):
+    if hasattr(response, "render") and callable(response.render):
+        response.add_post_render_callback(
+            lambda r: get_metadata_cache().set(
+                cache_key, _serialize_cached_response(r), timeout=3600
+            )
+        )
+
+
 def metadata_cache(view_func, cache_key_func=get_cache_key):
     """
-    Decorator to apply an Etag sensitive page cache
+    Decorator to apply an Etag sensitive page cache.
+    Responses are cached as their compressed content and headers in the shared
+    metadata cache, with the ETag of the cache key they were rendered for, so that
+    both conditional requests and cached responses are returned without the view.
     """
 
-    @etag(cache_key_func)
+    get_key_prefix = partial(_get_metadata_cache_key, cache_key_func)
+
+    @etag(get_key_prefix)
     def wrapper_func(*args, **kwargs):
-        try:
-            request = args[0]
-            request = kwargs.get("request", request)
-        except IndexError:
-            request = kwargs.get("request", None)
+        request = _get_request(*args, **kwargs)
         # Prevent the Django caching middleware from caching
         # this response, as we want to cache it ourselves
         request._cache_update_cache = False
-        key_prefix = cache_key_func(request)
+        key_prefix = get_key_prefix(*args, **kwargs)
         url_key = hashlib.md5(
             force_bytes(iri_to_uri(request.build_absolute_uri()))
         ).hexdigest()
-        response = None
+        cached = None
         if key_prefix is not None:
-            cache_key = "{}:{}".format(key_prefix, url_key)
-            response = cache.get(cache_key)
-        if response is None:
-            response = view_func(*args, **kwargs)
-            if response.status_code == 200:
-                if key_prefix is None:
-                    key_prefix = cache_key_func(request)
-                if (
-                    key_prefix is not None
-                    and hasattr(response, "render")
-                    and callable(response.render)
-                ):
-                    cache_key = "{}:{}".format(key_prefix, url_key)
-                    response.add_post_render_callback(
-                        lambda r: cache.set(cache_key, r, timeout=3600)
-                    )
-            else:
-                # Don't cache responses that returned an error code
-                add_never_cache_headers(response)
+            cached = get_metadata_cache().get("{}:{}".format(key_prefix, url_key))
+        if cached is not None:
+            _record_metadata_cache_stat("hits")
+            return _deserialize_cached_response(cached)
+        _record_metadata_cache_stat("misses")
+        response = view_func(*args, **kwargs)
+        if response.status_code == 200:
+            if key_prefix is None:
+                key_prefix = get_key_prefix(*args, **kwargs)
+            if key_prefix is not None:
+                _cache_response(response, "{}:{}".format(key_prefix, url_key))
+        else:
+            # Don't cache responses that returned an error code
+            add_never_cache_headers(response)
         return response
 
-    return wrapper_func
+    def counted_func(*args, **kwargs):
+        response = wrapper_func(*args, **kwargs)
+        if response.status_code == 304:
+            _record_metadata_cache_stat("not_modified")
+        return response
 
+    return counted_func
 
-def get_remote_cache_key(request, *args, **kwargs):
-    if REMOTE_URL_PARAM in request.GET:
-        return cache.get(REMOTE_ETAG_CACHE_KEY.format(request.GET[REMOTE_URL_PARAM]))
-    return get_cache_key(*args, **kwargs)
 
+def remote_metadata_cache(view_func, cache_key_func=get_cache_key):
+    def get_remote_cache_key(request, *args, **kwargs):
+        if REMOTE_URL_PARAM in request.GET:
+            return cache.get(
+                REMOTE_ETAG_CACHE_KEY.format(request.GET[REMOTE_URL_PARAM])
+            )
+        return cache_key_func(request, *args, **kwargs)
 
-def remote_metadata_cache(view_func):
     return session_exempt(
         metadata_cache(view_func, cache_key_func=get_remote_cache_key)
     )
 
 
+def channel_metadata_cache(view_func):
+    return remote_metadata_cache(
+        view_func, cache_key_func=get_channel_metadata_cache_key
+    )
+
+
+def contentnode_metadata_cache(view_func):
+    return remote_metadata_cache(view_func, cache_key_func=get_contentnode_cache_key)
+
+
 def no_cache_on_method(view_func):
     """
     Decorator to disable caching for a particular method
@@ -410,7 +573,7 @@ def _create_channel_thumbnail_url(item):
     )
 
 
-@method_decorator(remote_metadata_cache, name="dispatch")
+@method_decorator(channel_metadata_cache, name="dispatch")
 class ChannelMetadataViewSet(BaseChannelMetadataMixin, RemoteViewSet):
     field_map = {
         "thumbnail": _create_channel_thumbnail_url,
@@ -752,7 +915,8 @@ class BaseContentNodeMixin(object):
 
         return assessmentmetadata_map, files_map, languages_map, tags_map
 
-    def consolidate(self, items, queryset):
+    def serialize_nodes(self, queryset):
+        items = list(map(self._map_fields, queryset.values(*self._values)))
         output = []
         if items:
             (
@@ -779,6 +943,52 @@ class BaseContentNodeMixin(object):
                 output.append(item)
         return output
 
+    def get_node_cache_key_prefix(self):
+        # The values serialized differ between viewsets, so they are part of the key,
+        # as is the content cache key, as the cache is only valid until it changes.
+        values_key = hashlib.md5(force_bytes(",".join(self._values))).hexdigest()
+        return CONTENTNODE_CACHE_KEY_PREFIX.format(
+            values_key, ContentCacheKey.get_cache_key()
+        )
+
+    def serialize(self, queryset):
+        """
+        Serialize the ContentNodes of queryset from the cache of serialized ContentNodes,
+        which is only valid until the content cache key changes, so that only their ids
+        are queried for, and only ContentNodes that are not in the cache are serialized.
+        """
+        queryset = self.annotate_queryset(queryset)
+        ids = list(queryset.values_list("id", flat=True))
+        contentnode_cache = get_contentnode_cache()
+        key_prefix = self.get_node_cache_key_prefix()
+        keys = {node_id: key_prefix + node_id for node_id in ids}
+        nodes = contentnode_cache.get_many(list(keys.values())) if keys else {}
+        missing_ids = [node_id for node_id in keys if keys[node_id] not in nodes]
+        if missing_ids and len(missing_ids) == len(ids):
+            missing_querysets = [queryset]
+        else:
+            # Batch the ids to avoid hitting the size limits of SQL queries
+            missing_querysets = [
+                self.annotate_queryset(
+                    models.ContentNode.objects.filter_by_uuids(
+                        missing_ids[i : i + CONTENTNODE_CACHE_BATCH_SIZE],
+                        validate=False,
+                    )
+                )
+                for i in range(0, len(missing_ids), CONTENTNODE_CACHE_BATCH_SIZE)
+            ]
+        for missing_queryset in missing_querysets:
+            serialized = {
+                keys[node["id"]]: node
+                for node in self.serialize_nodes(missing_queryset)
+            }
+            contentnode_cache.set_many(serialized)
+            nodes.update(serialized)
+        return self.consolidate(
+            [nodes[keys[node_id]] for node_id in ids if keys[node_id] in nodes],
+            queryset,
+        )
+
 
 class InternalContentNodeMixin(BaseContentNodeMixin):
     """
@@ -891,7 +1101,7 @@ class PublicContentNodePagination(OptionalContentNodePagination):
     use_deprecated_channels_labels = True
 
 
-@method_decorator(remote_metadata_cache, name="dispatch")
+@method_decorator(contentnode_metadata_cache, name="dispatch")
 class ContentNodeViewset(InternalContentNodeMixin, RemoteMixin, ReadOnlyValuesViewset):
     pagination_class = OptionalContentNodePagination
 
@@ -966,17 +1176,9 @@ class ContentNodeViewset(InternalContentNodeMixin, RemoteMixin, ReadOnlyValuesVi
         return Response(self.serialize(queryset))
 
 
-# The max recursed page size should be less than 25 for a couple of reasons:
-# 1. At this size the query appears to be relatively performant, and will deliver most of the tree
-#    data to the frontend in a single query.
-# 2. In the case where the tree topology means that this will not produce the full query, the limit of
-#    25 immediate children and 25 grand children means that we are at most using 1 + 25 + 25 * 25 = 651
-#    SQL parameters in the query to get the nodes for serialization - this means that we should not ever
-#    run into an issue where we hit a SQL parameters limit in the queries in here.
-# If we find that this page size is too high, we should lower it, but for the reasons noted above, we
-# should not raise it.
-NUM_CHILDREN = 12
-NUM_GRANDCHILDREN_PER_CHILD = 12
+# Query parameters of requests for the topic tree that can be returned from the
+# precomputed pages of the tree, as they do not filter the tree by anything else.
+TREE_PAGE_PARAMS = {"depth", "next__gt", "include_coach_content"}
 
 
 class TreeQueryMixin(object):
@@ -1048,7 +1250,64 @@ class TreeQueryMixin(object):
             child_qs = child_qs.filter(lft__gt=next__gt)
         return child_qs.values_list("id", flat=True).order_by("lft")[0:NUM_CHILDREN]
 
+    def get_tree_page_ids(self, request, pk):
+        """
+        Returns the ids of the ContentNodes to return for a request for the tree
+        from the precomputed page of the topic pk, or None if there is no page
+        for it or the request filters the tree by more than coach content.
+        """
+        if not TREE_PAGE_PARAMS.issuperset(request.query_params):
+            return None
+        # Parse the parameter in the same way as the BooleanFilter of the FilterSet
+        include_coach_content = BooleanWidget().value_from_datadict(
+            request.query_params, None, "include_coach_content"
+        )
+        include_coach_content = include_coach_content is not False
+        try:
+            page = models.ContentNodeTreePage.objects.get(id=pk)
+        except (models.ContentNodeTreePage.DoesNotExist, ValueError):
+            return None
+        if page.coach_content and not include_coach_content:
+            return None
+        depth, next__gt = self.validate_and_return_params(request)
+
+        if next__gt is None:
+            nodes = page.chain + page.children
+            children = page.children
+        else:
+            children = list(
+                self.get_queryset()
+                .filter(parent_id=page.id, lft__gt=next__gt)
+                .values_list("id", "coach_content")
+                .order_by("lft")[0:NUM_CHILDREN]
+            )
+            nodes = children
+
+        node_ids = [page.id] + [
+            node_id
+            for node_id, coach_content in nodes
+            if include_coach_content or not coach_content
+        ]
+        if depth == 2:
+            child_pages = models.ContentNodeTreePage.objects.filter_by_uuids(
+                [
+                    node_id
+                    for node_id, coach_content in children
+                    if include_coach_content or not coach_content
+                ],
+                validate=False,
+            )
+            for preview, learner_preview in child_pages.values_list(
+                "preview", "learner_preview"
+            ):
+                node_ids.extend(preview if include_coach_content else learner_preview)
+        return node_ids
+
     def get_tree_queryset(self, request, pk):
+        node_ids = self.get_tree_page_ids(request, pk)
+        if node_ids is not None:
+            return self.get_queryset().filter_by_uuids(node_ids, validate=False)
+
         # Get the model for the parent node here - we do this so that we trigger a 404 immediately if the node
         # does not exist (or exists but is not available, or is filtered).
         try:
@@ -1184,7 +1443,7 @@ class BaseContentNodeTreeViewset(
         return Response(parent)
 
 
-@method_decorator(remote_metadata_cache, name="dispatch")
+@method_decorator(contentnode_metadata_cache, name="dispatch")
 class ContentNodeTreeViewset(BaseContentNodeTreeViewset, RemoteMixin):
     def retrieve(self, request, pk=None):
         if pk is None:
@@ -1236,6 +1495,8 @@ class ContentNodeSearchViewset(ContentNodeViewset):
             queryset = self.filter_queryset(self.get_queryset())
         else:
             queryset = self.get_queryset()
+        if is_search_index_ready(queryset):
+            return self.search_with_index(queryset, value, max_results)
         # all words with punctuation removed
         all_words = [w for w in re.split('[?.,!";: ]', value) if w]
         # words in all_words that are not stopwords
@@ -1321,6 +1582,57 @@ class ContentNodeSearchViewset(ContentNodeViewset):
 
         return (results, channel_ids, content_kinds, total_results)
 
+    def search_with_index(self, queryset, value, max_results):
+        """
+        Search using the full text search index, taking the most relevant results that
+        are in the queryset from a single ranked query, rather than from a cascade of queries.
+        """
+        terms = get_search_terms(get_search_words(value), using=queryset.db)
+        matches = search_queryset(queryset, terms)
+        if matches is None:
+            return (queryset.none(), [], [], 0)
+
+        results = []
+        content_ids = set()
+        BUFFER_SIZE = max_results * 2  # grab some extras, but not too many
+
+        for batch in ranked_search(terms, BUFFER_SIZE, using=queryset.db):
+            # only take the matches that pass the filters of the queryset
+            in_queryset = set(
+                queryset.filter_by_uuids(
+                    [node_id for node_id, _ in batch], validate=False
+                ).values_list("id", flat=True)
+            )
+            for node_id, content_id in batch:
+                # filter the dupes
+                if node_id not in in_queryset or content_id in content_ids:
+                    continue
+                content_ids.add(content_id)
+                results.append(node_id)
+                if len(results) >= max_results:
+                    break
+            if len(results) >= max_results:
+                break
+
+        results = queryset.filter_by_uuids(results, validate=False)
+
+        # Use unfiltered queryset to collect channel_ids and kinds metadata,
+        # leaving the deduplication to the database, as there can be many matches.
+        facets = set(
+            search_queryset(self.get_queryset(), terms)
+            .order_by()
+            .values_list("channel_id", "kind")
+            .distinct()
+        )
+        channel_ids = sorted({channel_id for channel_id, _ in facets})
+        content_kinds = sorted({kind for _, kind in facets})
+
+        total_results = (
+            matches.order_by().values_list("content_id", flat=True).distinct().count()
+        )
+
+        return (results, channel_ids, content_kinds, total_results)
+
     def list(self, request, **kwargs):
         value = self.kwargs["search"]
         max_results = self.kwargs["max_results"]
@@ -1498,7 +1810,7 @@ class ContentRequestViewset(ReadOnlyValuesViewset, CreateModelMixin):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-@method_decorator(etag(get_cache_key), name="retrieve")
+@method_decorator(etag(get_contentnode_cache_key), name="retrieve")
 class ContentNodeGranularViewset(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
     serializer_class = serializers.ContentNodeGranularSerializer
 
@@ -0,0 +1,44 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from kolibri.core.content.api import get_metadata_cache_stats
+from kolibri.core.content.api import reset_metadata_cache_stats
+
+
+class Command(BaseCommand):
+    """
+    This command shows how many requests to the content metadata endpoints have been
+    returned from the metadata cache, rendered by the view, or answered with
+    304 Not Modified.
+    """
+
+    help = "Shows the hit rate of the content metadata cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="Output the counts and hit rate as JSON",
+        )
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Reset the counts after showing them",
+        )
+
+    def handle(self, *args, **options):
+        stats = get_metadata_cache_stats()
+
+        if options["json"]:
+            self.stdout.write(json.dumps(stats, indent=2))
+        elif stats["hit_rate"] is None:
+            self.stdout.write("No content metadata requests have been recorded")
+        else:
+            self.stdout.write("Cache hits: {}".format(stats["hits"]))
+            self.stdout.write("Cache misses: {}".format(stats["misses"]))
+            self.stdout.write("Not modified: {}".format(stats["not_modified"]))
+            self.stdout.write("Hit rate: {:.0%}".format(stats["hit_rate"]))
+
+        if options["reset"]:
+            reset_metadata_cache_stats()
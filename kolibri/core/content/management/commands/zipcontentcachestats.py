@@ -0,0 +1,50 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from kolibri.core.content.utils.zip_cache import get_zip_content_cache_stats
+from kolibri.core.content.utils.zip_cache import reset_zip_content_cache_stats
+
+
+class Command(BaseCommand):
+    """
+    This command shows how many lookups of zip central directories and rewritten HTML
+    files have been served from the in memory and disk caches of the zip content server,
+    totalled over every process that serves zip content.
+    """
+
+    help = "Shows the hit rate of the zip content cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="Output the counts and hit rate as JSON",
+        )
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Reset the counts after showing them",
+        )
+
+    def handle(self, *args, **options):
+        stats = get_zip_content_cache_stats()
+
+        if options["json"]:
+            self.stdout.write(json.dumps(stats, indent=2))
+        elif stats["hit_rate"] is None:
+            self.stdout.write("No zip content cache lookups have been recorded")
+        else:
+            self.stdout.write("Memory hits: {}".format(stats["memory_hits"]))
+            self.stdout.write("Memory misses: {}".format(stats["memory_misses"]))
+            self.stdout.write("Memory evictions: {}".format(stats["memory_evictions"]))
+            self.stdout.write("Disk hits: {}".format(stats["disk_hits"]))
+            self.stdout.write("Disk misses: {}".format(stats["disk_misses"]))
+            if stats["disk_size"] is not None:
+                self.stdout.write(
+                    "Disk size: {:.1f}MB".format(stats["disk_size"] / (1024.0 * 1024.0))
+                )
+            self.stdout.write("Hit rate: {:.0%}".format(stats["hit_rate"]))
+
+        if options["reset"]:
+            reset_zip_content_cache_stats()
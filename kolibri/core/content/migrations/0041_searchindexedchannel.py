@@ -0,0 +1,37 @@
+import morango.models.fields.uuids
+from django.db import migrations
+from django.db import models
+
+from kolibri.core.content.utils.search_index import create_search_index
+from kolibri.core.content.utils.search_index import drop_search_index
+
+
+def create_index(apps, schema_editor):
+    create_search_index(schema_editor.connection)
+
+
+def drop_index(apps, schema_editor):
+    drop_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("content", "0040_html_article_constants"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchIndexedChannel",
+            fields=[
+                (
+                    "channel_id",
+                    morango.models.fields.uuids.UUIDField(
+                        primary_key=True, serialize=False
+                    ),
+                ),
+                ("version", models.IntegerField()),
+            ],
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+from kolibri.core.content.utils.search_index import create_search_index
+from kolibri.core.content.utils.search_index import drop_search_index
+
+
+def recreate_index(apps, schema_editor):
+    # The index now holds tokenized terms, so every channel has to be indexed again.
+    drop_search_index(schema_editor.connection)
+    create_search_index(schema_editor.connection)
+    SearchIndexedChannel = apps.get_model("content", "SearchIndexedChannel")
+    SearchIndexedChannel.objects.using(schema_editor.connection.alias).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("content", "0041_searchindexedchannel"),
+    ]
+
+    operations = [
+        migrations.RunPython(recreate_index, migrations.RunPython.noop),
+    ]
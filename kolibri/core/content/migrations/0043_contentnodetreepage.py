@@ -0,0 +1,35 @@
+import morango.models.fields.uuids
+from django.db import migrations
+from django.db import models
+
+import kolibri.core.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("content", "0042_search_index_terms"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContentNodeTreePage",
+            fields=[
+                (
+                    "id",
+                    morango.models.fields.uuids.UUIDField(
+                        primary_key=True, serialize=False
+                    ),
+                ),
+                (
+                    "channel_id",
+                    morango.models.fields.uuids.UUIDField(db_index=True),
+                ),
+                ("coach_content", models.BooleanField(default=False)),
+                ("chain", kolibri.core.fields.JSONField(default=list)),
+                ("children", kolibri.core.fields.JSONField(default=list)),
+                ("preview", kolibri.core.fields.JSONField(default=list)),
+                ("learner_preview", kolibri.core.fields.JSONField(default=list)),
+            ],
+        ),
+    ]
@@ -44,6 +44,7 @@ from kolibri.core.content import base_models
 from kolibri.core.content.errors import InvalidStorageFilenameError
 from kolibri.core.content.utils.search import bitmask_fieldnames
 from kolibri.core.content.utils.search import metadata_bitmasks
+from kolibri.core.content.utils.search_index import clear_channel_search_index
 from kolibri.core.device.models import ContentCacheKey
 from kolibri.core.fields import DateTimeTzField
 from kolibri.core.fields import JSONField
@@ -419,7 +420,9 @@ class ChannelMetadata(base_models.ChannelMetadata):
                     qs.delete()
                     left_value += BATCH_SIZE
             self.root.delete()
-        ContentCacheKey.update_cache_key()
+        clear_channel_search_index(self.id)
+        ContentNodeTreePage.objects.filter(channel_id=self.id).delete()
+        ContentCacheKey.update_cache_key(channel_ids=[self.id])
 
 
 class ContentRequestType(ChoicesEnum):
@@ -560,3 +563,42 @@ class ContentRemovalRequest(ContentRequest):
 
     class Meta:
         proxy = True
+
+
+class SearchIndexedChannel(models.Model):
+    """
+    Records the channels whose ContentNodes are in the full text search index,
+    and the version of the search index they were indexed with.
+    """
+
+    channel_id = UUIDField(primary_key=True)
+    version = models.IntegerField()
+
+
+class ContentNodeTreePageQueryset(models.QuerySet, FilterByUUIDQuerysetMixin):
+    pass
+
+
+class ContentNodeTreePage(models.Model):
+    """
+    The precomputed first page of the children of an available topic, and the preview
+    of its own children shown beneath it in the page of its parent, so that the topic
+    tree can be returned without querying the tree. Each node is recorded as a pair of
+    its id and whether it is coach content, so that pages can be returned for learners.
+    """
+
+    # The id of the topic ContentNode
+    id = UUIDField(primary_key=True)
+    channel_id = UUIDField(db_index=True)
+    coach_content = models.BooleanField(default=False)
+    # Descendants that are the only child of their parent, which are collapsed into
+    # the first page of the topic
+    chain = JSONField(default=list)
+    # The first page of available children, of the last node of the chain if there is one
+    children = JSONField(default=list)
+    # The ids of the grandchildren shown beneath the topic as a child of another topic,
+    # with and without coach content
+    preview = JSONField(default=list)
+    learner_preview = JSONField(default=list)
+
+    objects = ContentNodeTreePageQueryset.as_manager()
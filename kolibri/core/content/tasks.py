@@ -38,6 +38,8 @@ from kolibri.core.discovery.utils.network.errors import NetworkLocationNotFound
 from kolibri.core.discovery.utils.network.errors import NetworkLocationResponseFailure
 from kolibri.core.discovery.utils.network.errors import ResourceGoneError
 from kolibri.core.serializers import HexOnlyUUIDField
+from kolibri.core.tasks.constants import Execution
+from kolibri.core.tasks.constants import Resource
 from kolibri.core.tasks.decorators import register_task
 from kolibri.core.tasks.job import default_status_text
 from kolibri.core.tasks.job import JobStatus
@@ -156,6 +158,7 @@ class LocalChannelImportResourcesValidator(LocalMixin, ChannelResourcesImportVal
     queue=QUEUE,
     long_running=True,
     status_fn=get_status,
+    resources=[Resource.DISK],
 )
 def diskcontentimport(
     channel_id,
@@ -221,6 +224,8 @@ class RemoteChannelImportValidator(RemoteImportMixin, ChannelValidator):
     priority=Priority.HIGH,
     queue=QUEUE,
     status_fn=get_status,
+    execution=Execution.PROCESS,
+    resources=[Resource.NETWORK, Resource.CPU, Resource.DB_WRITE],
 )
 def remotechannelimport(channel_id, baseurl=None, peer_id=None):
     transfer_channel(channel_id, DOWNLOAD_METHOD, baseurl=baseurl)
@@ -240,6 +245,7 @@ class RemoteChannelResourcesImportValidator(
     queue=QUEUE,
     long_running=True,
     status_fn=get_status,
+    resources=[Resource.NETWORK, Resource.DISK],
 )
 def remotecontentimport(
     channel_id,
@@ -330,6 +336,7 @@ class RemoteResourceImportValidator(ResourceNodeValidator):
     queue=QUEUE,
     long_running=False,
     status_fn=get_status,
+    resources=[Resource.NETWORK, Resource.DISK],
 )
 def remoteresourceimport(
     node_id,
@@ -451,6 +458,7 @@ class ExportChannelResourcesValidator(LocalMixin, ChannelResourcesValidator):
     queue=QUEUE,
     long_running=True,
     status_fn=get_status,
+    resources=[Resource.DISK],
 )
 def diskexport(
     channel_id,
@@ -495,6 +503,7 @@ class DeleteChannelValidator(ChannelResourcesValidator):
     queue=QUEUE,
     long_running=True,
     status_fn=get_status,
+    resources=[Resource.DISK, Resource.DB_WRITE],
 )
 def deletechannel(
     channel_id=None,
@@ -516,6 +525,7 @@ def deletechannel(
     queue=QUEUE,
     long_running=True,
     status_fn=get_status,
+    resources=[Resource.NETWORK, Resource.DISK, Resource.DB_WRITE],
 )
 def remoteimport(
     channel_id,
@@ -558,6 +568,7 @@ def remoteimport(
     queue=QUEUE,
     long_running=True,
     status_fn=get_status,
+    resources=[Resource.DISK, Resource.DB_WRITE],
 )
 def diskimport(
     channel_id,
@@ -606,6 +617,8 @@ class LocalChannelImportValidator(LocalMixin, ChannelValidator):
     priority=Priority.HIGH,
     queue=QUEUE,
     status_fn=get_status,
+    execution=Execution.PROCESS,
+    resources=[Resource.CPU, Resource.DB_WRITE],
 )
 def diskchannelimport(
     channel_id,
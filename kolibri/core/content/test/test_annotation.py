@@ -8,10 +8,13 @@ from django.test import TestCase
 from django.test import TransactionTestCase
 from le_utils.constants import content_kinds
 from mock import patch
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 
 from .sqlalchemytesting import django_connection_engine
 from kolibri.core.content.models import ChannelMetadata
 from kolibri.core.content.models import ContentNode
+from kolibri.core.content.models import ContentNodeTreePage
 from kolibri.core.content.models import File
 from kolibri.core.content.models import Language
 from kolibri.core.content.models import LocalFile
@@ -21,6 +24,7 @@ from kolibri.core.content.utils.annotation import calculate_ordered_categories
 from kolibri.core.content.utils.annotation import calculate_ordered_grade_levels
 from kolibri.core.content.utils.annotation import calculate_published_size
 from kolibri.core.content.utils.annotation import calculate_total_resource_count
+from kolibri.core.content.utils.annotation import ContentAnnotationBatch
 from kolibri.core.content.utils.annotation import mark_local_files_as_available
 from kolibri.core.content.utils.annotation import mark_local_files_as_unavailable
 from kolibri.core.content.utils.annotation import recurse_annotation_up_tree
@@ -31,6 +35,7 @@ from kolibri.core.content.utils.annotation import (
 )
 from kolibri.core.content.utils.annotation import set_leaf_nodes_invisible
 from kolibri.core.content.utils.annotation import set_local_file_availability_from_disk
+from kolibri.core.content.utils.tree_pages import build_tree_pages
 
 
 def get_engine(connection_string):
@@ -750,6 +755,165 @@ class AnnotationTreeRecursion(TransactionTestCase):
         super(AnnotationTreeRecursion, self).tearDown()
 
 
+@patch("kolibri.core.content.utils.sqlalchemybridge.get_engine", new=get_engine)
+class IncrementalAnnotationTestCase(TransactionTestCase):
+    annotation_fields = (
+        "id",
+        "available",
+        "coach_content",
+        "num_coach_contents",
+        "on_device_resources",
+    )
+
+    def _insert_channel(self, levels=3, num_children=5):
+        builder = ChannelBuilder(levels=levels, num_children=num_children)
+        builder.insert_into_default_db()
+        channel_id = builder.channel["id"]
+        ContentNode.objects.filter(channel_id=channel_id).update(available=False)
+        LocalFile.objects.all().update(available=False)
+        recurse_annotation_up_tree(channel_id)
+        return channel_id
+
+    def _get_leaf(self, channel_id, index=0):
+        return (
+            ContentNode.objects.filter(channel_id=channel_id)
+            .exclude(kind=content_kinds.TOPIC)
+            .order_by("lft")[index]
+        )
+
+    def _get_checksums(self, node):
+        return list(node.files.values_list("local_file_id", flat=True))
+
+    def _get_annotations(self, channel_id):
+        return {
+            node["id"]: node
+            for node in ContentNode.objects.filter(channel_id=channel_id).values(
+                *self.annotation_fields
+            )
+        }
+
+    def test_batch_matches_full_annotation(self):
+        channel_id = self._insert_channel()
+        with ContentAnnotationBatch() as batch:
+            for index in (0, 7, 30):
+                node = self._get_leaf(channel_id, index)
+                batch.add(channel_id, self._get_checksums(node), [node.id])
+        incremental_annotations = self._get_annotations(channel_id)
+        set_leaf_node_availability_from_local_file_availability(channel_id)
+        recurse_annotation_up_tree(channel_id)
+        self.assertEqual(incremental_annotations, self._get_annotations(channel_id))
+
+    def _get_tree_pages(self, channel_id):
+        return list(
+            ContentNodeTreePage.objects.filter(channel_id=channel_id)
+            .order_by("id")
+            .values()
+        )
+
+    def test_annotation_builds_tree_pages(self):
+        channel_id = self._insert_channel()
+        self.assertEqual(self._get_tree_pages(channel_id), [])
+        with ContentAnnotationBatch() as batch:
+            node = self._get_leaf(channel_id)
+            batch.add(channel_id, self._get_checksums(node), [node.id])
+        self.assertEqual(
+            [page["id"] for page in self._get_tree_pages(channel_id)],
+            sorted(node.get_ancestors().values_list("id", flat=True)),
+        )
+
+    def test_batch_tree_pages_match_full_annotation(self):
+        channel_id = self._insert_channel()
+        with ContentAnnotationBatch() as batch:
+            for index in (0, 1, 7, 30):
+                node = self._get_leaf(channel_id, index)
+                batch.add(channel_id, self._get_checksums(node), [node.id])
+        incremental_pages = self._get_tree_pages(channel_id)
+        build_tree_pages(channel_id)
+        self.assertEqual(incremental_pages, self._get_tree_pages(channel_id))
+
+    def test_batch_defers_annotation(self):
+        channel_id = self._insert_channel()
+        node = self._get_leaf(channel_id)
+        batch = ContentAnnotationBatch()
+        batch.add(channel_id, self._get_checksums(node), [node.id])
+        self.assertIn(node.id, batch)
+        node.refresh_from_db()
+        self.assertFalse(node.available)
+        self.assertFalse(
+            LocalFile.objects.filter(
+                id__in=self._get_checksums(node), available=False
+            ).exists()
+        )
+        batch.flush()
+        self.assertNotIn(node.id, batch)
+        node.refresh_from_db()
+        self.assertTrue(node.available)
+        self.assertTrue(all(a.available for a in node.get_ancestors()))
+
+    def test_batch_flushes_at_max_size(self):
+        channel_id = self._insert_channel()
+        batch = ContentAnnotationBatch(max_size=2)
+        nodes = [self._get_leaf(channel_id, index) for index in range(2)]
+        for node in nodes:
+            batch.add(channel_id, self._get_checksums(node), [node.id])
+        self.assertEqual(len(batch), 0)
+        self.assertEqual(
+            ContentNode.objects.filter(
+                id__in=[node.id for node in nodes], available=True
+            ).count(),
+            2,
+        )
+
+    def test_topic_node_ids_annotate_subtree(self):
+        channel_id = self._insert_channel()
+        topic = ContentNode.objects.filter(
+            channel_id=channel_id, kind=content_kinds.TOPIC, level=2
+        ).first()
+        checksums = list(
+            LocalFile.objects.filter(
+                files__contentnode__in=topic.get_descendants()
+            ).values_list("id", flat=True)
+        )
+        with ContentAnnotationBatch() as batch:
+            batch.add(channel_id, checksums, [topic.id])
+        incremental_annotations = self._get_annotations(channel_id)
+        set_leaf_node_availability_from_local_file_availability(channel_id)
+        recurse_annotation_up_tree(channel_id)
+        self.assertEqual(incremental_annotations, self._get_annotations(channel_id))
+
+    def _count_annotation_statements(self, channel_id):
+        node = self._get_leaf(channel_id)
+        statements = []
+
+        def count_statement(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(Engine, "before_cursor_execute", count_statement)
+        try:
+            set_leaf_node_availability_from_local_file_availability(
+                channel_id, node_ids=[node.id]
+            )
+            recurse_annotation_up_tree(channel_id, node_ids=[node.id])
+        finally:
+            event.remove(Engine, "before_cursor_execute", count_statement)
+        node.refresh_from_db()
+        return len(statements)
+
+    def test_annotation_cost_independent_of_channel_size(self):
+        # A rough benchmark of the cost of annotating a single resource, the number
+        # of statements should depend on the depth of the tree, not its size.
+        small_channel_id = self._insert_channel(levels=3, num_children=2)
+        large_channel_id = self._insert_channel(levels=3, num_children=6)
+        self.assertGreater(
+            ContentNode.objects.filter(channel_id=large_channel_id).count(),
+            ContentNode.objects.filter(channel_id=small_channel_id).count() * 10,
+        )
+        self.assertEqual(
+            self._count_annotation_statements(small_channel_id),
+            self._count_annotation_statements(large_channel_id),
+        )
+
+
 @patch("kolibri.core.content.utils.sqlalchemybridge.get_engine", new=get_engine)
 class LocalFileAvailableByChecksum(TransactionTestCase):
 
@@ -11,17 +11,20 @@ from django.conf import settings
 from django.core.management import call_command
 from django.test import TestCase
 from django.test import TransactionTestCase
+from le_utils.constants import content_kinds
 from mock import call
 from mock import MagicMock
 from mock import Mock
 from mock import patch
 from sqlalchemy import create_engine
 
+from .helpers import ChannelBuilder
 from .sqlalchemytesting import django_connection_engine
 from .test_content_app import ContentNodeTestBase
 from kolibri.core.content import models as content
 from kolibri.core.content.constants.kind_to_learningactivity import kind_activity_map
 from kolibri.core.content.constants.schema_versions import CONTENT_SCHEMA_VERSION
+from kolibri.core.content.constants.schema_versions import CURRENT_SCHEMA_VERSION
 from kolibri.core.content.constants.schema_versions import NO_VERSION
 from kolibri.core.content.constants.schema_versions import V020BETA1
 from kolibri.core.content.constants.schema_versions import V040BETA3
@@ -42,9 +45,11 @@ from kolibri.core.content.utils.annotation import (
 )
 from kolibri.core.content.utils.annotation import update_content_metadata
 from kolibri.core.content.utils.channel_import import BATCH_SIZE
+from kolibri.core.content.utils.channel_import import ChannelDiff
 from kolibri.core.content.utils.channel_import import ChannelImport
 from kolibri.core.content.utils.channel_import import import_channel_from_data
 from kolibri.core.content.utils.channel_import import import_channel_from_local_db
+from kolibri.core.content.utils.channel_import import ImportCancelError
 from kolibri.core.content.utils.channel_import import topological_sort
 from kolibri.core.content.utils.sqlalchemybridge import get_default_db_string
 from kolibri.core.content.utils.sqlalchemybridge import load_metadata
@@ -295,6 +300,81 @@ class BaseChannelImportClassTableImportTestCase(TestCase):
         )
         self.assertEqual(channel_import.destination.execute.call_count, 2)
 
+    def test_sequential_records_bulk_insert_flush(
+        self, apps_mock, tree_id_mock, BridgeMock
+    ):
+        idValue = uuid.uuid4().hex
+        channel_import = ChannelImport(idValue, "", pipelined=False)
+        record_mock = MagicMock(spec=["__table__"])
+        record_mock.__table__.columns.items.return_value = [("test_attr", MagicMock())]
+        channel_import.destination.get_class.return_value = record_mock
+        channel_import.table_import(
+            MagicMock(), lambda x, y: "test_val", lambda x: [{}] * (BATCH_SIZE + 1)
+        )
+        self.assertEqual(channel_import.destination.execute.call_count, 2)
+
+    def test_generator_table_mapper_all_records_imported(
+        self, apps_mock, tree_id_mock, BridgeMock
+    ):
+        idValue = uuid.uuid4().hex
+        channel_import = ChannelImport(idValue, "")
+        column_mock = MagicMock()
+        column_mock.name = "test_attr"
+        table_mock = channel_import.destination.get_table.return_value
+        table_mock.columns.items.return_value = [("test_attr", column_mock)]
+        model = MagicMock()
+
+        def table_mapper(SourceTable):
+            for i in range(BATCH_SIZE * 2 + 1):
+                yield {"test_attr": i}
+
+        channel_import.table_import(
+            model, lambda record, column: record[column], table_mapper
+        )
+        written = [
+            row["test_attr"]
+            for execute_call in channel_import.destination.execute.call_args_list
+            for row in execute_call[0][1]
+        ]
+        self.assertEqual(written, list(range(BATCH_SIZE * 2 + 1)))
+        self.assertEqual(
+            channel_import.table_timings[model]["rows"], BATCH_SIZE * 2 + 1
+        )
+
+    def test_pipelined_reader_error_raised(self, apps_mock, tree_id_mock, BridgeMock):
+        idValue = uuid.uuid4().hex
+        channel_import = ChannelImport(idValue, "")
+        column_mock = MagicMock()
+        column_mock.name = "test_attr"
+        table_mock = channel_import.destination.get_table.return_value
+        table_mock.columns.items.return_value = [("test_attr", column_mock)]
+
+        def row_mapper(record, column):
+            raise AttributeError("Bad mapping")
+
+        with self.assertRaises(AttributeError):
+            channel_import.table_import(
+                MagicMock(), row_mapper, lambda x: [{}] * BATCH_SIZE
+            )
+        channel_import.destination.execute.assert_not_called()
+
+    def test_pipelined_import_cancelled(self, apps_mock, tree_id_mock, BridgeMock):
+        idValue = uuid.uuid4().hex
+        channel_import = ChannelImport(idValue, "")
+        column_mock = MagicMock()
+        column_mock.name = "test_attr"
+        table_mock = channel_import.destination.get_table.return_value
+        table_mock.columns.items.return_value = [("test_attr", column_mock)]
+        # Allow the first batch to be written, then cancel
+        channel_import.cancel_check = Mock(side_effect=[False, False, True])
+        with self.assertRaises(ImportCancelError):
+            channel_import.table_import(
+                MagicMock(),
+                lambda x, y: "test_val",
+                lambda x: [{}] * (BATCH_SIZE * 10),
+            )
+        channel_import.destination.execute.assert_called_once()
+
 
 @patch("kolibri.core.content.utils.channel_import.Bridge")
 @patch("kolibri.core.content.utils.channel_import.ChannelImport.find_unique_tree_id")
@@ -415,7 +495,12 @@ class ContentImportTestBase(TransactionTestCase):
     def set_content_fixture(self, db_path_mock):
         _, self.content_db_path = tempfile.mkstemp(suffix=".sqlite3")
         db_path_mock.return_value = self.content_db_path
-        self.content_engine = create_engine("sqlite:///" + self.content_db_path)
+        # Match the connection arguments of the engine returned by get_engine, so that
+        # pipelined imports can read from the source database on a separate thread.
+        self.content_engine = create_engine(
+            "sqlite:///" + self.content_db_path,
+            connect_args={"check_same_thread": False},
+        )
 
         metadata = load_metadata(self.schema_name)
 
@@ -1069,3 +1154,168 @@ class ChannelImportTestCase(ContentImportTestBase, TransactionTestCase):
         self.channel_import.channel_version = self.channel_version
         result = self.channel_import.check_and_delete_existing_channel()
         self.assertTrue(result)
+
+
+class IncrementalChannelUpgradeTestCase(TransactionTestCase):
+    """
+    Run using a TransactionTestCase for the same reasons as ContentImportTestBase.
+    """
+
+    # Annotations that depend on which resources were available before the upgrade,
+    # or on the tree that the channel was imported into.
+    availability_fields = {
+        "available",
+        "admin_imported",
+        "num_coach_contents",
+        "on_device_resources",
+        "tree_id",
+    }
+
+    def setUp(self):
+        super(IncrementalChannelUpgradeTestCase, self).setUp()
+        self.content_db_path = None
+        self.content_engine = None
+        patcher = patch(
+            "kolibri.core.content.utils.sqlalchemybridge.get_engine",
+            new=self.get_engine,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.builder = ChannelBuilder()
+        self.builder.channel["min_schema_version"] = CONTENT_SCHEMA_VERSION
+        self.channel_id = self.builder.channel["id"]
+        self.import_content_fixture()
+        ContentNode.objects.all().update(available=True)
+        LocalFile.objects.all().update(available=True)
+
+        self.builder.upgrade(new_resources=3, updated_resources=4, deleted_resources=5)
+        self.builder.channel["version"] = 2
+        self.set_content_fixture()
+
+    def set_content_fixture(self):
+        self.dispose_content_fixture()
+        _, self.content_db_path = tempfile.mkstemp(suffix=".sqlite3")
+        self.content_engine = create_engine(
+            "sqlite:///" + self.content_db_path,
+            connect_args={"check_same_thread": False},
+        )
+        metadata = load_metadata(CURRENT_SCHEMA_VERSION)
+        metadata.bind = self.content_engine
+        metadata.create_all()
+        data = self.builder.data
+        # The builder keys the channel metadata by model name, rather than by table name.
+        data[ChannelMetadata._meta.db_table] = data.pop("content_channel")
+        # The builder keys foreign keys by field name, rather than by column name.
+        for node in data["content_contentnode"]:
+            for field in ContentNode._meta.concrete_fields:
+                if field.name != field.attname:
+                    node[field.attname] = node.pop(field.name)
+        with self.content_engine.connect() as conn:
+            for table in metadata.sorted_tables:
+                if table.name in data:
+                    conn.execute(table.insert(), data[table.name])
+
+    def import_content_fixture(self, incremental=False):
+        self.set_content_fixture()
+        return self.import_channel(incremental=incremental)
+
+    def import_channel(self, incremental=False):
+        with patch(
+            "kolibri.core.content.utils.channel_import.get_content_database_file_path",
+            return_value=self.content_db_path,
+        ):
+            return import_channel_from_local_db(
+                self.channel_id, incremental=incremental
+            )
+
+    def dispose_content_fixture(self):
+        if self.content_engine is not None:
+            self.content_engine.dispose()
+            os.remove(self.content_db_path)
+
+    def get_engine(self, connection_string):
+        if connection_string == get_default_db_string():
+            return django_connection_engine()
+        return self.content_engine
+
+    def tearDown(self):
+        self.dispose_content_fixture()
+        call_command("flush", interactive=False)
+        super(IncrementalChannelUpgradeTestCase, self).tearDown()
+
+    @classmethod
+    def tearDownClass(cls):
+        django_connection_engine().dispose()
+        super(IncrementalChannelUpgradeTestCase, cls).tearDownClass()
+
+    def _get_nodes(self):
+        return {
+            node["id"]: {
+                key: value
+                for key, value in node.items()
+                if key not in self.availability_fields
+            }
+            for node in ContentNode.objects.filter(channel_id=self.channel_id).values()
+        }
+
+    def test_upgrade_returns_diff(self):
+        result = self.import_channel(incremental=True)
+        self.assertTrue(result)
+        diff = result.diff
+        self.assertIsInstance(diff, ChannelDiff)
+        self.assertEqual(
+            diff.inserted, {node["id"] for node in self.builder.new_resources}
+        )
+        self.assertEqual(
+            diff.deleted, {node["id"] for node in self.builder.deleted_resources}
+        )
+        self.assertTrue(
+            {node["id"] for node in self.builder.updated_resources}.issubset(
+                diff.updated
+            )
+        )
+        self.assertGreater(diff.unchanged_rows, 0)
+
+    def test_upgrade_only_writes_changed_nodes(self):
+        diff = self.import_channel(incremental=True).diff
+        # The parents of new resources have their thumbnails updated, and the root
+        # node is referenced by the updated channel metadata.
+        expected = (
+            {node["id"] for node in self.builder.new_resources}
+            | {node["parent_id"] for node in self.builder.new_resources}
+            | {node["id"] for node in self.builder.updated_resources}
+            | {self.builder.root_node["id"]}
+        )
+        self.assertEqual(diff.changed - expected, set())
+
+    def test_upgrade_matches_full_import(self):
+        self.import_channel(incremental=True)
+        incremental_nodes = self._get_nodes()
+        ChannelMetadata.objects.filter(id=self.channel_id).update(version=1)
+        self.assertTrue(self.import_channel())
+        self.assertEqual(incremental_nodes, self._get_nodes())
+
+    def test_upgrade_keeps_availability(self):
+        self.import_channel(incremental=True)
+        new_ids = [node["id"] for node in self.builder.new_resources]
+        # Updated resources use new files that are not yet on disk
+        updated_ids = [node["id"] for node in self.builder.updated_resources]
+        self.assertFalse(
+            ContentNode.objects.filter(
+                id__in=new_ids + updated_ids, available=True
+            ).exists()
+        )
+        self.assertFalse(
+            ContentNode.objects.filter(channel_id=self.channel_id, available=False)
+            .exclude(kind=content_kinds.TOPIC)
+            .exclude(id__in=new_ids + updated_ids)
+            .exists()
+        )
+        self.assertTrue(
+            ContentNode.objects.get(id=self.builder.root_node["id"]).available
+        )
+
+    def test_same_version_not_upgraded(self):
+        ChannelMetadata.objects.filter(id=self.channel_id).update(version=2)
+        self.assertFalse(self.import_channel(incremental=True))
@@ -31,7 +31,12 @@ class ChannelUpdateTestBase(TestCase):
     def set_content_fixture(cls):
         _, cls.content_db_path = tempfile.mkstemp(suffix=".sqlite3")
 
-        cls.content_engine = create_engine("sqlite:///" + cls.content_db_path)
+        # Match the connection arguments of the engine returned by get_engine, so that
+        # pipelined imports can read from the source database on a separate thread.
+        cls.content_engine = create_engine(
+            "sqlite:///" + cls.content_db_path,
+            connect_args={"check_same_thread": False},
+        )
 
         metadata = load_metadata(CURRENT_SCHEMA_VERSION)
 
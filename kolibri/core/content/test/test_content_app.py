@@ -2,15 +2,20 @@
 To run this test, type this in command line <kolibri manage test -- kolibri.core.content>
 """
 import datetime
+import hashlib
 import time
 import unittest
 import uuid
+import zlib
 from base64 import urlsafe_b64decode
+from io import StringIO
 
 import mock
 from django.conf import settings
 from django.core.cache import cache
+from django.core.management import call_command
 from django.test import LiveServerTestCase
+from django.test import override_settings
 from django.test import TestCase
 from django.urls import reverse
 from django.utils import timezone
@@ -22,9 +27,17 @@ from kolibri.core.auth.models import Classroom
 from kolibri.core.auth.models import Facility
 from kolibri.core.auth.models import FacilityUser
 from kolibri.core.auth.models import LearnerGroup
+from kolibri.core.auth.test.helpers import clear_process_cache
 from kolibri.core.auth.test.helpers import provision_device
 from kolibri.core.content import models as content
+from kolibri.core.content.api import BaseContentNodeMixin
+from kolibri.core.content.api import ContentNodeViewset
+from kolibri.core.content.api import get_metadata_cache_stats
+from kolibri.core.content.api import TreeQueryMixin
 from kolibri.core.content.test.helpers import ChannelBuilder
+from kolibri.core.content.utils.search_index import index_all_channels
+from kolibri.core.content.utils.search_index import search_queryset
+from kolibri.core.content.utils.tree_pages import build_tree_pages
 from kolibri.core.device.models import ContentCacheKey
 from kolibri.core.device.models import DevicePermissions
 from kolibri.core.device.models import DeviceSettings
@@ -35,6 +48,8 @@ from kolibri.core.lessons.models import Lesson
 from kolibri.core.lessons.models import LessonAssignment
 from kolibri.core.logger.models import ContentSessionLog
 from kolibri.core.logger.models import ContentSummaryLog
+from kolibri.core.utils.cache import get_contentnode_cache
+from kolibri.core.utils.cache import get_metadata_cache
 from kolibri.utils.tests.helpers import override_option
 
 DUMMY_PASSWORD = "password"
@@ -2139,3 +2154,470 @@ class ChannelThumbnailViewTestCase(APITestCase):
             reverse("kolibri:core:channel-thumbnail", args=[self.channel_metadata.id])
         )
         self.assertEqual(response.status_code, 404)
+
+
+class ContentNodeSearchIndexAPITestCase(ContentNodeAPIBase, APITestCase):
+    """
+    Testcase for searches that use the full text search index
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super(ContentNodeSearchIndexAPITestCase, cls).setUpTestData()
+        index_all_channels()
+
+    def _search(self, **data):
+        with mock.patch(
+            "kolibri.core.content.api.search_queryset", wraps=search_queryset
+        ) as search_queryset_mock:
+            response = self.client.get(
+                reverse("kolibri:core:contentnode_search-list"), data=data
+            )
+            search_queryset_mock.assert_called()
+        return response
+
+    def test_search_total_results(self):
+        response = self._search(search="root")
+        self.assertEqual(response.data["total_results"], 1)
+
+    def test_search_kinds(self):
+        response = self._search(search="root")
+        self.assertEqual(list(response.data["content_kinds"]), [content_kinds.TOPIC])
+
+    def test_search_channels(self):
+        response = self._search(search="root")
+        self.assertEqual(response.data["channel_ids"][:], [self.the_channel_id])
+
+    def test_search_unique_content_ids(self):
+        response = self._search(search="c")
+        content_ids = [node["content_id"] for node in response.data["results"]]
+        self.assertEqual(len(content_ids), len(set(content_ids)))
+        self.assertEqual(len(content_ids), response.data["total_results"])
+
+    def test_search_max_results(self):
+        response = self._search(search="c", max_results=2)
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertGreater(response.data["total_results"], 2)
+
+    def test_search_filtered(self):
+        response = self._search(search="c", kind=content_kinds.VIDEO)
+        kinds = {node["kind"] for node in response.data["results"]}
+        self.assertEqual(kinds, {content_kinds.VIDEO})
+        # Kinds are collected from all matches, not only the filtered ones.
+        self.assertIn(content_kinds.TOPIC, response.data["content_kinds"])
+
+    def test_search(self):
+        response = self.client.get(
+            reverse("kolibri:core:contentnode_search-list"), data={"search": "!?,"}
+        )
+        self.assertEqual(len(response.data["results"]), 0)
+        response = self._search(search="or")
+        self.assertEqual(len(response.data["results"]), 0)
+        response = self._search(search="root")
+        self.assertEqual(len(response.data["results"]), 1)
+
+
+@override_settings(
+    CACHES=dict(
+        settings.CACHES,
+        contentnode_cache={
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "test_contentnode_cache",
+            "OPTIONS": {"MAX_ENTRIES": 20000},
+        },
+    )
+)
+class ContentNodeCacheAPITestCase(ContentNodeAPIBase, APITestCase):
+    """
+    Testcase for serializing ContentNodes from the cache of serialized ContentNodes
+    """
+
+    def setUp(self):
+        super(ContentNodeCacheAPITestCase, self).setUp()
+        get_contentnode_cache().clear()
+
+    def _get_with_serialize_nodes(self, *args, **kwargs):
+        """
+        Make a GET request, returning the response and the querysets of the
+        ContentNodes that were serialized for it.
+        """
+        serialized_querysets = []
+        serialize_nodes = BaseContentNodeMixin.serialize_nodes
+
+        def record_serialize_nodes(viewset, queryset):
+            serialized_querysets.append(queryset)
+            return serialize_nodes(viewset, queryset)
+
+        with mock.patch.object(
+            BaseContentNodeMixin, "serialize_nodes", record_serialize_nodes
+        ):
+            response = self.client.get(*args, **kwargs)
+        return response, serialized_querysets
+
+    def test_list_from_cache(self):
+        url = reverse("kolibri:core:contentnode-list")
+        response, serialized = self._get_with_serialize_nodes(url)
+        self.assertEqual(len(serialized), 1)
+        cached_response, serialized = self._get_with_serialize_nodes(url)
+        self.assertEqual(serialized, [])
+        self.assertEqual(cached_response.data, response.data)
+
+    def test_tree_from_cache(self):
+        root = content.ContentNode.objects.get(
+            channel_id=self.the_channel_id, parent=None
+        )
+        url = reverse("kolibri:core:contentnode_tree-detail", kwargs={"pk": root.id})
+        response, serialized = self._get_with_serialize_nodes(url)
+        self.assertEqual(len(serialized), 1)
+        cached_response, serialized = self._get_with_serialize_nodes(url)
+        self.assertEqual(serialized, [])
+        self.assertEqual(cached_response.data, response.data)
+
+    def test_retrieve_from_list_cache(self):
+        self.client.get(reverse("kolibri:core:contentnode-list"))
+        node = content.ContentNode.objects.filter(available=True).first()
+        response, serialized = self._get_with_serialize_nodes(
+            reverse("kolibri:core:contentnode-detail", kwargs={"pk": node.id})
+        )
+        self.assertEqual(serialized, [])
+        self._assert_node(response.data, node)
+
+    def test_only_missing_nodes_serialized(self):
+        nodes = content.ContentNode.objects.filter(available=True)
+        node_ids = list(nodes.values_list("id", flat=True)[:2])
+        self.client.get(
+            reverse("kolibri:core:contentnode-list"), data={"ids": node_ids[0]}
+        )
+        response, serialized = self._get_with_serialize_nodes(
+            reverse("kolibri:core:contentnode-list"), data={"ids": ",".join(node_ids)}
+        )
+        self.assertEqual(len(serialized), 1)
+        self.assertEqual(list(serialized[0].values_list("id", flat=True)), node_ids[1:])
+        self.assertEqual(
+            [node["id"] for node in response.data],
+            list(nodes.filter(id__in=node_ids).values_list("id", flat=True)),
+        )
+
+    def test_cache_invalidated_by_content_cache_key(self):
+        node = content.ContentNode.objects.filter(available=True).first()
+        url = reverse("kolibri:core:contentnode-detail", kwargs={"pk": node.id})
+        self.client.get(url)
+        content.ContentNode.objects.filter(id=node.id).update(title="Updated")
+        ContentCacheKey.update_cache_key()
+        response = self.client.get(url)
+        self.assertEqual(response.data["title"], "Updated")
+
+    def test_tree_requests_cached(self):
+        """
+        Repeated tree requests for all the topics of a channel are returned from the cache,
+        with the same responses as when they were serialized.
+        """
+        builder = ChannelBuilder(levels=3, num_children=10)
+        builder.insert_into_default_db()
+        topic_ids = list(
+            content.ContentNode.objects.filter(
+                channel_id=builder.channel["id"], kind=content_kinds.TOPIC
+            ).values_list("id", flat=True)
+        )
+        content.ContentNode.objects.filter(channel_id=builder.channel["id"]).update(
+            available=True
+        )
+
+        def get_trees():
+            responses = []
+            serialized = []
+            for topic_id in topic_ids:
+                response, serialized_querysets = self._get_with_serialize_nodes(
+                    reverse(
+                        "kolibri:core:contentnode_tree-detail", kwargs={"pk": topic_id}
+                    )
+                )
+                responses.append(response.data)
+                serialized.extend(serialized_querysets)
+            return responses, serialized
+
+        uncached_responses, _ = get_trees()
+        cached_responses, serialized = get_trees()
+        self.assertEqual(serialized, [])
+        self.assertEqual(cached_responses, uncached_responses)
+
+
+@override_settings(
+    CACHES=dict(
+        settings.CACHES,
+        metadata_cache={
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "test_metadata_cache",
+        },
+    )
+)
+class MetadataCacheAPITestCase(ContentNodeAPIBase, APITestCase):
+    """
+    Testcase for the cache of the responses of the content metadata endpoints
+    """
+
+    def setUp(self):
+        super(MetadataCacheAPITestCase, self).setUp()
+        clear_process_cache()
+        get_metadata_cache().clear()
+        self.node = content.ContentNode.objects.filter(
+            channel_id=self.the_channel_id, available=True
+        ).first()
+        self.url = reverse(
+            "kolibri:core:contentnode-detail", kwargs={"pk": self.node.id}
+        )
+
+    def _update_cache_key(self, channel_ids=None):
+        time.sleep(0.01)
+        ContentCacheKey.update_cache_key(channel_ids=channel_ids)
+
+    def test_cached_response_returned_without_view(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        with mock.patch.object(
+            ContentNodeViewset, "retrieve", side_effect=AssertionError
+        ):
+            cached_response = self.client.get(self.url)
+        self.assertEqual(cached_response.status_code, 200)
+        self.assertEqual(cached_response.json(), response.json())
+        self.assertEqual(cached_response["Content-Type"], response["Content-Type"])
+        self.assertEqual(cached_response["ETag"], response["ETag"])
+        stats = get_metadata_cache_stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_cached_response_compressed(self):
+        response = self.client.get(self.url)
+        cache_key = ContentCacheKey.get_channel_cache_key(self.the_channel_id)
+        self.assertEqual(response["ETag"], '"{}"'.format(cache_key))
+        url_key = hashlib.md5(
+            "http://testserver{}".format(self.url).encode()
+        ).hexdigest()
+        cached = get_metadata_cache().get("{}:{}".format(cache_key, url_key))
+        self.assertEqual(zlib.decompress(cached["content"]), response.content)
+
+    def test_channel_etag_unchanged_by_other_channel(self):
+        response = self._cached_get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self._update_cache_key(channel_ids=[uuid.uuid4().hex])
+        response = self._cached_get(self.url)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(get_metadata_cache_stats()["not_modified"], 1)
+
+    def test_channel_etag_changed_by_channel(self):
+        response = self._cached_get(self.url)
+        self._update_cache_key(channel_ids=[self.the_channel_id])
+        response = self._cached_get(self.url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_channel_etag_changed_by_all_channels(self):
+        response = self._cached_get(self.url)
+        self._update_cache_key()
+        response = self._cached_get(self.url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_channel_list_etag(self):
+        url = reverse("kolibri:core:contentnode-list")
+        channel_url = url + "?channel_id=" + self.the_channel_id
+        self._cached_get(url)
+        self._cached_get(channel_url)
+        self._update_cache_key(channel_ids=[uuid.uuid4().hex])
+        self.assertEqual(self._cached_get(url).status_code, 200)
+        self.assertEqual(self._cached_get(channel_url).status_code, 304)
+
+    def test_tree_etag_unchanged_by_other_channel(self):
+        root = content.ContentNode.objects.get(title="root")
+        url = reverse("kolibri:core:contentnode_tree-detail", kwargs={"pk": root.id})
+        self.assertEqual(self._cached_get(url).status_code, 200)
+        self._update_cache_key(channel_ids=[uuid.uuid4().hex])
+        self.assertEqual(self._cached_get(url).status_code, 304)
+
+    def test_channel_metadata_etag(self):
+        url = reverse("kolibri:core:channel-detail", kwargs={"pk": self.the_channel_id})
+        self.assertEqual(self._cached_get(url).status_code, 200)
+        self._update_cache_key(channel_ids=[uuid.uuid4().hex])
+        self.assertEqual(self._cached_get(url).status_code, 304)
+        self._update_cache_key(channel_ids=[self.the_channel_id])
+        self.assertEqual(self._cached_get(url).status_code, 200)
+
+    def test_invalid_pk_uses_cache_key(self):
+        url = reverse("kolibri:core:contentnode-detail", kwargs={"pk": "notanid"})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(
+            response["ETag"], '"{}"'.format(ContentCacheKey.get_cache_key())
+        )
+
+    def test_error_response_not_cached(self):
+        url = reverse(
+            "kolibri:core:contentnode-detail", kwargs={"pk": uuid.uuid4().hex}
+        )
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(get_metadata_cache_stats()["hits"], 0)
+
+    def test_metadata_cache_stats_command(self):
+        self.client.get(self.url)
+        self.client.get(self.url)
+        out = StringIO()
+        call_command("metadatacachestats", reset=True, stdout=out)
+        self.assertIn("Hit rate: 50%", out.getvalue())
+        self.assertIsNone(get_metadata_cache_stats()["hit_rate"])
+
+
+class ContentNodeTreePageAPITestCase(APITestCase):
+    """
+    Testcase for returning the topic tree from the precomputed pages of the tree
+    """
+
+    databases = "__all__"
+
+    def _get_tree(self, pk, data=None):
+        """
+        Make a request for the tree of pk, returning the response and whether the
+        tree was queried for it, rather than returned from the pages of the tree.
+        """
+        calls = []
+        get_child_ids = TreeQueryMixin.get_child_ids
+
+        def record_get_child_ids(viewset, *args):
+            calls.append(args)
+            return get_child_ids(viewset, *args)
+
+        with mock.patch.object(TreeQueryMixin, "get_child_ids", record_get_child_ids):
+            response = self.client.get(
+                reverse("kolibri:core:contentnode_tree-detail", kwargs={"pk": pk}),
+                data=data,
+            )
+        return response, bool(calls)
+
+    def _build_channel(self):
+        builder = ChannelBuilder(levels=1, num_children=13)
+        builder.insert_into_default_db()
+        channel_id = builder.channel["id"]
+        content.ContentNode.objects.filter(channel_id=channel_id).update(available=True)
+        topics = list(
+            content.ContentNode.objects.filter(
+                channel_id=channel_id, kind=content_kinds.TOPIC, level=1
+            )
+        )
+        leaves = content.ContentNode.objects.exclude(kind=content_kinds.TOPIC)
+        first_leaf_ids = [leaves.filter(parent=topic).first().id for topic in topics]
+        # A topic with a single available child
+        leaves.filter(parent=topics[0]).exclude(id=first_leaf_ids[0]).update(
+            available=False
+        )
+        # A topic with a single child that is not coach content
+        leaves.filter(parent=topics[1]).exclude(id=first_leaf_ids[1]).update(
+            coach_content=True
+        )
+        # A topic with only coach content
+        leaves.filter(parent=topics[2]).update(coach_content=True)
+        content.ContentNode.objects.filter(id=topics[2].id).update(coach_content=True)
+        # A topic with some coach content
+        leaves.filter(parent=topics[3]).exclude(id__in=first_leaf_ids).update(
+            coach_content=True
+        )
+        build_tree_pages(channel_id)
+        return channel_id, topics
+
+    def test_tree_pages_match_tree_queries(self):
+        channel_id, topics = self._build_channel()
+        root_id = topics[0].parent_id
+        requests = [
+            (topic_id, data)
+            for topic_id in [root_id] + [topic.id for topic in topics]
+            for data in (
+                {},
+                {"include_coach_content": "false"},
+                {"include_coach_content": "true"},
+                {"depth": 1},
+            )
+        ]
+        next__gt = content.ContentNode.objects.filter(parent_id=root_id)[11].rght
+        requests.append((root_id, {"next__gt": next__gt, "depth": 2}))
+        requests.append((root_id, {"next__gt": next__gt, "depth": 1}))
+        page_responses = []
+        for topic_id, data in requests:
+            response, queried = self._get_tree(topic_id, data=data)
+            if response.status_code == 200:
+                self.assertFalse(queried)
+            page_responses.append((response.status_code, response.data))
+        content.ContentNodeTreePage.objects.all().delete()
+        for (topic_id, data), page_response in zip(requests, page_responses):
+            response, queried = self._get_tree(topic_id, data=data)
+            self.assertEqual((response.status_code, response.data), page_response)
+
+    def test_filtered_tree_queried(self):
+        channel_id, topics = self._build_channel()
+        response, queried = self._get_tree(
+            topics[0].parent_id, data={"kind_in": content_kinds.TOPIC}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(queried)
+
+    def test_tree_without_pages_queried(self):
+        channel_id, topics = self._build_channel()
+        content.ContentNodeTreePage.objects.all().delete()
+        response, queried = self._get_tree(topics[0].parent_id)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(queried)
+
+    def test_build_tree_pages_of_topics(self):
+        channel_id, topics = self._build_channel()
+        content.ContentNode.objects.filter(parent=topics[4]).update(available=False)
+        content.ContentNode.objects.filter(id=topics[4].id).update(available=False)
+        content.ContentNode.objects.filter(parent=topics[5]).update(coach_content=True)
+        build_tree_pages(
+            channel_id, topic_ids=[topics[0].parent_id, topics[4].id, topics[5].id]
+        )
+        self.assertFalse(
+            content.ContentNodeTreePage.objects.filter(id=topics[4].id).exists()
+        )
+        pages = list(
+            content.ContentNodeTreePage.objects.filter(channel_id=channel_id)
+            .order_by("id")
+            .values()
+        )
+        build_tree_pages(channel_id)
+        self.assertEqual(
+            list(
+                content.ContentNodeTreePage.objects.filter(channel_id=channel_id)
+                .order_by("id")
+                .values()
+            ),
+            pages,
+        )
+
+    def test_delete_channel_deletes_tree_pages(self):
+        channel_id, _ = self._build_channel()
+        content.ChannelMetadata.objects.get(
+            id=channel_id
+        ).delete_content_tree_and_files()
+        self.assertFalse(
+            content.ContentNodeTreePage.objects.filter(channel_id=channel_id).exists()
+        )
+
+    def test_tree_pages_match_queried_trees(self):
+        """
+        Tree requests for all the topics of a channel return the same responses from
+        the tree pages as when the tree is queried.
+        """
+        builder = ChannelBuilder(levels=3, num_children=10)
+        builder.insert_into_default_db()
+        channel_id = builder.channel["id"]
+        content.ContentNode.objects.filter(channel_id=channel_id).update(available=True)
+        build_tree_pages(channel_id)
+        topic_ids = list(
+            content.ContentNode.objects.filter(
+                channel_id=channel_id, kind=content_kinds.TOPIC
+            ).values_list("id", flat=True)
+        )
+
+        def get_trees():
+            return [self._get_tree(topic_id)[0].data for topic_id in topic_ids]
+
+        page_responses = get_trees()
+        content.ContentNodeTreePage.objects.all().delete()
+        query_responses = get_trees()
+        self.assertEqual(page_responses, query_responses)
@@ -0,0 +1,235 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import uuid
+
+from django.test import TestCase
+from mock import MagicMock
+from mock import patch
+
+from kolibri.core.content.utils.file_bundle import download_file_bundle
+from kolibri.core.content.utils.file_bundle import FileBundleNotSupported
+from kolibri.core.content.utils.file_bundle import group_files_for_bundles
+from kolibri.core.content.utils.file_bundle import MAX_BUNDLE_FILES
+from kolibri.core.content.utils.file_bundle import MAX_BUNDLED_FILE_SIZE
+from kolibri.core.content.utils.file_bundle import stream_file_bundle
+from kolibri.core.content.utils.paths import get_content_file_name
+from kolibri.core.content.utils.paths import get_content_storage_file_path
+from kolibri.core.content.utils.resource_import import (
+    RemoteChannelResourceImportManager,
+)
+from kolibri.utils.filesystem import mkdirp
+
+
+def _create_file(content_dir, content=None, extension="png"):
+    content = content if content is not None else os.urandom(1024)
+    f = {
+        "id": hashlib.md5(content).hexdigest(),
+        "file_size": len(content),
+        "extension": extension,
+    }
+    path = get_content_storage_file_path(
+        get_content_file_name(f), contentfolder=content_dir
+    )
+    mkdirp(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as fp:
+        fp.write(content)
+    return f
+
+
+class GroupFilesForBundlesTestCase(TestCase):
+    def _file(self, file_size):
+        return {"id": uuid.uuid4().hex, "file_size": file_size, "extension": "png"}
+
+    def test_small_files_grouped(self):
+        files = [self._file(100) for _ in range(MAX_BUNDLE_FILES + 1)]
+        groups = list(group_files_for_bundles(files))
+        self.assertEqual(
+            [len(group) for group in groups],
+            [MAX_BUNDLE_FILES, 1],
+        )
+
+    def test_large_files_not_grouped(self):
+        large_file = self._file(MAX_BUNDLED_FILE_SIZE + 1)
+        files = [self._file(100), large_file, self._file(100)]
+        groups = list(group_files_for_bundles(files))
+        self.assertIn([large_file], groups)
+        self.assertIn([files[0], files[2]], groups)
+
+
+class DownloadFileBundleTestCase(TestCase):
+    def setUp(self):
+        self.source_dir = tempfile.mkdtemp()
+        self.dest_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.source_dir, ignore_errors=True)
+        shutil.rmtree(self.dest_dir, ignore_errors=True)
+
+    def _get_session(self, filenames=None, status_code=200):
+        session = MagicMock()
+
+        def post(url, json=None, **kwargs):
+            with patch(
+                "kolibri.core.content.utils.paths.get_content_dir_path",
+                return_value=self.source_dir,
+            ):
+                data = b"".join(stream_file_bundle(filenames or json))
+            response = MagicMock()
+            response.status_code = status_code
+            response.raw = io.BytesIO(data)
+            return response
+
+        session.post.side_effect = post
+        return session
+
+    def _dest_path(self, f):
+        return get_content_storage_file_path(
+            get_content_file_name(f), contentfolder=self.dest_dir
+        )
+
+    def test_download_file_bundle(self):
+        files = [_create_file(self.source_dir) for _ in range(3)]
+        transferred = download_file_bundle(
+            self._get_session(), "http://test.com/", files, content_dir=self.dest_dir
+        )
+        self.assertEqual(transferred, {f["id"] for f in files})
+        for f in files:
+            with open(self._dest_path(f), "rb") as dest, open(
+                get_content_storage_file_path(
+                    get_content_file_name(f), contentfolder=self.source_dir
+                ),
+                "rb",
+            ) as source:
+                self.assertEqual(dest.read(), source.read())
+
+    def test_download_file_bundle_missing_file(self):
+        f1 = _create_file(self.source_dir)
+        f2 = {"id": uuid.uuid4().hex, "file_size": 10, "extension": "png"}
+        transferred = download_file_bundle(
+            self._get_session(), "http://test.com/", [f1, f2], content_dir=self.dest_dir
+        )
+        self.assertEqual(transferred, {f1["id"]})
+        self.assertFalse(os.path.exists(self._dest_path(f2)))
+
+    def test_download_file_bundle_corrupted_file(self):
+        f1 = _create_file(self.source_dir)
+        f2 = _create_file(self.source_dir)
+        with open(
+            get_content_storage_file_path(
+                get_content_file_name(f2), contentfolder=self.source_dir
+            ),
+            "wb",
+        ) as fp:
+            fp.write(b"corrupted")
+        transferred = download_file_bundle(
+            self._get_session(), "http://test.com/", [f1, f2], content_dir=self.dest_dir
+        )
+        self.assertEqual(transferred, {f1["id"]})
+        self.assertFalse(os.path.exists(self._dest_path(f2)))
+        self.assertFalse(os.path.exists(self._dest_path(f2) + ".transfer"))
+
+    def test_download_file_bundle_not_supported(self):
+        f = _create_file(self.source_dir)
+        with self.assertRaises(FileBundleNotSupported):
+            download_file_bundle(
+                self._get_session(status_code=404),
+                "http://test.com/",
+                [f],
+                content_dir=self.dest_dir,
+            )
+
+
+@patch("kolibri.core.content.utils.resource_import.schedule_ping")
+@patch(
+    "kolibri.core.content.utils.resource_import.lookup_channel_listing_status",
+    return_value=None,
+)
+@patch("kolibri.core.content.utils.resource_import.get_import_export_data")
+@patch("kolibri.core.content.utils.resource_import.transfer.FileDownload")
+@patch("kolibri.core.content.utils.resource_import.file_bundle.download_file_bundle")
+class RemoteResourceImportFileBundleTestCase(TestCase):
+    def setUp(self):
+        self.content_dir = tempfile.mkdtemp()
+        self.small_files = [
+            {"id": uuid.uuid4().hex, "file_size": 100, "extension": "png"}
+            for _ in range(4)
+        ]
+        self.large_file = {
+            "id": uuid.uuid4().hex,
+            "file_size": MAX_BUNDLED_FILE_SIZE + 1,
+            "extension": "mp4",
+        }
+        self.files = self.small_files + [self.large_file]
+        patcher = patch("kolibri.core.content.utils.resource_import.annotation")
+        self.addCleanup(patcher.stop)
+        self.annotation_mock = patcher.start()
+        self.annotation_mock.calculate_dummy_progress_for_annotation.return_value = 1
+
+    def tearDown(self):
+        shutil.rmtree(self.content_dir, ignore_errors=True)
+
+    def _run_import(self, get_import_export_mock, baseurl="http://peer.local/"):
+        get_import_export_mock.return_value = (
+            1,
+            self.files,
+            sum(f["file_size"] for f in self.files),
+        )
+        manager = RemoteChannelResourceImportManager(
+            uuid.uuid4().hex, baseurl=baseurl, content_dir=self.content_dir
+        )
+        manager.run()
+        return manager
+
+    def _downloaded_checksums(self, FileDownloadMock):
+        return {c[0][2] for c in FileDownloadMock.call_args_list}
+
+    def test_small_files_bundled(
+        self, download_bundle_mock, FileDownloadMock, get_import_export_mock, *args
+    ):
+        download_bundle_mock.side_effect = lambda session, baseurl, files, **kwargs: {
+            f["id"] for f in files
+        }
+        manager = self._run_import(get_import_export_mock)
+        download_bundle_mock.assert_called_once()
+        self.assertEqual(
+            self._downloaded_checksums(FileDownloadMock), {self.large_file["id"]}
+        )
+        self.assertEqual(
+            set(manager.file_checksums_to_annotate), {f["id"] for f in self.files}
+        )
+        self.assertEqual(manager.transferred_file_size, manager.total_bytes_to_transfer)
+
+    def test_files_missing_from_bundle_downloaded_individually(
+        self, download_bundle_mock, FileDownloadMock, get_import_export_mock, *args
+    ):
+        download_bundle_mock.return_value = {self.small_files[0]["id"]}
+        manager = self._run_import(get_import_export_mock)
+        self.assertEqual(
+            self._downloaded_checksums(FileDownloadMock),
+            {f["id"] for f in self.files[1:]},
+        )
+        self.assertEqual(
+            set(manager.file_checksums_to_annotate), {f["id"] for f in self.files}
+        )
+
+    def test_bundles_not_supported(
+        self, download_bundle_mock, FileDownloadMock, get_import_export_mock, *args
+    ):
+        download_bundle_mock.side_effect = FileBundleNotSupported
+        manager = self._run_import(get_import_export_mock)
+        self.assertFalse(manager.use_file_bundles)
+        self.assertEqual(
+            self._downloaded_checksums(FileDownloadMock), {f["id"] for f in self.files}
+        )
+
+    def test_no_bundles_from_studio(
+        self, download_bundle_mock, FileDownloadMock, get_import_export_mock, *args
+    ):
+        self._run_import(get_import_export_mock, baseurl=None)
+        download_bundle_mock.assert_not_called()
+        self.assertEqual(
+            self._downloaded_checksums(FileDownloadMock), {f["id"] for f in self.files}
+        )
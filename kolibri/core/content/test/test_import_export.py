@@ -1,11 +1,14 @@
+import hashlib
 import itertools
 import json
 import os
+import shutil
 import sys
 import tempfile
 import time
 import uuid
 from io import StringIO
+from urllib.parse import urlsplit
 
 from django.core.management import call_command
 from django.core.management import CommandError
@@ -27,6 +30,7 @@ from kolibri.core.content.models import ContentNode
 from kolibri.core.content.models import File
 from kolibri.core.content.models import LocalFile
 from kolibri.core.content.utils import paths
+from kolibri.core.content.utils.channel_import import ChannelImportResult
 from kolibri.core.content.utils.content_types_tools import (
     renderable_contentnodes_q_filter,
 )
@@ -38,9 +42,11 @@ from kolibri.core.content.utils.resource_import import (
     RemoteChannelResourceImportManager,
 )
 from kolibri.core.device.models import ContentCacheKey
+from kolibri.utils.conf import OPTIONS
 from kolibri.utils.file_transfer import Transfer
 from kolibri.utils.file_transfer import TransferCanceled
 from kolibri.utils.file_transfer import TransferFailed
+from kolibri.utils.tests.content_server import LocalContentServer
 from kolibri.utils.tests.helpers import override_option
 
 # helper class for mocking that is equal to anything
@@ -601,6 +607,7 @@ class ImportChannelTestCase(TestCase):
     ):
         dummy_job = create_dummy_job()
         get_current_job_mock.return_value = dummy_job
+        import_channel_mock.return_value = ChannelImportResult(True)
         # Get the current content cache key and sleep a bit to ensure
         # time has elapsed before it's updated.
         cache_key_before = ContentCacheKey.get_cache_key()
@@ -612,6 +619,7 @@ class ImportChannelTestCase(TestCase):
             "197934f144305350b5820c7c4dd8e194",
             cancel_check=dummy_job.is_cancelled,
             contentfolder=paths.get_content_dir_path(),
+            incremental=True,
         )
 
         # Check that the content cache key was updated.
@@ -639,7 +647,7 @@ class ImportChannelTestCase(TestCase):
         os.close(fd)
         local_path_mock.return_value = local_path
         remote_path_mock.return_value = "notest"
-        import_channel_mock.return_value = True
+        import_channel_mock.return_value = ChannelImportResult(True)
         call_command("importchannel", "network", self.the_channel_id)
         self.assertTrue(channel_stats_clear_mock.called)
 
@@ -753,6 +761,8 @@ class ImportContentTestCase(TestCase):
             session=Any(Session),
             cancel_check=is_cancelled_mock,
             timeout=Transfer.DEFAULT_TIMEOUT,
+            segments=OPTIONS["Deployment"]["FILE_DOWNLOAD_SEGMENTS"],
+            bandwidth_key=Any(int),
         )
         # Check that the command itself was also cancelled.
         cancel_mock.assert_called_with()
@@ -2100,9 +2110,81 @@ class ImportContentTestCase(TestCase):
             session=Any(Session),
             cancel_check=is_cancelled_mock,
             timeout=5,
+            segments=OPTIONS["Deployment"]["FILE_DOWNLOAD_SEGMENTS"],
+            bandwidth_key=Any(int),
         )
 
 
+@patch("kolibri.core.content.utils.resource_import.schedule_ping")
+@patch(
+    "kolibri.core.content.utils.resource_import.lookup_channel_listing_status",
+    return_value=None,
+)
+@patch("kolibri.core.content.utils.resource_import.get_import_export_data")
+@override_option("Deployment", "FILE_TRANSFER_ENGINE", "asyncio")
+class ImportContentAsyncTransferEngineTestCase(TestCase):
+    """
+    Test importing content from a local server with the asyncio transfer engine.
+    """
+
+    def setUp(self):
+        self.server = LocalContentServer()
+        self.content_dir = tempfile.mkdtemp()
+        self.files = []
+        for _ in range(3):
+            data = os.urandom(300 * 1024)
+            f = {
+                "id": hashlib.md5(data).hexdigest(),
+                "file_size": len(data),
+                "extension": "mp4",
+            }
+            url = paths.get_content_storage_remote_url(
+                paths.get_content_file_name(f), baseurl=self.server.base_url
+            )
+            self.server.add_file(urlsplit(url).path, data)
+            self.files.append(f)
+        self.missing_file = {
+            "id": uuid.uuid4().hex,
+            "file_size": 300 * 1024,
+            "extension": "mp4",
+        }
+        patcher = patch("kolibri.core.content.utils.resource_import.annotation")
+        self.addCleanup(patcher.stop)
+        annotation_mock = patcher.start()
+        annotation_mock.calculate_dummy_progress_for_annotation.return_value = 1
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.content_dir, ignore_errors=True)
+
+    def test_remote_import_async_transfer_engine(self, get_import_export_mock, *args):
+        files = self.files + [self.missing_file]
+        get_import_export_mock.return_value = (
+            1,
+            files,
+            sum(f["file_size"] for f in files),
+        )
+        manager = RemoteChannelResourceImportManager(
+            uuid.uuid4().hex, baseurl=self.server.base_url, content_dir=self.content_dir
+        )
+        self.assertIsNotNone(manager.transfer_engine)
+        manager.run()
+        for f in self.files:
+            self.assertTrue(
+                os.path.isfile(
+                    paths.get_content_storage_file_path(
+                        paths.get_content_file_name(f), contentfolder=self.content_dir
+                    )
+                )
+            )
+        self.assertEqual(
+            sorted(manager.file_checksums_to_annotate),
+            sorted(f["id"] for f in self.files),
+        )
+        # The missing file is skipped, as it is with the threaded engine.
+        self.assertEqual(manager.number_of_skipped_files, 1)
+
+
 @override_option("Paths", "CONTENT_DIR", tempfile.mkdtemp())
 class ExportChannelTestCase(TestCase):
     """
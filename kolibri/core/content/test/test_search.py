@@ -4,11 +4,22 @@ from django.test import TestCase
 from le_utils.constants import content_kinds
 from parameterized import parameterized
 
+from kolibri.core.content.models import ChannelMetadata
 from kolibri.core.content.models import ContentNode
+from kolibri.core.content.models import Language
+from kolibri.core.content.models import SearchIndexedChannel
 from kolibri.core.content.test.helpers import ChannelBuilder
 from kolibri.core.content.utils.search import annotate_label_bitmasks
 from kolibri.core.content.utils.search import get_available_metadata_labels
 from kolibri.core.content.utils.search import metadata_lookup
+from kolibri.core.content.utils.search_index import get_search_terms
+from kolibri.core.content.utils.search_index import index_all_channels
+from kolibri.core.content.utils.search_index import index_channel
+from kolibri.core.content.utils.search_index import index_nodes
+from kolibri.core.content.utils.search_index import is_search_index_ready
+from kolibri.core.content.utils.search_index import SEARCH_INDEX_VERSION
+from kolibri.core.content.utils.search_index import search_queryset
+from kolibri.core.content.utils.search_text import get_search_words
 
 
 class RandomBitMaskTestCase(TestCase):
@@ -186,3 +197,160 @@ class ConstrainedMetadataLabelsTestCase(TestCase):
         except Exception as e:
             self.fail("get_available_metadata_labels raised {}".format(e))
         self.assertEqual(labels[field], [])
+
+
+class SearchIndexTestCase(TestCase):
+
+    databases = "__all__"
+
+    def setUp(self):
+        builder = ChannelBuilder()
+        builder.insert_into_default_db()
+        self.channel_id = builder.channel["id"]
+        leaves = ContentNode.objects.exclude(kind=content_kinds.TOPIC)
+        self.nodes = list(leaves.values_list("id", flat=True)[:3])
+        ContentNode.objects.filter(id=self.nodes[0]).update(
+            title="Photosynthesis in plants", description="How leaves make sugar"
+        )
+        ContentNode.objects.filter(id=self.nodes[1]).update(
+            title="Leaves", description="Photosynthesis and the colour of leaves"
+        )
+        ContentNode.objects.filter(id=self.nodes[2]).update(
+            title="Fractions", description="Adding and subtracting fractions"
+        )
+
+    def _search(self, value):
+        terms = get_search_terms(get_search_words(value))
+        return [
+            node["id"]
+            for node in search_queryset(ContentNode.objects.all(), terms)
+            .order_by("search_rank")
+            .values("id", "search_rank")
+        ]
+
+    def test_not_ready_before_indexing(self):
+        self.assertFalse(is_search_index_ready(ContentNode.objects.all()))
+
+    def test_index_channel(self):
+        index_channel(self.channel_id)
+        self.assertTrue(
+            SearchIndexedChannel.objects.filter(
+                channel_id=self.channel_id, version=SEARCH_INDEX_VERSION
+            ).exists()
+        )
+        self.assertTrue(is_search_index_ready(ContentNode.objects.all()))
+        self.assertEqual(self._search("fractions"), [self.nodes[2]])
+
+    def test_index_channel_twice(self):
+        index_channel(self.channel_id)
+        index_channel(self.channel_id)
+        self.assertEqual(self._search("fractions"), [self.nodes[2]])
+
+    def test_title_ranked_before_description(self):
+        index_channel(self.channel_id)
+        self.assertEqual(self._search("photosynthesis"), self.nodes[:2])
+
+    def test_prefix_match(self):
+        index_channel(self.channel_id)
+        self.assertEqual(self._search("fract"), [self.nodes[2]])
+
+    def test_any_word_matches(self):
+        index_channel(self.channel_id)
+        self.assertEqual(
+            set(self._search("sugar subtracting")), {self.nodes[0], self.nodes[2]}
+        )
+
+    def test_case_and_diacritics_ignored(self):
+        index_channel(self.channel_id)
+        self.assertEqual(self._search("FRACTÍONS"), [self.nodes[2]])
+
+    def test_query_syntax_escaped(self):
+        index_channel(self.channel_id)
+        self.assertEqual(self._search('"fractions OR NOT*'), [self.nodes[2]])
+
+    def test_no_words(self):
+        index_channel(self.channel_id)
+        terms = get_search_terms(get_search_words("!? -"))
+        self.assertIsNone(search_queryset(ContentNode.objects.all(), terms))
+
+    def test_plural_matches_singular(self):
+        ContentNode.objects.filter(id=self.nodes[2]).update(
+            title="Fraction", lang=Language.objects.create(id="en", lang_code="en")
+        )
+        index_channel(self.channel_id)
+        self.assertEqual(self._search("fractions"), [self.nodes[2]])
+
+    def test_misspelled_word(self):
+        index_channel(self.channel_id)
+        self.assertEqual(self._search("photosynthsis"), self.nodes[:2])
+        self.assertEqual(self._search("fractoins"), [self.nodes[2]])
+
+    def test_word_in_index_not_corrected(self):
+        index_channel(self.channel_id)
+        self.assertEqual(get_search_terms(["leaves"]), ["leaves", "leave"])
+
+    def test_hindi(self):
+        ContentNode.objects.filter(id=self.nodes[2]).update(
+            title="बच्चों की किताबें",
+            lang=Language.objects.create(id="hi", lang_code="hi"),
+        )
+        index_channel(self.channel_id)
+        self.assertEqual(self._search("किताब"), [self.nodes[2]])
+        self.assertEqual(self._search("किताबों"), [self.nodes[2]])
+
+    def test_arabic(self):
+        ContentNode.objects.filter(id=self.nodes[2]).update(
+            title="الكِتابُ المدرسي",
+            lang=Language.objects.create(id="ar", lang_code="ar"),
+        )
+        index_channel(self.channel_id)
+        self.assertEqual(self._search("كتاب"), [self.nodes[2]])
+        self.assertEqual(self._search("والكتاب"), [self.nodes[2]])
+
+    def test_unspaced_script(self):
+        ContentNode.objects.filter(id=self.nodes[2]).update(title="分数的加法")
+        index_channel(self.channel_id)
+        self.assertEqual(self._search("加法"), [self.nodes[2]])
+        self.assertEqual(self._search("分数"), [self.nodes[2]])
+
+    def test_filtered_queryset(self):
+        index_channel(self.channel_id)
+        self.assertEqual(
+            list(
+                search_queryset(
+                    ContentNode.objects.exclude(id=self.nodes[0]), ["photosynthesis"]
+                ).values_list("id", flat=True)
+            ),
+            [self.nodes[1]],
+        )
+
+    def test_index_nodes(self):
+        index_channel(self.channel_id)
+        ContentNode.objects.filter(id=self.nodes[2]).update(title="Decimals")
+        index_nodes(self.channel_id, [self.nodes[2]], deleted_node_ids=[self.nodes[0]])
+        self.assertEqual(self._search("decimals"), [self.nodes[2]])
+        self.assertEqual(self._search("decimels"), [self.nodes[2]])
+        self.assertEqual(self._search("sugar"), [])
+
+    def test_index_nodes_of_unindexed_channel(self):
+        index_nodes(self.channel_id, [self.nodes[2]])
+        self.assertTrue(is_search_index_ready(ContentNode.objects.all()))
+        self.assertEqual(self._search("photosynthesis"), self.nodes[:2])
+
+    def test_index_all_channels(self):
+        index_all_channels()
+        self.assertTrue(is_search_index_ready(ContentNode.objects.all()))
+
+    def test_not_ready_with_unindexed_channel(self):
+        index_channel(self.channel_id)
+        ChannelBuilder(levels=1, num_children=2).insert_into_default_db()
+        self.assertFalse(is_search_index_ready(ContentNode.objects.all()))
+
+    def test_delete_channel(self):
+        index_channel(self.channel_id)
+        ChannelMetadata.objects.get(id=self.channel_id).delete_content_tree_and_files()
+        self.assertFalse(
+            SearchIndexedChannel.objects.filter(channel_id=self.channel_id).exists()
+        )
+        self.assertEqual(self._search("fractions"), [])
+        self.assertEqual(get_search_terms(["fractoins"]), ["fractoins", "fractoin"])
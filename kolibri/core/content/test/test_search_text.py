@@ -0,0 +1,67 @@
+from django.test import SimpleTestCase
+
+from kolibri.core.content.utils.search_text import get_search_words
+from kolibri.core.content.utils.search_text import get_stems
+from kolibri.core.content.utils.search_text import get_trigrams
+from kolibri.core.content.utils.search_text import get_words
+from kolibri.core.content.utils.search_text import normalize
+from kolibri.core.content.utils.search_text import tokenize
+
+
+class SearchTextTestCase(SimpleTestCase):
+    def test_normalize_latin_diacritics(self):
+        self.assertEqual(normalize("Fracción Ñandú"), "fraccion nandu")
+
+    def test_normalize_arabic(self):
+        self.assertEqual(normalize("أَلْكِتَابُ"), "الكتاب")
+
+    def test_devanagari_words_kept_whole(self):
+        self.assertEqual(get_words("बच्चों की किताबें"), ["बच्चों", "की", "किताबें"])
+
+    def test_unspaced_script_split_into_pairs(self):
+        self.assertEqual(get_words("分数的 abc"), ["分数", "数的", "abc"])
+
+    def test_single_unspaced_character(self):
+        self.assertEqual(get_words("数"), ["数"])
+
+    def test_punctuation_and_underscores_split(self):
+        self.assertEqual(
+            get_words("plants, cells_and-energy!"), ["plants", "cells", "and", "energy"]
+        )
+
+    def test_tokenize_english(self):
+        self.assertEqual(tokenize("Studies of plants", "en"), ["study", "of", "plant"])
+
+    def test_tokenize_hindi(self):
+        self.assertEqual(tokenize("किताबें", "hi"), ["किताब"])
+
+    def test_tokenize_arabic(self):
+        self.assertEqual(tokenize("والكتاب", "ar"), ["كتاب"])
+
+    def test_tokenize_language_subcode(self):
+        self.assertEqual(tokenize("plants", "en-GB"), ["plant"])
+
+    def test_tokenize_no_stemmer(self):
+        self.assertEqual(
+            tokenize("Vitabu vya watoto", "sw"), ["vitabu", "vya", "watoto"]
+        )
+        self.assertEqual(tokenize("plants", None), ["plants"])
+
+    def test_tokenize_empty(self):
+        self.assertEqual(tokenize(None, "en"), [])
+
+    def test_search_words_without_stopwords(self):
+        self.assertEqual(
+            get_search_words("the plants and fractions"), ["plants", "fractions"]
+        )
+        self.assertEqual(get_search_words("vitabu na watoto"), ["vitabu", "watoto"])
+
+    def test_search_words_only_stopwords(self):
+        self.assertEqual(get_search_words("the and"), ["the", "and"])
+
+    def test_stems(self):
+        self.assertEqual(get_stems("plants"), ["plants", "plant"])
+        self.assertEqual(get_stems("algebra"), ["algebra"])
+
+    def test_trigrams(self):
+        self.assertEqual(get_trigrams("cat"), {" ca", "cat", "at "})
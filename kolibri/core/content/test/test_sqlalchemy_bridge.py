@@ -1,3 +1,7 @@
+import os
+import shutil
+import tempfile
+
 import pytest
 from django.test import override_settings
 from django.test import TestCase
@@ -7,11 +11,17 @@ from mock import Mock
 from mock import patch
 from sqlalchemy.engine import Engine
 
+from kolibri.core.content.constants.schema_versions import CONTENT_DB_SCHEMA_VERSIONS
+from kolibri.core.content.utils.sqlalchemybridge import BASES
 from kolibri.core.content.utils.sqlalchemybridge import Bridge
 from kolibri.core.content.utils.sqlalchemybridge import ClassNotFoundError
+from kolibri.core.content.utils.sqlalchemybridge import clear_bridge_caches
+from kolibri.core.content.utils.sqlalchemybridge import db_matches_schema
+from kolibri.core.content.utils.sqlalchemybridge import dispose_sqlite_file_engine
 from kolibri.core.content.utils.sqlalchemybridge import get_class
 from kolibri.core.content.utils.sqlalchemybridge import get_default_db_string
 from kolibri.core.content.utils.sqlalchemybridge import get_engine
+from kolibri.core.content.utils.sqlalchemybridge import is_cached_engine
 from kolibri.core.content.utils.sqlalchemybridge import set_all_class_defaults
 from kolibri.core.content.utils.sqlalchemybridge import sqlite_connection_string
 
@@ -91,6 +101,134 @@ class SQLAlchemyBridgeClassTestCase(TestCase):
         engine_mock.dispose.assert_called_once_with()
 
 
+class SQLAlchemyBridgeCacheTestCase(TestCase):
+    """
+    Testcase for the engines and schema information that are cached between Bridges
+    """
+
+    def setUp(self):
+        clear_bridge_caches()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "content.sqlite3")
+        self.schema_version = CONTENT_DB_SCHEMA_VERSIONS[0]
+        Bridge(sqlite_file_path=self.path, schema_version=self.schema_version).end()
+
+    def tearDown(self):
+        clear_bridge_caches()
+        shutil.rmtree(self.directory)
+
+    def _replace_file(self):
+        os.remove(self.path)
+        Bridge(sqlite_file_path=self.path, schema_version=self.schema_version).end()
+
+    def test_engine_reused(self):
+        bridge = Bridge(sqlite_file_path=self.path)
+        bridge.end()
+        self.assertTrue(is_cached_engine(bridge.engine))
+        other_bridge = Bridge(sqlite_file_path=self.path)
+        other_bridge.end()
+        self.assertIs(bridge.engine, other_bridge.engine)
+
+    def test_engine_replaced_with_file(self):
+        bridge = Bridge(sqlite_file_path=self.path)
+        bridge.end()
+        # Keep the old file around, so that the new one can't reuse its inode.
+        os.rename(self.path, self.path + ".old")
+        Bridge(sqlite_file_path=self.path, schema_version=self.schema_version).end()
+        other_bridge = Bridge(sqlite_file_path=self.path)
+        other_bridge.end()
+        self.assertIsNot(bridge.engine, other_bridge.engine)
+        self.assertFalse(is_cached_engine(bridge.engine))
+
+    @patch(
+        "kolibri.core.content.utils.sqlalchemybridge.db_matches_schema",
+        wraps=db_matches_schema,
+    )
+    def test_engine_disposed_with_file(self, db_matches_schema_mock):
+        bridge = Bridge(sqlite_file_path=self.path)
+        bridge.end()
+        with patch.object(
+            bridge.engine, "dispose", wraps=bridge.engine.dispose
+        ) as dispose_mock:
+            dispose_sqlite_file_engine(self.path)
+            dispose_mock.assert_called_once_with()
+        self.assertFalse(is_cached_engine(bridge.engine))
+        db_matches_schema_mock.reset_mock()
+        Bridge(sqlite_file_path=self.path).end()
+        db_matches_schema_mock.assert_called()
+
+    def test_memory_engine_not_shared(self):
+        bridge = Bridge(sqlite_file_path=":memory:", schema_version=self.schema_version)
+        other_bridge = Bridge(
+            sqlite_file_path=":memory:", schema_version=self.schema_version
+        )
+        self.assertIsNot(bridge.engine, other_bridge.engine)
+        self.assertFalse(is_cached_engine(bridge.engine))
+        bridge.end()
+        other_bridge.end()
+
+    @patch(
+        "kolibri.core.content.utils.sqlalchemybridge.db_matches_schema",
+        wraps=db_matches_schema,
+    )
+    def test_schema_version_detected_once(self, db_matches_schema_mock):
+        bridge = Bridge(sqlite_file_path=self.path)
+        bridge.end()
+        self.assertEqual(bridge.schema_version, self.schema_version)
+        db_matches_schema_mock.assert_called()
+        db_matches_schema_mock.reset_mock()
+        bridge = Bridge(sqlite_file_path=self.path)
+        bridge.end()
+        self.assertEqual(bridge.schema_version, self.schema_version)
+        db_matches_schema_mock.assert_not_called()
+
+    @patch(
+        "kolibri.core.content.utils.sqlalchemybridge.db_matches_schema",
+        wraps=db_matches_schema,
+    )
+    def test_schema_version_detected_after_file_changes(self, db_matches_schema_mock):
+        Bridge(sqlite_file_path=self.path).end()
+        db_matches_schema_mock.reset_mock()
+        self._replace_file()
+        Bridge(sqlite_file_path=self.path).end()
+        db_matches_schema_mock.assert_called()
+
+    def test_schema_created_once(self):
+        metadata = BASES[self.schema_version].metadata
+        with patch.object(
+            metadata, "create_all", wraps=metadata.create_all
+        ) as create_all_mock:
+            Bridge(sqlite_file_path=self.path, schema_version=self.schema_version).end()
+            create_all_mock.assert_not_called()
+            self._replace_file()
+            create_all_mock.assert_called_once()
+
+    def test_bridge_setup_cached(self):
+        """
+        Only the first Bridge to a content database detects its schema version and
+        creates its schema, later Bridges are set up from the caches.
+        """
+        clear_bridge_caches()
+        metadata = BASES[self.schema_version].metadata
+        with patch.object(
+            Bridge,
+            "_detect_schema_version",
+            autospec=True,
+            side_effect=Bridge._detect_schema_version,
+        ) as detect_mock, patch.object(
+            metadata, "create_all", wraps=metadata.create_all
+        ) as create_all_mock:
+            for _ in range(2):
+                bridge = Bridge(sqlite_file_path=self.path)
+                self.assertEqual(bridge.execute("SELECT 1").fetchall(), [(1,)])
+                bridge.end()
+                Bridge(
+                    sqlite_file_path=self.path, schema_version=self.schema_version
+                ).end()
+                self.assertEqual(detect_mock.call_count, 1)
+                self.assertEqual(create_all_mock.call_count, 1)
+
+
 class SQLAlchemyBridgeSQLAlchemyFunctionsTestCase(TestCase):
     def test_sqlite_string(self):
         self.assertEqual("sqlite:///test", sqlite_connection_string("test"))
@@ -0,0 +1,166 @@
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+
+from django.test import TestCase
+from mock import MagicMock
+from mock import patch
+
+from kolibri.core.content.utils.paths import get_content_file_name
+from kolibri.core.content.utils.paths import get_content_storage_file_path
+from kolibri.core.content.utils.resource_import import ResourceImportManagerBase
+from kolibri.core.content.utils.transfer_registry import transfer_registry
+from kolibri.core.content.utils.transfer_registry import TransferRegistry
+from kolibri.utils.file_transfer import TransferCanceled
+from kolibri.utils.filesystem import mkdirp
+
+
+class TransferRegistryTestCase(TestCase):
+    def setUp(self):
+        self.registry = TransferRegistry()
+        self.registry.poll_interval = 0.01
+        self.checksum = uuid.uuid4().hex
+
+    def test_claim(self):
+        token = self.registry.claim(self.checksum)
+        self.assertIsNotNone(token)
+        self.assertTrue(self.registry.in_progress(self.checksum))
+        self.assertIsNone(self.registry.claim(self.checksum))
+        self.registry.release(self.checksum, token)
+        self.assertFalse(self.registry.in_progress(self.checksum))
+        self.assertIsNotNone(self.registry.claim(self.checksum))
+
+    def test_release_other_token(self):
+        token = self.registry.claim(self.checksum)
+        self.registry.release(self.checksum, uuid.uuid4().hex)
+        self.assertTrue(self.registry.in_progress(self.checksum))
+        self.registry.release(self.checksum, token)
+
+    def test_claimed_releases_on_error(self):
+        with self.assertRaises(ValueError):
+            with self.registry.claimed(self.checksum) as token:
+                self.assertIsNotNone(token)
+                raise ValueError()
+        self.assertFalse(self.registry.in_progress(self.checksum))
+
+    def test_claimed_already_in_progress(self):
+        token = self.registry.claim(self.checksum)
+        with self.registry.claimed(self.checksum) as other_token:
+            self.assertIsNone(other_token)
+        self.assertTrue(self.registry.in_progress(self.checksum))
+        self.registry.release(self.checksum, token)
+
+    def test_wait_for_release(self):
+        token = self.registry.claim(self.checksum)
+        waiter = threading.Thread(target=self.registry.wait, args=(self.checksum,))
+        waiter.start()
+        waiter.join(0.1)
+        self.assertTrue(waiter.is_alive())
+        self.registry.release(self.checksum, token)
+        waiter.join(5)
+        self.assertFalse(waiter.is_alive())
+
+    def test_wait_for_other_process(self):
+        # A claim made by another process has no local event to wait on,
+        # so the registry polls the cache.
+        other_registry = TransferRegistry()
+        token = other_registry.claim(self.checksum)
+        waiter = threading.Thread(target=self.registry.wait, args=(self.checksum,))
+        waiter.start()
+        waiter.join(0.1)
+        self.assertTrue(waiter.is_alive())
+        other_registry.release(self.checksum, token)
+        waiter.join(5)
+        self.assertFalse(waiter.is_alive())
+
+    def test_wait_cancelled(self):
+        token = self.registry.claim(self.checksum)
+        cancel_check = MagicMock(side_effect=TransferCanceled)
+        with self.assertRaises(TransferCanceled):
+            self.registry.wait(self.checksum, cancel_check=cancel_check)
+        self.registry.release(self.checksum, token)
+
+    def test_renew_throttled(self):
+        cache = MagicMock()
+        cache.add.return_value = True
+        registry = TransferRegistry(cache=cache)
+        token = registry.claim(self.checksum)
+        cache.get.return_value = token
+        registry.renew(self.checksum, token)
+        cache.set.assert_not_called()
+        registry._last_renewed[token] = 0
+        registry.renew(self.checksum, token)
+        cache.set.assert_called_once_with(
+            registry._key(self.checksum), token, timeout=registry.lease
+        )
+
+
+class DummyResourceImportManager(ResourceImportManagerBase):
+    def get_import_data(self):
+        return 0, [], 0
+
+    def create_file_transfer(self, f, filename, dest):
+        return self.file_transfer_mock(f, filename, dest)
+
+
+@patch.object(transfer_registry, "poll_interval", 0.01)
+class ResourceImportTransferDeduplicationTestCase(TestCase):
+    def setUp(self):
+        self.content_dir = tempfile.mkdtemp()
+        self.file = {"id": uuid.uuid4().hex, "file_size": 5, "extension": "mp4"}
+        self.dest = get_content_storage_file_path(
+            get_content_file_name(self.file), contentfolder=self.content_dir
+        )
+        self.manager = DummyResourceImportManager(
+            uuid.uuid4().hex, content_dir=self.content_dir
+        )
+        self.manager.file_transfer_mock = MagicMock()
+
+    def tearDown(self):
+        shutil.rmtree(self.content_dir, ignore_errors=True)
+
+    def _write_dest(self):
+        mkdirp(os.path.dirname(self.dest), exist_ok=True)
+        with open(self.dest, "wb") as f:
+            f.write(b"12345")
+
+    def test_transfer_claims_file(self):
+        def run(progress_update=None):
+            self.assertTrue(transfer_registry.in_progress(self.file["id"]))
+            progress_update(5)
+
+        transfer = self.manager.file_transfer_mock.return_value
+        transfer.run.side_effect = run
+        self.manager._start_file_transfer(self.file)
+        transfer.run.assert_called_once()
+        self.assertFalse(transfer_registry.in_progress(self.file["id"]))
+
+    def test_waits_for_in_progress_transfer(self):
+        token = transfer_registry.claim(self.file["id"])
+        waiter = threading.Thread(
+            target=self.manager._start_file_transfer, args=(self.file,)
+        )
+        waiter.start()
+        waiter.join(0.1)
+        self.assertTrue(waiter.is_alive())
+        self._write_dest()
+        transfer_registry.release(self.file["id"], token)
+        waiter.join(5)
+        self.assertFalse(waiter.is_alive())
+        self.manager.file_transfer_mock.assert_not_called()
+
+    def test_transfers_file_if_in_progress_transfer_fails(self):
+        token = transfer_registry.claim(self.file["id"])
+        waiter = threading.Thread(
+            target=self.manager._start_file_transfer, args=(self.file,)
+        )
+        waiter.start()
+        waiter.join(0.1)
+        transfer_registry.release(self.file["id"], token)
+        waiter.join(5)
+        self.assertFalse(waiter.is_alive())
+        self.manager.file_transfer_mock.assert_called_once_with(
+            self.file, get_content_file_name(self.file), self.dest
+        )
@@ -1,24 +1,39 @@
 import hashlib
+import logging
 import os
+import shutil
 import tempfile
+import time
 import zipfile
+from io import StringIO
 from wsgiref.util import setup_testing_defaults
 
+from django.core.management import call_command
 from django.test import override_settings
 from django.test import TestCase
 from django.utils.http import http_date
+from mock import patch
 
+from kolibri.core.auth.test.helpers import clear_process_cache
 from kolibri.core.content.utils.paths import get_content_storage_file_path
+from kolibri.core.content.utils.zip_cache import get_zip_content_cache_stats
+from kolibri.core.content.utils.zip_cache import LRUCache
+from kolibri.core.content.utils.zip_cache import zip_content_cache
+from kolibri.core.content.utils.zip_cache import ZipContentCache
 from kolibri.core.content.zip_wsgi import generate_zip_content_response
+from kolibri.core.content.zip_wsgi import HTML_READ_SIZE
 from kolibri.core.content.zip_wsgi import INITIALIZE_HASHI_FROM_IFRAME
+from kolibri.core.content.zip_wsgi import inject_hashi_script
+from kolibri.core.content.zip_wsgi import parse_html
 from kolibri.utils.tests.helpers import override_option
 
+logger = logging.getLogger(__name__)
 
 hashi_injection = '<script type="text/javascript">{}</script>'.format(
     INITIALIZE_HASHI_FROM_IFRAME
 )
 
-empty_content = "<html><head>{}</head><body></body></html>".format(hashi_injection)
+empty_content = "<html><head>{}</head></html>".format(hashi_injection)
 
 # datetime.datetime(2016, 9, 10, 19, 14, 7) in time from EPOCH
 # do this to avoid having to backport `timestamp` method of datetime
@@ -81,6 +96,9 @@ class ZipContentTestCase(TestCase):
 
         self.zip_file_base_url = "/{}/".format(self.filename)
 
+        # The tests reuse the same file name for zip files with different contents.
+        zip_content_cache.clear()
+
         self.environ = {}
         setup_testing_defaults(self.environ)
 
@@ -187,7 +205,10 @@ class ZipContentTestCase(TestCase):
 
     def test_request_for_html_no_head_return_hashi_modified_html(self):
         response = self._get_file("")
-        self.assertEqual(response.content.decode("utf-8"), empty_content)
+        self.assertEqual(
+            response.content.decode("utf-8"),
+            "<html>{}</html>".format(hashi_injection),
+        )
 
     def test_request_for_html_body_no_script_return_hashi_modified_html(self):
         response = self._get_file(self.other_name)
@@ -195,10 +216,8 @@ class ZipContentTestCase(TestCase):
 
     def test_request_for_html_body_script_return_hashi_modified_html(self):
         response = self._get_file(self.script_name)
-        content = (
-            "<html><head>{}<script>test</script></head><body></body></html>".format(
-                hashi_injection
-            )
+        content = "<html><head>{}<script>test</script></head></html>".format(
+            hashi_injection
         )
         self.assertEqual(response.content.decode("utf-8"), content)
 
@@ -206,10 +225,8 @@ class ZipContentTestCase(TestCase):
         self,
     ):
         response = self._get_file("/" + self.script_name)
-        content = (
-            "<html><head>{}<script>test</script></head><body></body></html>".format(
-                hashi_injection
-            )
+        content = "<html><head>{}<script>test</script></head></html>".format(
+            hashi_injection
         )
         self.assertEqual(response.content.decode("utf-8"), content)
 
@@ -228,28 +245,24 @@ class ZipContentTestCase(TestCase):
     def test_request_for_html_doctype_return_with_doctype(self):
         response = self._get_file(self.doctype_name)
         content = response.content.decode("utf-8")
-        self.assertEqual(
-            content[:92].lower().replace("  ", " "), self.doctype.strip().lower()
-        )
+        self.assertTrue(content.startswith(self.doctype))
 
     def test_request_for_html5_doctype_return_with_doctype(self):
         response = self._get_file(self.html5_doctype_name)
         content = response.content.decode("utf-8")
-        self.assertEqual(content[:15].lower(), self.html5_doctype.strip().lower())
+        self.assertTrue(content.startswith(self.html5_doctype))
 
     def test_request_for_html_body_script_return_correct_length_header(self):
         response = self._get_file(self.script_name)
-        expected_content = (
-            "<html><head>{}<script>test</script></head><body></body></html>".format(
-                hashi_injection
-            )
+        expected_content = "<html><head>{}<script>test</script></head></html>".format(
+            hashi_injection
         )
         file_size = len(expected_content)
         self.assertEqual(int(response.headers["Content-Length"]), file_size)
 
     def test_request_for_html_empty_html(self):
         response = self._get_file(self.empty_html_name)
-        self.assertEqual(response.content.decode("utf-8"), empty_content)
+        self.assertEqual(response.content.decode("utf-8"), hashi_injection)
 
     def test_not_modified_response_when_if_modified_since_header_set_index_file(self):
         response = self._get_file("", HTTP_IF_MODIFIED_SINCE=caching_http_date)
@@ -332,10 +345,8 @@ class ZipContentTestCase(TestCase):
         """Test range requests on HTML files that get modified - should return full file"""
         response = self._get_file(self.script_name, HTTP_RANGE="bytes=0-10")
         # Should return full modified file, not range
-        content = (
-            "<html><head>{}<script>test</script></head><body></body></html>".format(
-                hashi_injection
-            )
+        content = "<html><head>{}<script>test</script></head></html>".format(
+            hashi_injection
         )
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.content.decode("utf-8"), content)
@@ -388,3 +399,298 @@ class ZipContentTestCase(TestCase):
 @override_option("Deployment", "ZIP_CONTENT_URL_PATH_PREFIX", "prefix_test/")
 class UrlPrefixZipContentTestCase(ZipContentTestCase):
     pass
+
+
+@override_option("Paths", "CONTENT_DIR", tempfile.mkdtemp())
+class ZipContentCacheTestCase(TestCase):
+    """
+    Testcase for caching of zip files and rewritten HTML by the zipcontent endpoint
+    """
+
+    def setUp(self):
+        self.filename = "{}.zip".format(hashlib.md5("CACHEDATA".encode()).hexdigest())
+        self.zip_path = get_content_storage_file_path(self.filename)
+        zip_path_dir = os.path.dirname(self.zip_path)
+        if not os.path.exists(zip_path_dir):
+            os.makedirs(zip_path_dir)
+        with zipfile.ZipFile(self.zip_path, "w") as zf:
+            zf.writestr("index.html", "<html><head></head></html>")
+            zf.writestr("test.txt", "This is a test!")
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = ZipContentCache(1024 * 1024, 1024 * 1024, self.cache_dir)
+        self.environ = {}
+        setup_testing_defaults(self.environ)
+
+    def tearDown(self):
+        if self.cache.disk is not None:
+            self.cache.disk.close()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def _get_file(self, file_name):
+        self.environ["PATH_INFO"] = "/{}/{}".format(self.filename, file_name)
+        with patch("kolibri.core.content.zip_wsgi.zip_content_cache", self.cache):
+            return generate_zip_content_response(self.environ)
+
+    def test_html_cached(self):
+        response = self._get_file("index.html")
+        with patch("kolibri.core.content.zip_wsgi.parse_html") as parse_html_mock:
+            cached_response = self._get_file("index.html")
+            parse_html_mock.assert_not_called()
+        self.assertEqual(cached_response.content, response.content)
+        self.assertEqual(
+            cached_response.headers["Content-Length"], str(len(response.content))
+        )
+        self.assertEqual(self.cache.stats()["memory"]["hits"], 1)
+
+    def test_html_cached_on_disk(self):
+        response = self._get_file("index.html")
+        self.cache.memory.clear()
+        with patch("kolibri.core.content.zip_wsgi.parse_html") as parse_html_mock:
+            cached_response = self._get_file("index.html")
+            parse_html_mock.assert_not_called()
+        self.assertEqual(cached_response.content, response.content)
+        self.assertEqual(self.cache.stats()["disk"]["hits"], 1)
+
+    def test_central_directory_cached(self):
+        self._get_file("test.txt")
+        with patch(
+            "zipfile.ZipFile._RealGetContents", side_effect=AssertionError
+        ) as read_mock:
+            response = self._get_file("test.txt")
+            read_mock.assert_not_called()
+        self.assertEqual(b"".join(response.streaming_content), b"This is a test!")
+
+    def test_central_directory_cached_on_disk(self):
+        self._get_file("test.txt")
+        self.cache.memory.clear()
+        response = self._get_file("test.txt")
+        self.assertEqual(b"".join(response.streaming_content), b"This is a test!")
+        self.assertEqual(self.cache.stats()["disk"]["hits"], 1)
+
+    def test_missing_file_not_found(self):
+        self._get_file("test.txt")
+        self.assertEqual(self._get_file("missing.txt").status_code, 404)
+
+    def test_disk_cache_disabled(self):
+        self.cache = ZipContentCache(1024 * 1024, 0, self.cache_dir)
+        self._get_file("index.html")
+        self.cache.memory.clear()
+        self._get_file("index.html")
+        self.assertIsNone(self.cache.disk)
+        self.assertEqual(self.cache.stats()["memory"]["misses"], 4)
+
+
+class ZipContentCacheStatsTestCase(TestCase):
+    """
+    Testcase for the totals of the hits and misses of the zip content caches
+    """
+
+    def setUp(self):
+        clear_process_cache()
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = ZipContentCache(1024 * 1024, 0, self.cache_dir, stats_interval=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_stats_saved(self):
+        self.cache.set_html("file.zip", "index.html", b"html")
+        self.cache.get_html("file.zip", "index.html")
+        self.cache.get_html("file.zip", "missing.html")
+        self.cache.save_stats()
+        stats = get_zip_content_cache_stats()
+        self.assertEqual(stats["memory_hits"], 1)
+        self.assertEqual(stats["memory_misses"], 1)
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_stats_only_added_once(self):
+        self.cache.get_html("file.zip", "index.html")
+        self.cache.save_stats()
+        self.cache.save_stats()
+        self.assertEqual(get_zip_content_cache_stats()["memory_misses"], 1)
+
+    def test_stats_added_from_every_cache(self):
+        other_cache = ZipContentCache(1024 * 1024, 0, self.cache_dir)
+        self.cache.get_html("file.zip", "index.html")
+        other_cache.get_html("file.zip", "index.html")
+        self.cache.save_stats()
+        other_cache.save_stats()
+        self.assertEqual(get_zip_content_cache_stats()["memory_misses"], 2)
+
+    def test_stats_saved_after_interval(self):
+        self.cache.stats_interval = 60
+        self.cache.get_html("file.zip", "index.html")
+        self.cache.get_html("file.zip", "index.html")
+        self.assertIsNone(get_zip_content_cache_stats()["hit_rate"])
+        self.cache._stats_saved -= 60
+        self.cache.get_html("file.zip", "index.html")
+        self.assertEqual(get_zip_content_cache_stats()["memory_misses"], 2)
+
+    def test_zip_content_cache_stats_command(self):
+        self.cache.set_html("file.zip", "index.html", b"html")
+        self.cache.get_html("file.zip", "index.html")
+        self.cache.get_html("file.zip", "missing.html")
+        self.cache.save_stats()
+        out = StringIO()
+        call_command("zipcontentcachestats", reset=True, stdout=out)
+        self.assertIn("Hit rate: 50%", out.getvalue())
+        self.assertIsNone(get_zip_content_cache_stats()["hit_rate"])
+
+
+class LRUCacheTestCase(TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(10)
+        cache.set("a", b"aaaa", 4)
+        cache.set("b", b"bbbb", 4)
+        cache.get("a")
+        cache.set("c", b"cccc", 4)
+        self.assertEqual(cache.get("a"), b"aaaa")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), b"cccc")
+        self.assertEqual(
+            cache.stats(),
+            {
+                "hits": 3,
+                "misses": 1,
+                "evictions": 1,
+                "entries": 2,
+                "size": 8,
+                "max_size": 10,
+            },
+        )
+
+    def test_value_larger_than_cache_not_stored(self):
+        cache = LRUCache(10)
+        cache.set("a", b"a" * 11, 11)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.size, 0)
+
+
+class InjectHashiScriptTestCase(TestCase):
+    def _inject(self, *chunks):
+        return b"".join(inject_hashi_script(chunks)).decode("utf-8")
+
+    def test_after_head_start_tag(self):
+        self.assertEqual(
+            self._inject(b'<html lang="en"><HEAD data-x="a>b"><title>t</title>'),
+            '<html lang="en"><HEAD data-x="a>b">{}<title>t</title>'.format(
+                hashi_injection
+            ),
+        )
+
+    def test_doctype_and_comments_preserved(self):
+        content = '\ufeff<!DOCTYPE html>\n<!-- <head> -->\n<html>\n<head>\n<meta charset="utf-8">'
+        self.assertEqual(
+            self._inject(content.encode("utf-8")),
+            content.replace("<head>\n", "<head>{}\n".format(hashi_injection)),
+        )
+
+    def test_implied_head(self):
+        self.assertEqual(
+            self._inject(b"<!DOCTYPE html><html><body><header></header></body></html>"),
+            "<!DOCTYPE html><html>{}<body><header></header></body></html>".format(
+                hashi_injection
+            ),
+        )
+
+    def test_implied_head_text(self):
+        self.assertEqual(
+            self._inject(b"  Some text"), "  {}Some text".format(hashi_injection)
+        )
+
+    def test_split_across_chunks(self):
+        self.assertEqual(
+            self._inject(
+                b"<!DOCTYPE html><!-", b"- x --><ht", b"ml><he", b"ad><title>"
+            ),
+            "<!DOCTYPE html><!-- x --><html><head>{}<title>".format(hashi_injection),
+        )
+
+    def test_rest_of_document_not_read(self):
+        read = []
+
+        def chunks():
+            for chunk in (b"<html><head>", b"<title>", b"</title>"):
+                read.append(chunk)
+                yield chunk
+
+        injected = inject_hashi_script(chunks())
+        self.assertEqual(
+            next(injected).decode("utf-8"), "<html><head>{}".format(hashi_injection)
+        )
+        self.assertEqual(len(read), 1)
+        self.assertEqual(list(injected), [b"<title>", b"</title>"])
+
+    def test_unterminated_comment_falls_back_to_parse_html(self):
+        self.assertEqual(
+            self._inject(b"<!-- unterminated"),
+            "<html><head>{}</head><body></body></html>".format(hashi_injection),
+        )
+
+    def test_utf16_falls_back_to_parse_html(self):
+        content = "<html><head></head></html>".encode("utf-16")
+        self.assertEqual(
+            self._inject(content),
+            "<html><head>{}</head><body></body></html>".format(hashi_injection),
+        )
+
+
+class InjectHashiScriptBenchmarkTestCase(TestCase):
+    """
+    Compares inserting the hashi script with inject_hashi_script against rewriting with
+    parse_html, over the HTML test fixtures and a large HTML5 app index page.
+    """
+
+    repeats = 20
+
+    def _time(self, function, documents, repeats):
+        start = time.time()
+        for _ in range(repeats):
+            for document in documents:
+                function(document)
+        return time.time() - start
+
+    def test_benchmark(self):
+        fixtures = [
+            getattr(ZipContentTestCase, name).encode("utf-8")
+            for name in (
+                "index_str",
+                "other_str",
+                "script_str",
+                "empty_html_str",
+                "doctype_str",
+                "html5_doctype_str",
+            )
+        ]
+        large_document = (
+            b"<!DOCTYPE html><html><head><title>App</title></head><body>"
+            + b'<div class="item"><p>Some <b>text</b> here</p></div>' * 5000
+            + b"</body></html>"
+        )
+
+        def inject(document):
+            return b"".join(
+                inject_hashi_script(
+                    document[i : i + HTML_READ_SIZE]
+                    for i in range(0, len(document), HTML_READ_SIZE)
+                )
+            )
+
+        fixtures_parse_time = self._time(parse_html, fixtures, self.repeats)
+        fixtures_inject_time = self._time(inject, fixtures, self.repeats)
+        large_parse_time = self._time(parse_html, [large_document], 1)
+        large_inject_time = self._time(inject, [large_document], 1)
+
+        logger.info(
+            "Fixtures x{}: parse_html {:.4f}s, inject_hashi_script {:.4f}s; "
+            "{}KB document: parse_html {:.4f}s, inject_hashi_script {:.4f}s".format(
+                self.repeats,
+                fixtures_parse_time,
+                fixtures_inject_time,
+                len(large_document) // 1024,
+                large_parse_time,
+                large_inject_time,
+            )
+        )
+        self.assertLess(fixtures_inject_time, fixtures_parse_time)
+        self.assertLess(large_inject_time, large_parse_time)
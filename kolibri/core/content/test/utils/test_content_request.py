@@ -786,7 +786,7 @@ class ProcessContentRequestsTestCase(BaseQuerysetTestCase):
 
         self.qs = incomplete_downloads_queryset()
 
-    def _side_effect_success(self, request):
+    def _side_effect_success(self, request, annotation_batch=None):
         if isinstance(request, (ContentDownloadRequest, ContentRemovalRequest)):
             request.status = ContentRequestStatus.Completed
             request.save()
@@ -794,7 +794,7 @@ class ProcessContentRequestsTestCase(BaseQuerysetTestCase):
             request.update(status=ContentRequestStatus.Completed)
         return True
 
-    def _side_effect_fail(self, request):
+    def _side_effect_fail(self, request, annotation_batch=None):
         if isinstance(request, (ContentDownloadRequest, ContentRemovalRequest)):
             request.status = ContentRequestStatus.Failed
             request.save()
@@ -810,7 +810,9 @@ class ProcessContentRequestsTestCase(BaseQuerysetTestCase):
         self.assertEqual(self.qs.count(), 1)
         self.mock_process_download.side_effect = self._side_effect_success
         _process_content_requests(self.qs)
-        self.mock_process_download.assert_called_once_with(self.request)
+        self.mock_process_download.assert_called_once_with(
+            self.request, annotation_batch=mock.ANY
+        )
 
     def test_fail(self):
         """
@@ -819,7 +821,9 @@ class ProcessContentRequestsTestCase(BaseQuerysetTestCase):
         self.assertEqual(self.qs.count(), 1)
         self.mock_process_download.side_effect = self._side_effect_fail
         _process_content_requests(self.qs)
-        self.mock_process_download.assert_called_once_with(self.request)
+        self.mock_process_download.assert_called_once_with(
+            self.request, annotation_batch=mock.ANY
+        )
 
     def test_no_free_space__sync_removal(self):
         self.assertEqual(self.qs.count(), 1)
@@ -841,7 +845,9 @@ class ProcessContentRequestsTestCase(BaseQuerysetTestCase):
         self.mock_process_removals.side_effect = self._side_effect_success
         self.mock_process_download.side_effect = self._side_effect_success
         _process_content_requests(self.qs)
-        self.mock_process_download.assert_called_once_with(self.request)
+        self.mock_process_download.assert_called_once_with(
+            self.request, annotation_batch=mock.ANY
+        )
 
     def test_no_free_space__user_removal(self):
         self.assertEqual(self.qs.count(), 1)
@@ -857,7 +863,9 @@ class ProcessContentRequestsTestCase(BaseQuerysetTestCase):
         self.mock_process_removals.side_effect = self._side_effect_success
         self.mock_process_download.side_effect = self._side_effect_success
         _process_content_requests(self.qs)
-        self.mock_process_download.assert_called_once_with(self.request)
+        self.mock_process_download.assert_called_once_with(
+            self.request, annotation_batch=mock.ANY
+        )
 
     def test_no_free_space__user_downloads(self):
         self.assertEqual(self.qs.count(), 1)
@@ -876,7 +884,9 @@ class ProcessContentRequestsTestCase(BaseQuerysetTestCase):
         )
         self.mock_process_download.side_effect = self._side_effect_success
         _process_content_requests(self.qs)
-        self.mock_process_download.assert_called_once_with(self.request)
+        self.mock_process_download.assert_called_once_with(
+            self.request, annotation_batch=mock.ANY
+        )
 
     def test_no_free_space__insufficient(self):
         self.assertEqual(self.qs.count(), 1)
@@ -999,6 +1009,7 @@ class ProcessDownloadRequestTestCase(BaseQuerysetTestCase):
             self.request,
             self.node.channel_id,
             self.mock_sync_peer,
+            annotation_batch=None,
         )
         self.request.refresh_from_db()
         self.assertEqual(self.request.status, ContentRequestStatus.Failed)
@@ -1013,6 +1024,7 @@ class ProcessDownloadRequestTestCase(BaseQuerysetTestCase):
             self.request,
             self.node.channel_id,
             self.mock_sync_peer,
+            annotation_batch=None,
         )
         self.request.refresh_from_db()
         self.assertEqual(self.request.status, ContentRequestStatus.Completed)
@@ -1035,11 +1047,13 @@ class ProcessDownloadRequestTestCase(BaseQuerysetTestCase):
                     self.request,
                     self.node.channel_id,
                     self.mock_preferred_peer,
+                    annotation_batch=None,
                 ),
                 mock.call(
                     self.request,
                     self.node.channel_id,
                     self.mock_sync_peer,
+                    annotation_batch=None,
                 ),
             ]
         )
@@ -1064,11 +1078,13 @@ class ProcessDownloadRequestTestCase(BaseQuerysetTestCase):
                     self.request,
                     self.node.channel_id,
                     self.mock_preferred_peer,
+                    annotation_batch=None,
                 ),
                 mock.call(
                     self.request,
                     self.node.channel_id,
                     self.mock_sync_peer,
+                    annotation_batch=None,
                 ),
             ]
         )
@@ -1093,6 +1109,7 @@ class ProcessDownloadRequestTestCase(BaseQuerysetTestCase):
                     self.request,
                     self.node.channel_id,
                     self.mock_preferred_peer,
+                    annotation_batch=None,
                 ),
             ]
         )
@@ -33,8 +33,10 @@ from kolibri.core.content.utils.paths import get_all_content_dir_paths
 from kolibri.core.content.utils.paths import get_content_database_file_path
 from kolibri.core.content.utils.search import annotate_label_bitmasks
 from kolibri.core.content.utils.search import get_all_contentnode_label_metadata
+from kolibri.core.content.utils.search_index import index_all_channels
 from kolibri.core.content.utils.sqlalchemybridge import Bridge
 from kolibri.core.content.utils.tree import get_channel_node_depth
+from kolibri.core.content.utils.tree_pages import build_tree_pages
 from kolibri.core.device.models import ContentCacheKey
 from kolibri.core.upgrade import version_upgrade
 
@@ -359,3 +361,29 @@ def ordered_metadata_in_channels():
         calculate_ordered_grade_levels(channel)
         calculate_included_languages(channel)
     ContentCacheKey.update_cache_key()
+
+
+# This was introduced in 0.19.0, so only index
+# when upgrading from versions prior to this.
+@version_upgrade(old_version="<0.19.0")
+def build_search_index():
+    """
+    Build the full text search index for all channels on the device, as channels
+    imported before the search index existed are not in it, and searches only use it
+    when all channels are in it.
+    """
+    index_all_channels()
+    ContentCacheKey.update_cache_key()
+
+
+# This was introduced in 0.19.0, so only build
+# when upgrading from versions prior to this.
+@version_upgrade(old_version="<0.19.0")
+def build_topic_tree_pages():
+    """
+    Build the precomputed pages of the topic tree for all channels on the device,
+    as channels annotated before they existed have none, and are returned by querying
+    the tree until they do.
+    """
+    for channel_id in ChannelMetadata.objects.all().values_list("id", flat=True):
+        build_tree_pages(channel_id)
@@ -35,6 +35,7 @@ from kolibri.core.content.models import LocalFile
 from kolibri.core.content.utils.search import get_all_contentnode_label_metadata
 from kolibri.core.content.utils.sqlalchemybridge import filter_by_checksums
 from kolibri.core.content.utils.tree import get_channel_node_depth
+from kolibri.core.content.utils.tree_pages import build_tree_pages
 from kolibri.core.device.models import ContentCacheKey
 from kolibri.core.utils.lock import db_lock
 
@@ -366,6 +367,49 @@ def set_leaf_node_availability_from_local_file_availability(
         .where(ContentNodeTable.c.id == FileTable.c.contentnode_id)
     )
 
+    values_dict = {
+        "available": exists(contentnode_statement),
+    }
+
+    if admin_imported is not None:
+        values_dict["admin_imported"] = or_(
+            admin_imported, coalesce(ContentNodeTable.c.admin_imported, False)
+        )
+
+    if node_ids is not None and exclude_node_ids is None:
+        # Non-topic nodes have no descendants, so they can be updated directly,
+        # rather than by scanning the tree of the whole channel in batches.
+        node_ids = list(node_ids)
+        leaf_ids = []
+        for i in range(0, len(node_ids), CHUNKSIZE):
+            leaf_ids.extend(
+                row[0]
+                for row in connection.execute(
+                    select(ContentNodeTable.c.id).where(
+                        and_(
+                            ContentNodeTable.c.channel_id == channel_id,
+                            ContentNodeTable.c.kind != content_kinds.TOPIC,
+                            filter_by_uuids(
+                                ContentNodeTable.c.id, node_ids[i : i + CHUNKSIZE]
+                            ),
+                        )
+                    )
+                )
+            )
+        for i in range(0, len(leaf_ids), CHUNKSIZE):
+            connection.execute(
+                ContentNodeTable.update()
+                .where(
+                    filter_by_uuids(ContentNodeTable.c.id, leaf_ids[i : i + CHUNKSIZE])
+                )
+                .values(**values_dict)
+                .execution_options(autocommit=True)
+            )
+        node_ids = list(set(node_ids).difference(leaf_ids))
+        if not node_ids:
+            bridge.end()
+            return
+
     # Start a counter for the while loop
     min_boundary = 1
 
@@ -380,15 +424,6 @@ def set_leaf_node_availability_from_local_file_availability(
         )
     )
 
-    values_dict = {
-        "available": exists(contentnode_statement),
-    }
-
-    if admin_imported is not None:
-        values_dict["admin_imported"] = or_(
-            admin_imported, coalesce(ContentNodeTable.c.admin_imported, False)
-        )
-
     while min_boundary < max_rght:
         batch_statement = _create_batch_update_statement(
             bridge,
@@ -526,7 +561,164 @@ def set_local_file_availability_from_disk(checksums=None, destination=None):
     )
 
 
-def recurse_annotation_up_tree(channel_id):
+def _get_annotation_expressions(bridge, ContentNodeTable):
+    """
+    Return the expressions used to annotate a topic from its children, in the order:
+    available children, coach content, number of coach contents, number of on device resources.
+    """
+    child = ContentNodeTable.alias()
+
+    # Expression to capture all available child nodes of a contentnode
+    available_nodes = select(child.c.available).where(
+        and_(
+            child.c.available == True,  # noqa
+            ContentNodeTable.c.id == child.c.parent_id,
+        )
+    )
+
+    # Expressions for annotation of coach content
+
+    # Expression that will resolve a boolean value for all the available children
+    # of a content node, whereby if they all have coach_content flagged on them, it will be true,
+    # but otherwise false.
+    # Everything after the select statement should be identical to the available_nodes expression above.
+    if bridge.engine.name == "sqlite":
+        # Use a min function to simulate an AND.
+        coach_content_nodes = select(func.min(child.c.coach_content)).where(
+            and_(
+                child.c.available == True,  # noqa
+                ContentNodeTable.c.id == child.c.parent_id,
+            )
+        )
+    elif bridge.engine.name == "postgresql":
+        # Use the postgres boolean AND operator
+        coach_content_nodes = select(func.bool_and(child.c.coach_content)).where(
+            and_(
+                child.c.available == True,  # noqa
+                ContentNodeTable.c.id == child.c.parent_id,
+            )
+        )
+
+    # Expression that sums the total number of coach contents for each child node
+    # of a contentnode
+    coach_content_num = select(func.sum(child.c.num_coach_contents)).where(
+        and_(
+            child.c.available == True,  # noqa
+            ContentNodeTable.c.id == child.c.parent_id,
+        )
+    )
+
+    # Expression that sums the total number of on_device_resources for each child node
+    # of a contentnode
+    on_device_num = select(func.sum(child.c.on_device_resources)).where(
+        and_(
+            child.c.available == True,  # noqa
+            ContentNodeTable.c.id == child.c.parent_id,
+        )
+    )
+    return available_nodes, coach_content_nodes, coach_content_num, on_device_num
+
+
+def _get_affected_topic_ids_by_level(bridge, channel_id, node_ids):
+    """
+    Return a dict mapping tree levels to the ids of the topics whose annotations
+    depend on the passed in node_ids: the topics that are ancestors of those nodes,
+    and the topics within their subtrees.
+    These are found from the MPTT values of the nodes, so this takes a single query
+    for each chunk of node_ids, regardless of the size of the channel or the depth
+    of the tree.
+    """
+    ContentNodeTable = bridge.get_table(ContentNode)
+    connection = bridge.get_connection()
+
+    node = ContentNodeTable.alias()
+
+    topic_ids_by_level = {}
+
+    for i in range(0, len(node_ids), CHUNKSIZE):
+        results = connection.execute(
+            select([ContentNodeTable.c.id, ContentNodeTable.c.level])
+            .distinct()
+            .select_from(
+                ContentNodeTable.join(
+                    node,
+                    and_(
+                        ContentNodeTable.c.tree_id == node.c.tree_id,
+                        or_(
+                            # Topics that are ancestors of, or are, one of the nodes
+                            and_(
+                                ContentNodeTable.c.lft <= node.c.lft,
+                                ContentNodeTable.c.rght >= node.c.rght,
+                            ),
+                            # Topics that are descendants of one of the nodes
+                            and_(
+                                ContentNodeTable.c.lft > node.c.lft,
+                                ContentNodeTable.c.rght < node.c.rght,
+                            ),
+                        ),
+                    ),
+                )
+            )
+            .where(
+                and_(
+                    ContentNodeTable.c.channel_id == channel_id,
+                    ContentNodeTable.c.kind == content_kinds.TOPIC,
+                    filter_by_uuids(node.c.id, node_ids[i : i + CHUNKSIZE]),
+                )
+            )
+        )
+        for topic_id, level in results:
+            topic_ids_by_level.setdefault(level, set()).add(topic_id)
+
+    return topic_ids_by_level
+
+
+def _subtree_leaf_ids_statement(bridge, channel_id, node_ids):
+    """
+    Return a statement selecting the ids of the non-topic nodes that are either
+    one of node_ids, or a descendant of one of node_ids.
+    """
+    ContentNodeTable = bridge.get_table(ContentNode)
+
+    node = ContentNodeTable.alias()
+
+    return (
+        select(ContentNodeTable.c.id)
+        .select_from(
+            ContentNodeTable.join(
+                node,
+                and_(
+                    ContentNodeTable.c.tree_id == node.c.tree_id,
+                    ContentNodeTable.c.lft >= node.c.lft,
+                    ContentNodeTable.c.rght <= node.c.rght,
+                ),
+            )
+        )
+        .where(
+            and_(
+                ContentNodeTable.c.channel_id == channel_id,
+                ContentNodeTable.c.kind != content_kinds.TOPIC,
+                filter_by_uuids(node.c.id, node_ids),
+            )
+        )
+    )
+
+
+def recurse_annotation_up_tree(channel_id, node_ids=None):
+    """
+    Annotate topics in a channel with the availability, coach content and number of
+    on device resources of their descendants.
+    With no additional arguments, this will annotate the entire channel tree.
+    If node_ids is passed, only the subtrees of those nodes and their ancestors are
+    annotated, so that the cost of annotating changed resources is proportional to the
+    number of changed resources and the depth of the tree, rather than to the size
+    of the channel.
+    """
+    if node_ids is not None:
+        topic_ids = _recurse_annotation_up_ancestors(channel_id, node_ids)
+        build_tree_pages(channel_id, topic_ids=topic_ids)
+        return
+
     bridge = Bridge(app_name=CONTENT_APP_NAME)
 
     ContentNodeTable = bridge.get_table(ContentNode)
@@ -541,8 +733,6 @@ def recurse_annotation_up_tree(channel_id):
         )
     )
 
-    child = ContentNodeTable.alias()
-
     # start a transaction
 
     trans = connection.begin()
@@ -583,54 +773,12 @@ def recurse_annotation_up_tree(channel_id):
         )
     )
 
-    # Expression to capture all available child nodes of a contentnode
-    available_nodes = select(child.c.available).where(
-        and_(
-            child.c.available == True,  # noqa
-            ContentNodeTable.c.id == child.c.parent_id,
-        )
-    )
-
-    # Expressions for annotation of coach content
-
-    # Expression that will resolve a boolean value for all the available children
-    # of a content node, whereby if they all have coach_content flagged on them, it will be true,
-    # but otherwise false.
-    # Everything after the select statement should be identical to the available_nodes expression above.
-    if bridge.engine.name == "sqlite":
-        # Use a min function to simulate an AND.
-        coach_content_nodes = select(func.min(child.c.coach_content)).where(
-            and_(
-                child.c.available == True,  # noqa
-                ContentNodeTable.c.id == child.c.parent_id,
-            )
-        )
-    elif bridge.engine.name == "postgresql":
-        # Use the postgres boolean AND operator
-        coach_content_nodes = select(func.bool_and(child.c.coach_content)).where(
-            and_(
-                child.c.available == True,  # noqa
-                ContentNodeTable.c.id == child.c.parent_id,
-            )
-        )
-
-    # Expression that sums the total number of coach contents for each child node
-    # of a contentnode
-    coach_content_num = select(func.sum(child.c.num_coach_contents)).where(
-        and_(
-            child.c.available == True,  # noqa
-            ContentNodeTable.c.id == child.c.parent_id,
-        )
-    )
-
-    # Expression that sums the total number of on_device_resources for each child node
-    # of a contentnode
-    on_device_num = select(func.sum(child.c.on_device_resources)).where(
-        and_(
-            child.c.available == True,  # noqa
-            ContentNodeTable.c.id == child.c.parent_id,
-        )
-    )
+    (
+        available_nodes,
+        coach_content_nodes,
+        coach_content_num,
+        on_device_num,
+    ) = _get_annotation_expressions(bridge, ContentNodeTable)
 
     # Go from the deepest level to the shallowest
     for level in range(node_depth, 0, -1):
@@ -671,6 +819,100 @@ def recurse_annotation_up_tree(channel_id):
 
     bridge.end()
 
+    build_tree_pages(channel_id)
+
+
+def _recurse_annotation_up_ancestors(channel_id, node_ids):
+    bridge = Bridge(app_name=CONTENT_APP_NAME)
+
+    ContentNodeTable = bridge.get_table(ContentNode)
+
+    connection = bridge.get_connection()
+
+    node_ids = list(node_ids)
+
+    # start a transaction
+
+    trans = connection.begin()
+    start = datetime.datetime.now()
+
+    # Update the leaf ContentNodes in the subtrees of the passed in nodes
+    # to have num_coach_content and on_device_resources to 1 or 0
+    for i in range(0, len(node_ids), CHUNKSIZE):
+        connection.execute(
+            ContentNodeTable.update()
+            .where(
+                ContentNodeTable.c.id.in_(
+                    _subtree_leaf_ids_statement(
+                        bridge, channel_id, node_ids[i : i + CHUNKSIZE]
+                    )
+                )
+            )
+            .values(
+                num_coach_contents=cast(ContentNodeTable.c.coach_content, Integer()),
+                on_device_resources=cast(ContentNodeTable.c.available, Integer()),
+            )
+        )
+
+    topic_ids_by_level = _get_affected_topic_ids_by_level(bridge, channel_id, node_ids)
+
+    logger.info(
+        "Annotating {topics} topic ContentNode objects affected by {nodes} ContentNode objects".format(
+            topics=sum(map(len, topic_ids_by_level.values())), nodes=len(node_ids)
+        )
+    )
+
+    (
+        available_nodes,
+        coach_content_nodes,
+        coach_content_num,
+        on_device_num,
+    ) = _get_annotation_expressions(bridge, ContentNodeTable)
+
+    # Go from the deepest level to the shallowest
+    for level in sorted(topic_ids_by_level, reverse=True):
+        topic_ids = list(topic_ids_by_level[level])
+        for i in range(0, len(topic_ids), CHUNKSIZE):
+            topics_statement = ContentNodeTable.update().where(
+                and_(
+                    ContentNodeTable.c.channel_id == channel_id,
+                    ContentNodeTable.c.kind == content_kinds.TOPIC,
+                    filter_by_uuids(
+                        ContentNodeTable.c.id, topic_ids[i : i + CHUNKSIZE]
+                    ),
+                )
+            )
+            # Unlike the full tree annotation, we have not reset all topics first,
+            # so topics that no longer have any available children are reset here.
+            connection.execute(
+                topics_statement.where(~exists(available_nodes)).values(
+                    available=False,
+                    on_device_resources=0,
+                )
+            )
+            connection.execute(
+                topics_statement.where(exists(available_nodes)).values(
+                    available=exists(available_nodes),
+                    coach_content=coach_content_nodes.scalar_subquery(),
+                    num_coach_contents=coach_content_num.scalar_subquery(),
+                    on_device_resources=on_device_num.scalar_subquery(),
+                )
+            )
+
+    # commit the transaction
+    trans.commit()
+
+    elapsed = datetime.datetime.now() - start
+    logger.debug(
+        "Ancestor topic annotation took {} seconds".format(elapsed.total_seconds())
+    )
+
+    bridge.end()
+
+    return [
+        topic_id for topic_ids in topic_ids_by_level.values() for topic_id in topic_ids
+    ]
+
 
 def calculate_dummy_progress_for_annotation(node_ids, exclude_node_ids, total_progress):
     num_annotation_constraints = len(node_ids or []) + len(exclude_node_ids or [])
@@ -724,7 +966,7 @@ def update_content_metadata(
     )
     recurse_annotation_up_tree(channel_id)
     set_channel_metadata_fields(channel_id, public=public)
-    ContentCacheKey.update_cache_key()
+    ContentCacheKey.update_cache_key(channel_ids=[channel_id])
     # Do this call after refreshing the content cache key
     # as the caching is dependent on the key.
     get_all_contentnode_label_metadata()
@@ -748,6 +990,68 @@ def set_content_visibility(
     )
 
 
+class ContentAnnotationBatch(object):
+    """
+    Collects the resources imported by many small imports, such as the imports
+    of single resources for content download requests, so that they can be
+    annotated together.
+    As only the collected resources and their ancestors are annotated, rather than
+    the whole tree of their channels, the cost of annotation per resource does not
+    depend on the size of the channel.
+    Local file availability is updated as soon as resources are added, so that
+    storage calculations stay accurate while node annotation is deferred.
+    """
+
+    def __init__(self, max_size=100):
+        self.max_size = max_size
+        # Map of (channel_id, admin_imported) to the node ids to annotate
+        self._pending = {}
+        # Map of channel_id to the public status to set on the channel
+        self._public = {}
+
+    def __len__(self):
+        return sum(len(node_ids) for node_ids in self._pending.values())
+
+    def __contains__(self, node_id):
+        return any(node_id in node_ids for node_ids in self._pending.values())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def add(self, channel_id, checksums, node_ids, public=None, admin_imported=None):
+        mark_local_files_as_available(checksums)
+        self._pending.setdefault((channel_id, admin_imported), set()).update(node_ids)
+        if public is not None:
+            self._public[channel_id] = public
+        if len(self) >= self.max_size:
+            self.flush()
+
+    def flush(self):
+        pending = self._pending
+        public = self._public
+        self._pending = {}
+        self._public = {}
+        if not pending:
+            return
+        channel_ids = set()
+        for (channel_id, admin_imported), node_ids in pending.items():
+            node_ids = list(node_ids)
+            set_leaf_node_availability_from_local_file_availability(
+                channel_id, node_ids=node_ids, admin_imported=admin_imported
+            )
+            recurse_annotation_up_tree(channel_id, node_ids=node_ids)
+            channel_ids.add(channel_id)
+        for channel_id in channel_ids:
+            set_channel_metadata_fields(channel_id, public=public.get(channel_id))
+        ContentCacheKey.update_cache_key(channel_ids=channel_ids)
+        # Do this call after refreshing the content cache key
+        # as the caching is dependent on the key.
+        get_all_contentnode_label_metadata()
+
+
 def set_content_visibility_from_disk(channel_id):
     set_local_file_availability_from_disk()
     update_content_metadata(channel_id)
@@ -762,7 +1066,7 @@ def set_content_invisible(channel_id, node_ids, exclude_node_ids, clear_admin_im
     )
     recurse_annotation_up_tree(channel_id)
     set_channel_metadata_fields(channel_id)
-    ContentCacheKey.update_cache_key()
+    ContentCacheKey.update_cache_key(channel_ids=[channel_id])
     # Do this call after refreshing the content cache key
     # as the caching is dependent on the key.
     get_all_contentnode_label_metadata()
@@ -870,7 +1174,22 @@ def calculate_next_order(channel, model=ChannelMetadata):
     channel.save()
 
 
-def set_channel_ancestors(channel_id):
+def set_channel_ancestors(channel_id, node_ids=None):
+    """
+    Set the ancestors field of all nodes in a channel.
+    If node_ids is passed, only those nodes and their descendants are updated.
+    """
+    if node_ids is not None:
+        node_ids = list(node_ids)
+        # Batch the ids to keep the descendant constraints a manageable size,
+        # each batch is a complete annotation of the subtrees of its nodes.
+        for i in range(0, len(node_ids), CHUNKSIZE):
+            _set_ancestors(channel_id, node_ids=node_ids[i : i + CHUNKSIZE])
+    else:
+        _set_ancestors(channel_id)
+
+
+def _set_ancestors(channel_id, node_ids=None):
     bridge = Bridge(app_name=CONTENT_APP_NAME)
 
     ContentNodeTable = bridge.get_table(ContentNode)
@@ -879,6 +1198,12 @@ def set_channel_ancestors(channel_id):
 
     node_depth = get_channel_node_depth(bridge, channel_id)
 
+    if node_ids is not None:
+        max_rght, _ = _calculate_batch_params(bridge, channel_id, node_ids, None)
+        restrict_statement = _MPTT_descendant_ids_statement(
+            bridge, channel_id, node_ids, 1, max_rght
+        )
+
     parent = ContentNodeTable.alias()
 
     # start a transaction
@@ -886,17 +1211,20 @@ def set_channel_ancestors(channel_id):
     trans = connection.begin()
     start = datetime.datetime.now()
 
-    connection.execute(
-        ContentNodeTable.update()
-        .where(
-            and_(
-                ContentNodeTable.c.level == 0,
-                ContentNodeTable.c.channel_id == channel_id,
-            )
+    root_statement = ContentNodeTable.update().where(
+        and_(
+            ContentNodeTable.c.level == 0,
+            ContentNodeTable.c.channel_id == channel_id,
         )
-        .values(ancestors="[]")
     )
 
+    if node_ids is not None:
+        root_statement = root_statement.where(
+            ContentNodeTable.c.id.in_(restrict_statement)
+        )
+
+    connection.execute(root_statement.values(ancestors="[]"))
+
     # Go from the shallowest to deepest
     for level in range(1, node_depth + 1):
 
@@ -948,15 +1276,20 @@ def set_channel_ancestors(channel_id):
             )
         )
 
-        connection.execute(
-            ContentNodeTable.update()
-            .where(
-                and_(
-                    ContentNodeTable.c.level == level,
-                    ContentNodeTable.c.channel_id == channel_id,
-                )
+        level_statement = ContentNodeTable.update().where(
+            and_(
+                ContentNodeTable.c.level == level,
+                ContentNodeTable.c.channel_id == channel_id,
             )
-            .values(
+        )
+
+        if node_ids is not None:
+            level_statement = level_statement.where(
+                ContentNodeTable.c.id.in_(restrict_statement)
+            )
+
+        connection.execute(
+            level_statement.values(
                 ancestors=ancestors.scalar_subquery(),
             )
         )
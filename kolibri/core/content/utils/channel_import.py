@@ -1,13 +1,19 @@
+import hashlib
 import io
 import json
 import logging
+import queue
+import threading
 import time
+from functools import partial
 from itertools import islice
 
 from django.apps import apps
 from django.core.management.base import CommandError
 from django.db.models.fields.related import ForeignKey
+from le_utils.constants import content_kinds
 from sqlalchemy import and_
+from sqlalchemy import bindparam
 from sqlalchemy import or_
 from sqlalchemy import String as sa_String
 from sqlalchemy.dialects.postgresql import insert
@@ -38,8 +44,20 @@ from kolibri.core.content.models import ContentTag
 from kolibri.core.content.models import File
 from kolibri.core.content.models import Language
 from kolibri.core.content.models import LocalFile
+from kolibri.core.content.utils.annotation import recurse_annotation_up_tree
 from kolibri.core.content.utils.annotation import set_channel_ancestors
+from kolibri.core.content.utils.annotation import set_channel_metadata_fields
+from kolibri.core.content.utils.annotation import (
+    set_leaf_node_availability_from_local_file_availability,
+)
 from kolibri.core.content.utils.search import annotate_label_bitmasks
+from kolibri.core.content.utils.search import bitmask_fieldnames
+from kolibri.core.content.utils.search import get_all_contentnode_label_metadata
+from kolibri.core.content.utils.search_index import index_channel
+from kolibri.core.content.utils.search_index import index_nodes
+from kolibri.core.content.utils.tree_pages import build_tree_pages
+from kolibri.core.content.utils.tree_pages import delete_tree_pages
+from kolibri.core.device.models import ContentCacheKey
 from kolibri.core.errors import KolibriUpgradeError
 from kolibri.utils.time_utils import local_now
 
@@ -57,6 +75,8 @@ no_schema_models = [
     apps.get_model(CONTENT_APP_NAME, "ContentRequest"),
     apps.get_model(CONTENT_APP_NAME, "ContentDownloadRequest"),
     apps.get_model(CONTENT_APP_NAME, "ContentRemovalRequest"),
+    apps.get_model(CONTENT_APP_NAME, "SearchIndexedChannel"),
+    apps.get_model(CONTENT_APP_NAME, "ContentNodeTreePage"),
 ]
 
 models_to_exclude = [
@@ -142,6 +162,246 @@ class StringIteratorIO(io.TextIOBase):
 
 BATCH_SIZE = 1000
 
+# Maximum number of mapped batches that the reader thread of a pipelined
+# table import is allowed to get ahead of the destination writer.
+PIPELINE_QUEUE_SIZE = 4
+
+
+def iter_batches(iterable, size=BATCH_SIZE):
+    """
+    Yield lists of at most size items from iterable, consuming it only once.
+    """
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
+
+
+class _PipelineEnd(object):
+    pass
+
+
+class _PipelineError(object):
+    def __init__(self, exception):
+        self.exception = exception
+
+
+class _PipelineReader(threading.Thread):
+    """
+    Thread that reads and maps batches of source records for a pipelined table import
+    into a bounded queue, followed by _PipelineEnd, or a _PipelineError if reading fails.
+    """
+
+    def __init__(self, get_results, map_record, timing):
+        super(_PipelineReader, self).__init__(name="channel-import-reader")
+        self.daemon = True
+        self.get_results = get_results
+        self.map_record = map_record
+        self.timing = timing
+        self.queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        self.stopped = threading.Event()
+
+    def put(self, item):
+        # Don't block forever if the writer has stopped consuming, for example
+        # because the import was cancelled or a write failed.
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def run(self):
+        try:
+            read_start = time.time()
+            for batch in iter_batches(self.get_results()):
+                mapped = [self.map_record(record) for record in batch]
+                self.timing["read"] += time.time() - read_start
+                if not self.put(mapped):
+                    return
+                read_start = time.time()
+            self.put(_PipelineEnd)
+        except Exception as e:
+            self.put(_PipelineError(e))
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class ChannelDiff(object):
+    """
+    Record of the ContentNodes affected by an incremental channel upgrade.
+    """
+
+    def __init__(self):
+        self.inserted = set()
+        # Nodes whose own data, or whose related data (such as files), has changed
+        self.updated = set()
+        self.deleted = set()
+        # Parents of deleted nodes, as their annotations may have changed
+        self.deleted_parents = set()
+        self.unchanged_rows = 0
+
+    @property
+    def changed(self):
+        return self.inserted | self.updated
+
+    def __repr__(self):
+        return "ChannelDiff(inserted={}, updated={}, deleted={}, unchanged_rows={})".format(
+            len(self.inserted),
+            len(self.updated),
+            len(self.deleted),
+            self.unchanged_rows,
+        )
+
+
+class ChannelImportResult(object):
+    """
+    The result of importing a channel from its content database, which is true if the import ran.
+    """
+
+    def __init__(self, ran, diff=None):
+        self.ran = ran
+        # The ChannelDiff of the upgrade, if an older version of the channel was upgraded
+        # incrementally, in which case the changed nodes have already been annotated.
+        self.diff = diff
+
+    def __bool__(self):
+        return bool(self.ran)
+
+
+def _row_digest(row, columns):
+    return hashlib.md5(
+        repr(tuple(row[column] for column in columns)).encode("utf-8")
+    ).digest()
+
+
+class _IncrementalTable(object):
+    """
+    Compares the rows of one table of the installed channel tree with rows mapped
+    from the source during an incremental upgrade.
+    """
+
+    def __init__(
+        self,
+        model,
+        table,
+        column_names,
+        structure_columns,
+        ignored_columns,
+        node_columns,
+    ):
+        self.model = model
+        self.table = table
+        self.column_names = column_names
+        self.pk_column = table.primary_key.columns.values()[0]
+        self.keyed_by_pk = column_not_auto_integer_pk(self.pk_column)
+        self.structure_columns = [
+            name for name in structure_columns if name in column_names
+        ]
+        self.compared_columns = [
+            name
+            for name in column_names
+            if name not in self.structure_columns
+            and name not in ignored_columns
+            and name != self.pk_column.name
+        ]
+        self.node_columns = node_columns
+        self.update_columns = self.compared_columns + self.structure_columns
+        self.update_statement = self._update_statement(self.update_columns)
+        self.structure_statement = self._update_statement(self.structure_columns)
+        self.existing = {}
+
+    def _update_statement(self, names):
+        return (
+            self.table.update()
+            .where(self.pk_column == bindparam("b_" + self.pk_column.name))
+            .values({name: bindparam("b_" + name) for name in names})
+        )
+
+    def _to_bindparams(self, row, names):
+        values = {"b_" + name: row[name] for name in names}
+        values["b_" + self.pk_column.name] = row[self.pk_column.name]
+        return values
+
+    def _get_key(self, row, digest):
+        return row[self.pk_column.name] if self.keyed_by_pk else digest
+
+    def select_existing(self):
+        return select(
+            list(
+                set(
+                    [self.pk_column]
+                    + [self.table.c[name] for name in self.column_names]
+                )
+            )
+        )
+
+    def add_existing(self, row):
+        digest = _row_digest(row, self.compared_columns)
+        self.existing[self._get_key(row, digest)] = (
+            digest,
+            tuple(row[name] for name in self.structure_columns),
+            row[self.pk_column.name],
+            tuple(row[name] for name in self.node_columns),
+            row["parent_id"] if self.model is ContentNode else None,
+        )
+
+    def diff_batch(self, batch, diff):
+        """
+        Match a batch of source rows against the existing rows, recording affected nodes on diff.
+        Returns lists of rows to insert, and of bind parameters for rows to update and to move.
+        """
+        inserts = []
+        updates = []
+        moves = []
+        for row in batch:
+            digest = _row_digest(row, self.compared_columns)
+            current = self.existing.pop(self._get_key(row, digest), None)
+            if current is None:
+                inserts.append(row)
+                node_ids = [row[name] for name in self.node_columns]
+                if self.model is ContentNode:
+                    diff.inserted.update(node_ids)
+                else:
+                    diff.updated.update(node_ids)
+            elif current[0] != digest:
+                updates.append(self._to_bindparams(row, self.update_columns))
+                diff.updated.update(row[name] for name in self.node_columns)
+            else:
+                if current[1] != tuple(row[name] for name in self.structure_columns):
+                    moves.append(self._to_bindparams(row, self.structure_columns))
+                diff.unchanged_rows += 1
+        return inserts, updates, moves
+
+    def import_batch(self, destination, batch, diff):
+        inserts, updates, moves = self.diff_batch(batch, diff)
+        if inserts:
+            destination.execute(self.table.insert(), inserts)
+        if updates:
+            destination.execute(self.update_statement, updates)
+        if moves:
+            destination.execute(self.structure_statement, moves)
+
+    def record_deleted(self, diff):
+        """
+        Record the nodes affected by the existing rows that were not in the source on diff,
+        and return the primary keys of those rows.
+        """
+        deleted_pks = []
+        for _, _, pk, node_ids, parent_id in self.existing.values():
+            deleted_pks.append(pk)
+            if self.model is ContentNode:
+                diff.deleted.update(node_ids)
+                if parent_id is not None:
+                    diff.deleted_parents.add(parent_id)
+            else:
+                diff.updated.update(node_ids)
+        return deleted_pks
+
 
 def _get_dependencies(content_models):
     references = {}
@@ -231,6 +491,23 @@ class ChannelImport(object):
         File: {"per_row": {"available": "default_to_not_available"}},
     }
 
+    # Columns that are not compared or overwritten during an incremental upgrade,
+    # as they are annotated on the destination after import.
+    incremental_ignored_columns = (
+        "available",
+        "admin_imported",
+        "ancestors",
+        "num_coach_contents",
+        "on_device_resources",
+    ) + tuple(bitmask_fieldnames)
+
+    # Columns that define the position of a row in the tree. Any insertion or deletion
+    # in the tree renumbers large parts of it, so changes to these alone are updated
+    # in place, without the row being treated as changed.
+    incremental_structure_columns = {
+        ContentNode: ("lft", "rght", "level", "tree_id"),
+    }
+
     def __init__(
         self,
         channel_id,
@@ -239,6 +516,8 @@ class ChannelImport(object):
         cancel_check=None,
         destination=None,
         partial=False,
+        pipelined=True,
+        incremental=False,
     ):
         self.channel_id = channel_id
         self.channel_version = channel_version
@@ -251,6 +530,20 @@ class ChannelImport(object):
 
         self.partial = partial
 
+        # When pipelined, source reads and row mapping for each table are done on a
+        # reader thread, overlapping with the batch writes to the destination.
+        self.pipelined = pipelined
+
+        # When incremental, upgrading from an older version of the channel only applies
+        # the differences between the installed channel tree and the source, rather than
+        # deleting the installed tree and importing the source in full.
+        self.incremental = incremental and isinstance(source, str)
+        # Set to a ChannelDiff when an incremental upgrade is being carried out.
+        self.incremental_diff = None
+
+        # Per table timing information, keyed by model, reported at the end of the import.
+        self.table_timings = {}
+
         if isinstance(source, str):
             if self.partial:
                 raise ValueError(
@@ -423,7 +716,9 @@ class ChannelImport(object):
         if SourceTable is not None:
             if self.source_data is not None:
                 return self.source_data.get(SourceTable.name, [])
-            return self.source.execute(select(SourceTable)).fetchall()
+            # Return the result directly rather than fetching all rows, so that
+            # the rows can be streamed in batches from the source database.
+            return self.source.execute(select(SourceTable))
         return []
 
     def base_row_mapper(self, record, column):
@@ -541,24 +836,20 @@ class ChannelImport(object):
         )
 
         def create_data_dict_with_default(record):
-            output = {}
-            for col_name, column_obj in columns:
-                default = self.get_and_set_column_default(column_obj)
-                value = row_mapper(record, column_obj.name)
-                output[col_name] = value if value is not None else default
-            return output
+            return self.create_data_dict_with_default(columns, row_mapper, record)
 
-        results = table_mapper(SourceTable)
+        for batch in self.iter_mapped_batches(
+            model, lambda: table_mapper(SourceTable), create_data_dict_with_default
+        ):
+            self.destination.execute(query, batch)
 
-        i = 0
-        results_slice = list(islice(results, i, i + BATCH_SIZE))
-        while results_slice:
-            self.destination.execute(
-                query,
-                [create_data_dict_with_default(record) for record in results_slice],
-            )
-            i += BATCH_SIZE
-            results_slice = list(islice(results, i, i + BATCH_SIZE))
+    def create_data_dict_with_default(self, columns, row_mapper, record):
+        output = {}
+        for col_name, column_obj in columns:
+            default = self.get_and_set_column_default(column_obj)
+            value = row_mapper(record, column_obj.name)
+            output[col_name] = value if value is not None else default
+        return output
 
     def get_and_set_column_default(self, column_obj):
         if hasattr(column_obj, "k_memoized_default"):
@@ -573,6 +864,65 @@ class ChannelImport(object):
             setattr(column_obj, "k_memoized_default", default)
         return default
 
+    def _get_table_timing(self, model):
+        return self.table_timings.setdefault(
+            model, {"rows": 0, "read": 0.0, "write": 0.0, "total": 0.0}
+        )
+
+    def iter_mapped_batches(self, model, get_results, map_record):
+        """
+        Yield lists of at most BATCH_SIZE mapped records for a table import.
+        get_results is called to get the iterable of source records, and map_record is
+        called on each source record to produce the value to be written.
+        If pipelined, reading and mapping happen on a reader thread, which feeds a
+        bounded queue so that it can run ahead of, but not too far ahead of, the writes
+        done by the consumer of this generator.
+        """
+        timing = self._get_table_timing(model)
+
+        if self.pipelined:
+            batches = self._pipelined_batches(get_results, map_record, timing)
+        else:
+            batches = self._sequential_batches(get_results, map_record, timing)
+
+        for batch in batches:
+            self.check_cancelled()
+            timing["rows"] += len(batch)
+            # Time spent suspended here is time spent writing the batch.
+            write_start = time.time()
+            yield batch
+            timing["write"] += time.time() - write_start
+
+    def _sequential_batches(self, get_results, map_record, timing):
+        read_start = time.time()
+        for batch in iter_batches(get_results()):
+            mapped = [map_record(record) for record in batch]
+            timing["read"] += time.time() - read_start
+            yield mapped
+            read_start = time.time()
+
+    def _pipelined_batches(self, get_results, map_record, timing):
+        reader = _PipelineReader(get_results, map_record, timing)
+        reader.start()
+        try:
+            while True:
+                item = reader.queue.get()
+                if item is _PipelineEnd:
+                    break
+                if isinstance(item, _PipelineError):
+                    raise item.exception
+                yield item
+        finally:
+            reader.stop()
+
+    def log_table_timings(self):
+        for model, timing in self.table_timings.items():
+            logger.info(
+                "{model}: {rows} rows imported in {total:.3f}s (read {read:.3f}s, write {write:.3f}s)".format(
+                    model=model.__name__, **timing
+                )
+            )
+
     def postgres_table_import(self, model, row_mapper, table_mapper):
         DestinationTable = self.destination.get_table(model)
 
@@ -596,9 +946,8 @@ class ChannelImport(object):
         raw_connection = self.destination.get_raw_connection()
         cursor = raw_connection.cursor()
 
-        results = table_mapper(SourceTable)
-
-        def generate_data_with_default(record):
+        def generate_values(record):
+            values = []
             for col_name, column_obj in columns:
                 default = self.get_and_set_column_default(column_obj)
                 value = row_mapper(record, col_name)
@@ -609,21 +958,20 @@ class ChannelImport(object):
                     if max_length is not None:
                         value = value[:max_length] if value is not None else default
 
-                yield value if value is not None else default
+                values.append(value if value is not None else default)
+            return tuple(values)
+
+        get_results = partial(table_mapper, SourceTable)
 
         if not merge:
             separator = "\t"
+
             data_string_iterator = StringIteratorIO(
-                (
-                    separator.join(
-                        map(
-                            clean_csv_value,
-                            (datum for datum in generate_data_with_default(record)),
-                        )
-                    )
-                    + "\n"
-                    for record in results
+                separator.join(map(clean_csv_value, values)) + "\n"
+                for batch in self.iter_mapped_batches(
+                    model, get_results, generate_values
                 )
+                for values in batch
             )
 
             cursor.copy_from(
@@ -637,29 +985,17 @@ class ChannelImport(object):
 
             pk_name = DestinationTable.primary_key.columns.values()[0].name
 
-            i = 0
-            results_slice = list(islice(results, i, i + BATCH_SIZE))
-            while results_slice:
+            for list_of_values in self.iter_mapped_batches(
+                model, get_results, generate_values
+            ):
                 insert_statement = insert(DestinationTable)
                 if do_not_overwrite:
                     self.destination.execute(
-                        insert_statement.values(
-                            [
-                                tuple(
-                                    datum
-                                    for datum in generate_data_with_default(record)
-                                )
-                                for record in results_slice
-                            ]
-                        ).on_conflict_do_nothing(
+                        insert_statement.values(list_of_values).on_conflict_do_nothing(
                             constraint=DestinationTable.primary_key
                         )
                     )
                 else:
-                    list_of_values = (
-                        tuple(datum for datum in generate_data_with_default(record))
-                        for record in results_slice
-                    )
                     values_str = ", ".join(
                         cursor.mogrify(
                             f"({', '.join(['%s'] * len(column_names))})", v
@@ -692,9 +1028,6 @@ class ChannelImport(object):
                         )
                     )
                     cursor.execute(insert_sql)
-
-                i += BATCH_SIZE
-                results_slice = list(islice(results, i, i + BATCH_SIZE))
         cursor.close()
 
     def can_use_sqlite_attach_method(self, model, table_mapper):
@@ -737,6 +1070,130 @@ class ChannelImport(object):
 
         return result
 
+    def _get_contentnode_fk_columns(self, model):
+        return [
+            f.column
+            for f in model._meta.fields
+            if isinstance(f, ForeignKey) and f.target_field.model is ContentNode
+        ]
+
+    def _channel_tree_filter(self, model, table, tree_id):
+        """
+        Return a filter for the rows of table that belong to the channel tree with tree_id
+        """
+        ContentNodeTable = self.destination.get_table(ContentNode)
+        if model is ContentNode:
+            return ContentNodeTable.c.tree_id == tree_id
+        # a filter for each field this model has that foreignkeys onto ContentNode
+        return or_(
+            *[
+                getattr(table.c, column).in_(
+                    select(ContentNodeTable.c.id).where(
+                        ContentNodeTable.c.tree_id == tree_id
+                    )
+                )
+                for column in self._get_contentnode_fk_columns(model)
+            ]
+        )
+
+    def can_upgrade_incrementally(self, root_node):
+        # Post operations rewrite imported rows in bulk, so rows mapped from older
+        # schemas cannot be compared with the rows already in the destination.
+        return (
+            self.incremental
+            and root_node is not None
+            and not self.partial
+            and not self.current_channel.partial
+            and not any(mapping.get("post") for mapping in self.schema_mapping.values())
+        )
+
+    def _get_incremental_node_columns(self, model, pk_column):
+        """
+        Return the columns of model that identify the ContentNodes its rows belong to.
+        """
+        if model is ContentNode:
+            return [pk_column.name]
+        if model is ChannelMetadata:
+            # The channel metadata is annotated as a whole after every upgrade,
+            # so changes to it do not need to be recorded against its root node.
+            return []
+        return self._get_contentnode_fk_columns(model)
+
+    def incremental_table_import(self, model, row_mapper, table_mapper):
+        """
+        Import a table for an incremental upgrade, by comparing the rows of the installed
+        channel tree with the rows mapped from the source, and only inserting, updating or
+        deleting the rows that differ. Rows are matched by primary key or, for tables with
+        auto incrementing integer primary keys, by their contents.
+        The ContentNodes affected are recorded on self.incremental_diff.
+        """
+        DestinationTable = self.destination.get_table(model)
+
+        try:
+            SourceTable = self.source.get_table(model)
+        except ClassNotFoundError:
+            SourceTable = None
+
+        columns = self.get_dest_columns(DestinationTable)
+        pk_column = DestinationTable.primary_key.columns.values()[0]
+        table = _IncrementalTable(
+            model,
+            DestinationTable,
+            [column.name for _, column in columns],
+            structure_columns=self.incremental_structure_columns.get(model, ()),
+            ignored_columns=self.incremental_ignored_columns,
+            node_columns=self._get_incremental_node_columns(model, pk_column),
+        )
+
+        self.check_cancelled()
+
+        # Index the rows currently in the channel tree by key
+        for row in self.destination.execute(
+            table.select_existing().where(
+                self._channel_tree_filter(
+                    model, DestinationTable, self.available_tree_id
+                )
+            )
+        ):
+            table.add_existing(row._mapping)
+
+        def create_data_dict_with_default(record):
+            return self.create_data_dict_with_default(columns, row_mapper, record)
+
+        for batch in self.iter_mapped_batches(
+            model, lambda: table_mapper(SourceTable), create_data_dict_with_default
+        ):
+            table.import_batch(self.destination, batch, self.incremental_diff)
+
+        deleted_pks = table.record_deleted(self.incremental_diff)
+
+        if model is ContentNode:
+            # Defer deleting ContentNodes until the tables that reference them have been
+            # imported, as rows of those tables are found by their ContentNode.
+            return
+
+        for i in range(0, len(deleted_pks), BATCH_SIZE):
+            self.destination.execute(
+                DestinationTable.delete().where(
+                    pk_column.in_(deleted_pks[i : i + BATCH_SIZE])
+                )
+            )
+
+    def delete_incrementally_removed_nodes(self):
+        diff = self.incremental_diff
+        # Rows of related tables are removed along with their nodes, which will have
+        # been recorded as updates to those nodes.
+        diff.updated -= diff.deleted
+        diff.deleted_parents -= diff.deleted
+        ContentNodeTable = self.destination.get_table(ContentNode)
+        deleted = list(diff.deleted)
+        for i in range(0, len(deleted), BATCH_SIZE):
+            self.destination.execute(
+                ContentNodeTable.delete().where(
+                    ContentNodeTable.c.id.in_(deleted[i : i + BATCH_SIZE])
+                )
+            )
+
     def check_and_delete_existing_channel(self):
 
         if self.current_channel:
@@ -782,7 +1239,16 @@ class ChannelImport(object):
                 ).fetchone()
 
                 self.delete_old_channel_many_to_many_fields(self.channel_id)
-                if root_node:
+                if self.can_upgrade_incrementally(root_node):
+                    logger.info(
+                        "Upgrading channel {channel_id} incrementally".format(
+                            channel_id=self.channel_id
+                        )
+                    )
+                    # Keep the installed tree in place, and apply the changes to it.
+                    self.available_tree_id = root_node["tree_id"]
+                    self.incremental_diff = ChannelDiff()
+                elif root_node:
                     self.delete_old_channel_tree_data(root_node["tree_id"])
             else:
                 # We have previously fully loaded this channel, with the same or newer version, so our work here is done
@@ -828,31 +1294,11 @@ class ChannelImport(object):
             if model is not ContentNode and model not in merge_models
         ] + [ContentNode]
 
-        ContentNodeTable = self.destination.get_table(ContentNode)
-
         for model in models_to_delete:
             table = self.destination.get_table(model)
-            query = table.delete()
-
-            # we do a few things differently if it's the ContentNode model, vs a model related to ContentNode
-            if model is ContentNode:
-                query = query.where(ContentNodeTable.c.tree_id == old_tree_id)
-            else:
-                columns = [
-                    f.column
-                    for f in model._meta.fields
-                    if isinstance(f, ForeignKey) and f.target_field.model is ContentNode
-                ]
-                # run a query for each field this model has that foreignkeys onto ContentNode
-                or_queries = [
-                    getattr(table.c, column).in_(
-                        select(ContentNodeTable.c.id).where(
-                            ContentNodeTable.c.tree_id == old_tree_id
-                        )
-                    )
-                    for column in columns
-                ]
-                query = query.where(or_(*or_queries))
+            query = table.delete().where(
+                self._channel_tree_filter(model, table, old_tree_id)
+            )
 
             pk_column = table.primary_key.columns.values()[0]
             # if the external database is attached and there are no incompatible schema mappings for a table,
@@ -946,13 +1392,24 @@ class ChannelImport(object):
                     row_mapper = self.generate_row_mapper(mapping.get("per_row"))
                     table_mapper = self.generate_table_mapper(mapping.get("per_table"))
                     logger.info("Importing {model} data".format(model=model.__name__))
-                    self.table_import(model, row_mapper, table_mapper)
+                    if self.incremental_diff is not None and model not in merge_models:
+                        self.incremental_table_import(model, row_mapper, table_mapper)
+                    else:
+                        self.table_import(model, row_mapper, table_mapper)
                     self.execute_post_operations(model, mapping.get("post", []))
+                    model_seconds = time.time() - model_start
+                    self._get_table_timing(model)["total"] = model_seconds
                     logger.debug(
                         "{model} data imported after {seconds} seconds".format(
-                            model=model.__name__, seconds=time.time() - model_start
+                            model=model.__name__, seconds=model_seconds
                         )
                     )
+                if self.incremental_diff is not None:
+                    self.delete_incrementally_removed_nodes()
+                    logger.info(
+                        "Incremental upgrade applied: {}".format(self.incremental_diff)
+                    )
+                self.log_table_timings()
                 import_ran = True
             if self.destination.engine.name == "sqlite":
                 # reenable foreign key integrity checking before we commit the transaction
@@ -1007,12 +1464,18 @@ class ChannelImport(object):
                     channel_id=self.channel_id,
                 )
 
-            annotate_label_bitmasks(
-                ContentNode.objects.filter(channel_id=self.channel_id)
-            )
-            set_channel_ancestors(self.channel_id)
+            if self.incremental_diff is not None:
+                channel.save()
+                self.annotate_incremental_upgrade()
+            else:
+                annotate_label_bitmasks(
+                    ContentNode.objects.filter(channel_id=self.channel_id)
+                )
+                set_channel_ancestors(self.channel_id)
+                index_channel(self.channel_id)
+                build_tree_pages(self.channel_id)
 
-            channel.save()
+                channel.save()
 
             logger.info(
                 "Channel {} successfully imported into the database".format(
@@ -1021,6 +1484,48 @@ class ChannelImport(object):
             )
         return import_ran
 
+    def annotate_incremental_upgrade(self):
+        """
+        Annotate only the nodes affected by an incremental upgrade. As the rows of
+        unchanged nodes have been left in place, their annotations are still valid.
+        """
+        diff = self.incremental_diff
+        changed = list(diff.changed)
+
+        for i in range(0, len(changed), BATCH_SIZE):
+            annotate_label_bitmasks(
+                ContentNode.objects.filter_by_uuids(changed[i : i + BATCH_SIZE])
+            )
+        set_channel_ancestors(self.channel_id, node_ids=changed)
+        index_nodes(self.channel_id, changed, deleted_node_ids=diff.deleted)
+        delete_tree_pages(self.channel_id, node_ids=diff.deleted)
+
+        # The availability of updated nodes was left as it was before the upgrade,
+        # so recheck the availability of those that were available, as their files
+        # may have changed.
+        available_updated = []
+        updated = list(diff.updated)
+        for i in range(0, len(updated), BATCH_SIZE):
+            available_updated.extend(
+                ContentNode.objects.filter_by_uuids(updated[i : i + BATCH_SIZE])
+                .filter(available=True)
+                .exclude(kind=content_kinds.TOPIC)
+                .values_list("id", flat=True)
+            )
+        if available_updated:
+            set_leaf_node_availability_from_local_file_availability(
+                self.channel_id, node_ids=available_updated
+            )
+
+        recurse_annotation_up_tree(
+            self.channel_id, node_ids=changed + list(diff.deleted_parents)
+        )
+        set_channel_metadata_fields(self.channel_id)
+        ContentCacheKey.update_cache_key(channel_ids=[self.channel_id])
+        # Do this call after refreshing the content cache key
+        # as the caching is dependent on the key.
+        get_all_contentnode_label_metadata()
+
     def end(self):
         self.source.end()
         self.destination.end()
@@ -1187,7 +1692,12 @@ class InvalidSchemaVersionError(Exception):
 
 
 def initialize_import_manager(
-    channel_metadata, source, cancel_check=None, destination=None, partial=False
+    channel_metadata,
+    source,
+    cancel_check=None,
+    destination=None,
+    partial=False,
+    incremental=False,
 ):
     # For old versions of content databases, we can only infer the schema version
     min_version = channel_metadata.get(
@@ -1227,19 +1737,31 @@ def initialize_import_manager(
         cancel_check=cancel_check,
         destination=destination,
         partial=partial,
+        incremental=incremental,
     )
 
 
-def import_channel_from_local_db(channel_id, cancel_check=None, contentfolder=None):
+def import_channel_from_local_db(
+    channel_id, cancel_check=None, contentfolder=None, incremental=False
+):
+    """
+    Import the content database for channel_id into the default database.
+    Returns a ChannelImportResult, which also holds the ChannelDiff of the upgrade if
+    incremental is True and an older version of the channel was upgraded incrementally.
+    """
     source = get_content_database_file_path(channel_id, contentfolder=contentfolder)
 
     channel_metadata = read_channel_metadata_from_db_file(source)
 
     import_manager = initialize_import_manager(
-        channel_metadata, source, cancel_check=cancel_check
+        channel_metadata, source, cancel_check=cancel_check, incremental=incremental
     )
 
-    return import_manager.run_and_annotate()
+    import_ran = import_manager.run_and_annotate()
+
+    return ChannelImportResult(
+        import_ran, diff=import_manager.incremental_diff if import_ran else None
+    )
 
 
 def import_channel_from_data(source_data, cancel_check=None, partial=False):
@@ -1252,10 +1774,15 @@ def import_channel_from_data(source_data, cancel_check=None, partial=False):
     return import_manager.run_and_annotate()
 
 
-def import_channel_by_id(channel_id, cancel_check, contentfolder=None):
+def import_channel_by_id(
+    channel_id, cancel_check, contentfolder=None, incremental=False
+):
     try:
         return import_channel_from_local_db(
-            channel_id, cancel_check=cancel_check, contentfolder=contentfolder
+            channel_id,
+            cancel_check=cancel_check,
+            contentfolder=contentfolder,
+            incremental=incremental,
         )
     except InvalidSchemaVersionError:
         raise CommandError(
@@ -11,6 +11,7 @@ from kolibri.core.content.utils.annotation import update_content_metadata
 from kolibri.core.content.utils.channel_import import import_channel_by_id
 from kolibri.core.content.utils.channel_import import ImportCancelError
 from kolibri.core.content.utils.importability_annotation import clear_channel_stats
+from kolibri.core.content.utils.sqlalchemybridge import dispose_sqlite_file_engine
 from kolibri.core.device.models import ContentCacheKey
 from kolibri.core.tasks.utils import get_current_job
 from kolibri.utils import file_transfer as transfer
@@ -100,10 +101,13 @@ def start_file_transfer(filetransfer, channel_id, dest, no_upgrade, contentfolde
                     .values_list("id", flat=True)
                 )
                 import_ran = import_channel_by_id(
-                    channel_id, job.is_cancelled, contentfolder
+                    channel_id, job.is_cancelled, contentfolder, incremental=True
                 )
                 if import_ran:
-                    if node_ids:
+                    # A channel that was upgraded in place has already had the nodes it
+                    # changed annotated, so nothing needs restoring.
+                    upgraded_in_place = import_ran.diff is not None
+                    if node_ids and not upgraded_in_place:
                         # Annotate default channel DB based on previously annotated leaf nodes.
                         update_content_metadata(channel_id, node_ids=node_ids)
                         if admin_imported_ids:
@@ -116,9 +120,9 @@ def start_file_transfer(filetransfer, channel_id, dest, no_upgrade, contentfolde
                             ContentNode.objects.filter_by_uuids(
                                 not_admin_imported_ids
                             ).update(admin_imported=False)
-                    else:
+                    elif not upgraded_in_place:
                         # Ensure the channel is available to the frontend.
-                        ContentCacheKey.update_cache_key()
+                        ContentCacheKey.update_cache_key(channel_ids=[channel_id])
 
                     # Clear any previously set channel availability stats for this channel.
                     clear_channel_stats(channel_id)
@@ -181,6 +185,9 @@ def transfer_channel(
 
     logger.debug("Destination: {}".format(dest))
 
+    # The database at the destination is about to be replaced.
+    dispose_sqlite_file_engine(dest)
+
     try:
         start_file_transfer(filetransfer, channel_id, dest, no_upgrade, content_dir)
     except transfer.TransferCanceled:
@@ -198,6 +205,7 @@ def transfer_channel(
 
     # If we are trying to upgrade, remove the new channel DB.
     if os.path.exists(new_channel_dest) and not no_upgrade:
+        dispose_sqlite_file_engine(new_channel_dest)
         os.remove(new_channel_dest)
 
     return dest
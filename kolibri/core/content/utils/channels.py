@@ -8,6 +8,7 @@ from sqlalchemy.sql import select
 
 from .paths import get_content_database_dir_path
 from .sqlalchemybridge import Bridge
+from .sqlalchemybridge import dispose_sqlite_file_engine
 from kolibri.core.discovery.utils.filesystem import enumerate_mounted_disk_partitions
 from kolibri.utils.uuids import is_valid_uuid
 
@@ -57,6 +58,7 @@ def get_channel_ids_for_content_database_dir(content_database_dir):
         filename = os.path.join(content_database_dir, "{}.sqlite3".format(db_name))
         if not os.path.exists(filename) or os.path.getsize(filename) == 0:
             db_files_to_remove.add(db_name)
+            dispose_sqlite_file_engine(filename)
             os.remove(filename)
 
     if db_files_to_remove:
@@ -14,6 +14,7 @@ from kolibri.core.content.utils.channel_transfer import get_job
 from kolibri.core.content.utils.content_request import propagate_contentnode_removal
 from kolibri.core.content.utils.importability_annotation import clear_channel_stats
 from kolibri.core.content.utils.paths import get_content_database_file_path
+from kolibri.core.content.utils.sqlalchemybridge import dispose_sqlite_file_engine
 from kolibri.core.utils.lock import db_lock
 
 
@@ -131,8 +132,10 @@ def delete_content(
     current_progress += 1
     job.update_progress(current_progress, target_progress)
     if delete_all_metadata:
+        content_database_file_path = get_content_database_file_path(channel_id)
+        dispose_sqlite_file_engine(content_database_file_path)
         try:
-            os.remove(get_content_database_file_path(channel_id))
+            os.remove(content_database_file_path)
         except OSError:
             pass
         current_progress += 1
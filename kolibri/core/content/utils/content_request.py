@@ -26,6 +26,7 @@ from kolibri.core.content.models import ContentRequest
 from kolibri.core.content.models import ContentRequestReason
 from kolibri.core.content.models import ContentRequestStatus
 from kolibri.core.content.models import File
+from kolibri.core.content.utils.annotation import ContentAnnotationBatch
 from kolibri.core.content.utils.assignment import ContentAssignmentManager
 from kolibri.core.content.utils.assignment import DeletedAssignment
 from kolibri.core.content.utils.channel_import import import_channel_from_data
@@ -684,72 +685,84 @@ def _process_content_requests(incomplete_downloads):
     has_freed_space_in_stream_cache = False
     qs = incomplete_downloads_with_metadata.all()
 
-    # loop while we have pending downloads
-    while qs.exists():
-        free_space = get_free_space_for_downloads(
-            completed_size=_total_size(completed_downloads_queryset())
-        )
-
-        # grab the next request that will fit within current free space
-        download_request = qs.filter(total_size__lte=free_space).first()
-
-        if download_request is not None:
-            if not process_download_request(download_request):
-                failed_ids.append(download_request.id)
-                qs = incomplete_downloads_with_metadata.exclude(id__in=failed_ids)
-        else:
-            logger.debug(
-                "Did not find suitable download request for free space {}".format(
-                    free_space
-                )
+    # Annotation of completed downloads is batched across requests, so that only
+    # the ancestors of the imported resources are annotated, and only once for
+    # all of the requests in a batch.
+    with ContentAnnotationBatch() as annotation_batch:
+        # loop while we have pending downloads
+        while qs.exists():
+            free_space = get_free_space_for_downloads(
+                completed_size=_total_size(completed_downloads_queryset())
             )
-            if (
-                not has_processed_sync_removals
-                and calc.incomplete_sync_removals.exists()
-            ):
-                # process, then repeat
-                has_processed_sync_removals = True
-                logger.info("Processing sync-initiated content removal requests")
-                process_content_removal_requests(calc.incomplete_sync_removals)
-                continue
-            if (
-                not has_processed_user_removals
-                and calc.incomplete_user_removals.exists()
-            ):
-                # process, then repeat
-                has_processed_user_removals = True
-                logger.info("Processing user-initiated content removal requests")
-                process_content_removal_requests(calc.incomplete_user_removals)
-                continue
-            if (
-                not has_processed_user_downloads
-                and calc.complete_user_downloads.exists()
-            ):
-                # process, then repeat
-                has_processed_user_downloads = True
-                process_user_downloads_for_removal()
-                continue
-            if not has_freed_space_in_stream_cache:
-                # try to clear space, then repeat
-                has_freed_space_in_stream_cache = True
-                chunked_file_manager = ChunkedFileDirectoryManager(
-                    OPTIONS["Paths"]["CONTENT_DIR"]
-                )
-                chunked_file_manager.evict_files(
-                    calc.get_additional_free_space_needed()
+
+            # grab the next request that will fit within current free space
+            download_request = qs.filter(total_size__lte=free_space).first()
+
+            if download_request is not None:
+                if not process_download_request(
+                    download_request, annotation_batch=annotation_batch
+                ):
+                    failed_ids.append(download_request.id)
+                    qs = incomplete_downloads_with_metadata.exclude(id__in=failed_ids)
+            else:
+                logger.debug(
+                    "Did not find suitable download request for free space {}".format(
+                        free_space
+                    )
                 )
-                continue
-            raise InsufficientStorage(
-                "Content download requests need {} of free space".format(
-                    bytes_for_humans(_total_size(incomplete_downloads_with_metadata))
+                # Annotate the completed downloads before any content is removed
+                annotation_batch.flush()
+                if (
+                    not has_processed_sync_removals
+                    and calc.incomplete_sync_removals.exists()
+                ):
+                    # process, then repeat
+                    has_processed_sync_removals = True
+                    logger.info("Processing sync-initiated content removal requests")
+                    process_content_removal_requests(calc.incomplete_sync_removals)
+                    continue
+                if (
+                    not has_processed_user_removals
+                    and calc.incomplete_user_removals.exists()
+                ):
+                    # process, then repeat
+                    has_processed_user_removals = True
+                    logger.info("Processing user-initiated content removal requests")
+                    process_content_removal_requests(calc.incomplete_user_removals)
+                    continue
+                if (
+                    not has_processed_user_downloads
+                    and calc.complete_user_downloads.exists()
+                ):
+                    # process, then repeat
+                    has_processed_user_downloads = True
+                    process_user_downloads_for_removal()
+                    continue
+                if not has_freed_space_in_stream_cache:
+                    # try to clear space, then repeat
+                    has_freed_space_in_stream_cache = True
+                    chunked_file_manager = ChunkedFileDirectoryManager(
+                        OPTIONS["Paths"]["CONTENT_DIR"]
+                    )
+                    chunked_file_manager.evict_files(
+                        calc.get_additional_free_space_needed()
+                    )
+                    continue
+                raise InsufficientStorage(
+                    "Content download requests need {} of free space".format(
+                        bytes_for_humans(
+                            _total_size(incomplete_downloads_with_metadata)
+                        )
+                    )
                 )
-            )
 
 
-def process_download_request(download_request):
+def process_download_request(download_request, annotation_batch=None):
     """
     Processes a download request
     :type download_request: ContentDownloadRequest
+    :param annotation_batch: A batch to defer the annotation of the imported content to
+    :type annotation_batch: ContentAnnotationBatch
     """
     logger.info(
         "Processing content import request for node {}".format(
@@ -763,7 +776,9 @@ def process_download_request(download_request):
     try:
         # by this point we should have a ContentNode
         node = ContentNode.objects.get(pk=download_request.contentnode_id)
-        if node.available:
+        if node.available or (
+            annotation_batch is not None and node.id in annotation_batch
+        ):
             raise AlreadyAvailable(
                 "ContentNode {} is already available".format(node.id)
             )
@@ -782,7 +797,12 @@ def process_download_request(download_request):
 
         # we try to import from the source instance first
         for peer in chain(*peer_sets):
-            if _process_download(download_request, node.channel_id, peer):
+            if _process_download(
+                download_request,
+                node.channel_id,
+                peer,
+                annotation_batch=annotation_batch,
+            ):
                 # if we successfully imported, break out of the loop
                 break
         else:
@@ -807,7 +827,7 @@ def process_download_request(download_request):
     return True
 
 
-def _process_download(download_request, channel_id, peer):
+def _process_download(download_request, channel_id, peer, annotation_batch=None):
     """
     Processes an import for a download request
     :param download_request: The download request model instance
@@ -816,6 +836,8 @@ def _process_download(download_request, channel_id, peer):
     :type channel_id: str
     :param peer: The peer to import from
     :type peer: NetworkLocation
+    :param annotation_batch: A batch to defer the annotation of the imported content to
+    :type annotation_batch: ContentAnnotationBatch
     :return: True if the import was successful, False otherwise
     :rtype: bool
     """
@@ -825,6 +847,7 @@ def _process_download(download_request, channel_id, peer):
             peer,
             download_request,
             fail_on_error=True,
+            annotation_batch=annotation_batch,
         )
         _, count = import_manager.run()
 
@@ -0,0 +1,185 @@
+"""
+Utilities for transferring many small content files in a single request.
+
+A file bundle is an uncompressed tar stream of content storage files, each named by its
+content storage filename (checksum plus extension). The serving Kolibri streams the files it
+has on disk, skipping any that it does not have, and the importing Kolibri verifies the
+checksum of every file it extracts, so any file that is missing from the bundle or corrupted
+can be fetched on its own afterwards.
+"""
+import hashlib
+import logging
+import os
+import tarfile
+import time
+
+from kolibri.core.content.errors import InvalidStorageFilenameError
+from kolibri.core.content.utils.paths import get_content_file_name
+from kolibri.core.content.utils.paths import get_content_storage_file_path
+from kolibri.core.content.utils.paths import get_file_bundle_url
+from kolibri.utils.file_transfer import replace
+from kolibri.utils.filesystem import mkdirp
+
+logger = logging.getLogger(__name__)
+
+# Only files up to this size are grouped into bundles, larger files are
+# still transferred individually, where per request overhead is negligible.
+MAX_BUNDLED_FILE_SIZE = 256 * 1024
+
+# Limits on the number of files and the total size of a single bundle requested
+# by an importing Kolibri. These are kept small enough that several bundles can
+# be transferred concurrently.
+MAX_BUNDLE_FILES = 50
+
+MAX_BUNDLE_SIZE = 2 * 1024 * 1024
+
+# The maximum number of files that the serving Kolibri will put in a single bundle.
+MAX_BUNDLE_REQUEST_FILES = 1000
+
+BLOCK_SIZE = 128 * 1024
+
+
+class FileBundleNotSupported(Exception):
+    """
+    Raised when the remote does not provide the file bundle endpoint.
+    """
+
+    pass
+
+
+def group_files_for_bundles(files):
+    """
+    Split an iterable of LocalFile dicts into lists of files to transfer together.
+    Files that are too large to be bundled are returned in lists of their own.
+    """
+    bundle = []
+    bundle_size = 0
+    for f in files:
+        file_size = f["file_size"] or 0
+        if file_size > MAX_BUNDLED_FILE_SIZE:
+            yield [f]
+            continue
+        if bundle and (
+            len(bundle) >= MAX_BUNDLE_FILES or bundle_size + file_size > MAX_BUNDLE_SIZE
+        ):
+            yield bundle
+            bundle = []
+            bundle_size = 0
+        bundle.append(f)
+        bundle_size += file_size
+    if bundle:
+        yield bundle
+
+
+def _tar_padding(size):
+    remainder = size % tarfile.BLOCKSIZE
+    return tarfile.NUL * (tarfile.BLOCKSIZE - remainder) if remainder else b""
+
+
+def stream_file_bundle(filenames):
+    """
+    Generator of the bytes of a tar stream of the content storage files for filenames.
+    Filenames that are invalid, or are not present in content storage, are skipped.
+    """
+    for filename in filenames:
+        try:
+            path = get_content_storage_file_path(filename)
+            file_obj = open(path, "rb")
+        except (InvalidStorageFilenameError, IOError, OSError):
+            continue
+        with file_obj:
+            size = os.fstat(file_obj.fileno()).st_size
+            info = tarfile.TarInfo(name=filename)
+            info.size = size
+            info.mtime = int(time.time())
+            yield info.tobuf(format=tarfile.USTAR_FORMAT)
+            remaining = size
+            while remaining > 0:
+                block = file_obj.read(min(BLOCK_SIZE, remaining))
+                if not block:
+                    # The file was truncated while we were reading it, so pad it out to the
+                    # size declared in the header, the checksum check on import will reject it.
+                    block = tarfile.NUL * remaining
+                yield block
+                remaining -= len(block)
+            yield _tar_padding(size)
+    # Two empty blocks mark the end of the archive.
+    yield tarfile.NUL * (tarfile.BLOCKSIZE * 2)
+
+
+def _extract_bundle_member(bundle, member, dest, checksum, cancel_check=None):
+    """
+    Write a file from the bundle to its destination, only if its checksum matches.
+    """
+    source = bundle.extractfile(member)
+    mkdirp(os.path.dirname(dest), exist_ok=True)
+    tmp_dest = dest + ".transfer"
+    hasher = hashlib.md5()
+    try:
+        with open(tmp_dest, "wb") as f:
+            while True:
+                if cancel_check:
+                    cancel_check()
+                block = source.read(BLOCK_SIZE)
+                if not block:
+                    break
+                f.write(block)
+                hasher.update(block)
+    except Exception:
+        os.remove(tmp_dest)
+        raise
+    if hasher.hexdigest() != checksum:
+        logger.error("File {} in file bundle is corrupted.".format(member.name))
+        os.remove(tmp_dest)
+        return False
+    replace(tmp_dest, dest)
+    return True
+
+
+def download_file_bundle(
+    session, baseurl, files, content_dir=None, timeout=60, cancel_check=None
+):
+    """
+    Download a bundle of files from the remote at baseurl into content storage.
+
+    :param session: The requests session to make the request with
+    :param baseurl: The base url of the remote Kolibri
+    :param files: An iterable of LocalFile dicts of id, file_size and extension
+    :param content_dir: The content directory to write the files to
+    :param timeout: The timeout for the request
+    :param cancel_check: A callable that raises if the transfer has been cancelled
+    :return: The set of the checksums of the files that were transferred and verified
+    """
+    files_by_name = {get_content_file_name(f): f for f in files}
+    transferred = set()
+    response = session.post(
+        get_file_bundle_url(baseurl),
+        json=list(files_by_name),
+        stream=True,
+        timeout=timeout,
+    )
+    with response:
+        # Versions of Kolibri without the bundle endpoint will not route this URL,
+        # and will not allow it to be POSTed to.
+        if response.status_code in (404, 405):
+            raise FileBundleNotSupported(
+                "{} does not support file bundles".format(baseurl)
+            )
+        response.raise_for_status()
+        response.raw.decode_content = True
+        try:
+            with tarfile.open(fileobj=response.raw, mode="r|") as bundle:
+                for member in bundle:
+                    f = files_by_name.get(member.name)
+                    if f is None or not member.isfile():
+                        continue
+                    dest = get_content_storage_file_path(
+                        member.name, contentfolder=content_dir
+                    )
+                    if _extract_bundle_member(
+                        bundle, member, dest, f["id"], cancel_check=cancel_check
+                    ):
+                        transferred.add(f["id"])
+        except tarfile.TarError as e:
+            raise IOError("Invalid file bundle from {}: {}".format(baseurl, e))
+    return transferred
@@ -256,6 +256,14 @@ def get_file_checksums_url(channel_id, baseurl, version="1"):
     )
 
 
+def get_file_bundle_url(baseurl, version="1"):
+    # This endpoint does not exist on Studio, so a baseurl is required.
+    return get_content_server_url(
+        "api/public/v{version}/file_bundle/".format(version=version),
+        baseurl=baseurl,
+    )
+
+
 HASHI = "hashi/"
 
 ZIPCONTENT = "zipcontent/"
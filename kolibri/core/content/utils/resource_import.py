@@ -1,3 +1,4 @@
+import asyncio
 import concurrent.futures
 import logging
 import os
@@ -12,6 +13,7 @@ from kolibri.core.content.errors import InsufficientStorageSpaceError
 from kolibri.core.content.errors import InvalidStorageFilenameError
 from kolibri.core.content.models import ContentNode
 from kolibri.core.content.utils import annotation
+from kolibri.core.content.utils import file_bundle
 from kolibri.core.content.utils import paths
 from kolibri.core.content.utils.channels import get_mounted_drive_by_id
 from kolibri.core.content.utils.content_manifest import ContentManifest
@@ -20,6 +22,7 @@ from kolibri.core.content.utils.file_availability import LocationError
 from kolibri.core.content.utils.import_export_content import get_import_export_data
 from kolibri.core.content.utils.paths import get_channel_lookup_url
 from kolibri.core.content.utils.paths import get_content_file_name
+from kolibri.core.content.utils.transfer_registry import transfer_registry
 from kolibri.core.content.utils.upgrade import get_import_data_for_update
 from kolibri.core.discovery.models import NetworkLocation
 from kolibri.core.discovery.utils.network.client import NetworkClient
@@ -32,6 +35,7 @@ from kolibri.core.tasks.utils import JobProgressMixin
 from kolibri.core.utils.urls import reverse_path
 from kolibri.utils import conf
 from kolibri.utils import file_transfer as transfer
+from kolibri.utils.async_file_transfer import get_transfer_engine
 from kolibri.utils.system import get_free_space
 
 
@@ -92,6 +96,11 @@ class ResourceImportManagerBase(JobProgressMixin, metaclass=ABCMeta):
         self.admin_imported = admin_imported
         super(ResourceImportManagerBase, self).__init__()
 
+    @property
+    def bandwidth_key(self):
+        # Transfers for the same job share a single portion of the bandwidth limit.
+        return self.job.job_id if self.job else id(self)
+
     @classmethod
     def from_manifest(cls, channel_id, manifest_file, **kwargs):
         if "node_ids" in kwargs:
@@ -118,14 +127,72 @@ class ResourceImportManagerBase(JobProgressMixin, metaclass=ABCMeta):
             filename, contentfolder=self.content_dir
         )
 
-        # if the file already exists add its size to our overall progress, and skip
-        if os.path.isfile(dest) and os.path.getsize(dest) == f["file_size"]:
-            return
+        while True:
+            # if the file already exists add its size to our overall progress, and skip
+            if self._file_exists(f, dest):
+                return
+
+            with transfer_registry.claimed(f["id"]) as token:
+                if token is not None:
+                    # Check again in case another transfer of the file finished
+                    # between the check above and our claim on it.
+                    if self._file_exists(f, dest):
+                        return
+                    self._run_file_transfer(f, filename, dest, token)
+                    return
+
+            # Another import is already transferring this file to the same destination,
+            # so wait for it to finish, rather than transferring the file again.
+            # If that transfer failed, we will claim the file and transfer it ourselves.
+            transfer_registry.wait(f["id"], cancel_check=self._check_cancelled)
+
+    def _submit_file_transfer(self, f):
+        """
+        Start the transfer of a single file, returning a future for its completion.
+        """
+        return self.executor.submit(self._start_file_transfer, f)
+
+    def _run_file_transfer(self, f, filename, dest, token):
+        def renew_claim(bytes_transferred):
+            # Keep our claim on the file alive for as long as the transfer progresses.
+            transfer_registry.renew(f["id"], token)
 
         filetransfer = self.create_file_transfer(f, filename, dest)
         if filetransfer:
             with filetransfer:
-                filetransfer.run()
+                filetransfer.run(progress_update=renew_claim)
+
+    def _file_exists(self, f, dest):
+        return os.path.isfile(dest) and os.path.getsize(dest) == f["file_size"]
+
+    def _get_files_to_transfer(self, files):
+        """
+        Filter out any files that are already present in content storage.
+        """
+        for f in files:
+            dest = paths.get_content_storage_file_path(
+                get_content_file_name(f), contentfolder=self.content_dir
+            )
+            if not self._file_exists(f, dest):
+                yield f
+
+    def _check_cancelled(self):
+        if self.is_cancelled():
+            raise transfer.TransferCanceled("The transfer was canceled.")
+
+    def _group_file_transfers(self, files):
+        """
+        Returns an iterable of lists of files to be transferred together.
+        By default every file is transferred on its own.
+        """
+        return ([f] for f in files)
+
+    def _start_bundle_transfer(self, files):
+        """
+        Transfer a group of files together, should return a list of any of the files
+        that could not be transferred, to be transferred individually instead.
+        """
+        return files
 
     @abstractmethod
     def get_import_data(self):
@@ -180,16 +247,64 @@ class ResourceImportManagerBase(JobProgressMixin, metaclass=ABCMeta):
             else:
                 self.exception = e
 
-    def _wait_for_futures(self):
-        for future in concurrent.futures.as_completed(self.future_file_transfers):
-            f = self.future_file_transfers[future]
-            self._handle_future(future, f)
+    def _handle_bundle_future(self, future, files):
+        """
+        Handle a completed bundle transfer, and return a dict of futures for the
+        transfers of any files that still need to be transferred individually.
+        """
+        try:
+            remaining_files = future.result()
+        except Exception:
+            # Let _handle_future handle the error for each file in the bundle.
+            remaining_files = []
+        remaining_ids = {f["id"] for f in remaining_files}
+        for f in files:
+            if f["id"] not in remaining_ids:
+                self._handle_future(future, f)
+        future_file_transfers = {}
+        for f in remaining_files:
             if self.is_cancelled() or self.exception:
                 break
+            future_file_transfers[self._submit_file_transfer(f)] = f
+        return future_file_transfers
+
+    def _wait_for_futures(self):
+        not_done = set(self.future_file_transfers)
+        while not_done and not (self.is_cancelled() or self.exception):
+            done, not_done = concurrent.futures.wait(
+                not_done, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                f = self.future_file_transfers[future]
+                if isinstance(f, list):
+                    future_file_transfers = self._handle_bundle_future(future, f)
+                    self.future_file_transfers.update(future_file_transfers)
+                    not_done.update(future_file_transfers)
+                else:
+                    self._handle_future(future, f)
+                if self.is_cancelled() or self.exception:
+                    break
         if self.is_cancelled() or self.exception:
             for future in self.future_file_transfers:
                 future.cancel()
 
+    def count_available_resources(self):
+        return (
+            ContentNode.objects.filter(channel_id=self.channel_id, available=True)
+            .exclude(kind=content_kinds.TOPIC)
+            .count()
+        )
+
+    def annotate_content(self):
+        annotation.set_content_visibility(
+            self.channel_id,
+            self.file_checksums_to_annotate,
+            node_ids=self.node_ids,
+            exclude_node_ids=self.exclude_node_ids,
+            public=self.public,
+            admin_imported=self.admin_imported,
+        )
+
     def _check_free_space(self, total_bytes_to_transfer):
         if not paths.using_remote_storage():
             free_space = get_free_space(self.content_dir)
@@ -220,11 +335,7 @@ class ResourceImportManagerBase(JobProgressMixin, metaclass=ABCMeta):
 
         self._check_free_space(self.total_bytes_to_transfer)
 
-        self.resources_before_transfer = (
-            ContentNode.objects.filter(channel_id=self.channel_id, available=True)
-            .exclude(kind=content_kinds.TOPIC)
-            .count()
-        )
+        self.resources_before_transfer = self.count_available_resources()
 
         self.dummy_bytes_for_annotation = (
             annotation.calculate_dummy_progress_for_annotation(
@@ -294,30 +405,25 @@ class ResourceImportManagerBase(JobProgressMixin, metaclass=ABCMeta):
                 file_batch = self.files_to_download[i : i + batch_size]
                 while file_batch and not (self.is_cancelled() or self.exception):
                     self.future_file_transfers = {}
-                    for f in file_batch:
+                    for files in self._group_file_transfers(file_batch):
                         if self.is_cancelled() or self.exception:
                             break
-                        future = self.executor.submit(self._start_file_transfer, f)
-                        self.future_file_transfers[future] = f
+                        if len(files) > 1:
+                            future = self.executor.submit(
+                                self._start_bundle_transfer, files
+                            )
+                            self.future_file_transfers[future] = files
+                        else:
+                            future = self._submit_file_transfer(files[0])
+                            self.future_file_transfers[future] = files[0]
 
                     self._wait_for_futures()
                     i += batch_size
                     file_batch = self.files_to_download[i : i + batch_size]
 
-        annotation.set_content_visibility(
-            self.channel_id,
-            self.file_checksums_to_annotate,
-            node_ids=self.node_ids,
-            exclude_node_ids=self.exclude_node_ids,
-            public=self.public,
-            admin_imported=self.admin_imported,
-        )
+        self.annotate_content()
 
-        self.resources_after_transfer = (
-            ContentNode.objects.filter(channel_id=self.channel_id, available=True)
-            .exclude(kind=content_kinds.TOPIC)
-            .count()
-        )
+        self.resources_after_transfer = self.count_available_resources()
 
         if self.number_of_skipped_files > 0:
             logger.warning(
@@ -393,6 +499,134 @@ class RemoteResourceImportManagerBase(ResourceImportManagerBase):
 
         self.session = requests.Session()
 
+        # Studio does not provide the file bundle endpoint, so only request
+        # bundles of small files from other Kolibri instances.
+        self.use_file_bundles = (
+            self.baseurl != conf.OPTIONS["Urls"]["CENTRAL_CONTENT_BASE_URL"]
+        )
+
+        # Downloads run as coroutines on the shared asyncio engine when it is enabled,
+        # rather than each in its own thread.
+        self.transfer_engine = (
+            get_transfer_engine()
+            if conf.OPTIONS["Deployment"]["FILE_TRANSFER_ENGINE"] == "asyncio"
+            else None
+        )
+
+    def _group_file_transfers(self, files):
+        if not self.use_file_bundles:
+            return super(RemoteResourceImportManagerBase, self)._group_file_transfers(
+                files
+            )
+        return file_bundle.group_files_for_bundles(files)
+
+    def _start_bundle_transfer(self, files):
+        files = list(self._get_files_to_transfer(files))
+        if not files or not self.use_file_bundles:
+            return files
+        # Only bundle the files that are not already being transferred by another import,
+        # the rest are returned to be handled individually, which waits for those transfers.
+        tokens = {}
+        for f in files:
+            token = transfer_registry.claim(f["id"])
+            if token is not None:
+                tokens[f["id"]] = token
+        try:
+            return self._download_file_bundle(
+                [f for f in files if f["id"] in tokens]
+            ) + [f for f in files if f["id"] not in tokens]
+        finally:
+            for checksum, token in tokens.items():
+                transfer_registry.release(checksum, token)
+
+    def _download_file_bundle(self, files):
+        if not files:
+            return files
+        try:
+            transferred = file_bundle.download_file_bundle(
+                self.session,
+                self.baseurl,
+                files,
+                content_dir=self.content_dir,
+                timeout=self.timeout,
+                cancel_check=self._check_cancelled,
+            )
+        except file_bundle.FileBundleNotSupported:
+            logger.info(
+                "Remote {} does not support file bundles, transferring files individually".format(
+                    self.baseurl
+                )
+            )
+            self.use_file_bundles = False
+            return files
+        except (requests.exceptions.RequestException, IOError) as e:
+            # Fall back to transferring each file individually, which has its own
+            # handling for retrying or skipping files.
+            logger.warning(
+                "Error transferring file bundle, transferring files individually: {}".format(
+                    e
+                )
+            )
+            return files
+        return [f for f in files if f["id"] not in transferred]
+
+    def _submit_file_transfer(self, f):
+        if self.transfer_engine is None:
+            return super(RemoteResourceImportManagerBase, self)._submit_file_transfer(f)
+        return self.transfer_engine.submit(self._start_async_file_transfer(f))
+
+    async def _start_async_file_transfer(self, f):
+        """
+        The equivalent of _start_file_transfer for the asyncio transfer engine,
+        which runs any blocking calls on the engine's thread pool.
+        """
+        filename = get_content_file_name(f)
+        dest = paths.get_content_storage_file_path(
+            filename, contentfolder=self.content_dir
+        )
+        run_io = self.transfer_engine.run_io
+
+        while True:
+            if await run_io(self._file_exists, f, dest):
+                return
+
+            token = await run_io(transfer_registry.claim, f["id"])
+            if token is not None:
+
+                def renew_claim(bytes_transferred):
+                    transfer_registry.renew(f["id"], token)
+
+                try:
+                    if await run_io(self._file_exists, f, dest):
+                        return
+                    await self.create_async_file_transfer(
+                        f, filename, dest, progress_update=renew_claim
+                    )
+                    return
+                finally:
+                    await run_io(transfer_registry.release, f["id"], token)
+
+            # Wait for the transfer of the file by another import to finish.
+            while await run_io(transfer_registry.in_progress, f["id"]):
+                await run_io(self._check_cancelled)
+                await asyncio.sleep(transfer_registry.poll_interval)
+
+    def create_async_file_transfer(self, f, filename, dest, progress_update=None):
+        """
+        Returns a coroutine to download the file on the asyncio transfer engine,
+        the alternative to create_file_transfer when the engine is enabled.
+        """
+        url = paths.get_content_storage_remote_url(filename, baseurl=self.baseurl)
+        return self.transfer_engine.download(
+            url,
+            dest,
+            checksum=f["id"],
+            file_size=f["file_size"],
+            cancel_check=self.is_cancelled,
+            progress_update=progress_update,
+            bandwidth_key=self.bandwidth_key,
+        )
+
     def create_file_transfer(self, f, filename, dest):
         url = paths.get_content_storage_remote_url(filename, baseurl=self.baseurl)
         return transfer.FileDownload(
@@ -402,6 +636,8 @@ class RemoteResourceImportManagerBase(ResourceImportManagerBase):
             session=self.session,
             cancel_check=self.is_cancelled,
             timeout=self.timeout,
+            segments=conf.OPTIONS["Deployment"]["FILE_DOWNLOAD_SEGMENTS"],
+            bandwidth_key=self.bandwidth_key,
         )
 
 
@@ -540,6 +776,7 @@ class ContentDownloadRequestResourceImportManager(RemoteChannelResourceImportMan
         # As this is primarily used for importing non-admin imported content
         # we reverse the default here.
         admin_imported=False,
+        annotation_batch=None,
     ):
         """
         :param channel_id: A hex UUID string
@@ -556,6 +793,8 @@ class ContentDownloadRequestResourceImportManager(RemoteChannelResourceImportMan
         :type content_dir: str
         :param timeout: The timeout for the download request
         :type timeout: int
+        :param annotation_batch: A batch to defer the annotation of the imported content to
+        :type annotation_batch: ContentAnnotationBatch
         """
         super(ContentDownloadRequestResourceImportManager, self).__init__(
             channel_id,
@@ -571,6 +810,7 @@ class ContentDownloadRequestResourceImportManager(RemoteChannelResourceImportMan
         )
         self.peer = peer
         self.download_request = download_request
+        self.annotation_batch = annotation_batch
 
     def get_import_data(self):
         return get_import_export_data(
@@ -626,6 +866,39 @@ class ContentDownloadRequestResourceImportManager(RemoteChannelResourceImportMan
 
         return super(ContentDownloadRequestResourceImportManager, self).run()
 
+    def count_available_resources(self):
+        # Only the requested nodes are imported, so only count those, and count any
+        # whose annotation has been deferred to the batch as available.
+        return sum(
+            1
+            for node_id, available in ContentNode.objects.filter_by_uuids(self.node_ids)
+            .exclude(kind=content_kinds.TOPIC)
+            .values_list("id", "available")
+            if available
+            or (self.annotation_batch is not None and node_id in self.annotation_batch)
+        )
+
+    def annotate_content(self):
+        # Only annotate the requested nodes and their ancestors, rather than the whole
+        # channel, as this is run for every completed download request.
+        if self.annotation_batch is not None:
+            self.annotation_batch.add(
+                self.channel_id,
+                self.file_checksums_to_annotate,
+                self.node_ids,
+                public=self.public,
+                admin_imported=self.admin_imported,
+            )
+        else:
+            with annotation.ContentAnnotationBatch() as annotation_batch:
+                annotation_batch.add(
+                    self.channel_id,
+                    self.file_checksums_to_annotate,
+                    self.node_ids,
+                    public=self.public,
+                    admin_imported=self.admin_imported,
+                )
+
     def start_progress(self, total=100):
         super(ContentDownloadRequestResourceImportManager, self).start_progress(total)
         if self.download_request:
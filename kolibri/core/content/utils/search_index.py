@@ -0,0 +1,487 @@
+"""
+A full text index of the titles and descriptions of ContentNodes, so that searches are
+answered from an inverted index and ranked by relevance, rather than by scanning every
+ContentNode once for each word searched for.
+
+On SQLite the index is an FTS5 virtual table, on Postgres it is a table of weighted
+tsvectors with a GIN index. The index of a channel is rebuilt whenever the channel is
+imported or upgraded, and the channels that have been indexed are recorded, so that
+searches only use the index when every channel on the device is in it.
+
+Text is tokenized and stemmed according to the language of each ContentNode before it is
+indexed, see search_text. The trigrams of the terms of each channel are indexed as well,
+so that words of a search that are not in the index can be replaced by the terms most
+like them, to allow for misspellings.
+
+Avoiding direct model imports in here so that we can import these functions into places
+that should not initiate the Django app registry.
+"""
+import logging
+
+from django.db import connections
+from django.db import DatabaseError
+from django.db import transaction
+
+from kolibri.core.content.utils.search_text import get_stems
+from kolibri.core.content.utils.search_text import get_trigrams
+from kolibri.core.content.utils.search_text import tokenize
+
+logger = logging.getLogger(__name__)
+
+
+# Bump this when the contents of the index change, so that channels are reindexed.
+SEARCH_INDEX_VERSION = 2
+
+SEARCH_INDEX_TABLE = "content_contentnode_search"
+
+SEARCH_TRIGRAM_TABLE = "content_contentnode_search_trigram"
+
+CONTENTNODE_TABLE = "content_contentnode"
+
+# Weights of the title and description columns in the ranking of SQLite results.
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+BATCH_SIZE = 500
+
+# Terms shorter than this have too few trigrams to tell misspellings of them apart.
+MIN_CORRECTION_LENGTH = 4
+
+# The least trigram similarity of a term to a word for it to replace the word,
+# the same as the default similarity threshold of pg_trgm.
+CORRECTION_THRESHOLD = 0.3
+
+MAX_CORRECTIONS = 3
+
+
+def is_search_index_supported(connection):
+    if connection.vendor == "postgresql":
+        return True
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return "ENABLE_FTS5" in {row[0] for row in cursor.fetchall()}
+
+
+def create_search_index(connection):
+    """
+    Create the search index table in the database of connection, if it is supported.
+    """
+    if not is_search_index_supported(connection):
+        logger.warning(
+            "Full text search is not supported by this database, searches will be slower"
+        )
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            # The ids are indexed as well as the text, so that the rows of a node
+            # or channel can be found without scanning the whole index. The text is
+            # already tokenized into terms separated by spaces, which the ascii
+            # tokenizer keeps whole, whatever their script.
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+                "node_id, content_id UNINDEXED, channel_id, title, description, "
+                "tokenize = 'ascii', prefix = '2 3')".format(table=SEARCH_INDEX_TABLE)
+            )
+        else:
+            cursor.execute(
+                "CREATE TABLE IF NOT EXISTS {table} ("
+                "node_id uuid PRIMARY KEY, content_id uuid NOT NULL, "
+                "channel_id uuid NOT NULL, document tsvector NOT NULL)".format(
+                    table=SEARCH_INDEX_TABLE
+                )
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS {table}_document ON {table} "
+                "USING GIN (document)".format(table=SEARCH_INDEX_TABLE)
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS {table}_channel_id ON {table} "
+                "(channel_id)".format(table=SEARCH_INDEX_TABLE)
+            )
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS {table} ("
+            "channel_id varchar(32) NOT NULL, term text NOT NULL, "
+            "trigram varchar(3) NOT NULL, UNIQUE (channel_id, term, trigram))".format(
+                table=SEARCH_TRIGRAM_TABLE
+            )
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS {table}_trigram ON {table} "
+            "(trigram)".format(table=SEARCH_TRIGRAM_TABLE)
+        )
+
+
+def drop_search_index(connection):
+    with connection.cursor() as cursor:
+        for table in (SEARCH_INDEX_TABLE, SEARCH_TRIGRAM_TABLE):
+            cursor.execute("DROP TABLE IF EXISTS {table}".format(table=table))
+
+
+def search_index_exists(connection):
+    table_names = connection.introspection.table_names()
+    return SEARCH_INDEX_TABLE in table_names and SEARCH_TRIGRAM_TABLE in table_names
+
+
+def _normalize_id(value):
+    return value.hex if hasattr(value, "hex") else value
+
+
+def _quote_id(value):
+    # Ids are hexadecimal, so they can't contain quotes.
+    return '"{}"'.format(value)
+
+
+def _delete_rows(cursor, vendor, column, values):
+    if vendor == "sqlite":
+        cursor.execute(
+            "DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} "
+            "WHERE {table} MATCH %s)".format(table=SEARCH_INDEX_TABLE),
+            ["{}: ({})".format(column, " OR ".join(_quote_id(v) for v in values))],
+        )
+    else:
+        cursor.execute(
+            "DELETE FROM {table} WHERE {column} IN ({values})".format(
+                table=SEARCH_INDEX_TABLE,
+                column=column,
+                values=", ".join(["%s"] * len(values)),
+            ),
+            values,
+        )
+
+
+def _delete_trigrams(cursor, channel_id):
+    cursor.execute(
+        "DELETE FROM {table} WHERE channel_id = %s".format(table=SEARCH_TRIGRAM_TABLE),
+        [channel_id],
+    )
+
+
+def _insert_trigrams(cursor, vendor, channel_id, terms):
+    rows = [
+        (channel_id, term, trigram)
+        for term in terms
+        if len(term) >= MIN_CORRECTION_LENGTH and not term.isdigit()
+        for trigram in get_trigrams(term)
+    ]
+    if not rows:
+        return
+    if vendor == "sqlite":
+        query = "INSERT OR IGNORE INTO {table} (channel_id, term, trigram) VALUES (%s, %s, %s)"
+    else:
+        query = (
+            "INSERT INTO {table} (channel_id, term, trigram) VALUES (%s, %s, %s) "
+            "ON CONFLICT DO NOTHING"
+        )
+    cursor.executemany(query.format(table=SEARCH_TRIGRAM_TABLE), rows)
+
+
+def _insert_rows(connection, cursor, column, values):
+    """
+    Index the ContentNodes whose column is in values, returning the terms indexed.
+    """
+    vendor = connection.vendor
+    if vendor == "sqlite":
+        query = (
+            "INSERT INTO {table} (node_id, content_id, channel_id, title, description) "
+            "VALUES (%s, %s, %s, %s, %s)"
+        )
+    else:
+        query = (
+            "INSERT INTO {table} (node_id, content_id, channel_id, document) "
+            "VALUES (%s, %s, %s, setweight(array_to_tsvector(%s::text[]), 'A') || "
+            "setweight(array_to_tsvector(%s::text[]), 'B'))"
+        )
+    query = query.format(table=SEARCH_INDEX_TABLE)
+    terms = set()
+    with connection.cursor() as select_cursor:
+        select_cursor.execute(
+            "SELECT id, content_id, channel_id, title, description, lang_id "
+            "FROM {contentnode} WHERE {column} IN ({values})".format(
+                contentnode=CONTENTNODE_TABLE,
+                column=column,
+                values=", ".join(["%s"] * len(values)),
+            ),
+            values,
+        )
+        while True:
+            nodes = select_cursor.fetchmany(BATCH_SIZE)
+            if not nodes:
+                break
+            rows = []
+            for node_id, content_id, channel_id, title, description, lang_id in nodes:
+                title = tokenize(title, lang_id)
+                description = tokenize(description, lang_id)
+                terms.update(title)
+                terms.update(description)
+                if vendor == "sqlite":
+                    title = " ".join(title)
+                    description = " ".join(description)
+                rows.append((node_id, content_id, channel_id, title, description))
+            cursor.executemany(query, rows)
+    return terms
+
+
+def _can_index(connection):
+    return is_search_index_supported(connection) and search_index_exists(connection)
+
+
+def index_channel(channel_id):
+    """
+    Rebuild the search index of all the ContentNodes of a channel.
+    """
+    from kolibri.core.content.models import SearchIndexedChannel
+
+    connection = connections[SearchIndexedChannel.objects.db]
+    if not _can_index(connection):
+        return
+    channel_id = _normalize_id(channel_id)
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        _delete_rows(cursor, connection.vendor, "channel_id", [channel_id])
+        _delete_trigrams(cursor, channel_id)
+        terms = _insert_rows(connection, cursor, "channel_id", [channel_id])
+        _insert_trigrams(cursor, connection.vendor, channel_id, terms)
+        SearchIndexedChannel.objects.update_or_create(
+            channel_id=channel_id, defaults={"version": SEARCH_INDEX_VERSION}
+        )
+
+
+def index_nodes(channel_id, node_ids, deleted_node_ids=()):
+    """
+    Update the search index of the given ContentNodes of a channel, and remove any deleted
+    ContentNodes from it. If the channel has not been indexed yet, index all of it.
+    Terms that are no longer in the channel are kept as corrections of misspellings
+    until the whole channel is indexed again.
+    """
+    from kolibri.core.content.models import SearchIndexedChannel
+
+    connection = connections[SearchIndexedChannel.objects.db]
+    if not _can_index(connection):
+        return
+    if not SearchIndexedChannel.objects.filter(
+        channel_id=channel_id, version=SEARCH_INDEX_VERSION
+    ).exists():
+        index_channel(channel_id)
+        return
+    channel_id = _normalize_id(channel_id)
+    node_ids = list(node_ids)
+    deleted_node_ids = list(deleted_node_ids)
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        for i in range(0, len(deleted_node_ids), BATCH_SIZE):
+            _delete_rows(
+                cursor,
+                connection.vendor,
+                "node_id",
+                deleted_node_ids[i : i + BATCH_SIZE],
+            )
+        for i in range(0, len(node_ids), BATCH_SIZE):
+            batch = node_ids[i : i + BATCH_SIZE]
+            _delete_rows(cursor, connection.vendor, "node_id", batch)
+            terms = _insert_rows(connection, cursor, "id", batch)
+            _insert_trigrams(cursor, connection.vendor, channel_id, terms)
+
+
+def clear_channel_search_index(channel_id):
+    from kolibri.core.content.models import SearchIndexedChannel
+
+    connection = connections[SearchIndexedChannel.objects.db]
+    channel_id = _normalize_id(channel_id)
+    SearchIndexedChannel.objects.filter(channel_id=channel_id).delete()
+    if not _can_index(connection):
+        return
+    with connection.cursor() as cursor:
+        _delete_rows(cursor, connection.vendor, "channel_id", [channel_id])
+        _delete_trigrams(cursor, channel_id)
+
+
+def index_all_channels():
+    """
+    Index every channel on the device that has not been indexed with the current version
+    of the search index.
+    """
+    from kolibri.core.content.models import ChannelMetadata
+    from kolibri.core.content.models import SearchIndexedChannel
+
+    indexed = SearchIndexedChannel.objects.filter(
+        version=SEARCH_INDEX_VERSION
+    ).values_list("channel_id", flat=True)
+    for channel_id in ChannelMetadata.objects.exclude(id__in=indexed).values_list(
+        "id", flat=True
+    ):
+        try:
+            index_channel(channel_id)
+        except DatabaseError as e:
+            logger.warning(
+                "Could not build the search index of channel {}: {}".format(
+                    channel_id, e
+                )
+            )
+
+
+def is_search_index_ready(queryset):
+    """
+    Whether searches of ContentNodes in queryset can use the search index, which they can
+    when every channel on the device has been indexed with the current version of it.
+    """
+    from kolibri.core.content.models import ChannelMetadata
+    from kolibri.core.content.models import SearchIndexedChannel
+
+    if not _can_index(connections[queryset.db]):
+        return False
+    indexed = SearchIndexedChannel.objects.filter(version=SEARCH_INDEX_VERSION)
+    return (
+        indexed.exists()
+        and not ChannelMetadata.objects.exclude(
+            id__in=indexed.values_list("channel_id", flat=True)
+        ).exists()
+    )
+
+
+def _sqlite_match_expression(terms):
+    # Quote each term, so that no term is interpreted as FTS5 query syntax, and
+    # match any term at the start of a term in the title or description.
+    return "{{title description}} : ({})".format(
+        " OR ".join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+    )
+
+
+def _postgres_tsquery(terms):
+    return " | ".join(
+        "'{}':*".format(term.replace("\\", "\\\\").replace("'", "''")) for term in terms
+    )
+
+
+def _has_match(cursor, vendor, terms):
+    if vendor == "sqlite":
+        cursor.execute(
+            "SELECT 1 FROM {table} WHERE {table} MATCH %s LIMIT 1".format(
+                table=SEARCH_INDEX_TABLE
+            ),
+            [_sqlite_match_expression(terms)],
+        )
+    else:
+        cursor.execute(
+            "SELECT 1 FROM {table} WHERE document @@ CAST(%s AS tsquery) "
+            "LIMIT 1".format(table=SEARCH_INDEX_TABLE),
+            [_postgres_tsquery(terms)],
+        )
+    return cursor.fetchone() is not None
+
+
+def _get_corrections(cursor, word):
+    """
+    Returns the terms of the index most like word, by the similarity of their trigrams.
+    """
+    if len(word) < MIN_CORRECTION_LENGTH or word.isdigit():
+        return []
+    trigrams = get_trigrams(word)
+    # Similarity is at most the share of the trigrams of word that a term has.
+    min_shared = max(1, int(CORRECTION_THRESHOLD * len(trigrams)))
+    cursor.execute(
+        "SELECT term, COUNT(DISTINCT trigram) FROM {table} WHERE trigram IN ({values}) "
+        "GROUP BY term HAVING COUNT(DISTINCT trigram) >= %s".format(
+            table=SEARCH_TRIGRAM_TABLE, values=", ".join(["%s"] * len(trigrams))
+        ),
+        list(trigrams) + [min_shared],
+    )
+    corrections = []
+    for term, shared in cursor.fetchall():
+        similarity = float(shared) / (len(trigrams) + len(get_trigrams(term)) - shared)
+        if similarity >= CORRECTION_THRESHOLD:
+            corrections.append((similarity, term))
+    corrections.sort(key=lambda correction: (-correction[0], correction[1]))
+    return [term for _, term in corrections[:MAX_CORRECTIONS]]
+
+
+def get_search_terms(words, using="default"):
+    """
+    Returns the terms to search the index for, given the normalized words of a search.
+    Each word is searched for with all of its stems, or if none of them start any term in
+    the index, the terms most like the word are searched for instead.
+    """
+    connection = connections[using]
+    terms = []
+    with connection.cursor() as cursor:
+        for word in words:
+            stems = get_stems(word)
+            if not _has_match(cursor, connection.vendor, stems):
+                stems = _get_corrections(cursor, word) or stems
+            terms.extend(stem for stem in stems if stem not in terms)
+    return terms
+
+
+def ranked_search(terms, batch_size, using="default"):
+    """
+    Yield batches of (node_id, content_id) pairs of the ContentNodes whose title or
+    description has a term starting with any of terms, most relevant first.
+    """
+    if not terms:
+        return
+    connection = connections[using]
+    if connection.vendor == "sqlite":
+        query = (
+            "SELECT node_id, content_id FROM {table} WHERE {table} MATCH %s "
+            "ORDER BY bm25({table}, 0.0, 0.0, 0.0, {title}, {description})"
+        ).format(
+            table=SEARCH_INDEX_TABLE,
+            title=TITLE_WEIGHT,
+            description=DESCRIPTION_WEIGHT,
+        )
+        params = [_sqlite_match_expression(terms)]
+    else:
+        query = (
+            "SELECT node_id, content_id FROM {table}, CAST(%s AS tsquery) query "
+            "WHERE document @@ query ORDER BY ts_rank(document, query) DESC"
+        ).format(table=SEARCH_INDEX_TABLE)
+        params = [_postgres_tsquery(terms)]
+    with connection.cursor() as cursor:
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [
+                (_normalize_id(node_id), _normalize_id(content_id))
+                for node_id, content_id in rows
+            ]
+
+
+def search_queryset(queryset, terms):
+    """
+    Filter a queryset of ContentNodes to those whose title or description has a term
+    starting with any of terms, annotated with a search_rank to order them by, lowest
+    first. Returns None if there are no terms to search for.
+    """
+    if not terms:
+        return None
+    if connections[queryset.db].vendor == "sqlite":
+        where = "{table} MATCH %s".format(table=SEARCH_INDEX_TABLE)
+        params = [_sqlite_match_expression(terms)]
+        rank = "bm25({table}, 0.0, 0.0, 0.0, {title}, {description})".format(
+            table=SEARCH_INDEX_TABLE,
+            title=TITLE_WEIGHT,
+            description=DESCRIPTION_WEIGHT,
+        )
+        select_params = []
+    else:
+        where = "{table}.document @@ CAST(%s AS tsquery)".format(
+            table=SEARCH_INDEX_TABLE
+        )
+        params = [_postgres_tsquery(terms)]
+        rank = "-ts_rank({table}.document, CAST(%s AS tsquery))".format(
+            table=SEARCH_INDEX_TABLE
+        )
+        select_params = params
+    return queryset.extra(
+        tables=[SEARCH_INDEX_TABLE],
+        where=[
+            "{table}.node_id = {contentnode}.id".format(
+                table=SEARCH_INDEX_TABLE, contentnode=CONTENTNODE_TABLE
+            ),
+            where,
+        ],
+        params=params,
+        select={"search_rank": rank},
+        select_params=select_params,
+    )
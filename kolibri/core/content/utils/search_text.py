@@ -0,0 +1,209 @@
+"""
+Language aware normalization, tokenization and stemming of text for the search index.
+
+Text is normalized the same way whatever its language, so that the terms of a search
+match the terms of the index whatever the language of the search. Stemming depends on
+the language of each ContentNode when indexing, and when searching every stem of a word
+is searched for, as the language of a search is not known.
+"""
+import re
+import unicodedata
+
+from kolibri.core.content.utils.stopwords import stopwords_set
+
+# Letters and numbers, and the combining marks of scripts that write vowels with them,
+# like Devanagari matras, which Python does not count as word characters.
+_token_re = re.compile(
+    "(?:[^\\W_]|[\u0300-\u036f\u0483-\u0489\u0591-\u05c7\u0610-\u061a"
+    "\u064b-\u065f\u0670\u06d6-\u06ed\u0900-\u0963\u0966-\u0dff\u0e00-\u0eff"
+    "\u0f00-\u0fff\u1000-\u109f\u1780-\u17ff\u1ab0-\u1aff\u1dc0-\u1dff"
+    "\u20d0-\u20ff\ufe20-\ufe2f])+"
+)
+
+# Scripts that are written without spaces between words, which are indexed as
+# overlapping pairs of characters instead of as words.
+_unspaced_re = re.compile(
+    "[\u0e00-\u0eff\u1000-\u109f\u1780-\u17ff\u3040-\u30ff\u3400-\u4dbf"
+    "\u4e00-\u9fff\uf900-\ufaff]+"
+)
+
+# Latin, Greek and Cyrillic diacritics, Arabic vowel marks and tatweel, and zero
+# width joiners, which are all left out so that they need not be typed.
+_ignored_re = re.compile("[\u0300-\u036f\u064b-\u065f\u0670\u0640\u200c\u200d]")
+
+_arabic_letters = str.maketrans(
+    {"\u0622": "\u0627", "\u0623": "\u0627", "\u0625": "\u0627", "\u0649": "\u064a"}
+)
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", text)
+    text = _ignored_re.sub("", text)
+    return unicodedata.normalize("NFC", text).casefold().translate(_arabic_letters)
+
+
+def _stem_english(word):
+    # The S-stemmer of Harman, which only removes plural endings.
+    if len(word) > 3 and word.endswith("ies") and not word.endswith(("eies", "aies")):
+        return word[:-3] + "y"
+    if (
+        len(word) > 3
+        and word.endswith("es")
+        and not word.endswith(("aes", "ees", "oes"))
+    ):
+        return word[:-1]
+    if len(word) > 2 and word.endswith("s") and not word.endswith(("us", "ss")):
+        return word[:-1]
+    return word
+
+
+_arabic_prefixes = (
+    "وال",
+    "بال",
+    "كال",
+    "فال",
+    "لل",
+    "ال",
+)
+
+_arabic_suffixes = (
+    "ها",
+    "ان",
+    "ات",
+    "ون",
+    "ين",
+    "يه",
+    "ية",
+    "ه",
+    "ة",
+    "ي",
+)
+
+
+def _stem_arabic(word):
+    # The light10 stemmer of Larkey, Ballesteros and Connell, which removes "and", the
+    # definite article with the prepositions attached to it, and common suffixes.
+    if len(word) > 3 and word.startswith("و"):
+        word = word[1:]
+    for prefix in _arabic_prefixes:
+        if word.startswith(prefix) and len(word) - len(prefix) > 1:
+            word = word[len(prefix) :]
+            break
+    for suffix in _arabic_suffixes:
+        if word.endswith(suffix) and len(word) - len(suffix) > 1:
+            word = word[: -len(suffix)]
+    return word
+
+
+# The suffixes removed by the light stemmer of Ramanathan and Rao, longest first.
+_hindi_suffixes = sorted(
+    (
+        "ाएंगी ाएंगे "
+        "ाऊंगी ाऊंगा "
+        "ाइयाँ ाइयों "
+        "ाइयां ाएगी "
+        "ाएगा ाओगी ाओगे "
+        "एंगी ेंगी एंगे "
+        "ेंगे ूंगी ूंगा "
+        "ातीं नाओं नाएं "
+        "ताओं ताएं ियाँ "
+        "ियों ियां ाकर "
+        "ाइए ाईं ाया ेगी "
+        "ेगा ोगी ोगे ाने "
+        "ाना ाते ाती ाता "
+        "तीं ाओं ाएं ुओं "
+        "ुएं ुआं कर ाओ िए "
+        "ाई ाए ने नी ना ते "
+        "ीं ती ता ाँ ां ों "
+        "ें ो े ू ु ी ि ा"
+    ).split(),
+    key=len,
+    reverse=True,
+)
+
+
+def _stem_hindi(word):
+    for suffix in _hindi_suffixes:
+        if word.endswith(suffix) and len(word) - len(suffix) > 1:
+            return word[: -len(suffix)]
+    return word
+
+
+STEMMERS = {
+    "ar": _stem_arabic,
+    "en": _stem_english,
+    "hi": _stem_hindi,
+}
+
+
+def get_stemmer(lang_id):
+    if not lang_id:
+        return None
+    return STEMMERS.get(lang_id.split("-")[0].lower())
+
+
+def get_words(text):
+    """
+    Returns the normalized words of text, with the runs of characters of scripts that
+    are written without spaces split into overlapping pairs of characters.
+    """
+    words = []
+    for token in _token_re.findall(normalize(text)):
+        if not _unspaced_re.search(token):
+            words.append(token)
+            continue
+        position = 0
+        for match in _unspaced_re.finditer(token):
+            if match.start() > position:
+                words.append(token[position : match.start()])
+            run = match.group()
+            if len(run) == 1:
+                words.append(run)
+            else:
+                words.extend(run[i : i + 2] for i in range(len(run) - 1))
+            position = match.end()
+        if position < len(token):
+            words.append(token[position:])
+    return words
+
+
+def tokenize(text, lang_id=None):
+    """
+    Returns the terms of text to index, stemmed for the language lang_id.
+    """
+    if not text:
+        return []
+    words = get_words(text)
+    stemmer = get_stemmer(lang_id)
+    if stemmer is None:
+        return words
+    return [stemmer(word) for word in words]
+
+
+_normalized_stopwords = {normalize(word) for word in stopwords_set}
+
+
+def get_search_words(text):
+    """
+    Returns the normalized words of a search, leaving out stopwords unless the search
+    has nothing but stopwords.
+    """
+    words = get_words(text)
+    return [word for word in words if word not in _normalized_stopwords] or words
+
+
+def get_stems(word):
+    """
+    Returns the word with every stem of it, as the language of a search is not known.
+    """
+    stems = [word]
+    for stemmer in STEMMERS.values():
+        stem = stemmer(word)
+        if stem not in stems:
+            stems.append(stem)
+    return stems
+
+
+def get_trigrams(word):
+    padded = " {} ".format(word)
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
@@ -2,6 +2,7 @@ import importlib
 import logging
 import os
 import re
+import threading
 from uuid import UUID
 
 from django.apps import apps
@@ -87,10 +88,7 @@ def sqlite_connection_string(db_path):
     )
 
 
-def get_engine(connection_string):
-    """
-    Get a SQLAlchemy engine that allows us to connect to a database.
-    """
+def _create_engine(connection_string):
     # Set echo to False, as otherwise we get full SQL Query outputted, which can overwhelm the terminal
     engine_kwargs = {"echo": False}
 
@@ -109,12 +107,151 @@ def get_engine(connection_string):
     engine = create_engine(connection_string, **engine_kwargs)
     if is_default_sqlite:
         event.listen(engine, "connect", set_sqlite_connection_pragma)
-        connection = engine.connect()
-        connection.execute(START_PRAGMAS)
+        with engine.connect() as connection:
+            connection.execute(START_PRAGMAS)
 
     return engine
 
 
+# Engines, content schema versions and created schemas are cached for the lifetime of
+# the process, so that each of the many short lived Bridges created by tasks does not
+# have to connect to, reflect or create the schema of the same databases again.
+# Entries for SQLite files are keyed by the signature of the file, so that they are
+# invalidated when the file is replaced or written to.
+_cache_lock = threading.Lock()
+_cache_pid = None
+_engines = {}
+_schema_versions = {}
+_created_schemas = {}
+
+
+def _is_memory_connection_string(connection_string):
+    return connection_string == "sqlite://"
+
+
+def _stat_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def get_file_signature(sqlite_file_path):
+    """
+    Returns a value that changes whenever the SQLite file is replaced or written to,
+    or None if the file does not exist.
+    """
+    if sqlite_file_path is None or sqlite_file_path == ":memory:":
+        return None
+    signature = _stat_signature(sqlite_file_path)
+    if signature is None:
+        return None
+    # Writes to a database in WAL mode only reach the database file on a checkpoint.
+    return signature + (_stat_signature(sqlite_file_path + "-wal"),)
+
+
+def _check_cache_pid():
+    # Engines must not be used from a forked process, as any connections they hold would
+    # be shared with the parent, so start afresh there. Must be called with _cache_lock held.
+    global _cache_pid
+    pid = os.getpid()
+    if _cache_pid != pid:
+        _engines.clear()
+        _schema_versions.clear()
+        _created_schemas.clear()
+        _cache_pid = pid
+
+
+def _get_sqlite_file_path(connection_string):
+    if connection_string.startswith("sqlite:///"):
+        return connection_string[len("sqlite:///") :]
+    return None
+
+
+def get_engine(connection_string):
+    """
+    Get a SQLAlchemy engine that allows us to connect to a database.
+    Engines are shared by all callers in this process, except for in memory databases,
+    which would otherwise be shared too. For SQLite files, a new engine is created when
+    the file has been replaced since the cached engine was created.
+    """
+    if _is_memory_connection_string(connection_string):
+        return _create_engine(connection_string)
+    file_signature = get_file_signature(_get_sqlite_file_path(connection_string))
+    file_identity = file_signature[:2] if file_signature else None
+    stale_engine = None
+    with _cache_lock:
+        _check_cache_pid()
+        cached = _engines.get(connection_string)
+        if cached is not None:
+            engine, cached_file_identity = cached
+            if cached_file_identity == file_identity:
+                return engine
+            if cached_file_identity is None:
+                # The engine was created before the file was, so it created the file.
+                _engines[connection_string] = (engine, file_identity)
+                return engine
+            stale_engine = engine
+        engine = _create_engine(connection_string)
+        _engines[connection_string] = (engine, file_identity)
+    if stale_engine is not None:
+        stale_engine.dispose()
+    return engine
+
+
+def is_cached_engine(engine):
+    with _cache_lock:
+        return any(cached[0] is engine for cached in _engines.values())
+
+
+def clear_bridge_caches():
+    """
+    Dispose of all cached engines and forget all cached content schema information.
+    """
+    with _cache_lock:
+        engines = [cached[0] for cached in _engines.values()]
+        _engines.clear()
+        _schema_versions.clear()
+        _created_schemas.clear()
+    for engine in engines:
+        engine.dispose()
+
+
+def dispose_sqlite_file_engine(sqlite_file_path):
+    """
+    Dispose of the cached engine for a SQLite file and forget its cached content schema
+    information, for when the file is deleted or is about to be replaced.
+    """
+    connection_string = sqlite_connection_string(sqlite_file_path)
+    with _cache_lock:
+        _check_cache_pid()
+        cached = _engines.pop(connection_string, None)
+        _schema_versions.pop(sqlite_file_path, None)
+        _created_schemas.pop(sqlite_file_path, None)
+    if cached is not None:
+        cached[0].dispose()
+
+
+def _get_cached_schema_info(cache, sqlite_file_path, file_signature):
+    if file_signature is None:
+        return None
+    with _cache_lock:
+        _check_cache_pid()
+        cached = cache.get(sqlite_file_path)
+    if cached is not None and cached[0] == file_signature:
+        return cached[1]
+    return None
+
+
+def _set_cached_schema_info(cache, sqlite_file_path, file_signature, value):
+    if file_signature is None:
+        return
+    with _cache_lock:
+        _check_cache_pid()
+        cache[sqlite_file_path] = (file_signature, value)
+
+
 def get_class(DjangoModel, Base):
     """
     Given a DjangoModel and SQLAlachemy Base mapping that has undergone reflection to have
@@ -194,10 +331,23 @@ def load_metadata(name):
 class LazyBases(object):
     _valid_bases = set(CONTENT_DB_SCHEMA_VERSIONS + [CURRENT_SCHEMA_VERSION])
     _loaded_bases = {}
+    _lock = threading.RLock()
 
     def __getitem__(self, name):
         if name not in self._valid_bases:
             raise AttributeError("Unknown content schema {} requested".format(name))
+        if name not in self._loaded_bases:
+            with self._lock:
+                self._load(name)
+        if self._loaded_bases[name] is None:
+            raise AttributeError(
+                "Known content schema requested, but the schema failed to import"
+            )
+        return self._loaded_bases[name]
+
+    def _load(self, name):
+        # Bases are prepared once per process, and tasks running in threads of the
+        # same worker may ask for the same base at the same time.
         if name not in self._loaded_bases:
             try:
                 metadata = load_metadata(name)
@@ -209,11 +359,6 @@ class LazyBases(object):
                     )
                 )
                 self._loaded_bases[name] = None
-        if self._loaded_bases[name] is None:
-            raise AttributeError(
-                "Known content schema requested, but the schema failed to import"
-            )
-        return self._loaded_bases[name]
 
 
 BASES = LazyBases()
@@ -276,6 +421,7 @@ class SchemaNotFoundError(Exception):
 
 class Bridge(object):
     def __init__(self, sqlite_file_path=None, schema_version=None, app_name=None):
+        file_signature = None
         if sqlite_file_path is None:
             # If sqlite_file_path is None, we are referencing the Django default database
             self.connection_string = get_default_db_string()
@@ -283,6 +429,7 @@ class Bridge(object):
         else:
             # Otherwise, we are accessing an external database.
             self.connection_string = sqlite_connection_string(sqlite_file_path)
+            file_signature = get_file_signature(sqlite_file_path)
 
         self.engine = get_engine(self.connection_string)
         # If the schema_version is defined, then use the schema_version that was
@@ -293,15 +440,17 @@ class Bridge(object):
             # If not, we are probably looking at an imported content db
             # So we try each of our historical database schema in order to see
             # which glass slipper fits! If none do, just turn into a pumpkin.
-            for version in CONTENT_DB_SCHEMA_VERSIONS:
-                self.schema_version = version
-                try:
-                    db_matches_schema(BASES[self.schema_version].classes, self.engine)
-                    break
-                except DBSchemaError as e:
-                    logging.debug(e)
-            else:
-                raise SchemaNotFoundError("No matching schema found for this database")
+            self.schema_version = _get_cached_schema_info(
+                _schema_versions, sqlite_file_path, file_signature
+            )
+            if self.schema_version is None:
+                self.schema_version = self._detect_schema_version()
+                _set_cached_schema_info(
+                    _schema_versions,
+                    sqlite_file_path,
+                    file_signature,
+                    self.schema_version,
+                )
 
         self.Base = BASES[self.schema_version]
 
@@ -314,10 +463,31 @@ class Bridge(object):
             # to be idempotent.
             # Note, that this will not migrate databases if there has been a
             # change in the schema beyond creating tables.
-            self.Base.metadata.create_all(self.engine)
+            if (
+                _get_cached_schema_info(
+                    _created_schemas, sqlite_file_path, file_signature
+                )
+                != self.schema_version
+            ):
+                self.Base.metadata.create_all(self.engine)
+                _set_cached_schema_info(
+                    _created_schemas,
+                    sqlite_file_path,
+                    get_file_signature(sqlite_file_path),
+                    self.schema_version,
+                )
 
         self._connection = None
 
+    def _detect_schema_version(self):
+        for version in CONTENT_DB_SCHEMA_VERSIONS:
+            try:
+                db_matches_schema(BASES[version].classes, self.engine)
+                return version
+            except DBSchemaError as e:
+                logging.debug(e)
+        raise SchemaNotFoundError("No matching schema found for this database")
+
     def get_class(self, DjangoModel):
         return get_class(DjangoModel, self.Base)
 
@@ -351,8 +521,12 @@ class Bridge(object):
         return self.connection.execute(query, *args)
 
     def end(self):
-        self.connection.close()
-        self.engine.dispose()
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+        # Cached engines are kept for the next Bridge to the same database.
+        if not is_cached_engine(self.engine):
+            self.engine.dispose()
 
 
 def filter_by_uuids(field, ids, validate=True, vendor=None):
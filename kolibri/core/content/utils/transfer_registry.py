@@ -0,0 +1,117 @@
+"""
+A registry of the content files that are currently being transferred, keyed by checksum.
+
+As content storage is content addressed, two import jobs that need the same LocalFile are
+writing to the same destination. Rather than both transferring the file, the first job to
+claim the checksum transfers it, and any other job waits for that transfer to finish, and
+then treats the file as transferred, or claims it for itself if the first transfer failed.
+
+Claims are stored in the process cache, so that they are shared between worker processes,
+and expire unless they are renewed while the transfer progresses, so that a claim held by a
+process that has died is not waited on indefinitely.
+"""
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from kolibri.core.utils.cache import process_cache
+
+logger = logging.getLogger(__name__)
+
+
+class TransferRegistry(object):
+    # How long in seconds a claim lasts without being renewed.
+    lease = 60
+
+    # The minimum number of seconds between renewals of a claim.
+    renew_interval = 10
+
+    # How often in seconds to check whether a transfer claimed by another process has finished.
+    poll_interval = 1
+
+    def __init__(self, cache=process_cache):
+        self.cache = cache
+        self._lock = threading.Lock()
+        # Events for claims made in this process, so that waiters in this process
+        # are notified as soon as the transfer finishes.
+        self._events = {}
+        self._last_renewed = {}
+
+    def _key(self, checksum):
+        return "CONTENT_TRANSFER_IN_PROGRESS_{}".format(checksum)
+
+    def claim(self, checksum):
+        """
+        Attempt to claim the transfer of the file with checksum.
+        Returns a token to renew and release the claim with, or None if
+        the file is already being transferred.
+        """
+        token = uuid.uuid4().hex
+        if not self.cache.add(self._key(checksum), token, timeout=self.lease):
+            return None
+        with self._lock:
+            self._events[checksum] = threading.Event()
+            self._last_renewed[token] = time.time()
+        return token
+
+    def renew(self, checksum, token):
+        """
+        Extend the lease on a claim, no more often than every renew_interval seconds,
+        so this can be called on every progress update of the transfer.
+        """
+        now = time.time()
+        with self._lock:
+            if now - self._last_renewed.get(token, 0) < self.renew_interval:
+                return
+            self._last_renewed[token] = now
+        key = self._key(checksum)
+        if self.cache.get(key) in (token, None):
+            self.cache.set(key, token, timeout=self.lease)
+
+    def release(self, checksum, token):
+        key = self._key(checksum)
+        if self.cache.get(key) == token:
+            self.cache.delete(key)
+        with self._lock:
+            self._last_renewed.pop(token, None)
+            event = self._events.pop(checksum, None)
+        if event is not None:
+            event.set()
+
+    def in_progress(self, checksum):
+        return self.cache.get(self._key(checksum)) is not None
+
+    def wait(self, checksum, cancel_check=None):
+        """
+        Block until the transfer of the file with checksum is no longer in progress.
+        """
+        with self._lock:
+            event = self._events.get(checksum)
+        logger.debug(
+            "Waiting for in progress transfer of file with checksum {}".format(checksum)
+        )
+        while self.in_progress(checksum):
+            if cancel_check:
+                cancel_check()
+            if event is not None:
+                event.wait(self.poll_interval)
+            else:
+                time.sleep(self.poll_interval)
+
+    @contextmanager
+    def claimed(self, checksum):
+        """
+        Context manager that yields a token if the transfer of the file with checksum
+        was claimed, or None if it is already in progress, and releases any claim on exit.
+        """
+        token = self.claim(checksum)
+        try:
+            yield token
+        finally:
+            if token is not None:
+                self.release(checksum, token)
+
+
+transfer_registry = TransferRegistry()
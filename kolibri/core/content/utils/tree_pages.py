@@ -0,0 +1,191 @@
+"""
+Precomputed pages of the topic tree, so that the tree endpoint can return the children
+and grandchildren of a topic without querying the tree for them on every request.
+
+For every available topic this records the first page of its available children, with
+any chain of descendants that are the only child of their parent collapsed into it, and
+the preview of its own children that is shown beneath it in the page of its parent.
+Pages are rebuilt whenever the availability of the ContentNodes of a channel is
+annotated, and as they are recorded both with and without coach content, they can be
+used for any request that does not filter the tree by anything else.
+"""
+import logging
+
+from django.db import transaction
+from le_utils.constants import content_kinds
+
+from kolibri.core.content.models import ContentNode
+from kolibri.core.content.models import ContentNodeTreePage
+
+logger = logging.getLogger(__name__)
+
+# The max recursed page size should be less than 25 for a couple of reasons:
+# 1. At this size the query appears to be relatively performant, and will deliver most of the tree
+#    data to the frontend in a single query.
+# 2. In the case where the tree topology means that this will not produce the full query, the limit of
+#    25 immediate children and 25 grand children means that we are at most using 1 + 25 + 25 * 25 = 651
+#    SQL parameters in the query to get the nodes for serialization - this means that we should not ever
+#    run into an issue where we hit a SQL parameters limit in the queries in here.
+# If we find that this page size is too high, we should lower it, but for the reasons noted above, we
+# should not raise it.
+NUM_CHILDREN = 12
+NUM_GRANDCHILDREN_PER_CHILD = 12
+
+BATCH_SIZE = 500
+
+# Indices of the values of the nodes loaded to build pages
+ID = 0
+KIND = 1
+COACH_CONTENT = 2
+
+
+def _add_children(children_by_parent, queryset):
+    for node_id, parent_id, kind, coach_content in queryset.values_list(
+        "id", "parent_id", "kind", "coach_content"
+    ).order_by("lft"):
+        children_by_parent.setdefault(parent_id, []).append(
+            (node_id, kind, coach_content)
+        )
+
+
+def _load_children(channel_id, parent_ids, children_by_parent):
+    parent_ids = [
+        parent_id for parent_id in parent_ids if parent_id not in children_by_parent
+    ]
+    for i in range(0, len(parent_ids), BATCH_SIZE):
+        _add_children(
+            children_by_parent,
+            ContentNode.objects.filter(
+                channel_id=channel_id,
+                available=True,
+                parent_id__in=parent_ids[i : i + BATCH_SIZE],
+            ),
+        )
+    for parent_id in parent_ids:
+        children_by_parent.setdefault(parent_id, [])
+
+
+def _without_coach_content(children):
+    return [child for child in children if not child[COACH_CONTENT]]
+
+
+def _load_topics_children(channel_id, topic_ids):
+    # Load the children of the topics, and then the children of any topic that is
+    # the only child of its parent, with or without coach content, as chains of
+    # single children are followed down the tree.
+    children_by_parent = {}
+    parent_ids = topic_ids
+    while parent_ids:
+        _load_children(channel_id, parent_ids, children_by_parent)
+        single_child_ids = set()
+        for parent_id in parent_ids:
+            for children in (
+                children_by_parent[parent_id],
+                _without_coach_content(children_by_parent[parent_id]),
+            ):
+                if len(children) == 1 and children[0][KIND] == content_kinds.TOPIC:
+                    single_child_ids.add(children[0][ID])
+        parent_ids = [
+            child_id
+            for child_id in single_child_ids
+            if child_id not in children_by_parent
+        ]
+    return children_by_parent
+
+
+def _get_chain_and_children(topic_id, children_by_parent):
+    # The same children as TreeQueryMixin.get_tree_queryset returns for the first page
+    # of a topic, before they are filtered.
+    chain = []
+    children = children_by_parent.get(topic_id, [])[:NUM_CHILDREN]
+    while len(children) == 1:
+        chain.extend(children)
+        children = children_by_parent.get(children[0][ID], [])[:NUM_CHILDREN]
+    return chain, children
+
+
+def _get_preview(topic_id, children_by_parent, include_coach_content):
+    # The same grandchildren as TreeQueryMixin.get_grandchild_ids returns for a child.
+    preview = []
+    node_id = topic_id
+    while True:
+        children = children_by_parent.get(node_id, [])
+        if not include_coach_content:
+            children = _without_coach_content(children)
+        preview.extend(child[ID] for child in children[:NUM_GRANDCHILDREN_PER_CHILD])
+        if len(children) != 1:
+            return preview
+        node_id = children[0][ID]
+
+
+def _serialize_nodes(nodes):
+    return [[node[ID], node[COACH_CONTENT]] for node in nodes]
+
+
+def delete_tree_pages(channel_id, node_ids=None):
+    """
+    Delete the pages of a channel, or only those of the passed in node_ids.
+    """
+    queryset = ContentNodeTreePage.objects.filter(channel_id=channel_id)
+    if node_ids is None:
+        queryset.delete()
+        return
+    node_ids = list(node_ids)
+    for i in range(0, len(node_ids), BATCH_SIZE):
+        queryset.filter_by_uuids(node_ids[i : i + BATCH_SIZE], validate=False).delete()
+
+
+def build_tree_pages(channel_id, topic_ids=None):
+    """
+    Build the pages of the available topics of a channel. If topic_ids is passed, only
+    the pages of those topics are rebuilt, so they must include every topic that is an
+    ancestor of a ContentNode whose availability or coach content has changed.
+    """
+    if topic_ids is None:
+        children_by_parent = {}
+        _add_children(
+            children_by_parent,
+            ContentNode.objects.filter(channel_id=channel_id, available=True),
+        )
+        topics = {
+            child[ID]: child[COACH_CONTENT]
+            for children in children_by_parent.values()
+            for child in children
+            if child[KIND] == content_kinds.TOPIC
+        }
+    else:
+        topic_ids = list(topic_ids)
+        children_by_parent = _load_topics_children(channel_id, topic_ids)
+        topics = {}
+        for i in range(0, len(topic_ids), BATCH_SIZE):
+            topics.update(
+                ContentNode.objects.filter_by_uuids(
+                    topic_ids[i : i + BATCH_SIZE], validate=False
+                )
+                .filter(channel_id=channel_id, available=True, kind=content_kinds.TOPIC)
+                .values_list("id", "coach_content")
+            )
+
+    pages = []
+    for topic_id, coach_content in topics.items():
+        chain, children = _get_chain_and_children(topic_id, children_by_parent)
+        pages.append(
+            ContentNodeTreePage(
+                id=topic_id,
+                channel_id=channel_id,
+                coach_content=coach_content,
+                chain=_serialize_nodes(chain),
+                children=_serialize_nodes(children),
+                preview=_get_preview(topic_id, children_by_parent, True),
+                learner_preview=_get_preview(topic_id, children_by_parent, False),
+            )
+        )
+
+    with transaction.atomic():
+        # Pages of topics that are no longer available are deleted, and not rebuilt
+        delete_tree_pages(channel_id, node_ids=topic_ids)
+        ContentNodeTreePage.objects.bulk_create(pages, batch_size=BATCH_SIZE)
+
+    logger.debug(
+        "Built {} topic tree pages for channel {}".format(len(pages), channel_id)
+    )
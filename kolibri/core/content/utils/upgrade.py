@@ -34,6 +34,7 @@ from kolibri.core.content.utils.paths import get_annotated_content_database_file
 from kolibri.core.content.utils.paths import get_upgrade_content_database_file_path
 from kolibri.core.content.utils.sqlalchemybridge import Bridge
 from kolibri.core.content.utils.sqlalchemybridge import coerce_key
+from kolibri.core.content.utils.sqlalchemybridge import dispose_sqlite_file_engine
 from kolibri.core.content.utils.sqlalchemybridge import filter_by_uuids
 from kolibri.core.tasks.exceptions import UserCancelledError
 from kolibri.core.tasks.utils import get_current_job
@@ -112,6 +113,7 @@ def diff_stats(channel_id, method, drive_id=None, baseurl=None):
             updated_resource_total_size,
         ) = get_automatically_updated_resources(destination_path, channel_id)
         # remove the annotated database
+        dispose_sqlite_file_engine(destination_path)
         try:
             os.remove(destination_path)
         except OSError as e:
@@ -151,6 +153,7 @@ def diff_stats(channel_id, method, drive_id=None, baseurl=None):
 
     except UserCancelledError:
         # remove the annotated database
+        dispose_sqlite_file_engine(destination_path)
         try:
             os.remove(destination_path)
         except OSError:
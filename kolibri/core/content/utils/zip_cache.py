@@ -0,0 +1,353 @@
+"""
+Caches for the zip content server, so that the work of serving a file from a zip file is
+not repeated for every learner that opens the same content.
+
+Two things are cached: the central directory of each zip file, so that it does not have to be
+read and parsed every time the zip file is opened, and the rewritten bytes of HTML files.
+Both are kept in a size limited in memory LRU cache in each process, backed by a size limited
+disk cache under KOLIBRI_HOME that is shared between processes and persists across restarts.
+
+Content files are stored under their checksum, so the file name of a zip file identifies its
+contents, and cache entries never need to be invalidated.
+
+Each process periodically adds its counts of hits and misses to totals in the process cache,
+so that the hit rate of every process serving zip content can be seen together.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+
+from diskcache import Cache
+from django.utils.functional import SimpleLazyObject
+
+from kolibri.core.utils.cache import process_cache
+from kolibri.utils import conf
+
+logger = logging.getLogger(__name__)
+
+
+# An estimate of the memory used by each ZipInfo object, on top of its file name.
+ZIPINFO_SIZE = 300
+
+ZIP_CONTENT_CACHE_STATS_CACHE_KEY = "zip_content_cache_{}"
+
+ZIP_CONTENT_CACHE_STATS = (
+    "memory_hits",
+    "memory_misses",
+    "memory_evictions",
+    "disk_hits",
+    "disk_misses",
+)
+
+# How often in seconds each process adds its counts to the totals in the process cache.
+STATS_INTERVAL = 60
+
+
+class LRUCache(object):
+    """
+    A thread safe least recently used cache, limited by the total size of its values.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value, size = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, size):
+        if size > self.max_size:
+            return
+        with self._lock:
+            if key in self._data:
+                self.size -= self._data.pop(key)[1]
+            self._data[key] = (value, size)
+            self.size += size
+            while self.size > self.max_size:
+                self.size -= self._data.popitem(last=False)[1][1]
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._data),
+                "size": self.size,
+                "max_size": self.max_size,
+            }
+
+
+class CentralDirectory(object):
+    """
+    The parsed central directory of a zip file, enough to open its members for reading.
+    """
+
+    def __init__(self, start_dir, comment, filelist):
+        self.start_dir = start_dir
+        self.comment = comment
+        self.filelist = filelist
+
+    @classmethod
+    def from_zip_file(cls, zf):
+        return cls(zf.start_dir, zf.comment, zf.filelist)
+
+    @property
+    def size(self):
+        return sum(
+            ZIPINFO_SIZE + len(info.filename) + len(info.extra) + len(info.comment)
+            for info in self.filelist
+        )
+
+
+class CachedZipFile(zipfile.ZipFile):
+    """
+    A read only ZipFile that uses a previously parsed central directory, if given,
+    rather than reading it from the file.
+    """
+
+    def __init__(self, file, central_directory=None):
+        self._central_directory = central_directory
+        super(CachedZipFile, self).__init__(file)
+
+    def _RealGetContents(self):
+        if self._central_directory is None:
+            return super(CachedZipFile, self)._RealGetContents()
+        self.start_dir = self._central_directory.start_dir
+        self._comment = self._central_directory.comment
+        for info in self._central_directory.filelist:
+            self.filelist.append(info)
+            self.NameToInfo[info.filename] = info
+
+
+def _sizeof(value):
+    if isinstance(value, CentralDirectory):
+        return value.size
+    return len(value)
+
+
+class ZipContentCache(object):
+    """
+    :param memory_size: The maximum size in bytes of the in memory cache
+    :param disk_size: The maximum size in bytes of the disk cache, 0 to disable it
+    :param directory: The directory to keep the disk cache in
+    :param stats_interval: How often in seconds to add the counts of hits and misses
+        to the totals in the process cache
+    """
+
+    DISK_ERRORS = (sqlite3.OperationalError, OSError)
+
+    def __init__(
+        self, memory_size, disk_size, directory, stats_interval=STATS_INTERVAL
+    ):
+        self.memory = LRUCache(memory_size)
+        self.disk_size = disk_size
+        self.directory = directory
+        self.disk_hits = 0
+        self.disk_misses = 0
+        self.stats_interval = stats_interval
+        self._disk = None
+        self._disk_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats_saved = time.time()
+        self._saved_counts = {}
+
+    @property
+    def disk(self):
+        if self.disk_size and self._disk is None:
+            with self._disk_lock:
+                if self._disk is None:
+                    try:
+                        self._disk = Cache(
+                            self.directory,
+                            size_limit=self.disk_size,
+                            eviction_policy="least-recently-used",
+                        )
+                    except self.DISK_ERRORS as e:
+                        logger.warning(
+                            "Could not open zip content cache, disabling it: {}".format(
+                                e
+                            )
+                        )
+                        self.disk_size = 0
+        return self._disk
+
+    def _get_counts(self):
+        memory = self.memory.stats()
+        return {
+            "memory_hits": memory["hits"],
+            "memory_misses": memory["misses"],
+            "memory_evictions": memory["evictions"],
+            "disk_hits": self.disk_hits,
+            "disk_misses": self.disk_misses,
+        }
+
+    def save_stats(self):
+        """
+        Add the counts of hits and misses since they were last saved to the totals
+        in the process cache.
+        """
+        with self._stats_lock:
+            self._stats_saved = time.time()
+            counts = self._get_counts()
+            deltas = {
+                name: count - self._saved_counts.get(name, 0)
+                for name, count in counts.items()
+            }
+            self._saved_counts = counts
+        for name, delta in deltas.items():
+            if not delta:
+                continue
+            cache_key = ZIP_CONTENT_CACHE_STATS_CACHE_KEY.format(name)
+            try:
+                if not process_cache.add(cache_key, delta, None):
+                    process_cache.incr(cache_key, delta)
+            except ValueError:
+                # The total was deleted since it was added, so start it again.
+                process_cache.set(cache_key, delta, None)
+
+    def _get(self, key):
+        if time.time() - self._stats_saved >= self.stats_interval:
+            self.save_stats()
+        value = self.memory.get(key)
+        if value is not None or self.disk is None:
+            return value
+        try:
+            value = self.disk.get(key)
+        except self.DISK_ERRORS:
+            value = None
+        if value is None:
+            self.disk_misses += 1
+        else:
+            self.disk_hits += 1
+            # Hold on to entries that are in use again in memory as well.
+            self.memory.set(key, value, _sizeof(value))
+        return value
+
+    def _set(self, key, value):
+        self.memory.set(key, value, _sizeof(value))
+        if self.disk is None:
+            return
+        try:
+            self.disk.set(key, value)
+        except self.DISK_ERRORS as e:
+            logger.debug("Could not write to zip content cache: {}".format(e))
+
+    def get_html(self, zipped_filename, embedded_filepath):
+        """
+        Returns the rewritten bytes of the HTML file embedded_filepath in the zip file,
+        or None if it is not cached.
+        """
+        return self._get(("html", zipped_filename, embedded_filepath))
+
+    def set_html(self, zipped_filename, embedded_filepath, html):
+        self._set(("html", zipped_filename, embedded_filepath), html)
+
+    def get_central_directory(self, zipped_filename):
+        return self._get(("central_directory", zipped_filename))
+
+    def set_central_directory(self, zipped_filename, central_directory):
+        self._set(("central_directory", zipped_filename), central_directory)
+
+    def open_zip_file(self, zipped_path, zipped_filename):
+        """
+        Returns a ZipFile for the zip file at zipped_path, whose central directory is only
+        read from the file when it is not already cached.
+        """
+        central_directory = self.get_central_directory(zipped_filename)
+        zf = CachedZipFile(zipped_path, central_directory=central_directory)
+        if central_directory is None:
+            self.set_central_directory(
+                zipped_filename, CentralDirectory.from_zip_file(zf)
+            )
+        return zf
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            try:
+                self.disk.clear()
+            except self.DISK_ERRORS:
+                pass
+
+    def stats(self):
+        """
+        Returns the number of hits and misses and the size of each cache.
+        """
+        disk = {"hits": self.disk_hits, "misses": self.disk_misses}
+        if self.disk is not None:
+            try:
+                disk["size"] = self.disk.volume()
+            except self.DISK_ERRORS:
+                pass
+            disk["max_size"] = self.disk_size
+        return {"memory": self.memory.stats(), "disk": disk}
+
+
+def get_zip_content_cache_stats():
+    """
+    Returns the totals of the hits and misses of the zip content caches of every process,
+    with the hit rate of zip content lookups, and the size of the disk cache.
+    """
+    counts = process_cache.get_many(
+        [
+            ZIP_CONTENT_CACHE_STATS_CACHE_KEY.format(name)
+            for name in ZIP_CONTENT_CACHE_STATS
+        ]
+    )
+    stats = {
+        name: counts.get(ZIP_CONTENT_CACHE_STATS_CACHE_KEY.format(name), 0)
+        for name in ZIP_CONTENT_CACHE_STATS
+    }
+    # Every lookup is first looked up in memory, and only misses are looked up on disk.
+    lookups = stats["memory_hits"] + stats["memory_misses"]
+    stats["hit_rate"] = (
+        (stats["memory_hits"] + stats["disk_hits"]) / float(lookups)
+        if lookups
+        else None
+    )
+    stats["disk_size"] = zip_content_cache.stats()["disk"].get("size")
+    return stats
+
+
+def reset_zip_content_cache_stats():
+    process_cache.delete_many(
+        [
+            ZIP_CONTENT_CACHE_STATS_CACHE_KEY.format(name)
+            for name in ZIP_CONTENT_CACHE_STATS
+        ]
+    )
+
+
+def _get_zip_content_cache():
+    return ZipContentCache(
+        conf.OPTIONS["Cache"]["ZIP_CONTENT_CACHE_MEMORY_SIZE"],
+        conf.OPTIONS["Cache"]["ZIP_CONTENT_CACHE_DISK_SIZE"],
+        os.path.join(conf.KOLIBRI_HOME, "zip_content_cache"),
+    )
+
+
+zip_content_cache = SimpleLazyObject(_get_zip_content_cache)
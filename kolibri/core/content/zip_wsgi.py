@@ -4,12 +4,11 @@ import os
 import re
 import sys
 import time
-import zipfile
+from functools import partial
 from urllib.parse import unquote
 
 import html5lib
 from cheroot import wsgi
-from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.handlers.wsgi import WSGIRequest
 from django.http import HttpResponse
@@ -17,7 +16,6 @@ from django.http import HttpResponseNotAllowed
 from django.http import HttpResponseNotFound
 from django.http import HttpResponseNotModified
 from django.http.response import FileResponse
-from django.http.response import StreamingHttpResponse
 from django.utils.cache import patch_response_headers
 from django.utils.encoding import force_str
 from django.utils.http import http_date
@@ -32,6 +30,7 @@ from kolibri.core.content.errors import InvalidStorageFilenameError
 from kolibri.core.content.utils.paths import get_content_storage_file_path
 from kolibri.core.content.utils.paths import get_content_storage_remote_url
 from kolibri.core.content.utils.paths import get_zip_content_base_path
+from kolibri.core.content.utils.zip_cache import zip_content_cache
 from kolibri.utils.file_transfer import RemoteFile
 from kolibri.utils.urls import validator
 
@@ -146,6 +145,105 @@ allowed_methods = set(["GET", "OPTIONS"])
 INITIALIZE_HASHI_FROM_IFRAME = "if (window.parent && window.parent.hashi) {try {window.parent.hashi.initializeIframe(window);} catch (e) {}}"
 
 
+HASHI_SCRIPT_TAG = '<script type="text/javascript">{}</script>'.format(
+    INITIALIZE_HASHI_FROM_IFRAME
+).encode("utf-8")
+
+# The size of the blocks that HTML files are read in.
+HTML_READ_SIZE = 64 * 1024
+
+UTF8_BOM = b"\xef\xbb\xbf"
+UTF16_BOMS = (b"\xff\xfe", b"\xfe\xff")
+
+HTML_WHITESPACE_RE = re.compile(rb"[ \t\n\f\r]*")
+HTML_START_TAG_OPEN_RE = re.compile(rb"<[a-zA-Z]")
+HTML_START_TAG_RE = re.compile(rb"""<([a-zA-Z][^\s/>]*)(?:[^>"']|"[^"]*"|'[^']*')*>""")
+
+
+def _leading_token_end(content, pos):
+    """
+    Returns the end of the comment, doctype or start tag at pos in content, and the lower cased
+    name of the tag for a start tag. The end is -1 if the token is incomplete, or pos if there
+    is text or an end tag at pos.
+    """
+    if content.startswith(b"<", pos) and len(content) - pos < 4:
+        return -1, None
+    if content.startswith(b"<!--", pos):
+        end = content.find(b"-->", pos + 2)
+        return (end + 3 if end != -1 else -1), None
+    if content.startswith((b"<!", b"<?"), pos):
+        end = content.find(b">", pos)
+        return (end + 1 if end != -1 else -1), None
+    match = HTML_START_TAG_RE.match(content, pos)
+    if match:
+        return match.end(), match.group(1).lower()
+    if HTML_START_TAG_OPEN_RE.match(content, pos):
+        return -1, None
+    return pos, None
+
+
+def find_head_insertion_point(content, final=True):
+    """
+    Find where to insert an element into the bytes of an HTML document for it to be the first
+    element of the head, as a browser parses it: after the head start tag, or, when the head is
+    implied, before the first token that is not whitespace, a comment, the doctype or the html
+    start tag.
+
+    Returns None if content is only the start of the document, and more of it is needed.
+    Raises ValueError if the document cannot be handled this way.
+    """
+    if content.startswith(UTF16_BOMS):
+        raise ValueError("HTML is not encoded in an ASCII compatible encoding")
+    pos = len(UTF8_BOM) if content.startswith(UTF8_BOM) else 0
+    while True:
+        pos = HTML_WHITESPACE_RE.match(content, pos).end()
+        if pos == len(content):
+            return pos if final else None
+        end, tag = _leading_token_end(content, pos)
+        if end == -1:
+            if final:
+                raise ValueError("HTML ends in an incomplete tag or comment")
+            return None
+        if tag == b"head":
+            return end
+        if end == pos or (tag is not None and tag != b"html"):
+            return pos
+        pos = end
+
+
+def inject_hashi_script(chunks):
+    """
+    Yields the bytes of the HTML document read from the iterable chunks, with the script to
+    initialize hashi inserted as the first element of its head. Only the start of the document,
+    up to where the head starts, is tokenized, the rest is passed through unchanged, so that the
+    original bytes and doctype are preserved.
+    Falls back to rewriting the whole document with parse_html if it cannot be handled this way.
+    """
+    chunks = iter(chunks)
+    content = b""
+    insertion_point = None
+    for chunk in chunks:
+        content += chunk
+        try:
+            insertion_point = find_head_insertion_point(content, final=False)
+        except ValueError:
+            break
+        if insertion_point is not None:
+            break
+    else:
+        try:
+            insertion_point = find_head_insertion_point(content)
+        except ValueError:
+            pass
+    if insertion_point is None:
+        html = parse_html(content + b"".join(chunks))
+        yield html.encode("utf-8") if isinstance(html, str) else html
+        return
+    yield content[:insertion_point] + HASHI_SCRIPT_TAG + content[insertion_point:]
+    for chunk in chunks:
+        yield chunk
+
+
 def parse_html(content):
     try:
         document = html5lib.parse(content, namespaceHTMLElements=False)
@@ -205,14 +303,67 @@ def parse_html(content):
         return content
 
 
+def _html_response(html, content_type):
+    response = HttpResponse(html, content_type=content_type)
+    # Only accept byte ranges for files that are not HTML
+    response.headers["Accept-Ranges"] = "none"
+    response.headers["Content-Length"] = len(response.content)
+    return response
+
+
+def _file_response(zipped_file_object, info, content_type, range_header=None):
+    # generate a streaming response object, pulling data from within the zip file
+    status = 200
+    file_size = info.file_size
+    range_response_header = None
+
+    # handle byte-range requests
+    if range_header:
+        range_tuple = parse_byte_range(range_header, file_size)
+        if range_tuple:
+            start, length = range_tuple
+            zipped_file_object = RangeZipFileObjectWrapper(
+                zipped_file_object, start, length
+            )
+            status = 206
+            # Use the total file size of the object for the Content-Range header
+            range_response_header = f"bytes {start}-{start + length - 1}/{file_size}"
+            # Update the file size to the length of the requested range
+            file_size = length
+
+    response = FileResponse(
+        zipped_file_object, content_type=content_type, status=status
+    )
+    if range_response_header:
+        response.headers["Content-Range"] = range_response_header
+
+    response.headers["Accept-Ranges"] = "bytes"
+    # set the content-length header to the size of the embedded file
+    response.headers["Content-Length"] = file_size
+    return response
+
+
 def get_embedded_file(
     zipped_path, zipped_filename, embedded_filepath, range_header=None
 ):
-    with zipfile.ZipFile(zipped_path) as zf:
-        # if no path, or a directory, is being referenced, look for an index.html file
-        if not embedded_filepath or embedded_filepath.endswith("/"):
-            embedded_filepath += "index.html"
+    # if no path, or a directory, is being referenced, look for an index.html file
+    if not embedded_filepath or embedded_filepath.endswith("/"):
+        embedded_filepath += "index.html"
 
+    # try to guess the MIME type of the embedded file being referenced
+    content_type = (
+        mimetypes.guess_type(embedded_filepath)[0] or "application/octet-stream"
+    )
+
+    is_html = embedded_filepath.lower().endswith(("html", "htm"))
+
+    if is_html:
+        # Rewriting HTML means parsing it, so reuse the result for every request for the file.
+        html = zip_content_cache.get_html(zipped_filename, embedded_filepath)
+        if html is not None:
+            return _html_response(html, content_type)
+
+    with zip_content_cache.open_zip_file(zipped_path, zipped_filename) as zf:
         # get the details about the embedded file, and ensure it exists
         try:
             info = zf.getinfo(embedded_filepath)
@@ -223,52 +374,18 @@ def get_embedded_file(
                 )
             )
 
-        # try to guess the MIME type of the embedded file being referenced
-        content_type = (
-            mimetypes.guess_type(embedded_filepath)[0] or "application/octet-stream"
-        )
         zipped_file_object = zf.open(info)
 
-        is_html = embedded_filepath.lower().endswith(("html", "htm"))
-
         if is_html:
-            content = zipped_file_object.read()
-            html = parse_html(content)
-            response = HttpResponse(html, content_type=content_type)
-            file_size = len(response.content)
-        else:
-            # generate a streaming response object, pulling data from within the zip file
-            status = 200
-            file_size = info.file_size
-            range_response_header = None
-
-            # handle byte-range requests
-            if range_header:
-                range_tuple = parse_byte_range(range_header, file_size)
-                if range_tuple:
-                    start, length = range_tuple
-                    zipped_file_object = RangeZipFileObjectWrapper(
-                        zipped_file_object, start, length
-                    )
-                    status = 206
-                    # Use the total file size of the object for the Content-Range header
-                    range_response_header = (
-                        f"bytes {start}-{start + length - 1}/{file_size}"
-                    )
-                    # Update the file size to the length of the requested range
-                    file_size = length
-
-            response = FileResponse(
-                zipped_file_object, content_type=content_type, status=status
+            html = b"".join(
+                inject_hashi_script(
+                    iter(partial(zipped_file_object.read, HTML_READ_SIZE), b"")
+                )
             )
-            if range_response_header:
-                response.headers["Content-Range"] = range_response_header
+            zip_content_cache.set_html(zipped_filename, embedded_filepath, html)
+            return _html_response(html, content_type)
 
-        # Only accept byte ranges for files that are not HTML
-        response.headers["Accept-Ranges"] = "none" if is_html else "bytes"
-        # set the content-length header to the size of the embedded file
-        response.headers["Content-Length"] = file_size
-        return response
+        return _file_response(zipped_file_object, info, content_type, range_header)
 
 
 archive_file_types = (HTML5, H5P, BLOOMPUB, BLOOMD, PERSEUS)
@@ -388,13 +505,6 @@ def _zip_content_from_request(request):  # noqa: C901
     if request.META.get("HTTP_IF_MODIFIED_SINCE"):
         return HttpResponseNotModified()
 
-    CACHE_KEY = "ZIPCONTENT_VIEW_RESPONSE_{}/{}".format(
-        zipped_filename, embedded_filepath
-    )
-    cached_response = cache.get(CACHE_KEY)
-    if cached_response is not None:
-        return cached_response
-
     range_header = request.META.get("HTTP_RANGE")
 
     try:
@@ -414,10 +524,6 @@ def _zip_content_from_request(request):  # noqa: C901
 
     patch_response_headers(response, cache_timeout=YEAR_IN_SECONDS)
 
-    if not isinstance(response, StreamingHttpResponse):
-
-        cache.set(CACHE_KEY, response, YEAR_IN_SECONDS)
-
     return response
 
 
@@ -230,6 +230,10 @@ class DeviceSettings(models.Model):
 
 CONTENT_CACHE_KEY_CACHE_KEY = "content_cache_key"
 
+CONTENT_CACHE_EPOCH_CACHE_KEY = "content_cache_epoch"
+
+CHANNEL_CONTENT_CACHE_KEY_CACHE_KEY = "content_cache_key_{}"
+
 
 class ContentCacheKey(models.Model):
     """
@@ -244,11 +248,21 @@ class ContentCacheKey(models.Model):
         super(ContentCacheKey, self).save(*args, **kwargs)
 
     @classmethod
-    def update_cache_key(cls):
+    def update_cache_key(cls, channel_ids=None):
+        """
+        Update the cache key, and the cache keys of the channels in channel_ids,
+        or of every channel if channel_ids is not passed.
+        """
         cache_key, created = cls.objects.get_or_create()
         cache_key.key = time.time()
         cache_key.save()
         cache.set(CONTENT_CACHE_KEY_CACHE_KEY, cache_key.key, 5000)
+        if channel_ids is None:
+            cache.set(CONTENT_CACHE_EPOCH_CACHE_KEY, cache_key.key, None)
+        else:
+            for channel_id in channel_ids:
+                channel_key = CHANNEL_CONTENT_CACHE_KEY_CACHE_KEY.format(channel_id)
+                cache.set(channel_key, cache_key.key, None)
         return cache_key
 
     @classmethod
@@ -263,6 +277,24 @@ class ContentCacheKey(models.Model):
             cache.set(CONTENT_CACHE_KEY_CACHE_KEY, key, 5000)
         return key
 
+    @classmethod
+    def get_channel_cache_key(cls, channel_id):
+        """
+        Returns a cache key for the content metadata of a single channel, which is
+        only updated when the content of that channel, or of every channel, changes.
+        Any part of it that is missing from the cache is replaced by the cache key,
+        which changes whenever the content of any channel changes.
+        """
+        channel_key = CHANNEL_CONTENT_CACHE_KEY_CACHE_KEY.format(channel_id)
+        keys = cache.get_many([CONTENT_CACHE_EPOCH_CACHE_KEY, channel_key])
+        for key in (CONTENT_CACHE_EPOCH_CACHE_KEY, channel_key):
+            if key not in keys:
+                # Only add the key if it is still missing, so that we do not overwrite
+                # a key that has been updated since we looked for it.
+                cache.add(key, cls.get_cache_key(), None)
+                keys[key] = cache.get(key, cls.get_cache_key())
+        return "{}_{}".format(keys[CONTENT_CACHE_EPOCH_CACHE_KEY], keys[channel_key])
+
 
 APP_KEY_CACHE_KEY = "app_key"
 
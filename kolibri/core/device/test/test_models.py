@@ -8,6 +8,7 @@ from morango.models.core import InstanceIDModel
 from kolibri.core.auth.models import Facility
 from kolibri.core.auth.models import FacilityUser
 from kolibri.core.auth.test.helpers import clear_process_cache
+from kolibri.core.device.models import ContentCacheKey
 from kolibri.core.device.models import DeviceStatus
 from kolibri.core.device.models import LearnerDeviceStatus
 from kolibri.core.device.models import StatusSentiment
@@ -191,3 +192,43 @@ class LearnerDeviceStatusTestCase(TestCase):
             "{}:user-rw:{}".format(self.facility.dataset_id, self.user.id),
             device_status._morango_partition,
         )
+
+
+class ContentCacheKeyTestCase(TestCase):
+    def setUp(self):
+        clear_process_cache()
+        self.channel_id = uuid4().hex
+        self.other_channel_id = uuid4().hex
+
+    def _update_cache_key(self, channel_ids=None):
+        time.sleep(0.01)
+        ContentCacheKey.update_cache_key(channel_ids=channel_ids)
+
+    def test_channel_cache_key_stable(self):
+        self.assertEqual(
+            ContentCacheKey.get_channel_cache_key(self.channel_id),
+            ContentCacheKey.get_channel_cache_key(self.channel_id),
+        )
+
+    def test_channel_cache_key_unchanged_by_other_channel(self):
+        cache_key = ContentCacheKey.get_cache_key()
+        channel_cache_key = ContentCacheKey.get_channel_cache_key(self.channel_id)
+        self._update_cache_key(channel_ids=[self.other_channel_id])
+        self.assertNotEqual(ContentCacheKey.get_cache_key(), cache_key)
+        self.assertEqual(
+            ContentCacheKey.get_channel_cache_key(self.channel_id), channel_cache_key
+        )
+
+    def test_channel_cache_key_changed_by_channel(self):
+        channel_cache_key = ContentCacheKey.get_channel_cache_key(self.channel_id)
+        self._update_cache_key(channel_ids=[self.channel_id])
+        self.assertNotEqual(
+            ContentCacheKey.get_channel_cache_key(self.channel_id), channel_cache_key
+        )
+
+    def test_channel_cache_key_changed_by_all_channels(self):
+        channel_cache_key = ContentCacheKey.get_channel_cache_key(self.channel_id)
+        self._update_cache_key()
+        self.assertNotEqual(
+            ContentCacheKey.get_channel_cache_key(self.channel_id), channel_cache_key
+        )
@@ -6,6 +6,7 @@ from django.apps import apps
 
 from kolibri.core.tasks.decorators import register_task
 from kolibri.core.tasks.exceptions import JobRunning
+from kolibri.core.tasks.main import job_storage
 from kolibri.core.utils.lock import db_lock
 from kolibri.utils.conf import OPTIONS
 from kolibri.utils.file_transfer import ChunkedFileDirectoryManager
@@ -90,3 +91,24 @@ def schedule_streamed_cache_cleanup():
         )
     except JobRunning:
         pass
+
+
+# Constant job id for job storage compaction task
+JOB_STORAGE_COMPACTION_JOB_ID = "job_storage_compaction"
+
+
+@register_task(job_id=JOB_STORAGE_COMPACTION_JOB_ID)
+def compact_job_storage():
+    job_storage.compact(
+        max_age=timedelta(days=OPTIONS["Tasks"]["JOB_RETENTION_DAYS"]),
+        max_count=OPTIONS["Tasks"]["JOB_RETENTION_COUNT"],
+    )
+
+
+def schedule_job_storage_compaction():
+    try:
+        compact_job_storage.enqueue_in(
+            timedelta(hours=1), repeat=None, interval=24 * 60 * 60
+        )
+    except JobRunning:
+        pass
@@ -8,6 +8,8 @@ from kolibri.core.auth.management.commands.bulkexportusers import (
 from kolibri.core.auth.models import Facility
 from kolibri.core.logger.csv_export import CSV_EXPORT_FILENAMES
 from kolibri.core.logger.models import GenerateCSVLogRequest
+from kolibri.core.tasks.constants import Execution
+from kolibri.core.tasks.constants import Resource
 from kolibri.core.tasks.decorators import register_task
 from kolibri.core.tasks.permissions import IsAdminForJob
 from kolibri.core.tasks.validation import JobValidator
@@ -126,6 +128,8 @@ def _exportlogcsv(log_type, facility_id, start_date, end_date, locale):
     validator=ExportLogCSVValidator,
     track_progress=True,
     permission_classes=[IsAdminForJob],
+    execution=Execution.PROCESS,
+    resources=[Resource.CPU],
 )
 def exportsessionlogcsv(facility_id, **kwargs):
     """
@@ -146,6 +150,8 @@ def exportsessionlogcsv(facility_id, **kwargs):
     validator=ExportLogCSVValidator,
     track_progress=True,
     permission_classes=[IsAdminForJob],
+    execution=Execution.PROCESS,
+    resources=[Resource.CPU],
 )
 def exportsummarylogcsv(facility_id, **kwargs):
     """
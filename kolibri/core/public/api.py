@@ -8,12 +8,14 @@ from django.db.models import Q
 from django.http import HttpResponse
 from django.http import HttpResponseBadRequest
 from django.http import HttpResponseNotFound
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 from django.utils.cache import patch_cache_control
 from django.utils.decorators import method_decorator
 from django.utils.http import http_date
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_POST
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import exceptions
 from rest_framework import filters
@@ -33,6 +35,9 @@ from kolibri.core.auth.models import FacilityUser
 from kolibri.core.content.api import BaseChannelMetadataMixin
 from kolibri.core.content.api import BaseContentNodeMixin
 from kolibri.core.content.api import BaseContentNodeTreeViewset
+from kolibri.core.content.api import get_cache_key
+from kolibri.core.content.api import get_channel_metadata_cache_key
+from kolibri.core.content.api import get_contentnode_cache_key
 from kolibri.core.content.api import metadata_cache
 from kolibri.core.content.api import PublicContentNodePagination
 from kolibri.core.content.models import ChannelMetadata
@@ -41,6 +46,10 @@ from kolibri.core.content.models import LocalFile
 from kolibri.core.content.serializers import PublicChannelSerializer
 from kolibri.core.content.utils.file_availability import checksum_regex
 from kolibri.core.content.utils.file_availability import generate_checksum_integer_mask
+from kolibri.core.content.utils.file_bundle import MAX_BUNDLE_REQUEST_FILES
+from kolibri.core.content.utils.file_bundle import stream_file_bundle
+from kolibri.core.content.utils.paths import using_remote_storage
+from kolibri.core.content.utils.paths import VALID_STORAGE_FILENAME
 from kolibri.core.device import soud
 from kolibri.core.device.models import SyncQueue
 from kolibri.core.device.models import SyncQueueStatus
@@ -111,8 +120,8 @@ def _get_channel_list_v1(params, identifier=None):
     return channels.filter(root__available=True).distinct()
 
 
-def public_metadata_cache(view_func):
-    view_func = metadata_cache(view_func)
+def public_metadata_cache(view_func, cache_key_func=get_cache_key):
+    view_func = metadata_cache(view_func, cache_key_func=cache_key_func)
 
     def wrapped_view(*args, **kwargs):
         response = view_func(*args, **kwargs)
@@ -125,7 +134,17 @@ def public_metadata_cache(view_func):
     return session_exempt(wrapped_view)
 
 
-@method_decorator(public_metadata_cache, name="dispatch")
+def public_channel_metadata_cache(view_func):
+    return public_metadata_cache(
+        view_func, cache_key_func=get_channel_metadata_cache_key
+    )
+
+
+def public_contentnode_metadata_cache(view_func):
+    return public_metadata_cache(view_func, cache_key_func=get_contentnode_cache_key)
+
+
+@method_decorator(public_channel_metadata_cache, name="dispatch")
 class PublicChannelMetadataViewSet(BaseChannelMetadataMixin, ReadOnlyValuesViewset):
     def get_queryset(self):
         return (
@@ -135,12 +154,12 @@ class PublicChannelMetadataViewSet(BaseChannelMetadataMixin, ReadOnlyValuesViews
         )
 
 
-@method_decorator(public_metadata_cache, name="dispatch")
+@method_decorator(public_contentnode_metadata_cache, name="dispatch")
 class PublicContentNodeViewSet(BaseContentNodeMixin, ReadOnlyValuesViewset):
     pagination_class = PublicContentNodePagination
 
 
-@method_decorator(public_metadata_cache, name="dispatch")
+@method_decorator(public_contentnode_metadata_cache, name="dispatch")
 class PublicContentNodeTreeViewSet(BaseContentNodeTreeViewset):
     pass
 
@@ -187,22 +206,33 @@ def get_public_channel_lookup(request, version, identifier):
     )
 
 
+def _get_json_body(request):
+    """
+    Returns the decoded JSON body of a request, that may have been gzipped.
+    Raises a ValueError if it could not be decoded.
+    """
+    if request.content_type == "application/json":
+        data = request.body
+    elif request.content_type == "application/gzip":
+        with gzip.GzipFile(fileobj=io.BytesIO(request.body)) as f:
+            data = f.read()
+    else:
+        raise ValueError("POST body must be either json or gzip")
+    try:
+        return json.loads(data.decode("utf-8"))
+    except ValueError:
+        raise ValueError("POST body must be valid json")
+
+
 @csrf_exempt
 @gzip_page
 def get_public_file_checksums(request, version):
     """ Endpoint: /public/<version>/file_checksums/ """
     if version == "v1":
-        if request.content_type == "application/json":
-            data = request.body
-        elif request.content_type == "application/gzip":
-            with gzip.GzipFile(fileobj=io.BytesIO(request.body)) as f:
-                data = f.read()
-        else:
-            return HttpResponseBadRequest("POST body must be either json or gzip")
         try:
-            checksums = json.loads(data.decode("utf-8"))
-        except ValueError:
-            return HttpResponseBadRequest("POST body must be valid json")
+            checksums = _get_json_body(request)
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
 
         checksums = [
             checksum for checksum in checksums if checksum_regex.match(checksum)
@@ -223,6 +253,39 @@ def get_public_file_checksums(request, version):
     )
 
 
+@csrf_exempt
+@require_POST
+def get_public_file_bundle(request, version):
+    """
+    Endpoint: /public/<version>/file_bundle/
+    Streams an uncompressed tar of the requested content storage files that are on this device,
+    so that peers can import many small files in a single request.
+    """
+    if version == "v1" and not using_remote_storage():
+        try:
+            filenames = _get_json_body(request)
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+        if not isinstance(filenames, list) or len(filenames) > MAX_BUNDLE_REQUEST_FILES:
+            return HttpResponseBadRequest(
+                "POST body must be a list of at most {} filenames".format(
+                    MAX_BUNDLE_REQUEST_FILES
+                )
+            )
+        filenames = [
+            filename
+            for filename in filenames
+            if isinstance(filename, str) and VALID_STORAGE_FILENAME.fullmatch(filename)
+        ]
+        return StreamingHttpResponse(
+            stream_file_bundle(filenames), content_type="application/x-tar"
+        )
+    return HttpResponseNotFound(
+        json.dumps({"id": error_constants.NOT_FOUND, "metadata": {"view": ""}}),
+        content_type="application/json",
+    )
+
+
 class QueueDeserializer(serializers.Serializer):
     user = HexOnlyUUIDField()
     instance = HexOnlyUUIDField()
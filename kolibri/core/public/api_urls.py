@@ -21,6 +21,7 @@ from ..auth.api import PublicSignUpViewSet
 from .api import FacilitySearchUsernameViewSet
 from .api import get_public_channel_list
 from .api import get_public_channel_lookup
+from .api import get_public_file_bundle
 from .api import get_public_file_checksums
 from .api import InfoViewSet
 from .api import PublicChannelMetadataViewSet
@@ -75,6 +76,11 @@ urlpatterns = [
         get_public_file_checksums,
         name="get_public_file_checksums",
     ),
+    re_path(
+        r"(?P<version>[^/]+)/file_bundle/",
+        get_public_file_bundle,
+        name="get_public_file_bundle",
+    ),
     re_path(
         r"syncqueue/",
         SyncQueueAPIView.as_view(),
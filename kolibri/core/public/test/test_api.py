@@ -1,4 +1,9 @@
+import hashlib
+import io
+import os
 import platform
+import tarfile
+import tempfile
 import time
 import uuid
 
@@ -27,6 +32,7 @@ from kolibri.core.content.models import Language
 from kolibri.core.content.models import LocalFile
 from kolibri.core.content.utils.annotation import set_channel_metadata_fields
 from kolibri.core.content.utils.paths import get_channel_lookup_url
+from kolibri.core.content.utils.paths import get_content_storage_file_path
 from kolibri.core.device.models import DeviceSettings
 from kolibri.core.device.models import SyncQueue
 from kolibri.core.device.models import SyncQueueStatus
@@ -34,6 +40,8 @@ from kolibri.core.device.utils import set_device_settings
 from kolibri.core.public.constants.user_sync_options import HANDSHAKING_TIME
 from kolibri.core.public.constants.user_sync_options import MAX_CONCURRENT_SYNCS
 from kolibri.core.public.constants.user_sync_options import STALE_QUEUE_TIME
+from kolibri.utils.filesystem import mkdirp
+from kolibri.utils.tests.helpers import override_option
 
 
 class ContentNodeFactory(factory.DjangoModelFactory):
@@ -276,6 +284,78 @@ class PublicAPITestCase(APITestCase):
         self.assertEqual(len(data), 2)
 
 
+@override_option("Paths", "CONTENT_DIR", tempfile.mkdtemp())
+class PublicFileBundleTestCase(APITestCase):
+    """
+    IMPORTANT: These tests are to never be changed. They are enforcing a
+    public API contract. If the tests fail, then the implementation needs
+    to be changed, and not the tests themselves.
+    """
+
+    def _create_storage_file(self, content):
+        checksum = hashlib.md5(content).hexdigest()
+        filename = "{}.mp4".format(checksum)
+        path = get_content_storage_file_path(filename)
+        mkdirp(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content)
+        return filename
+
+    def _post_bundle(self, filenames, version="v1"):
+        return self.client.post(
+            reverse("kolibri:core:get_public_file_bundle", kwargs={"version": version}),
+            data=filenames,
+            format="json",
+        )
+
+    def _read_bundle(self, response):
+        contents = {}
+        data = io.BytesIO(b"".join(response.streaming_content))
+        with tarfile.open(fileobj=data, mode="r|") as bundle:
+            for member in bundle:
+                contents[member.name] = bundle.extractfile(member).read()
+        return contents
+
+    def test_file_bundle(self):
+        content1 = os.urandom(1000)
+        content2 = os.urandom(1024)
+        filename1 = self._create_storage_file(content1)
+        filename2 = self._create_storage_file(content2)
+        response = self._post_bundle([filename1, filename2])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-tar")
+        self.assertEqual(
+            self._read_bundle(response), {filename1: content1, filename2: content2}
+        )
+
+    def test_file_bundle_skips_missing_and_invalid_files(self):
+        content = os.urandom(100)
+        filename = self._create_storage_file(content)
+        missing_filename = "{}.mp4".format(uuid.uuid4().hex)
+        response = self._post_bundle([missing_filename, "../../settings.py", filename])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._read_bundle(response), {filename: content})
+
+    def test_file_bundle_no_files(self):
+        response = self._post_bundle([])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._read_bundle(response), {})
+
+    def test_file_bundle_invalid_body(self):
+        response = self._post_bundle({"files": []})
+        self.assertEqual(response.status_code, 400)
+
+    def test_file_bundle_get_not_allowed(self):
+        response = self.client.get(
+            reverse("kolibri:core:get_public_file_bundle", kwargs={"version": "v1"})
+        )
+        self.assertEqual(response.status_code, 405)
+
+    def test_file_bundle_unknown_version(self):
+        response = self._post_bundle([], version="v2")
+        self.assertEqual(response.status_code, 404)
+
+
 class SyncQueueViewSetTestCase(APITestCase):
     """
     IMPORTANT: These tests are to never be changed. They are enforcing a
@@ -1,4 +1,7 @@
 import logging
+import threading
+from datetime import datetime
+from datetime import timedelta
 
 from django.http.response import Http404
 from django.utils.decorators import method_decorator
@@ -24,6 +27,23 @@ from kolibri.core.tasks.validation import EnqueueArgsSerializer
 logger = logging.getLogger(__name__)
 
 
+# The longest that a request for task changes can wait for a change, in seconds.
+MAX_CHANGES_TIMEOUT = 10
+
+# How many requests for task changes can wait for a change at the same time. Each waiting
+# request holds a thread of the server, so any more requests are answered straight away.
+MAX_WAITING_CHANGES_REQUESTS = 4
+
+_waiting_changes_requests = threading.BoundedSemaphore(MAX_WAITING_CHANGES_REQUESTS)
+
+
+def _cursor_to_change_seq(cursor):
+    try:
+        return int(cursor)
+    except (TypeError, ValueError):
+        raise serializers.ValidationError("Invalid cursor: {}".format(cursor))
+
+
 class TasksSerializer(serializers.Serializer):
     """
     At the moment this is purely for documentation purposes.
@@ -85,8 +105,9 @@ class TasksViewSet(viewsets.GenericViewSet):
 
         return validated_jobs
 
-    def _job_to_response(self, job):
-        orm_job = job_storage.get_orm_job(job_id=job.job_id)
+    def _job_to_response(self, job, orm_job=None):
+        if orm_job is None:
+            orm_job = job_storage.get_orm_job(job_id=job.job_id)
         output = {
             "status": job.state,
             "type": job.func,
@@ -116,6 +137,40 @@ class TasksViewSet(viewsets.GenericViewSet):
         else:
             return None
 
+    def _permitted_jobs(self, request, jobs):
+        """
+        Returns the jobs in jobs, a list of jobs or of (job, orm_job) tuples,
+        that `request.user` has permissions for, as (job, orm_job) tuples.
+        """
+        permitted_jobs = []
+        for job in jobs:
+            job, orm_job = job if isinstance(job, tuple) else (job, None)
+            try:
+                registered_task = TaskRegistry[job.func]
+                registered_task.check_job_permissions(request.user, job, self)
+            except KeyError:
+                # Note: Temporarily including unregistered tasks until we complete
+                # our transition to to the new tasks API.
+                # After completing transition to the new tasks API, we won't be
+                # including unregistered tasks to the response list.
+                pass
+            except PermissionDenied:
+                # `request.user` do not have permission for this job hence
+                # we we will NOT append this job to the list.
+                continue
+            permitted_jobs.append((job, orm_job))
+        return permitted_jobs
+
+    def _jobs_to_response(self, request, jobs):
+        """
+        Returns the response for the jobs in jobs, a list of jobs or of (job, orm_job) tuples,
+        that `request.user` has permissions for.
+        """
+        return [
+            self._job_to_response(job, orm_job=orm_job)
+            for job, orm_job in self._permitted_jobs(request, jobs)
+        ]
+
     def list(self, request):
         """
         Returns a list of jobs that `request.user` has permissions for.
@@ -130,24 +185,98 @@ class TasksViewSet(viewsets.GenericViewSet):
 
         all_jobs = job_storage.get_all_jobs(queue=queue, repeating=repeating)
 
-        jobs_response = []
-        for job in all_jobs:
+        return Response(self._jobs_to_response(request, all_jobs))
+
+    @decorators.action(methods=["get"], detail=False)
+    def changes(self, request):
+        """
+        Returns the jobs that `request.user` has permissions for that have changed since
+        the `cursor` query parameter, or all of them if it is not given, so that clients can
+        keep a list of jobs up to date without fetching every job each time.
+
+        If nothing has changed, waits for a change for up to `timeout` seconds, up to 10,
+        defaults to 0. Only a few requests wait at the same time, any others return straight away.
+
+        Accepts the same `queue` and `repeating` query parameters as the list endpoint.
+
+        Response:
+            - `cursor`: the cursor to pass to get the next changes.
+            - `jobs`: the jobs that have changed.
+            - `job_ids`: the ids of all jobs that `request.user` has permissions for,
+              to remove jobs that have been cleared.
+        """
+        queue = request.query_params.get("queue", None)
+
+        repeating = self._handle_repeat_query_param(
+            repeating=request.query_params.get("repeating", None)
+        )
+
+        cursor = request.query_params.get("cursor", None)
+        since = _cursor_to_change_seq(cursor) if cursor else None
+
+        try:
+            timeout = float(request.query_params.get("timeout", 0))
+        except ValueError:
+            raise serializers.ValidationError("timeout must be a number")
+        timeout = min(max(timeout, 0), MAX_CHANGES_TIMEOUT)
+
+        if timeout and _waiting_changes_requests.acquire(blocking=False):
             try:
-                registered_task = TaskRegistry[job.func]
-                registered_task.check_job_permissions(request.user, job, self)
-                jobs_response.append(self._job_to_response(job))
-            except KeyError:
-                # Note: Temporarily including unregistered tasks until we complete
-                # our transition to to the new tasks API.
-                # After completing transition to the new tasks API, we won't be
-                # including unregistered tasks to the response list.
-                jobs_response.append(self._job_to_response(job))
-            except PermissionDenied:
-                # `request.user` do not have permission for this job hence
-                # we we will NOT append this job to the list.
-                pass
+                last_change_seq = job_storage.wait_for_update(since, timeout)
+            finally:
+                _waiting_changes_requests.release()
+        else:
+            last_change_seq = job_storage.wait_for_update(since, 0)
 
-        return Response(jobs_response)
+        if last_change_seq is None or (since is not None and last_change_seq <= since):
+            jobs = []
+        else:
+            jobs = job_storage.get_updated_jobs(
+                since, last_change_seq, queue=queue, repeating=repeating
+            )
+        if last_change_seq is not None:
+            cursor = str(last_change_seq)
+
+        all_jobs = job_storage.get_all_jobs(queue=queue, repeating=repeating)
+
+        return Response(
+            {
+                "cursor": cursor,
+                "jobs": self._jobs_to_response(request, jobs),
+                "job_ids": [
+                    job.job_id for job, _ in self._permitted_jobs(request, all_jobs)
+                ],
+            }
+        )
+
+    @decorators.action(methods=["get"], detail=False)
+    def metrics(self, request):
+        """
+        Returns the metrics of the runs of each task, for super admins only.
+
+        Accepts a `func` query parameter to only return the metrics of one task, and a `days`
+        query parameter to only include the jobs that finished in that many last days.
+
+        Response: a list with, for each task, the number of `runs`, `failures` and `canceled`
+        runs, the `failure_rate`, and summaries with histograms of the `queue_latency` and
+        `duration` in seconds, and of the `rss_delta` memory usage change in bytes.
+        """
+        if not request.user.is_superuser:
+            raise PermissionDenied()
+
+        since = None
+        days = request.query_params.get("days", None)
+        if days is not None:
+            try:
+                since = datetime.utcnow() - timedelta(days=float(days))
+            except (ValueError, OverflowError):
+                raise serializers.ValidationError("days must be a number")
+
+        return Response(
+            job_storage.get_job_metrics(
+                func=request.query_params.get("func", None), since=since
+            )
+        )
 
     def _enqueue_job_based_on_enqueue_args(self, registered_task, job, enqueue_args):
         """
@@ -19,3 +19,43 @@ class Priority(object):
 
     # A set of all valid priorities
     Priorities = {HIGH, REGULAR, LOW}
+
+
+class Execution(object):
+    """
+    This class defines how a worker runs the jobs of a task.
+
+    THREAD is for tasks that mostly wait on I/O, the network or the database. They are run
+    in a thread of the worker's process, unless worker multiprocessing is enabled.
+
+    PROCESS is for CPU-bound tasks, like importing channel metadata or exporting CSV files,
+    that would otherwise compete for the GIL with other tasks and with the server's request
+    threads. They are run in a separate process, on platforms that support it, and fall back
+    to a thread otherwise.
+    """
+
+    THREAD = "thread"
+    PROCESS = "process"
+
+    # A set of all valid executions
+    Executions = {THREAD, PROCESS}
+
+
+class Resource(object):
+    """
+    This class defines the resources that a task can declare it uses heavily, so that the
+    number of tasks using each at the same time can be limited, see the RESOURCE_LIMITS option.
+
+    DISK is for tasks that read or write a lot of files, like content imports and exports.
+    NETWORK is for tasks that transfer a lot of data over the network.
+    CPU is for CPU-bound tasks.
+    DB_WRITE is for tasks that write a lot to the database, like channel imports and syncs.
+    """
+
+    DISK = "disk"
+    NETWORK = "network"
+    CPU = "cpu"
+    DB_WRITE = "db-write"
+
+    # A set of all valid resources
+    Resources = {DISK, NETWORK, CPU, DB_WRITE}
@@ -1,6 +1,7 @@
 from functools import partial
 
 from kolibri.core.tasks.constants import DEFAULT_QUEUE
+from kolibri.core.tasks.constants import Execution
 from kolibri.core.tasks.constants import Priority
 from kolibri.core.tasks.registry import RegisteredTask
 from kolibri.core.tasks.validation import JobValidator
@@ -17,6 +18,10 @@ def register_task(
     permission_classes=None,
     long_running=False,
     status_fn=None,
+    execution=Execution.THREAD,
+    resources=None,
+    batch_key=None,
+    merge_fn=None,
 ):
     """
     Registers the decorated function as task.
@@ -36,6 +41,10 @@ def register_task(
             permission_classes=permission_classes,
             long_running=long_running,
             status_fn=status_fn,
+            execution=execution,
+            resources=resources,
+            batch_key=batch_key,
+            merge_fn=merge_fn,
         )
 
     return RegisteredTask(
@@ -49,4 +58,8 @@ def register_task(
         permission_classes=permission_classes,
         long_running=long_running,
         status_fn=status_fn,
+        execution=execution,
+        resources=resources,
+        batch_key=batch_key,
+        merge_fn=merge_fn,
     )
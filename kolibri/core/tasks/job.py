@@ -1,6 +1,7 @@
 import copy
 import json
 import logging
+import time
 import traceback
 import uuid
 from collections import namedtuple
@@ -10,9 +11,11 @@ from kolibri.core.tasks.constants import (  # noqa F401 - imported for backwards
 )
 from kolibri.core.tasks.exceptions import JobNotRunning
 from kolibri.core.tasks.exceptions import UserCancelledError
+from kolibri.core.tasks.metrics import measure_job_run
 from kolibri.core.tasks.utils import callable_to_import_path
 from kolibri.core.tasks.utils import current_state_tracker
 from kolibri.core.tasks.utils import import_path_to_callable
+from kolibri.core.tasks.utils import is_cancel_requested
 from kolibri.core.tasks.validation import validate_interval
 from kolibri.core.tasks.validation import validate_priority
 from kolibri.core.tasks.validation import validate_repeat
@@ -124,11 +127,17 @@ class Job(object):
         "kwargs",
     }
 
+    # How often a running job checks the job storage for whether it has been canceled,
+    # in seconds, when it has not been told so by the worker.
+    cancel_check_interval = 1
+
     JSON_KEYS = UPDATEABLE_KEYS | {
         "job_id",
         "facility_id",
         "func",
         "long_running",
+        "resources",
+        "batch_key",
     }
 
     def to_json(self):
@@ -169,6 +178,8 @@ class Job(object):
         kwargs["track_progress"] = job.track_progress
         kwargs["cancellable"] = job.cancellable
         kwargs["long_running"] = job.long_running
+        kwargs["resources"] = list(job.resources)
+        kwargs["batch_key"] = job.batch_key
         kwargs["extra_metadata"] = job.extra_metadata.copy()
         kwargs["facility_id"] = job.facility_id
         return cls(job.func, **kwargs)
@@ -190,6 +201,8 @@ class Job(object):
         total_progress=0,
         result=None,
         long_running=False,
+        resources=None,
+        batch_key=None,
     ):
         """
         Create a new Job that will run func given the arguments passed to Job(). If the track_progress keyword parameter
@@ -221,6 +234,9 @@ class Job(object):
         self.track_progress = track_progress
         self.cancellable = cancellable
         self.long_running = long_running
+        self.resources = resources or []
+        self.batch_key = batch_key
+        self._last_cancel_check = None
         self.extra_metadata = extra_metadata or {}
         self.progress = progress
         self._last_saved_progress = progress
@@ -304,7 +320,23 @@ class Job(object):
         )
 
     def check_for_cancel(self):
-        if self.cancellable:
+        """
+        Raises UserCancelledError if the job has been canceled.
+
+        Jobs run in a thread of the worker are told that they have been canceled by the worker,
+        so this is usually only a flag check. The job storage is only checked every
+        cancel_check_interval seconds, for jobs that are run in other processes.
+        """
+        if not self.cancellable:
+            return
+        if is_cancel_requested(self.job_id):
+            raise UserCancelledError()
+        now = time.monotonic()
+        if (
+            self._last_cancel_check is None
+            or now - self._last_cancel_check >= self.cancel_check_interval
+        ):
+            self._last_cancel_check = now
             if self.storage.check_job_canceled(self.job_id):
                 raise UserCancelledError()
 
@@ -362,21 +394,33 @@ class Job(object):
 
         args, kwargs = copy.copy(self.args), copy.copy(self.kwargs)
 
-        try:
-            # First check whether the job has been cancelled
-            self.check_for_cancel()
-            result = func(*args, **kwargs)
-            self.storage.complete_job(self.job_id, result=result)
-        except UserCancelledError:
-            self.storage.mark_job_as_canceled(self.job_id)
-        except Exception as e:
-            # If any error occurs, mark the job as failed and save the exception
-            traceback_str = traceback.format_exc()
-            e.traceback = traceback_str
-            logger.error(
-                "Job {} raised an exception: {}".format(self.job_id, traceback_str)
-            )
-            self.storage.mark_job_as_failed(self.job_id, e, traceback_str)
+        with measure_job_run(self) as measurement:
+            try:
+                # First check whether the job has been cancelled
+                self.check_for_cancel()
+                result = func(*args, **kwargs)
+                self.storage.complete_job(self.job_id, result=result)
+                state = State.COMPLETED
+            except UserCancelledError:
+                self.storage.mark_job_as_canceled(self.job_id)
+                state = State.CANCELED
+            except Exception as e:
+                # If any error occurs, mark the job as failed and save the exception
+                traceback_str = traceback.format_exc()
+                e.traceback = traceback_str
+                logger.error(
+                    "Job {} raised an exception: {}".format(self.job_id, traceback_str)
+                )
+                self.storage.mark_job_as_failed(self.job_id, e, traceback_str)
+                state = State.FAILED
+
+        self.storage.record_job_run(
+            self.job_id,
+            self.func,
+            state,
+            measurement.duration,
+            rss_delta=measurement.rss_delta,
+        )
 
         self.storage.reschedule_finished_job_if_needed(
             self.job_id, delay=self._retry_in_delay, **self._retry_in_kwargs
@@ -32,4 +32,5 @@ def initialize_workers(log_queue=None):
         regular_workers=conf.OPTIONS["Tasks"]["REGULAR_PRIORITY_WORKERS"],
         high_workers=conf.OPTIONS["Tasks"]["HIGH_PRIORITY_WORKERS"],
         log_queue=log_queue,
+        resource_limits=dict(conf.OPTIONS["Tasks"]["RESOURCE_LIMITS"]),
     )
@@ -0,0 +1,113 @@
+import json
+from datetime import datetime
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from kolibri.core.tasks.main import job_storage
+
+
+def _format_seconds(value):
+    if value is None:
+        return "-"
+    return "{:.2f}s".format(value)
+
+
+def _format_bytes(value):
+    if value is None:
+        return "-"
+    return "{:.1f}MB".format(value / (1024.0 * 1024.0))
+
+
+class Command(BaseCommand):
+    """
+    This command shows how long the jobs of each task have waited to run and run for,
+    how often they have failed and how much memory they have used.
+    """
+
+    help = "Shows the run time, queue wait time, failure rate and memory usage of each task"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--func",
+            action="store",
+            type=str,
+            default=None,
+            help="Only show the metrics of the task with this import path",
+        )
+        parser.add_argument(
+            "--days",
+            action="store",
+            type=int,
+            default=None,
+            help="Only include the jobs that finished in this many last days",
+        )
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="Output the metrics with their histograms as JSON",
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options["days"] is not None:
+            since = datetime.utcnow() - timedelta(days=options["days"])
+
+        metrics = job_storage.get_job_metrics(func=options["func"], since=since)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(metrics, indent=2))
+            return
+
+        if not metrics:
+            self.stdout.write("No task runs have been recorded")
+            return
+
+        header = (
+            "Task",
+            "Runs",
+            "Failure rate",
+            "Wait p50",
+            "Wait p95",
+            "Run p50",
+            "Run p95",
+            "Run max",
+            "Memory max",
+        )
+        data = [
+            (
+                task_metrics["func"],
+                task_metrics["runs"],
+                "{:.0%}".format(task_metrics["failure_rate"]),
+                _format_seconds(task_metrics["queue_latency"]["p50"]),
+                _format_seconds(task_metrics["queue_latency"]["p95"]),
+                _format_seconds(task_metrics["duration"]["p50"]),
+                _format_seconds(task_metrics["duration"]["p95"]),
+                _format_seconds(task_metrics["duration"]["max"]),
+                _format_bytes(task_metrics["rss_delta"]["max"]),
+            )
+            for task_metrics in metrics
+        ]
+        self._tabulate(header, data)
+
+    def _tabulate(self, header, data):
+        """
+        Prints a table with the given header and data.
+        """
+        col_length = [0] * len(header)
+        for i, col in enumerate(header):
+            col_length[i] = max(col_length[i], len(str(col)))
+        for row in data:
+            for i, col in enumerate(row):
+                col_length[i] = max(col_length[i], len(str(col)))
+
+        self.stdout.write(
+            " | ".join([str(col).ljust(col_length[i]) for i, col in enumerate(header)])
+        )
+        self.stdout.write(
+            "-+-".join(["-" * col_length[i] for i, col in enumerate(header)])
+        )
+        for row in data:
+            self.stdout.write(
+                " | ".join([str(col).ljust(col_length[i]) for i, col in enumerate(row)])
+            )
@@ -0,0 +1,111 @@
+"""
+Measurements of job runs, to see how long each task waits to run and runs for, how often it
+fails and how much memory it uses, and optionally a profile of each run of chosen tasks.
+
+Each job run is recorded in the job storage, so that runs in any worker process are
+aggregated together, and summarized as histograms per task.
+"""
+import cProfile
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from kolibri.utils import conf
+
+logger = logging.getLogger(__name__)
+
+try:
+    import kolibri.utils.pskolibri as psutil
+except NotImplementedError:
+    # Memory usage can't be measured on this OS
+    psutil = None
+
+
+# The upper bounds of the histogram buckets for times, in seconds.
+TIME_BUCKETS = (0.1, 1, 10, 60, 600, 3600, float("inf"))
+
+# The upper bounds of the histogram buckets for memory, in bytes.
+MEMORY_BUCKETS = (
+    1024 * 1024,
+    10 * 1024 * 1024,
+    100 * 1024 * 1024,
+    1024 * 1024 * 1024,
+    float("inf"),
+)
+
+PROFILE_DIRECTORY = "task_profiles"
+
+
+def get_rss():
+    """
+    Returns the resident set size of the current process in bytes, or None if it can't
+    be measured.
+    """
+    if psutil is None:
+        return None
+    try:
+        return psutil.Process().memory_info().rss
+    except Exception as e:
+        logger.debug("Could not measure memory usage: {}".format(e))
+        return None
+
+
+def get_profile_path(job):
+    return os.path.join(
+        conf.KOLIBRI_HOME,
+        PROFILE_DIRECTORY,
+        "{}_{}.prof".format(job.func, job.job_id),
+    )
+
+
+def should_profile(job):
+    return job.func in conf.OPTIONS["Tasks"]["PROFILE_TASKS"]
+
+
+class JobRunMeasurement(object):
+    """
+    The measurements of a single run of a job, filled in by measure_job_run.
+    """
+
+    def __init__(self):
+        self.duration = None
+        self.rss_delta = None
+        self.profile_path = None
+
+
+@contextmanager
+def measure_job_run(job):
+    """
+    Measures how long the block takes to run and how much the memory usage of the process
+    changes while it runs, and profiles it if the task of the job is to be profiled.
+
+    Memory is measured for the whole process, so for jobs run in threads it includes the
+    memory used by any other jobs running at the same time.
+    """
+    measurement = JobRunMeasurement()
+    profile = cProfile.Profile() if should_profile(job) else None
+    rss_before = get_rss()
+    start = time.monotonic()
+    if profile is not None:
+        profile.enable()
+    try:
+        yield measurement
+    finally:
+        if profile is not None:
+            profile.disable()
+        measurement.duration = time.monotonic() - start
+        rss_after = get_rss()
+        if rss_before is not None and rss_after is not None:
+            measurement.rss_delta = rss_after - rss_before
+        if profile is not None:
+            path = get_profile_path(job)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                profile.dump_stats(path)
+                measurement.profile_path = path
+                logger.info("Saved profile of job {} to {}".format(job.job_id, path))
+            except OSError as e:
+                logger.warning(
+                    "Could not save profile of job {}: {}".format(job.job_id, e)
+                )
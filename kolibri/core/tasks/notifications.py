@@ -0,0 +1,207 @@
+"""
+Notifications that wake up workers when there may be a job for them to start or cancel,
+so that they do not have to keep polling the job storage database.
+
+Notifications are sent to listeners in the same process through a socket pair, and to
+listeners in other processes with LISTEN/NOTIFY on Postgres, or through a named pipe next
+to the database file on SQLite, on platforms that have named pipes. Notifications carry no
+data and may be lost, so listeners should still check the database every so often.
+"""
+import logging
+import os
+import selectors
+import socket
+import stat
+import threading
+from collections import defaultdict
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger(__name__)
+
+
+# The Postgres channel to notify on.
+CHANNEL = "kolibri_job_storage"
+
+# Listeners in this process, by the url of the database they listen for.
+_listeners = defaultdict(set)
+
+_listeners_lock = threading.Lock()
+
+
+def _get_key(engine):
+    return str(engine.url)
+
+
+def _get_wakeup_pipe_path(engine):
+    database = engine.url.database
+    if (
+        engine.name != "sqlite"
+        or not database
+        or database == ":memory:"
+        or not hasattr(os, "mkfifo")
+    ):
+        return None
+    return database + ".wakeup"
+
+
+def _notify_postgres(engine):
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("SELECT pg_notify(:channel, '')"), {"channel": CHANNEL})
+    except SQLAlchemyError as e:
+        logger.debug("Could not notify job storage listeners: {}".format(e))
+
+
+def _notify_wakeup_pipe(engine):
+    path = _get_wakeup_pipe_path(engine)
+    if path is None:
+        return
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+    except OSError:
+        # There is no pipe, or no listener has it open.
+        return
+    try:
+        os.write(fd, b"\0")
+    except OSError:
+        # The pipe is full, so the listener already has a notification waiting.
+        pass
+    finally:
+        os.close(fd)
+
+
+def notify(engine):
+    """
+    Wake up the listeners for the job storage database of engine.
+    """
+    with _listeners_lock:
+        listeners = list(_listeners[_get_key(engine)])
+    for listener in listeners:
+        listener.wake()
+    if engine.name == "postgresql":
+        _notify_postgres(engine)
+    else:
+        _notify_wakeup_pipe(engine)
+
+
+class Listener(object):
+    """
+    Waits for notifications for the job storage database of engine.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._selector = selectors.DefaultSelector()
+        self._wake_reader, self._wake_writer = socket.socketpair()
+        self._wake_reader.setblocking(False)
+        self._wake_writer.setblocking(False)
+        self._selector.register(self._wake_reader, selectors.EVENT_READ, self._drain)
+        self._postgres_connection = None
+        self._pipe_fds = []
+        self._created_pipe_path = None
+        if engine.name == "postgresql":
+            self._listen_postgres()
+        else:
+            self._open_wakeup_pipe()
+        with _listeners_lock:
+            _listeners[_get_key(engine)].add(self)
+
+    def _listen_postgres(self):
+        try:
+            connection = self.engine.raw_connection()
+            # Keep the connection out of the pool, as it is dedicated to listening.
+            connection.detach()
+            dbapi_connection = connection.connection
+            dbapi_connection.autocommit = True
+            with dbapi_connection.cursor() as cursor:
+                cursor.execute("LISTEN {}".format(CHANNEL))
+            self._selector.register(
+                dbapi_connection, selectors.EVENT_READ, self._drain_postgres
+            )
+            self._postgres_connection = dbapi_connection
+        except (SQLAlchemyError, AttributeError, OSError) as e:
+            logger.warning(
+                "Could not listen for job storage notifications from other processes: {}".format(
+                    e
+                )
+            )
+
+    def _open_wakeup_pipe(self):
+        path = _get_wakeup_pipe_path(self.engine)
+        if path is None:
+            return
+        try:
+            if not os.path.exists(path):
+                os.mkfifo(path)
+                self._created_pipe_path = path
+            if not stat.S_ISFIFO(os.stat(path).st_mode):
+                raise OSError("{} is not a named pipe".format(path))
+            read_fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+            self._pipe_fds.append(read_fd)
+            # Hold the pipe open for writing as well, so that it does not keep reporting
+            # end of file once other processes have closed it.
+            self._pipe_fds.append(os.open(path, os.O_WRONLY | os.O_NONBLOCK))
+            self._selector.register(read_fd, selectors.EVENT_READ, self._drain)
+        except OSError as e:
+            logger.warning(
+                "Could not listen for job storage notifications from other processes: {}".format(
+                    e
+                )
+            )
+
+    def _drain(self, fileobj):
+        try:
+            while True:
+                if isinstance(fileobj, socket.socket):
+                    data = fileobj.recv(4096)
+                else:
+                    data = os.read(fileobj, 4096)
+                if not data:
+                    break
+        except OSError:
+            # Nothing left to read.
+            pass
+
+    def _drain_postgres(self, dbapi_connection):
+        dbapi_connection.poll()
+        del dbapi_connection.notifies[:]
+
+    def wake(self):
+        """
+        Wake up a wait in progress, or the next wait if there is none.
+        """
+        try:
+            self._wake_writer.send(b"\0")
+        except OSError:
+            # The socket buffer is full, so a wake up is already pending.
+            pass
+
+    def wait(self, timeout):
+        """
+        Wait up to timeout seconds for a notification, returns whether there was one.
+        """
+        events = self._selector.select(timeout)
+        for key, _ in events:
+            key.data(key.fileobj)
+        return bool(events)
+
+    def close(self):
+        with _listeners_lock:
+            _listeners[_get_key(self.engine)].discard(self)
+        self._selector.close()
+        self._wake_reader.close()
+        self._wake_writer.close()
+        for fd in self._pipe_fds:
+            os.close(fd)
+        self._pipe_fds = []
+        if self._created_pipe_path is not None:
+            try:
+                os.remove(self._created_pipe_path)
+            except OSError:
+                pass
+            self._created_pipe_path = None
+        if self._postgres_connection is not None:
+            self._postgres_connection.close()
+            self._postgres_connection = None
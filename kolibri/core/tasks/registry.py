@@ -7,7 +7,9 @@ from rest_framework import serializers
 from rest_framework.exceptions import PermissionDenied
 
 from kolibri.core.tasks.constants import DEFAULT_QUEUE
+from kolibri.core.tasks.constants import Execution
 from kolibri.core.tasks.constants import Priority
+from kolibri.core.tasks.constants import Resource
 from kolibri.core.tasks.job import Job
 from kolibri.core.tasks.main import job_storage
 from kolibri.core.tasks.permissions import BasePermission
@@ -159,6 +161,10 @@ class RegisteredTask(object):
         permission_classes=None,
         long_running=False,
         status_fn=None,
+        execution=Execution.THREAD,
+        resources=None,
+        batch_key=None,
+        merge_fn=None,
     ):
         """
         :param func: Function to be wrapped as a Registered task
@@ -189,15 +195,41 @@ class RegisteredTask(object):
         text describing the status of the job to an end user. Should use string wrapping, as it will
         usually be invoked in a context where internationalization is being used.
         :type status_fn: function
+        :param execution: Whether jobs of this task are run in a thread or in a separate process,
+        can be either THREAD or PROCESS, defaults to Execution.THREAD
+        :type execution: str
+        :param resources: The resources that jobs of this task use heavily, out of those in Resource,
+        to limit how many jobs using each run at the same time, defaults to None
+        :type resources: list of str
+        :param batch_key: A function that takes the args and kwargs of a job of this task and returns
+        a string key, or None. When enqueued, a job is merged into any queued job of this task with
+        the same key, rather than being queued separately, defaults to None
+        :type batch_key: function
+        :param merge_fn: A function that takes the queued job and the job being merged into it,
+        and returns the args and kwargs of the merged job. If not set, the queued job is left
+        unchanged, defaults to None
+        :type merge_fn: function
         """
         if permission_classes is None:
             permission_classes = []
+        if resources is None:
+            resources = []
         if not issubclass(validator, JobValidator):
             raise TypeError("Validators must be a subclass of {}".format(JobValidator))
         if priority not in Priority.Priorities:
             raise ValueError("priority must be one of '5' or '10' (integer).")
+        if execution not in Execution.Executions:
+            raise ValueError("execution must be one of 'thread' or 'process'.")
         if not isinstance(permission_classes, list):
             raise TypeError("permission_classes must be of list type.")
+        if not isinstance(resources, list):
+            raise TypeError("resources must be of list type.")
+        if not set(resources).issubset(Resource.Resources):
+            raise ValueError(
+                "resources must be among {}.".format(
+                    ", ".join(sorted(Resource.Resources))
+                )
+            )
         if not isinstance(queue, str):
             raise TypeError("queue must be of string type.")
         if not isinstance(cancellable, bool):
@@ -208,6 +240,12 @@ class RegisteredTask(object):
             raise TypeError("long_running must be of bool type.")
         if status_fn is not None and not callable(status_fn):
             raise TypeError("status_fn must be callable.")
+        if batch_key is not None and not callable(batch_key):
+            raise TypeError("batch_key must be callable.")
+        if merge_fn is not None and not callable(merge_fn):
+            raise TypeError("merge_fn must be callable.")
+        if merge_fn is not None and batch_key is None:
+            raise ValueError("When merge_fn is defined, batch_key must be defined")
         if long_running and status_fn is None:
             raise ValueError(
                 "When long_running is set to True, status_fn must be defined"
@@ -229,6 +267,10 @@ class RegisteredTask(object):
         self.track_progress = track_progress
         self.long_running = long_running
         self._status_fn = status_fn
+        self.execution = execution
+        self.resources = resources
+        self.batch_key = batch_key
+        self.merge_fn = merge_fn
 
         # Make this wrapper object look seamlessly like the wrapped function
         update_wrapper(self, func)
@@ -290,10 +332,22 @@ class RegisteredTask(object):
         """
         Enqueue the function with arguments passed to this method.
 
+        If the task has a batch_key, and there is a queued job of this task with the same key,
+        the job is merged into that job instead.
+
         :return: enqueued job's id.
         """
+        job = job or self._ready_job(**job_kwargs)
+        if self.batch_key is not None:
+            return job_storage.enqueue_job_or_merge(
+                job,
+                merge_fn=self.merge_fn,
+                queue=self.queue,
+                priority=priority or self.priority,
+                retry_interval=retry_interval,
+            )
         return job_storage.enqueue_job(
-            job or self._ready_job(**job_kwargs),
+            job,
             queue=self.queue,
             priority=priority or self.priority,
             retry_interval=retry_interval,
@@ -389,12 +443,17 @@ class RegisteredTask(object):
         """
         Returns a job object with args and kwargs as its positional and keyword arguments.
         """
+        if "batch_key" not in job_kwargs and self.batch_key is not None:
+            job_kwargs["batch_key"] = self.batch_key(
+                *job_kwargs.get("args", ()), **job_kwargs.get("kwargs", None) or {}
+            )
         job_obj = Job(
             self,
             job_id=job_kwargs.pop("job_id", self.job_id),
             cancellable=job_kwargs.pop("cancellable", self.cancellable),
             track_progress=job_kwargs.pop("track_progress", self.track_progress),
             long_running=job_kwargs.pop("long_running", self.long_running),
+            resources=job_kwargs.pop("resources", self.resources),
             **job_kwargs
         )
         return job_obj
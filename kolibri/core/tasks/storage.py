@@ -1,13 +1,19 @@
 import logging
+import threading
+import time
 from contextlib import contextmanager
 from datetime import datetime
 from datetime import timedelta
 
 import pytz
+from sqlalchemy import case
 from sqlalchemy import Column
 from sqlalchemy import DateTime
+from sqlalchemy import delete
+from sqlalchemy import Float
 from sqlalchemy import func as sql_func
 from sqlalchemy import Index
+from sqlalchemy import insert
 from sqlalchemy import Integer
 from sqlalchemy import or_
 from sqlalchemy import select
@@ -16,6 +22,7 @@ from sqlalchemy import Table
 from sqlalchemy import text
 from sqlalchemy import update
 from sqlalchemy.exc import OperationalError
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -27,6 +34,9 @@ from kolibri.core.tasks.exceptions import JobRunning
 from kolibri.core.tasks.hooks import StorageHook
 from kolibri.core.tasks.job import Job
 from kolibri.core.tasks.job import State
+from kolibri.core.tasks.metrics import MEMORY_BUCKETS
+from kolibri.core.tasks.metrics import TIME_BUCKETS
+from kolibri.core.tasks.notifications import notify
 from kolibri.core.tasks.validation import validate_interval
 from kolibri.core.tasks.validation import validate_priority
 from kolibri.core.tasks.validation import validate_repeat
@@ -40,6 +50,42 @@ Base = declarative_base()
 logger = logging.getLogger(__name__)
 
 
+class ORMJobChangeSeq(Base):
+    """
+    A single row holding the last change sequence number given to a job, so that
+    numbers are never given out again after the jobs that had them are deleted.
+    """
+
+    __tablename__ = "job_change_seq"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+
+    value = Column(Integer, nullable=False)
+
+
+def _next_change_seq(context):
+    """
+    Bumps the change sequence number in the transaction that inserts or updates a job,
+    and returns it for the job. The counter's row stays locked until the transaction ends,
+    so the transactions that change jobs are committed in the order of their numbers.
+    """
+    conn = context.connection
+    result = conn.execute(
+        update(ORMJobChangeSeq).values(value=ORMJobChangeSeq.value + 1)
+    )
+    if not result.rowcount:
+        # The tables have just been created, so start counting after any existing jobs.
+        conn.execute(
+            insert(ORMJobChangeSeq).values(
+                id=1,
+                value=select(
+                    sql_func.coalesce(sql_func.max(ORMJob.change_seq), 0) + 1
+                ).scalar_subquery(),
+            )
+        )
+    return conn.execute(select(ORMJobChangeSeq.value)).scalar()
+
+
 class ORMJob(Base):
     """
     The DB representation of a common.classes.Job object,
@@ -70,6 +116,21 @@ class ORMJob(Base):
     time_created = Column(DateTime(timezone=True), server_default=sql_func.now())
     time_updated = Column(DateTime(timezone=True), onupdate=sql_func.now())
 
+    # When the job was last changed, as a naive UTC datetime.
+    last_updated = Column(
+        DateTime(), default=datetime.utcnow, onupdate=datetime.utcnow, index=True
+    )
+
+    # Increases with every change to any job, for finding the jobs that have changed since
+    # a given change. Unlike last_updated, which is taken before the change is committed,
+    # changes are committed in the order of their sequence numbers, see _next_change_seq.
+    change_seq = Column(
+        Integer,
+        default=_next_change_seq,
+        onupdate=_next_change_seq,
+        index=True,
+    )
+
     # Repeat interval in seconds.
     interval = Column(Integer, default=0)
 
@@ -88,13 +149,163 @@ class ORMJob(Base):
     worker_thread = Column(String, nullable=True)
     worker_extra = Column(String, nullable=True)
 
-    __table_args__ = (Index("queue__scheduled_time", "queue", "scheduled_time"),)
+    # The resources that the job uses, inflated here for limiting how many jobs using
+    # each resource run at the same time. Stored as a comma delimited string, with
+    # leading and trailing commas so that each resource can be matched by ",resource,".
+    resources = Column(String, default="")
+
+    # The key that jobs of the same task that can be merged into one while they are queued
+    # share, if any.
+    batch_key = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("queue__scheduled_time", "queue", "scheduled_time"),
+        Index("func__batch_key", "func", "batch_key"),
+        # Covers the selection of the next queued job, in the order it is selected in,
+        # so that finding it does not have to scan or sort the finished jobs.
+        Index(
+            "state__priority__scheduled_time",
+            "state",
+            "priority",
+            "scheduled_time",
+            "time_created",
+        ),
+    )
+
+
+class ORMJobHistory(Base):
+    """
+    A summary of a finished job that has been removed from the jobs table
+    by compaction, to keep a record of what jobs have run.
+    """
+
+    __tablename__ = "job_history"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+
+    job_id = Column(String, index=True)
+
+    state = Column(String)
+
+    func = Column(String, index=True)
+
+    priority = Column(Integer)
+
+    queue = Column(String)
+
+    time_created = Column(DateTime(timezone=True))
+
+    # When the job finished, as a naive UTC datetime.
+    time_finished = Column(DateTime(), index=True)
+
+
+class ORMJobRun(Base):
+    """
+    The measurements of a single run of a job, for the metrics of each task.
+    """
+
+    __tablename__ = "job_runs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+
+    job_id = Column(String)
+
+    func = Column(String)
+
+    # The state the job finished running in.
+    state = Column(String)
+
+    # How long the job waited to start after it was scheduled to, in seconds.
+    queue_latency = Column(Float, nullable=True)
+
+    # How long the job ran for, in seconds.
+    duration = Column(Float)
+
+    # The change in the resident set size of the process that ran the job, in bytes.
+    rss_delta = Column(Integer, nullable=True)
+
+    # When the job finished running, as a naive UTC datetime.
+    time_finished = Column(DateTime(), index=True)
+
+    __table_args__ = (
+        # Covers finding the most recent runs of each task.
+        Index("func__id", "func", "id"),
+    )
+
+
+# The number of most recent runs of each task that are kept for its metrics.
+JOB_RUNS_MAX_COUNT = 1000
+
+
+def _summarize_job_runs(conn, column, runs, buckets):
+    """
+    Returns the count, mean, median, 95th percentile and maximum of the values of column
+    for the job runs matching the runs clause, and a histogram of them as a list of
+    [upper bound, count] pairs, with None as the last upper bound.
+    """
+    runs = runs & column.isnot(None)
+    row = conn.execute(
+        select(
+            sql_func.count(column),
+            sql_func.avg(column),
+            sql_func.max(column),
+            *(
+                sql_func.sum(case((column <= bound, 1), else_=0))
+                for bound in buckets[:-1]
+            )
+        ).where(runs)
+    ).one()
+    count, mean, maximum = row[:3]
+    # The values at or below each bound, from which each bucket's count is taken.
+    cumulative_counts = [at_or_below or 0 for at_or_below in row[3:]] + [count]
+    histogram = [
+        [None if bound == float("inf") else bound, at_or_below - previous]
+        for bound, at_or_below, previous in zip(
+            buckets, cumulative_counts, [0] + cumulative_counts[:-1]
+        )
+    ]
+    if not count:
+        return {
+            "count": 0,
+            "mean": None,
+            "p50": None,
+            "p95": None,
+            "max": None,
+            "histogram": histogram,
+        }
+
+    def percentile(percent):
+        index = int(round(percent / 100.0 * (count - 1)))
+        return conn.execute(
+            select(column).where(runs).order_by(column).offset(index).limit(1)
+        ).scalar()
+
+    return {
+        "count": count,
+        "mean": float(mean),
+        "p50": percentile(50),
+        "p95": percentile(95),
+        "max": maximum,
+        "histogram": histogram,
+    }
+
+
+FINISHED_STATES = (State.COMPLETED, State.FAILED, State.CANCELED)
 
 
 NO_VALUE = object()
 
 
+def _delimit_resources(resources):
+    return ",{},".format(",".join(resources)) if resources else ""
+
+
 class Storage(object):
+    # Progress updates for a job are written at most this often, in seconds. In between,
+    # the latest progress is held, and written with the next update to the job, such as a
+    # change of its state, or after the interval if there is none.
+    progress_flush_interval = 1
+
     def __init__(self, connection, Base=Base):
         self.engine = connection
         if self.engine.name == "sqlite":
@@ -103,6 +314,14 @@ class Storage(object):
         self.Base.metadata.create_all(self.engine)
         self.sessionmaker = sessionmaker(bind=self.engine)
         self._hooks = list(StorageHook.registered_hooks)
+        # Serializes the updates to jobs made through this storage, so that buffered
+        # progress is never written over a more recent update.
+        self._update_lock = threading.RLock()
+        # Key: job_id, Value: the progress values to write for the job
+        self._buffered_progress = {}
+        # Key: job_id, Value: when progress was last written for the job
+        self._progress_written_at = {}
+        self._progress_flush_timer = None
 
     @contextmanager
     def session_scope(self):
@@ -257,6 +476,74 @@ class Storage(object):
             job, queue=queue, priority=priority, retry_interval=retry_interval
         )
 
+    def enqueue_job_or_merge(
+        self,
+        job,
+        merge_fn=None,
+        queue=DEFAULT_QUEUE,
+        priority=Priority.REGULAR,
+        retry_interval=None,
+    ):
+        """
+        Enqueue the job, unless there is a queued job of the same task with the same batch key,
+        in which case the job is merged into that queued job instead. Jobs that are scheduled
+        for later, such as to retry them, and repeating jobs are never merged into.
+
+        :param merge_fn: A function that takes the queued job and the job being enqueued, and
+        returns the args and kwargs of the merged job. If None, the queued job is left as it is.
+        :return: the id of the enqueued or merged into job.
+        """
+        if job.batch_key is None:
+            return self.enqueue_job(
+                job, queue=queue, priority=priority, retry_interval=retry_interval
+            )
+
+        naive_utc_now = datetime.utcnow()
+        with self.session_scope() as session:
+            # Merging reads and writes back the queued job, so must not interleave with
+            # another merge into it.
+            self._begin_write(session)
+            orm_job = (
+                session.query(ORMJob)
+                .filter(ORMJob.func == job.func)
+                .filter(ORMJob.batch_key == job.batch_key)
+                .filter(ORMJob.queue == queue)
+                .filter(ORMJob.state == State.QUEUED)
+                .filter(ORMJob.scheduled_time <= naive_utc_now)
+                .filter(ORMJob.repeat == 0)
+                .order_by(ORMJob.scheduled_time)
+                .with_for_update()
+                .first()
+            )
+            if orm_job is not None:
+                queued_job = self._orm_to_job(orm_job)
+                if merge_fn is not None:
+                    queued_job.args, queued_job.kwargs = merge_fn(queued_job, job)
+                # Only merge into the job if it has not been started in the meantime.
+                merged = (
+                    session.query(ORMJob)
+                    .filter(ORMJob.id == orm_job.id)
+                    .filter(ORMJob.state == State.QUEUED)
+                    .update(
+                        {
+                            ORMJob.saved_job: queued_job.to_json(),
+                            ORMJob.priority: min(orm_job.priority, priority),
+                        },
+                        synchronize_session=False,
+                    )
+                )
+                if merged:
+                    logger.debug(
+                        "Merged job {} into queued job {}.".format(
+                            job.job_id, queued_job.job_id
+                        )
+                    )
+                    return queued_job.job_id
+
+        return self.enqueue_job(
+            job, queue=queue, priority=priority, retry_interval=retry_interval
+        )
+
     def mark_job_as_canceled(self, job_id):
         """
         Mark the job as canceled. Does not actually try to cancel a running job.
@@ -271,17 +558,24 @@ class Storage(object):
         :return: None
         """
         self._update_job(job_id, State.CANCELING)
+        notify(self.engine)
 
-    def _filter_next_query(self, query, priority):
+    def _filter_next_query(self, query, priority, exclude_resources=None):
         naive_utc_now = datetime.utcnow()
-        return (
+        query = (
             query.filter(ORMJob.state == State.QUEUED)
             .filter(ORMJob.scheduled_time <= naive_utc_now)
             .filter(ORMJob.priority <= priority)
-            .order_by(ORMJob.priority, ORMJob.scheduled_time, ORMJob.time_created)
+        )
+        for resource in exclude_resources or ():
+            query = query.filter(
+                ~ORMJob.resources.contains(_delimit_resources([resource]))
+            )
+        return query.order_by(
+            ORMJob.priority, ORMJob.scheduled_time, ORMJob.time_created
         )
 
-    def _postgres_next_queued_job(self, session, priority):
+    def _postgres_next_queued_job(self, session, priority, exclude_resources=None):
         """
         For postgres we are doing our best to ensure that the selected job
         is not then also selected by another potentially concurrent worker controller
@@ -292,7 +586,9 @@ class Storage(object):
         For SQLAlchemy details here: https://stackoverflow.com/a/25943713
         """
         subquery = (
-            self._filter_next_query(session.query(ORMJob.id), priority)
+            self._filter_next_query(
+                session.query(ORMJob.id), priority, exclude_resources
+            )
             .limit(1)
             .with_for_update(skip_locked=True)
         )
@@ -303,27 +599,33 @@ class Storage(object):
             .returning(ORMJob.saved_job)
         ).fetchone()
 
-    def _sqlite_next_queued_job(self, session, priority):
+    def _sqlite_next_queued_job(self, session, priority, exclude_resources=None):
         """
         Due to the difficulty in appropriately locking the task row
         we do not support multiple task runners potentially duelling
         to lock tasks for SQLite, so here we just do a minimal
         best effort to mark the job as selected for running.
         """
-        orm_job = self._filter_next_query(session.query(ORMJob), priority).first()
+        orm_job = self._filter_next_query(
+            session.query(ORMJob), priority, exclude_resources
+        ).first()
         if orm_job:
             orm_job.state = State.SELECTED
             session.add(orm_job)
         return orm_job
 
-    def get_next_queued_job(self, priority=Priority.REGULAR):
+    def get_next_queued_job(self, priority=Priority.REGULAR, exclude_resources=None):
+        """
+        Returns the next queued job to run, at priority or higher, and not using any of
+        the resources in exclude_resources, marking it as selected.
+        """
         with self.session_scope() as s:
             method = (
                 self._sqlite_next_queued_job
                 if self.engine.dialect.name == "sqlite"
                 else self._postgres_next_queued_job
             )
-            orm_job = method(s, priority)
+            orm_job = method(s, priority, exclude_resources)
 
             if orm_job:
                 job = self._orm_to_job(orm_job)
@@ -332,35 +634,98 @@ class Storage(object):
 
             return job
 
-    def filter_jobs(
-        self, queue=None, queues=None, state=None, repeating=None, func=None
+    def get_next_scheduled_time(self):
+        """
+        Returns the earliest scheduled time of the queued jobs, as a naive UTC datetime,
+        or None if there are no queued jobs.
+        """
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(sql_func.min(ORMJob.scheduled_time)).where(
+                    ORMJob.state == State.QUEUED
+                )
+            ).scalar()
+
+    def _filter_jobs_query(
+        self, q, queue=None, queues=None, state=None, repeating=None, func=None
     ):
         if queue and queues:
             raise ValueError("Cannot specify both queue and queues")
-        with self.engine.connect() as conn:
-            q = select(ORMJob)
 
-            if queue:
-                q = q.where(ORMJob.queue == queue)
+        if queue:
+            q = q.where(ORMJob.queue == queue)
 
-            if queues:
-                q = q.where(ORMJob.queue.in_(queues))
+        if queues:
+            q = q.where(ORMJob.queue.in_(queues))
 
-            if state:
-                q = q.where(ORMJob.state == state)
+        if state:
+            q = q.where(ORMJob.state == state)
 
-            if repeating is True:
-                q = q.where(or_(ORMJob.repeat > 0, ORMJob.repeat == None))  # noqa E711
-            elif repeating is False:
-                q = q.where(ORMJob.repeat == 0)
+        if repeating is True:
+            q = q.where(or_(ORMJob.repeat > 0, ORMJob.repeat == None))  # noqa E711
+        elif repeating is False:
+            q = q.where(ORMJob.repeat == 0)
 
-            if func:
-                q = q.where(ORMJob.func == func)
+        if func:
+            q = q.where(ORMJob.func == func)
+
+        return q
+
+    def filter_jobs(
+        self, queue=None, queues=None, state=None, repeating=None, func=None
+    ):
+        with self.engine.connect() as conn:
+            q = self._filter_jobs_query(
+                select(ORMJob),
+                queue=queue,
+                queues=queues,
+                state=state,
+                repeating=repeating,
+                func=func,
+            )
 
             orm_jobs = conn.execute(q)
 
             return [self._orm_to_job(o) for o in orm_jobs]
 
+    def get_last_change_seq(self):
+        """
+        Returns the change sequence number of the last change to a job, or None if no job has been changed.
+        """
+        with self.engine.connect() as conn:
+            return conn.execute(select(ORMJobChangeSeq.value)).scalar()
+
+    def wait_for_update(self, since, timeout, poll_interval=0.5):
+        """
+        Waits up to timeout seconds for a job to be changed after the change numbered since.
+        Only checks the last change sequence number, which is cheap, as change_seq is indexed.
+        Returns the last change sequence number.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            last_change_seq = self.get_last_change_seq()
+            if since is None or (
+                last_change_seq is not None and last_change_seq > since
+            ):
+                return last_change_seq
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return last_change_seq
+            time.sleep(min(poll_interval, remaining))
+
+    def get_updated_jobs(self, since, until, queue=None, repeating=None):
+        """
+        Returns a list of (job, orm_job) tuples for the jobs last changed after the change
+        numbered since, or for all jobs if since is None, and no later than the change numbered until.
+        """
+        with self.engine.connect() as conn:
+            q = self._filter_jobs_query(
+                select(ORMJob), queue=queue, repeating=repeating
+            ).where(ORMJob.change_seq <= until)
+            if since is not None:
+                q = q.where(ORMJob.change_seq > since)
+            return [(self._orm_to_job(o), o) for o in conn.execute(q)]
+
     def get_canceling_jobs(self, queues=None):
         return self.get_jobs_by_state(state=State.CANCELING, queues=queues)
 
@@ -419,12 +784,12 @@ class Storage(object):
             )
 
     def check_job_canceled(self, job_id):
-        try:
-            job = self.get_job(job_id)
-        except JobNotFound:
-            return True
+        with self.engine.connect() as conn:
+            state = conn.execute(
+                select(ORMJob.state).where(ORMJob.id == job_id)
+            ).scalar()
 
-        return job.state == State.CANCELED or job.state == State.CANCELING
+        return state is None or state == State.CANCELED or state == State.CANCELING
 
     def cancel(self, job_id):
         """
@@ -471,6 +836,8 @@ class Storage(object):
         :type force: bool
         :param force: If True, clear the job (or jobs), even if it hasn't completed, failed or been cancelled.
         """
+        if job_id:
+            self._discard_buffered_progress(job_id)
         with self.session_scope() as s:
             q = s.query(ORMJob)
             if queue:
@@ -494,11 +861,204 @@ class Storage(object):
                         hook.clear(job, orm_job)
             q.delete(synchronize_session=False)
 
+    def _get_jobs_to_compact(self, max_age, max_count, now):
+        """
+        Returns the ids of the finished jobs that finished more than max_age ago,
+        or that are not among the max_count most recently finished jobs of their func.
+        """
+        cutoff = now - max_age
+        job_ids = []
+        counts = {}
+        with self.engine.connect() as conn:
+            finished_jobs = conn.execute(
+                select(ORMJob.id, ORMJob.func, ORMJob.last_updated)
+                .where(ORMJob.state.in_(FINISHED_STATES))
+                .order_by(ORMJob.func, ORMJob.last_updated.desc())
+            )
+            for job_id, func, last_updated in finished_jobs:
+                counts[func] = counts.get(func, 0) + 1
+                if counts[func] > max_count or (
+                    last_updated is not None and last_updated < cutoff
+                ):
+                    job_ids.append(job_id)
+        return job_ids
+
+    def compact(
+        self,
+        max_age=timedelta(days=30),
+        max_count=100,
+        history_max_age=timedelta(days=365),
+        batch_size=500,
+    ):
+        """
+        Removes finished jobs that finished more than max_age ago, and all but the max_count
+        most recently finished jobs of each task, keeping a summary of each in the job history.
+        History and job run measurements older than history_max_age are removed.
+        Returns the number of jobs removed.
+        """
+        now = datetime.utcnow()
+        job_ids = self._get_jobs_to_compact(max_age, max_count, now)
+        for i in range(0, len(job_ids), batch_size):
+            batch = job_ids[i : i + batch_size]
+            with self.session_scope() as session:
+                # Only remove the jobs that are still finished, in case any have been restarted.
+                finished = ORMJob.id.in_(batch) & ORMJob.state.in_(FINISHED_STATES)
+                if self._hooks:
+                    for orm_job in session.query(ORMJob).filter(finished):
+                        job = self._orm_to_job(orm_job)
+                        for hook in self._hooks:
+                            hook.clear(job, orm_job)
+                session.execute(
+                    insert(ORMJobHistory).from_select(
+                        [
+                            "job_id",
+                            "state",
+                            "func",
+                            "priority",
+                            "queue",
+                            "time_created",
+                            "time_finished",
+                        ],
+                        select(
+                            ORMJob.id,
+                            ORMJob.state,
+                            ORMJob.func,
+                            ORMJob.priority,
+                            ORMJob.queue,
+                            ORMJob.time_created,
+                            ORMJob.last_updated,
+                        ).where(finished),
+                    )
+                )
+                session.execute(
+                    delete(ORMJob)
+                    .where(finished)
+                    .execution_options(synchronize_session=False)
+                )
+        with self.engine.begin() as conn:
+            conn.execute(
+                delete(ORMJobHistory).where(
+                    ORMJobHistory.time_finished < now - history_max_age
+                )
+            )
+            conn.execute(
+                delete(ORMJobRun).where(ORMJobRun.time_finished < now - history_max_age)
+            )
+        if job_ids:
+            logger.info("Compacted {} finished jobs.".format(len(job_ids)))
+        return len(job_ids)
+
+    def get_job_history(self, func=None):
+        """
+        Returns the summaries of compacted jobs, as dicts, most recently finished first.
+        """
+        with self.engine.connect() as conn:
+            q = select(ORMJobHistory).order_by(ORMJobHistory.time_finished.desc())
+            if func:
+                q = q.where(ORMJobHistory.func == func)
+            return [dict(row._mapping) for row in conn.execute(q)]
+
+    def record_job_run(self, job_id, func, state, duration, rss_delta=None):
+        """
+        Records the measurements of a run of the job that has just finished running,
+        along with how long it waited to start after it was scheduled to.
+        Failing to record them is logged rather than raised, so it never fails the job.
+        """
+        now = datetime.utcnow()
+        try:
+            with self.engine.begin() as conn:
+                scheduled_time = conn.execute(
+                    select(ORMJob.scheduled_time).where(ORMJob.id == job_id)
+                ).scalar()
+                queue_latency = None
+                if scheduled_time is not None:
+                    started = now - timedelta(seconds=duration)
+                    queue_latency = max((started - scheduled_time).total_seconds(), 0)
+                conn.execute(
+                    insert(ORMJobRun).values(
+                        job_id=job_id,
+                        func=func,
+                        state=state,
+                        queue_latency=queue_latency,
+                        duration=duration,
+                        rss_delta=rss_delta,
+                        time_finished=now,
+                    )
+                )
+                # Only keep the most recent runs of each task, so that the runs of
+                # frequently repeating tasks don't grow without bound.
+                oldest_kept_id = (
+                    select(ORMJobRun.id)
+                    .where(ORMJobRun.func == func)
+                    .order_by(ORMJobRun.id.desc())
+                    .offset(JOB_RUNS_MAX_COUNT - 1)
+                    .limit(1)
+                    .scalar_subquery()
+                )
+                conn.execute(
+                    delete(ORMJobRun).where(
+                        ORMJobRun.func == func, ORMJobRun.id < oldest_kept_id
+                    )
+                )
+        except SQLAlchemyError as e:
+            logger.warning("Could not record the run of job {}: {}".format(job_id, e))
+
+    def get_job_metrics(self, func=None, since=None):
+        """
+        Returns the metrics of the recorded runs of each task, or only of func, that finished
+        after the naive UTC datetime since, as a list of dicts sorted by func, with the number
+        of runs, failures and cancellations, the failure rate, and summaries with histograms
+        of the queue latency and run duration in seconds, and the memory usage change in bytes.
+        Only the most recent runs of each task are recorded, see JOB_RUNS_MAX_COUNT.
+        """
+        q = select(ORMJobRun.func).distinct().order_by(ORMJobRun.func)
+        if func:
+            q = q.where(ORMJobRun.func == func)
+        if since:
+            q = q.where(ORMJobRun.time_finished >= since)
+        metrics = []
+        with self.engine.connect() as conn:
+            for run_func in conn.execute(q).scalars().all():
+                runs = ORMJobRun.func == run_func
+                if since:
+                    runs = runs & (ORMJobRun.time_finished >= since)
+                count, failures, canceled = conn.execute(
+                    select(
+                        sql_func.count(ORMJobRun.id),
+                        sql_func.sum(
+                            case((ORMJobRun.state == State.FAILED, 1), else_=0)
+                        ),
+                        sql_func.sum(
+                            case((ORMJobRun.state == State.CANCELED, 1), else_=0)
+                        ),
+                    ).where(runs)
+                ).one()
+                metrics.append(
+                    {
+                        "func": run_func,
+                        "runs": count,
+                        "failures": failures,
+                        "canceled": canceled,
+                        "failure_rate": float(failures) / count,
+                        "queue_latency": _summarize_job_runs(
+                            conn, ORMJobRun.queue_latency, runs, TIME_BUCKETS
+                        ),
+                        "duration": _summarize_job_runs(
+                            conn, ORMJobRun.duration, runs, TIME_BUCKETS
+                        ),
+                        "rss_delta": _summarize_job_runs(
+                            conn, ORMJobRun.rss_delta, runs, MEMORY_BUCKETS
+                        ),
+                    }
+                )
+        return metrics
+
     def update_job_progress(
         self, job_id, progress, total_progress, extra_metadata=None
     ):
         """
         Update the job given by job_id's progress info.
+        Updates are coalesced, and written at most every progress_flush_interval seconds.
         :type total_progress: int
         :type progress: int
         :type job_id: str
@@ -513,7 +1073,39 @@ class Storage(object):
         }
         if extra_metadata is not None:
             kwargs["extra_metadata"] = extra_metadata
-        self._update_job(job_id, **kwargs)
+        with self._update_lock:
+            self._buffered_progress.setdefault(job_id, {}).update(kwargs)
+            written_at = self._progress_written_at.get(job_id)
+            if (
+                written_at is not None
+                and time.monotonic() - written_at < self.progress_flush_interval
+            ):
+                self._schedule_progress_flush()
+                return
+            # Writes the buffered progress.
+            self._update_job(job_id)
+
+    def _schedule_progress_flush(self):
+        if self._progress_flush_timer is None:
+            self._progress_flush_timer = threading.Timer(
+                self.progress_flush_interval, self.flush_progress
+            )
+            self._progress_flush_timer.daemon = True
+            self._progress_flush_timer.start()
+
+    def _discard_buffered_progress(self, job_id):
+        with self._update_lock:
+            self._buffered_progress.pop(job_id, None)
+            self._progress_written_at.pop(job_id, None)
+
+    def flush_progress(self):
+        """
+        Write the buffered progress of all jobs.
+        """
+        with self._update_lock:
+            self._progress_flush_timer = None
+            for job_id in list(self._buffered_progress):
+                self._update_job(job_id)
 
     def mark_job_as_failed(self, job_id, exception, traceback):
         """
@@ -535,6 +1127,7 @@ class Storage(object):
 
     def mark_job_as_queued(self, job_id):
         self._update_job(job_id, State.QUEUED)
+        notify(self.engine)
 
     def complete_job(self, job_id, result=None):
         self._update_job(job_id, State.COMPLETED, result=result)
@@ -662,9 +1255,33 @@ class Storage(object):
             self.schedule(new_scheduled_time, job, **kwargs)
 
     def _update_job(self, job_id, state=None, **kwargs):
+        with self._update_lock:
+            buffered_progress = self._buffered_progress.pop(job_id, None)
+            if buffered_progress:
+                kwargs = dict(buffered_progress, **kwargs)
+                self._progress_written_at[job_id] = time.monotonic()
+            if state is not None:
+                # The job has changed state, so its next progress update is written straight away.
+                self._progress_written_at.pop(job_id, None)
+            return self._write_job_update(job_id, state=state, **kwargs)
+
+    def _begin_write(self, session):
+        """
+        Start a write transaction before the job is read, so that the job is read and
+        written back in one transaction, and an update made to it by another process in
+        between, such as progress written from a process of the process pool, is not
+        written over with the values that were read before it. SQLite otherwise only starts
+        a transaction at the first write, and does not lock rows that are selected for update.
+        """
+        if self.engine.name == "sqlite":
+            session.execute(text("BEGIN IMMEDIATE"))
+
+    def _write_job_update(self, job_id, state=None, **kwargs):
         with self.session_scope() as session:
             try:
-                job, orm_job = self._get_job_and_orm_job(job_id, session)
+                job, orm_job = self._get_job_and_orm_job(
+                    job_id, session, for_update=True
+                )
                 if state is not None:
                     orm_job.state = job.state = state
                 for kwarg in kwargs:
@@ -699,8 +1316,12 @@ class Storage(object):
                         )
                     )
 
-    def _get_job_and_orm_job(self, job_id, session):
-        orm_job = session.query(ORMJob).filter_by(id=job_id).one_or_none()
+    def _get_job_and_orm_job(self, job_id, session, for_update=False):
+        query = session.query(ORMJob).filter_by(id=job_id)
+        if for_update:
+            self._begin_write(session)
+            query = query.with_for_update()
+        orm_job = query.one_or_none()
         if orm_job is None:
             raise JobNotFound()
         job = self._orm_to_job(orm_job)
@@ -801,6 +1422,8 @@ class Storage(object):
                 retry_interval=retry_interval,
                 scheduled_time=naive_utc_datetime(dt),
                 saved_job=job.to_json(),
+                resources=_delimit_resources(job.resources),
+                batch_key=job.batch_key,
             )
             session.merge(orm_job)
             try:
@@ -810,7 +1433,9 @@ class Storage(object):
 
             self._run_scheduled_hooks(orm_job)
 
-            return job.job_id
+        notify(self.engine)
+
+        return job.job_id
 
     def _run_scheduled_hooks(self, orm_job):
         job = self._orm_to_job(orm_job)
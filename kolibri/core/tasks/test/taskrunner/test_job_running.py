@@ -231,6 +231,22 @@ class TestJobStorage(object):
             assert time_spent < 5
         assert job.state == State.FAILED
 
+    def test_job_runs_are_recorded(self, storage_fixture, flag):
+        storage_fixture.enqueue_job(Job(set_flag, args=(flag.event_id,)))
+        storage_fixture.enqueue_job(Job(failing_func))
+
+        interval = 0.1
+        time_spent = 0
+        metrics = storage_fixture.get_job_metrics()
+        while sum(task_metrics["runs"] for task_metrics in metrics) < 2:
+            time.sleep(interval)
+            time_spent += interval
+            metrics = storage_fixture.get_job_metrics()
+            assert time_spent < 5
+        metrics = {task_metrics["func"]: task_metrics for task_metrics in metrics}
+        assert metrics[callable_to_import_path(set_flag)]["failure_rate"] == 0
+        assert metrics[callable_to_import_path(failing_func)]["failure_rate"] == 1
+
     def test_stringify_func_is_importable(self):
         funcstring = callable_to_import_path(set_flag)
         func = import_path_to_callable(funcstring)
@@ -0,0 +1,78 @@
+import os
+import time
+
+import pytest
+from sqlalchemy import create_engine
+
+from kolibri.core.tasks.notifications import _notify_wakeup_pipe
+from kolibri.core.tasks.notifications import Listener
+from kolibri.core.tasks.notifications import notify
+from kolibri.core.tasks.test.base import connection
+
+
+@pytest.fixture
+def engine():
+    with connection() as c:
+        yield c
+
+
+@pytest.fixture
+def listener(engine):
+    listener = Listener(engine)
+    yield listener
+    listener.close()
+
+
+def test_wait_times_out(listener):
+    start = time.time()
+    assert not listener.wait(0.1)
+    assert time.time() - start >= 0.1
+
+
+def test_notify_wakes_listener(engine, listener):
+    notify(engine)
+    assert listener.wait(1)
+    # The notification is consumed by the wait.
+    assert not listener.wait(0)
+
+
+def test_notify_wakes_all_listeners(engine, listener):
+    other_listener = Listener(engine)
+    try:
+        notify(engine)
+        assert listener.wait(1)
+        assert other_listener.wait(1)
+    finally:
+        other_listener.close()
+
+
+def test_notify_other_database(listener):
+    other_engine = create_engine("sqlite://")
+    notify(other_engine)
+    assert not listener.wait(0)
+
+
+def test_wake(listener):
+    listener.wake()
+    listener.wake()
+    assert listener.wait(1)
+    assert not listener.wait(0)
+
+
+def test_closed_listener_not_notified(engine):
+    listener = Listener(engine)
+    listener.close()
+    notify(engine)
+
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="Requires named pipes")
+def test_wakeup_pipe_notifies_other_processes(engine, listener):
+    # Only notify through the named pipe, as a process other than the listener's would.
+    _notify_wakeup_pipe(engine)
+    assert listener.wait(1)
+    assert not listener.wait(0)
+
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="Requires named pipes")
+def test_wakeup_pipe_without_listener(engine):
+    _notify_wakeup_pipe(engine)
@@ -1,18 +1,25 @@
 # -*- coding: utf-8 -*-
 import datetime
+import threading
 import time
 
 import pytest
 import pytz
 from mock import patch
+from sqlalchemy import event
+from sqlalchemy import insert
+from sqlalchemy import text
+from sqlalchemy import update
 
 from kolibri.core.tasks.constants import DEFAULT_QUEUE
 from kolibri.core.tasks.constants import Priority
+from kolibri.core.tasks.constants import Resource
 from kolibri.core.tasks.decorators import register_task
 from kolibri.core.tasks.exceptions import JobNotRestartable
 from kolibri.core.tasks.job import Job
 from kolibri.core.tasks.job import State
 from kolibri.core.tasks.registry import TaskRegistry
+from kolibri.core.tasks.storage import ORMJob
 from kolibri.core.tasks.storage import Storage
 from kolibri.core.tasks.test.base import connection
 from kolibri.core.tasks.utils import callable_to_import_path
@@ -60,6 +67,124 @@ class TestBackend:
         # Does the job have the right state (QUEUED)?
         assert new_job.state == State.QUEUED
 
+    def test_update_not_written_over_by_concurrent_update(
+        self, defaultbackend, simplejob
+    ):
+        job_id = defaultbackend.enqueue_job(simplejob, QUEUE)
+        # Another storage for the same database, like that of a process of the process pool.
+        other_backend = Storage(defaultbackend.engine)
+        read = threading.Event()
+        get_job_and_orm_job = Storage._get_job_and_orm_job
+
+        def slow_get_job_and_orm_job(storage, *args, **kwargs):
+            result = get_job_and_orm_job(storage, *args, **kwargs)
+            if storage is defaultbackend:
+                read.set()
+                time.sleep(0.5)
+            return result
+
+        with patch.object(Storage, "_get_job_and_orm_job", slow_get_job_and_orm_job):
+            thread = threading.Thread(
+                target=defaultbackend.mark_job_as_canceling, args=(job_id,)
+            )
+            thread.start()
+            read.wait(5)
+            # Written while the job is being updated by the other storage.
+            other_backend.update_job_progress(job_id, 1, 2)
+            thread.join()
+
+        job = defaultbackend.get_job(job_id)
+        assert job.state == State.CANCELING
+        assert job.progress == 1
+
+    def test_enqueue_job_or_merge(self, defaultbackend, func):
+        def merge_fn(queued_job, job):
+            ids = sorted(set(queued_job.kwargs["ids"]) | set(job.kwargs["ids"]))
+            return queued_job.args, {"ids": ids}
+
+        job_ids = [
+            defaultbackend.enqueue_job_or_merge(
+                Job(func, kwargs={"ids": ids}, batch_key="batch"),
+                merge_fn=merge_fn,
+                queue=QUEUE,
+                priority=priority,
+            )
+            for ids, priority in (
+                (["a"], Priority.REGULAR),
+                (["b", "c"], Priority.HIGH),
+                (["a", "d"], Priority.REGULAR),
+            )
+        ]
+        other_job_id = defaultbackend.enqueue_job_or_merge(
+            Job(func, kwargs={"ids": ["e"]}, batch_key="other"),
+            merge_fn=merge_fn,
+            queue=QUEUE,
+        )
+
+        assert len(set(job_ids)) == 1
+        assert len(defaultbackend) == 2
+        job = defaultbackend.get_job(job_ids[0])
+        assert job.kwargs == {"ids": ["a", "b", "c", "d"]}
+        assert job.batch_key == "batch"
+        assert defaultbackend.get_orm_job(job_ids[0]).priority == Priority.HIGH
+        assert defaultbackend.get_job(other_job_id).kwargs == {"ids": ["e"]}
+
+    def test_enqueue_job_or_merge_not_queued(self, defaultbackend, func):
+        job_id = defaultbackend.enqueue_job_or_merge(
+            Job(func, batch_key="batch"), queue=QUEUE
+        )
+        defaultbackend.get_next_queued_job()
+
+        new_job_id = defaultbackend.enqueue_job_or_merge(
+            Job(func, batch_key="batch"), queue=QUEUE
+        )
+
+        assert new_job_id != job_id
+        assert defaultbackend.get_job(new_job_id).state == State.QUEUED
+
+    def test_enqueue_job_or_merge_not_scheduled_or_repeating(
+        self, defaultbackend, func
+    ):
+        scheduled_job_id = defaultbackend.enqueue_in(
+            datetime.timedelta(hours=1), Job(func, batch_key="batch"), queue=QUEUE
+        )
+        repeating_job_id = defaultbackend.enqueue_at(
+            local_now(),
+            Job(func, batch_key="batch"),
+            queue=QUEUE,
+            interval=60,
+            repeat=None,
+        )
+
+        new_job_id = defaultbackend.enqueue_job_or_merge(
+            Job(func, batch_key="batch"), queue=QUEUE
+        )
+
+        assert new_job_id not in (scheduled_job_id, repeating_job_id)
+        assert len(defaultbackend) == 3
+        # Jobs that are due and do not repeat are still merged into.
+        assert (
+            defaultbackend.enqueue_job_or_merge(
+                Job(func, batch_key="batch"), queue=QUEUE
+            )
+            == new_job_id
+        )
+
+    def test_enqueue_job_or_merge_no_batch_key(self, defaultbackend, func):
+        job_ids = {
+            defaultbackend.enqueue_job_or_merge(Job(func), queue=QUEUE)
+            for _ in range(2)
+        }
+
+        assert len(job_ids) == 2
+
+    def test_check_job_canceled(self, defaultbackend, simplejob):
+        job_id = defaultbackend.enqueue_job(simplejob, QUEUE)
+        assert not defaultbackend.check_job_canceled(job_id)
+        defaultbackend.mark_job_as_canceling(job_id)
+        assert defaultbackend.check_job_canceled(job_id)
+        assert defaultbackend.check_job_canceled("nonexistent")
+
     def test_can_cancel_nonrunning_job(self, defaultbackend, simplejob):
         job_id = defaultbackend.enqueue_job(simplejob, QUEUE)
 
@@ -129,6 +254,101 @@ class TestBackend:
         job = defaultbackend.get_job(job_id)
         assert job.cancellable, "Job is not cancellable default"
 
+    def test_get_next_queued_job_excludes_resources(self, defaultbackend, func):
+        disk_job_id = defaultbackend.enqueue_job(
+            Job(func, resources=[Resource.NETWORK, Resource.DISK]), QUEUE
+        )
+        network_job_id = defaultbackend.enqueue_job(
+            Job(func, resources=[Resource.NETWORK]), QUEUE
+        )
+        other_job_id = defaultbackend.enqueue_job(Job(func), QUEUE)
+
+        job = defaultbackend.get_next_queued_job(exclude_resources=[Resource.DISK])
+        assert job.job_id == network_job_id
+        assert job.resources == [Resource.NETWORK]
+
+        job = defaultbackend.get_next_queued_job(
+            exclude_resources=[Resource.DISK, Resource.NETWORK]
+        )
+        assert job.job_id == other_job_id
+
+        assert defaultbackend.get_next_queued_job().job_id == disk_job_id
+
+    def test_change_seq(self, defaultbackend, simplejob):
+        job_id = defaultbackend.enqueue_job(simplejob, QUEUE)
+        created = defaultbackend.get_orm_job(job_id).change_seq
+        assert created is not None
+        assert defaultbackend.get_last_change_seq() == created
+
+        defaultbackend.mark_job_as_running(job_id)
+        updated = defaultbackend.get_orm_job(job_id).change_seq
+        assert updated > created
+        assert defaultbackend.get_last_change_seq() == updated
+
+    def test_change_seq_increases_across_jobs(self, defaultbackend, func):
+        job_ids = [defaultbackend.enqueue_job(Job(func), QUEUE) for _ in range(3)]
+        defaultbackend.mark_job_as_running(job_ids[0])
+        # Even when updated in the same millisecond as another job was inserted,
+        # every change gets a later sequence number.
+        change_seqs = [
+            defaultbackend.get_orm_job(job_id).change_seq for job_id in job_ids
+        ]
+        assert change_seqs[1] < change_seqs[2] < change_seqs[0]
+
+    def test_change_seq_not_reused_after_clear(self, defaultbackend, func):
+        defaultbackend.enqueue_job(Job(func), QUEUE)
+        job_id = defaultbackend.enqueue_job(Job(func), QUEUE)
+        defaultbackend.complete_job(job_id)
+        since = defaultbackend.get_last_change_seq()
+        defaultbackend.clear(job_id=job_id)
+
+        new_job_id = defaultbackend.enqueue_job(Job(func), QUEUE)
+        assert defaultbackend.get_orm_job(new_job_id).change_seq > since
+        assert [
+            job.job_id
+            for job, _ in defaultbackend.get_updated_jobs(
+                since, defaultbackend.get_last_change_seq()
+            )
+        ] == [new_job_id]
+
+    def test_get_updated_jobs(self, defaultbackend, func):
+        unchanged_job_id = defaultbackend.enqueue_job(Job(func), QUEUE)
+        changed_job_id = defaultbackend.enqueue_job(Job(func), QUEUE)
+        since = defaultbackend.get_last_change_seq()
+        defaultbackend.mark_job_as_running(changed_job_id)
+        until = defaultbackend.get_last_change_seq()
+
+        updated = defaultbackend.get_updated_jobs(since, until)
+        assert [job.job_id for job, _ in updated] == [changed_job_id]
+        assert updated[0][1].change_seq == until
+
+        assert {
+            job.job_id for job, _ in defaultbackend.get_updated_jobs(None, until)
+        } == {unchanged_job_id, changed_job_id}
+        assert defaultbackend.get_updated_jobs(until, until) == []
+        assert {job.job_id for job in defaultbackend.get_all_jobs()} == {
+            unchanged_job_id,
+            changed_job_id,
+        }
+
+    def test_wait_for_update_times_out(self, defaultbackend, simplejob):
+        defaultbackend.enqueue_job(simplejob, QUEUE)
+        since = defaultbackend.get_last_change_seq()
+        start = time.time()
+        assert defaultbackend.wait_for_update(since, 0.3, poll_interval=0.1) == since
+        assert time.time() - start >= 0.3
+
+    def test_wait_for_update_returns_on_change(self, defaultbackend, simplejob):
+        job_id = defaultbackend.enqueue_job(simplejob, QUEUE)
+        since = defaultbackend.get_last_change_seq()
+        timer = threading.Timer(0.2, defaultbackend.mark_job_as_running, (job_id,))
+        timer.start()
+        start = time.time()
+        last_change_seq = defaultbackend.wait_for_update(since, 10, poll_interval=0.05)
+        timer.join()
+        assert last_change_seq > since
+        assert time.time() - start < 5
+
     def test_can_get_high_priority_job_first(self, defaultbackend, simplejob):
         job_id = defaultbackend.enqueue_job(simplejob, QUEUE, Priority.HIGH)
 
@@ -659,3 +879,313 @@ class TestBackend:
         assert requeued_orm_job.priority == priority
         assert requeued_orm_job.repeat == repeat - 1
         assert requeued_orm_job.retry_interval == retry_interval
+
+
+@pytest.fixture
+def commit_counter(defaultbackend):
+    commits = []
+
+    def count(conn):
+        commits.append(conn)
+
+    event.listen(defaultbackend.engine, "commit", count)
+    yield commits
+    event.remove(defaultbackend.engine, "commit", count)
+
+
+class TestProgressBuffering:
+    def test_first_progress_update_written(self, defaultbackend, simplejob):
+        job_id = defaultbackend.enqueue_job(simplejob, QUEUE)
+        defaultbackend.update_job_progress(job_id, 1, 10)
+        assert defaultbackend.get_job(job_id).progress == 1
+
+    def test_progress_updates_coalesced(
+        self, defaultbackend, simplejob, commit_counter
+    ):
+        job_id = defaultbackend.enqueue_job(simplejob, QUEUE)
+        defaultbackend.progress_flush_interval = 60
+        del commit_counter[:]
+        for progress in range(1, 101):
+            defaultbackend.update_job_progress(job_id, progress, 100)
+        assert len(commit_counter) == 1
+        assert defaultbackend.get_job(job_id).progress == 1
+        defaultbackend.flush_progress()
+        assert len(commit_counter) == 2
+        job = defaultbackend.get_job(job_id)
+        assert job.progress == 100
+        assert job.total_progress == 100
+
+    def test_progress_flushed_on_state_transition(self, defaultbackend, simplejob):
+        job_id = defaultbackend.enqueue_job(simplejob, QUEUE)
+        defaultbackend.progress_flush_interval = 60
+        defaultbackend.update_job_progress(job_id, 1, 10)
+        defaultbackend.update_job_progress(
+            job_id, 10, 10, extra_metadata={"file_size": 5}
+        )
+        defaultbackend.complete_job(job_id)
+        job = defaultbackend.get_job(job_id)
+        assert job.state == State.COMPLETED
+        assert job.progress == 10
+        assert job.extra_metadata == {"file_size": 5}
+        assert not defaultbackend._buffered_progress
+
+    def test_progress_flushed_after_interval(self, defaultbackend, simplejob):
+        job_id = defaultbackend.enqueue_job(simplejob, QUEUE)
+        defaultbackend.progress_flush_interval = 0.1
+        defaultbackend.update_job_progress(job_id, 1, 10)
+        defaultbackend.update_job_progress(job_id, 5, 10)
+        assert defaultbackend.get_job(job_id).progress == 1
+        time.sleep(0.5)
+        assert defaultbackend.get_job(job_id).progress == 5
+
+    def test_clear_discards_buffered_progress(self, defaultbackend, simplejob):
+        job_id = defaultbackend.enqueue_job(simplejob, QUEUE)
+        defaultbackend.progress_flush_interval = 60
+        defaultbackend.update_job_progress(job_id, 1, 10)
+        defaultbackend.update_job_progress(job_id, 5, 10)
+        defaultbackend.clear(job_id=job_id, force=True)
+        assert job_id not in defaultbackend._buffered_progress
+
+    def test_transactions_per_import(self, defaultbackend, simplejob, commit_counter):
+        """
+        The progress updates of an import of 1000 files make a transaction each without
+        buffering, and only a few with it.
+        """
+        updates = 1000
+        results = {}
+        for interval in (0, 1):
+            job_id = defaultbackend.enqueue_job(Job(simplejob.func), QUEUE)
+            defaultbackend.progress_flush_interval = interval
+            defaultbackend.mark_job_as_running(job_id)
+            del commit_counter[:]
+            for progress in range(1, updates + 1):
+                defaultbackend.update_job_progress(job_id, progress, updates)
+            defaultbackend.complete_job(job_id)
+            results[interval] = len(commit_counter)
+            assert defaultbackend.get_job(job_id).progress == updates
+        assert results[0] == updates + 1
+        assert results[1] < updates / 10
+
+
+def _finish_job(backend, job, finished_at):
+    job_id = backend.enqueue_job(job, QUEUE)
+    backend.complete_job(job_id)
+    with backend.engine.begin() as conn:
+        conn.execute(
+            update(ORMJob).where(ORMJob.id == job_id).values(last_updated=finished_at)
+        )
+    return job_id
+
+
+class TestCompaction:
+    def test_compact_old_jobs(self, defaultbackend, func):
+        now = datetime.datetime.utcnow()
+        old_job_id = _finish_job(
+            defaultbackend, Job(func), now - datetime.timedelta(days=40)
+        )
+        recent_job_id = _finish_job(
+            defaultbackend, Job(func), now - datetime.timedelta(days=1)
+        )
+        queued_job_id = defaultbackend.enqueue_job(Job(func), QUEUE)
+
+        assert defaultbackend.compact(max_age=datetime.timedelta(days=30)) == 1
+
+        assert {job.job_id for job in defaultbackend.get_all_jobs()} == {
+            recent_job_id,
+            queued_job_id,
+        }
+        history = defaultbackend.get_job_history()
+        assert len(history) == 1
+        assert history[0]["job_id"] == old_job_id
+        assert history[0]["state"] == State.COMPLETED
+        assert history[0]["func"] == callable_to_import_path(func)
+        assert history[0]["queue"] == QUEUE
+
+    def test_compact_keeps_most_recent_per_func(self, defaultbackend, func):
+        now = datetime.datetime.utcnow()
+        job_ids = [
+            _finish_job(defaultbackend, Job(func), now - datetime.timedelta(hours=i))
+            for i in range(5)
+        ]
+        other_job_id = _finish_job(
+            defaultbackend, Job(open), now - datetime.timedelta(hours=10)
+        )
+
+        assert defaultbackend.compact(max_count=2) == 3
+
+        assert {job.job_id for job in defaultbackend.get_all_jobs()} == set(
+            job_ids[:2]
+        ) | {other_job_id}
+        assert [h["job_id"] for h in defaultbackend.get_job_history()] == job_ids[2:]
+
+    def test_change_seq_not_reused_after_compact(self, defaultbackend, func):
+        now = datetime.datetime.utcnow()
+        _finish_job(defaultbackend, Job(func), now - datetime.timedelta(days=1))
+        _finish_job(defaultbackend, Job(func), now - datetime.timedelta(days=40))
+        since = defaultbackend.get_last_change_seq()
+
+        assert defaultbackend.compact(max_age=datetime.timedelta(days=30)) == 1
+
+        new_job_id = defaultbackend.enqueue_job(Job(func), QUEUE)
+        assert defaultbackend.get_orm_job(new_job_id).change_seq > since
+
+    def test_compact_prunes_history(self, defaultbackend, func):
+        now = datetime.datetime.utcnow()
+        _finish_job(defaultbackend, Job(func), now - datetime.timedelta(days=400))
+        _finish_job(defaultbackend, Job(func), now - datetime.timedelta(days=40))
+
+        defaultbackend.compact(
+            max_age=datetime.timedelta(days=30),
+            history_max_age=datetime.timedelta(days=365),
+        )
+
+        assert len(defaultbackend.get_job_history()) == 1
+
+    def test_next_queued_job_with_history(self, defaultbackend, func):
+        """
+        Selects the next queued job with 100k finished jobs in storage, before and after compaction.
+        """
+        count = 100000
+        now = datetime.datetime.utcnow()
+        saved_job = Job(func, state=State.COMPLETED).to_json()
+        with defaultbackend.engine.begin() as conn:
+            conn.execute(
+                insert(ORMJob),
+                [
+                    {
+                        "id": "finished{}".format(i),
+                        "state": State.COMPLETED,
+                        "func": "kolibri.core.tasks.test.func{}".format(i % 10),
+                        "priority": Priority.REGULAR,
+                        "queue": QUEUE,
+                        "saved_job": saved_job,
+                        "scheduled_time": now - datetime.timedelta(seconds=i),
+                        "last_updated": now - datetime.timedelta(minutes=i),
+                        "resources": "",
+                    }
+                    for i in range(count)
+                ],
+            )
+        if defaultbackend.engine.name == "sqlite":
+            with defaultbackend.engine.connect() as conn:
+                plan = " ".join(
+                    str(row)
+                    for row in conn.execute(
+                        text(
+                            "EXPLAIN QUERY PLAN SELECT id FROM jobs WHERE state = 'QUEUED' "
+                            "AND scheduled_time <= '2100-01-01' AND priority <= 10 "
+                            "ORDER BY priority, scheduled_time, time_created LIMIT 1"
+                        )
+                    )
+                )
+            assert "state__priority__scheduled_time" in plan
+            assert "TEMP B-TREE" not in plan
+
+        def assert_next_queued_job():
+            job_id = defaultbackend.enqueue_job(Job(func), QUEUE)
+            assert defaultbackend.get_next_queued_job().job_id == job_id
+            defaultbackend.clear(job_id=job_id, force=True)
+
+        assert_next_queued_job()
+        compacted = defaultbackend.compact()
+        assert_next_queued_job()
+        # Only the 100 most recent jobs of each of the 10 funcs are kept.
+        assert len(defaultbackend) == 1000
+        assert compacted == count - 1000
+
+
+class TestJobMetrics:
+    def test_get_job_metrics(self, defaultbackend, func):
+        job_ids = [defaultbackend.enqueue_job(Job(func), QUEUE) for _ in range(4)]
+        for job_id, state, duration in zip(
+            job_ids,
+            (State.COMPLETED, State.COMPLETED, State.FAILED, State.CANCELED),
+            (0.05, 2, 30, 0.5),
+        ):
+            defaultbackend.record_job_run(
+                job_id, callable_to_import_path(func), state, duration, rss_delta=1024
+            )
+        defaultbackend.record_job_run(
+            defaultbackend.enqueue_job(Job(open), QUEUE),
+            callable_to_import_path(open),
+            State.COMPLETED,
+            1,
+        )
+
+        metrics = defaultbackend.get_job_metrics(func=callable_to_import_path(func))
+
+        assert len(metrics) == 1
+        task_metrics = metrics[0]
+        assert task_metrics["runs"] == 4
+        assert task_metrics["failures"] == 1
+        assert task_metrics["canceled"] == 1
+        assert task_metrics["failure_rate"] == 0.25
+        assert task_metrics["duration"]["max"] == 30
+        assert task_metrics["duration"]["p50"] == 2
+        assert task_metrics["duration"]["p95"] == 30
+        assert task_metrics["duration"]["mean"] == pytest.approx(8.1375)
+        assert [count for _, count in task_metrics["duration"]["histogram"]] == [
+            1,
+            1,
+            1,
+            1,
+            0,
+            0,
+            0,
+        ]
+        assert task_metrics["queue_latency"]["count"] == 4
+        assert task_metrics["rss_delta"]["max"] == 1024
+        assert len(defaultbackend.get_job_metrics()) == 2
+
+    def test_get_job_metrics_since(self, defaultbackend, func):
+        job_id = defaultbackend.enqueue_job(Job(func), QUEUE)
+        defaultbackend.record_job_run(
+            job_id, callable_to_import_path(func), State.COMPLETED, 1
+        )
+
+        assert (
+            defaultbackend.get_job_metrics(
+                since=datetime.datetime.utcnow() + datetime.timedelta(minutes=1)
+            )
+            == []
+        )
+
+    def test_record_job_run_keeps_most_recent_runs(self, defaultbackend, func):
+        job_id = defaultbackend.enqueue_job(Job(func), QUEUE)
+        with patch("kolibri.core.tasks.storage.JOB_RUNS_MAX_COUNT", 3):
+            for duration in range(5):
+                defaultbackend.record_job_run(
+                    job_id, callable_to_import_path(func), State.COMPLETED, duration
+                )
+        defaultbackend.record_job_run(
+            defaultbackend.enqueue_job(Job(open), QUEUE),
+            callable_to_import_path(open),
+            State.COMPLETED,
+            1,
+        )
+
+        metrics = defaultbackend.get_job_metrics(func=callable_to_import_path(func))
+        assert metrics[0]["runs"] == 3
+        assert metrics[0]["duration"]["p50"] == 3
+        assert len(defaultbackend.get_job_metrics()) == 2
+
+    def test_record_job_run_queue_latency(self, defaultbackend, func):
+        job_id = defaultbackend.enqueue_in(
+            datetime.timedelta(seconds=-10), Job(func), QUEUE
+        )
+        defaultbackend.record_job_run(
+            job_id, callable_to_import_path(func), State.COMPLETED, 2
+        )
+
+        queue_latency = defaultbackend.get_job_metrics()[0]["queue_latency"]
+        assert 7 < queue_latency["max"] < 10
+
+    def test_compact_prunes_job_runs(self, defaultbackend, func):
+        job_id = defaultbackend.enqueue_job(Job(func), QUEUE)
+        defaultbackend.record_job_run(
+            job_id, callable_to_import_path(func), State.COMPLETED, 1
+        )
+
+        defaultbackend.compact(history_max_age=datetime.timedelta(days=-1))
+
+        assert defaultbackend.get_job_metrics() == []
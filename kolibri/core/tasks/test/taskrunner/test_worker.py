@@ -1,15 +1,30 @@
 # -*- coding: utf-8 -*-
+import datetime
+import logging
+import os
+import queue
 import time
 
 import pytest
+from mock import Mock
+from mock import patch
 
+from kolibri.core.tasks.constants import Execution
 from kolibri.core.tasks.constants import Priority
+from kolibri.core.tasks.constants import Resource
+from kolibri.core.tasks.decorators import register_task
 from kolibri.core.tasks.job import Job
 from kolibri.core.tasks.job import State
 from kolibri.core.tasks.test.base import connection
 from kolibri.core.tasks.test.taskrunner.test_job_running import EventProxy
+from kolibri.core.tasks.utils import clear_cancel_request
+from kolibri.core.tasks.utils import get_current_job
+from kolibri.core.tasks.utils import is_cancel_requested
 from kolibri.core.tasks.worker import Worker
 from kolibri.utils import conf
+from kolibri.utils.multiprocessing_compat import use_process_pool
+
+logger = logging.getLogger(__name__)
 
 QUEUE = "pytest"
 
@@ -25,6 +40,40 @@ def error_func():
     raise TypeError(error_text)
 
 
+@register_task(execution=Execution.PROCESS, track_progress=True, cancellable=True)
+def process_task(wait=False):
+    """
+    Task that runs in a process, and records the process it ran in.
+    If wait is True, runs until it is canceled.
+    """
+    job = get_current_job()
+    job.update_metadata(pid=os.getpid())
+    logger.info("Process task running in {}".format(os.getpid()))
+    job.update_progress(1, 2)
+    while wait:
+        job.check_for_cancel()
+        time.sleep(0.05)
+    job.update_progress(2, 2)
+
+
+def wait_for_state(storage, job_id, states, timeout=10):
+    start = time.time()
+    job = storage.get_job(job_id)
+    while job.state not in states and time.time() - start < timeout:
+        time.sleep(0.05)
+        job = storage.get_job(job_id)
+    return job
+
+
+def wait_for_progress(storage, job_id, progress, timeout=10):
+    start = time.time()
+    job = storage.get_job(job_id)
+    while job.progress < progress and time.time() - start < timeout:
+        time.sleep(0.05)
+        job = storage.get_job(job_id)
+    return job
+
+
 @pytest.fixture
 def flag():
     e = EventProxy()
@@ -182,3 +231,155 @@ class TestWorker:
 
         # Worker must get this job since its a 'high' priority job.
         assert isinstance(job, Job) is True
+
+    def test_jobs_wait_when_resource_limit_reached(self, worker):
+        # Stop the job checker, so that it does not start the jobs first.
+        worker.job_checker.stop()
+        worker.listener.wake()
+        worker.job_checker.join()
+        worker.resource_limits = {Resource.DISK: 1}
+        running_job = Job(id, args=(9,), resources=[Resource.DISK, Resource.NETWORK])
+        worker.job_future_mapping = {"future": running_job}
+
+        disk_job = Job(id, args=(10,), resources=[Resource.DISK])
+        worker.storage.enqueue_job(disk_job, QUEUE)
+        network_job = Job(id, args=(11,), resources=[Resource.NETWORK])
+        worker.storage.enqueue_job(network_job, QUEUE)
+
+        job = worker.get_next_job()
+        # The disk job has to wait for the running job to finish, but not the network job.
+        assert job.job_id == network_job.job_id
+        assert worker.get_next_job() is None
+
+        worker.job_future_mapping.clear()
+        assert worker.get_next_job().job_id == disk_job.job_id
+
+    def test_enqueue_to_start_latency(self, worker):
+        # Give the job checker time to check the empty queue and start waiting.
+        time.sleep(0.2)
+        job = Job(id, args=(9,))
+        start = time.time()
+        worker.storage.enqueue_job(job, QUEUE)
+
+        while worker.storage.get_job(job.job_id).state == State.QUEUED:
+            time.sleep(0.005)
+        latency = time.time() - start
+
+        logger.info("Job started {:.3f}s after being enqueued".format(latency))
+        # The job is started on notification, well before the fallback check.
+        assert latency < worker.fallback_interval / 2
+
+    def test_cancel_is_notified(self, worker):
+        time.sleep(0.2)
+        with patch.object(worker, "cancel") as cancel:
+            worker.future_job_mapping["job_id"] = "future"
+            job = Job(id, args=(9,), job_id="job_id")
+            worker.storage.schedule(
+                worker.storage._now() + datetime.timedelta(hours=1), job, QUEUE
+            )
+            worker.storage.mark_job_as_canceling("job_id")
+            start = time.time()
+            while not cancel.called and time.time() - start < 2:
+                time.sleep(0.005)
+            worker.future_job_mapping.clear()
+        cancel.assert_called_with("job_id")
+
+    def test_cancel_running_job_requests_cancel(self, worker):
+        future = Mock()
+        future.cancel.return_value = False
+        worker.future_job_mapping["job_id"] = future
+        try:
+            assert not worker.cancel("job_id")
+            assert is_cancel_requested("job_id")
+        finally:
+            worker.future_job_mapping.clear()
+            clear_cancel_request("job_id")
+
+    def test_finished_job_cancel_request_cleared(self, worker):
+        future = Mock()
+        job = Job(id, job_id="job_id")
+        worker.job_future_mapping[future] = job
+        worker.future_job_mapping["job_id"] = future
+        worker.cancel("job_id")
+        worker.handle_finished_future(future)
+        assert not is_cancel_requested("job_id")
+
+    def test_idle_query_rate(self, worker):
+        time.sleep(0.2)
+        with patch.object(
+            worker.storage,
+            "get_next_queued_job",
+            wraps=worker.storage.get_next_queued_job,
+        ) as get_next_queued_job, patch.object(
+            worker.storage,
+            "get_canceling_jobs",
+            wraps=worker.storage.get_canceling_jobs,
+        ) as get_canceling_jobs:
+            time.sleep(1)
+        queries = get_next_queued_job.call_count + get_canceling_jobs.call_count
+        logger.info("Idle worker made {} job queries in 1s".format(queries))
+        # Polling every 0.2s would have made 10 queries.
+        assert queries <= 2
+
+
+@pytest.mark.skipif(not use_process_pool(), reason="Requires a process pool")
+class TestProcessExecution:
+    def test_thread_task_uses_workers(self, worker):
+        assert worker.get_workers(Job(id, args=(9,))) is worker.workers
+        assert worker.process_workers is None
+
+    def test_process_task_runs_in_process(self, worker):
+        job = Job(process_task, track_progress=True)
+        worker.storage.enqueue_job(job, QUEUE)
+
+        job = wait_for_state(
+            worker.storage, job.job_id, {State.COMPLETED, State.FAILED}
+        )
+
+        assert job.state == State.COMPLETED
+        assert worker.process_workers is not None
+        assert job.extra_metadata["pid"] != os.getpid()
+        assert job.progress == 2
+        assert job.total_progress == 2
+
+    def test_process_task_can_be_canceled(self, worker):
+        job = Job(
+            process_task, kwargs={"wait": True}, cancellable=True, track_progress=True
+        )
+        worker.storage.enqueue_job(job, QUEUE)
+
+        job = wait_for_state(worker.storage, job.job_id, {State.RUNNING})
+        assert job.state == State.RUNNING
+        # The task reports its progress once the process has imported and started it.
+        job = wait_for_progress(worker.storage, job.job_id, 1)
+        assert job.progress == 1
+        worker.storage.mark_job_as_canceling(job.job_id)
+
+        job = wait_for_state(worker.storage, job.job_id, {State.CANCELED})
+        assert job.state == State.CANCELED
+        assert job.progress == 1
+
+    def test_process_task_logs_forwarded(self):
+        log_queue = queue.Queue()
+        with connection() as c:
+            worker = Worker(c, regular_workers=1, high_workers=1, log_queue=log_queue)
+            try:
+                job = Job(process_task, track_progress=True)
+                worker.storage.enqueue_job(job, QUEUE)
+                wait_for_state(
+                    worker.storage, job.job_id, {State.COMPLETED, State.FAILED}
+                )
+                messages = []
+                start = time.time()
+                while time.time() - start < 5:
+                    try:
+                        record = log_queue.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                    messages.append(record.getMessage())
+                    if "Process task running" in messages[-1]:
+                        break
+            finally:
+                worker.storage.clear(force=True)
+                worker.shutdown()
+        assert any("Process task running" in message for message in messages)
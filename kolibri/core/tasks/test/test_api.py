@@ -1,4 +1,5 @@
 import datetime
+import threading
 
 import pytz
 from django.urls import reverse
@@ -17,6 +18,7 @@ from kolibri.core.auth.models import FacilityUser
 from kolibri.core.auth.test.test_api import FacilityUserFactory
 from kolibri.core.device.models import DevicePermissions
 from kolibri.core.device.models import DeviceSettings
+from kolibri.core.tasks.api import MAX_CHANGES_TIMEOUT
 from kolibri.core.tasks.decorators import register_task
 from kolibri.core.tasks.exceptions import JobNotFound
 from kolibri.core.tasks.exceptions import JobRunning
@@ -1175,6 +1177,171 @@ class ListAPIRepeat(BaseAPITestCase):
         )
 
 
+@patch("kolibri.core.tasks.api.job_storage")
+class ChangesAPITestCase(BaseAPITestCase):
+    def setUp(self):
+        self.client.login(username=self.superuser.username, password=DUMMY_PASSWORD)
+        self.last_change_seq = 42
+        self.cursor = "42"
+
+    def test_changes_without_cursor(self, mock_job_storage):
+        mock_job_storage.wait_for_update.return_value = self.last_change_seq
+        mock_job_storage.get_updated_jobs.return_value = [
+            (fake_job(job_id="1", state=State.RUNNING), dummy_orm_job_data)
+        ]
+        mock_job_storage.get_all_jobs.return_value = [
+            fake_job(job_id="1", state=State.RUNNING),
+            fake_job(job_id="2", state=State.QUEUED),
+        ]
+
+        response = self.client.get(reverse("kolibri:core:task-changes"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["cursor"], self.cursor)
+        self.assertEqual([job["id"] for job in response.data["jobs"]], ["1"])
+        self.assertEqual(response.data["job_ids"], ["1", "2"])
+        mock_job_storage.wait_for_update.assert_called_once_with(None, 0)
+        mock_job_storage.get_updated_jobs.assert_called_once_with(
+            None, self.last_change_seq, queue=None, repeating=None
+        )
+        # The job rows are not fetched again for each job.
+        mock_job_storage.get_orm_job.assert_not_called()
+
+    def test_changes_only_returns_permitted_jobs(self, mock_job_storage):
+        @register_task(permission_classes=[IsSuperAdmin])
+        def add(x, y):
+            return x + y
+
+        TaskRegistry["kolibri.core.tasks.test.test_api.add"] = add
+
+        self.client.login(username=self.facility2user.username, password=DUMMY_PASSWORD)
+        hidden_job = fake_job(
+            job_id="1", func="kolibri.core.tasks.test.test_api.add", state=State.QUEUED
+        )
+        visible_job = fake_job(job_id="2", state=State.QUEUED)
+        mock_job_storage.wait_for_update.return_value = self.last_change_seq
+        mock_job_storage.get_updated_jobs.return_value = [
+            (hidden_job, dummy_orm_job_data),
+            (visible_job, dummy_orm_job_data),
+        ]
+        mock_job_storage.get_all_jobs.return_value = [hidden_job, visible_job]
+
+        response = self.client.get(reverse("kolibri:core:task-changes"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([job["id"] for job in response.data["jobs"]], ["2"])
+        self.assertEqual(response.data["job_ids"], ["2"])
+        TaskRegistry.clear()
+
+    def test_changes_no_change(self, mock_job_storage):
+        mock_job_storage.wait_for_update.return_value = self.last_change_seq
+        mock_job_storage.get_all_jobs.return_value = [fake_job(job_id="1")]
+
+        response = self.client.get(
+            reverse("kolibri:core:task-changes"),
+            {"cursor": self.cursor, "timeout": "5"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["cursor"], self.cursor)
+        self.assertEqual(response.data["jobs"], [])
+        mock_job_storage.wait_for_update.assert_called_once_with(
+            self.last_change_seq, 5
+        )
+        mock_job_storage.get_updated_jobs.assert_not_called()
+
+    def test_changes_since_cursor(self, mock_job_storage):
+        since = self.last_change_seq - 1
+        mock_job_storage.wait_for_update.return_value = self.last_change_seq
+        mock_job_storage.get_updated_jobs.return_value = []
+        mock_job_storage.get_all_jobs.return_value = []
+
+        response = self.client.get(
+            reverse("kolibri:core:task-changes"),
+            {"cursor": str(since), "queue": "test"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["cursor"], self.cursor)
+        mock_job_storage.get_updated_jobs.assert_called_once_with(
+            since, self.last_change_seq, queue="test", repeating=None
+        )
+
+    def test_changes_timeout_capped(self, mock_job_storage):
+        mock_job_storage.wait_for_update.return_value = self.last_change_seq
+        mock_job_storage.get_all_jobs.return_value = []
+
+        self.client.get(
+            reverse("kolibri:core:task-changes"),
+            {"cursor": self.cursor, "timeout": "3600"},
+        )
+
+        mock_job_storage.wait_for_update.assert_called_once_with(
+            self.last_change_seq, MAX_CHANGES_TIMEOUT
+        )
+
+    def test_changes_does_not_wait_when_too_many_waiting(self, mock_job_storage):
+        mock_job_storage.wait_for_update.return_value = self.last_change_seq
+        mock_job_storage.get_all_jobs.return_value = []
+
+        with patch(
+            "kolibri.core.tasks.api._waiting_changes_requests", threading.Semaphore(0)
+        ):
+            response = self.client.get(
+                reverse("kolibri:core:task-changes"),
+                {"cursor": self.cursor, "timeout": "5"},
+            )
+
+        self.assertEqual(response.status_code, 200)
+        mock_job_storage.wait_for_update.assert_called_once_with(
+            self.last_change_seq, 0
+        )
+
+    def test_changes_invalid_params(self, mock_job_storage):
+        response = self.client.get(
+            reverse("kolibri:core:task-changes"), {"cursor": "yesterday"}
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(
+            reverse("kolibri:core:task-changes"), {"timeout": "forever"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+@patch("kolibri.core.tasks.api.job_storage")
+class MetricsAPITestCase(BaseAPITestCase):
+    def test_metrics(self, mock_job_storage):
+        self.client.login(username=self.superuser.username, password=DUMMY_PASSWORD)
+        mock_job_storage.get_job_metrics.return_value = [{"func": "test", "runs": 1}]
+
+        response = self.client.get(
+            reverse("kolibri:core:task-metrics"), {"func": "test", "days": "7"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [{"func": "test", "runs": 1}])
+        kwargs = mock_job_storage.get_job_metrics.call_args[1]
+        self.assertEqual(kwargs["func"], "test")
+        self.assertAlmostEqual(
+            kwargs["since"],
+            datetime.datetime.utcnow() - datetime.timedelta(days=7),
+            delta=datetime.timedelta(minutes=1),
+        )
+
+    def test_metrics_invalid_days(self, mock_job_storage):
+        self.client.login(username=self.superuser.username, password=DUMMY_PASSWORD)
+        response = self.client.get(
+            reverse("kolibri:core:task-metrics"), {"days": "forever"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_metrics_not_superuser(self, mock_job_storage):
+        self.client.login(username=self.facility2user.username, password=DUMMY_PASSWORD)
+        response = self.client.get(reverse("kolibri:core:task-metrics"))
+        self.assertEqual(response.status_code, 403)
+        mock_job_storage.get_job_metrics.assert_not_called()
+
+
 @patch("kolibri.core.tasks.api.job_storage")
 class TaskManagementAPITestCase(BaseAPITestCase):
     def setUp(self):
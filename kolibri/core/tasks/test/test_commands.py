@@ -0,0 +1,65 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from mock import patch
+
+from kolibri.core.tasks.metrics import TIME_BUCKETS
+
+
+def _summary(values):
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "mean": float(sum(values)) / len(values) if values else None,
+        "p50": values[len(values) // 2] if values else None,
+        "p95": values[-1] if values else None,
+        "max": values[-1] if values else None,
+        "histogram": [[bound, 0] for bound in TIME_BUCKETS[:-1]] + [[None, 0]],
+    }
+
+
+def _task_metrics(func, durations):
+    return {
+        "func": func,
+        "runs": len(durations),
+        "failures": 1,
+        "canceled": 0,
+        "failure_rate": 1.0 / len(durations),
+        "queue_latency": _summary(durations),
+        "duration": _summary(durations),
+        "rss_delta": _summary([]),
+    }
+
+
+@patch("kolibri.core.tasks.management.commands.taskmetrics.job_storage")
+class TaskMetricsCommandTestCase(TestCase):
+    def test_table(self, mock_job_storage):
+        mock_job_storage.get_job_metrics.return_value = [
+            _task_metrics("kolibri.core.content.tasks.diskimport", [1, 3])
+        ]
+        out = StringIO()
+        call_command("taskmetrics", days=1, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertIn("kolibri.core.content.tasks.diskimport", lines[2])
+        self.assertIn("50%", lines[2])
+        self.assertIn("3.00s", lines[2])
+        self.assertIsNotNone(mock_job_storage.get_job_metrics.call_args[1]["since"])
+
+    def test_json(self, mock_job_storage):
+        metrics = [_task_metrics("kolibri.core.content.tasks.diskimport", [1])]
+        mock_job_storage.get_job_metrics.return_value = metrics
+        out = StringIO()
+        call_command("taskmetrics", json=True, stdout=out)
+        self.assertEqual(json.loads(out.getvalue()), json.loads(json.dumps(metrics)))
+
+    def test_no_runs(self, mock_job_storage):
+        mock_job_storage.get_job_metrics.return_value = []
+        out = StringIO()
+        call_command("taskmetrics", func="missing", stdout=out)
+        self.assertIn("No task runs", out.getvalue())
+        mock_job_storage.get_job_metrics.assert_called_once_with(
+            func="missing", since=None
+        )
@@ -1,6 +1,7 @@
 from django.test import TestCase
 from mock import patch
 
+from kolibri.core.tasks.constants import Execution
 from kolibri.core.tasks.constants import Priority
 from kolibri.core.tasks.decorators import register_task
 from kolibri.core.tasks.registry import RegisteredTask
@@ -39,6 +40,10 @@ class TestTaskDecorators(TestCase):
             track_progress=True,
             long_running=False,
             status_fn=status_fn,
+            execution=Execution.THREAD,
+            resources=None,
+            batch_key=None,
+            merge_fn=None,
         )
 
     def test_register_decorator_registers_without_args(self):
@@ -1,16 +1,26 @@
+import os
+import shutil
+import tempfile
 from datetime import datetime
 from datetime import timedelta
 
 import mock
 from django.test.testcases import TestCase
 
+from kolibri.core.tasks.constants import Execution
 from kolibri.core.tasks.constants import Priority
+from kolibri.core.tasks.constants import Resource
 from kolibri.core.tasks.exceptions import JobNotRunning
+from kolibri.core.tasks.exceptions import UserCancelledError
 from kolibri.core.tasks.job import Job
+from kolibri.core.tasks.job import State
 from kolibri.core.tasks.permissions import IsSuperAdmin
 from kolibri.core.tasks.registry import RegisteredTask
+from kolibri.core.tasks.utils import clear_cancel_request
 from kolibri.core.tasks.utils import current_state_tracker
+from kolibri.core.tasks.utils import request_cancel
 from kolibri.core.tasks.validation import JobValidator
+from kolibri.utils import conf
 
 
 def status_fn(job):
@@ -47,6 +57,82 @@ class JobTest(TestCase):
         self.assertEqual(self.job.progress, 0.5)
         self.assertEqual(self.job.total_progress, 1.5)
 
+    def test_check_for_cancel_checks_storage_periodically(self):
+        self.job.cancellable = True
+        self.job.storage.check_job_canceled.return_value = False
+        for _ in range(10):
+            self.job.check_for_cancel()
+        self.job.storage.check_job_canceled.assert_called_once_with(self.job.job_id)
+        self.job._last_cancel_check -= self.job.cancel_check_interval
+        self.job.storage.check_job_canceled.return_value = True
+        with self.assertRaises(UserCancelledError):
+            self.job.check_for_cancel()
+
+    def test_check_for_cancel_requested(self):
+        self.job.cancellable = True
+        self.job.storage.check_job_canceled.return_value = False
+        self.job.check_for_cancel()
+        request_cancel(self.job.job_id)
+        self.addCleanup(clear_cancel_request, self.job.job_id)
+        with self.assertRaises(UserCancelledError):
+            self.job.check_for_cancel()
+        self.assertTrue(self.job.is_cancelled())
+        self.job.storage.check_job_canceled.assert_called_once_with(self.job.job_id)
+
+    def test_check_for_cancel_not_cancellable(self):
+        request_cancel(self.job.job_id)
+        self.addCleanup(clear_cancel_request, self.job.job_id)
+        self.job.check_for_cancel()
+        self.job.storage.check_job_canceled.assert_not_called()
+
+    def test_execute_records_run(self):
+        job = Job(id, args=(1,))
+        job.storage = mock.MagicMock()
+        job.execute()
+        job.storage.complete_job.assert_called_once()
+        job.storage.record_job_run.assert_called_once()
+        args, kwargs = job.storage.record_job_run.call_args
+        self.assertEqual(args[:3], (job.job_id, job.func, State.COMPLETED))
+        self.assertGreaterEqual(args[3], 0)
+
+    def test_execute_records_failed_run(self):
+        job = Job(int, args=("not a number",))
+        job.storage = mock.MagicMock()
+        job.execute()
+        job.storage.mark_job_as_failed.assert_called_once()
+        self.assertIsInstance(
+            job.storage.mark_job_as_failed.call_args[0][1], ValueError
+        )
+        self.assertEqual(job.storage.record_job_run.call_args[0][2], State.FAILED)
+
+    def test_execute_records_failed_completion(self):
+        job = Job(id, args=(1,))
+        job.storage = mock.MagicMock()
+        job.storage.complete_job.side_effect = RuntimeError("database is locked")
+        job.execute()
+        job.storage.mark_job_as_failed.assert_called_once()
+        self.assertIsInstance(
+            job.storage.mark_job_as_failed.call_args[0][1], RuntimeError
+        )
+        self.assertEqual(job.storage.record_job_run.call_args[0][2], State.FAILED)
+
+    def test_execute_profiles_task(self):
+        profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, profile_dir)
+        profile_path = os.path.join(profile_dir, "profiles", "job.prof")
+        with mock.patch.dict(
+            conf.OPTIONS["Tasks"], {"PROFILE_TASKS": [self.job.func]}
+        ), mock.patch(
+            "kolibri.core.tasks.metrics.get_profile_path", return_value=profile_path
+        ):
+            self.job.execute()
+        self.assertTrue(os.path.exists(profile_path))
+
+    def test_execute_does_not_profile_other_tasks(self):
+        with mock.patch("kolibri.core.tasks.metrics.cProfile.Profile") as mock_profile:
+            self.job.execute()
+        mock_profile.assert_not_called()
+
     def test_job_save_as_cancellable__skip(self):
         cancellable = self.job.cancellable
         self.job.save_as_cancellable(cancellable=cancellable)
@@ -377,6 +463,7 @@ class TestRegisteredTask(TestCase):
             track_progress=True,
             long_running=True,
             status_fn=status_fn,
+            resources=[Resource.DISK],
         )
 
     def test_constructor_sets_required_params(self):
@@ -389,6 +476,56 @@ class TestRegisteredTask(TestCase):
         self.assertEqual(self.registered_task.cancellable, True)
         self.assertEqual(self.registered_task.track_progress, True)
         self.assertEqual(self.registered_task.long_running, True)
+        self.assertEqual(self.registered_task.execution, Execution.THREAD)
+        self.assertEqual(self.registered_task.resources, [Resource.DISK])
+
+    def test_constructor_sets_execution(self):
+        registered_task = RegisteredTask(int, execution=Execution.PROCESS)
+        self.assertEqual(registered_task.execution, Execution.PROCESS)
+
+    def test_constructor_invalid_execution(self):
+        with self.assertRaises(ValueError):
+            RegisteredTask(int, execution="greenlet")
+
+    def test_constructor_invalid_resources(self):
+        with self.assertRaises(ValueError):
+            RegisteredTask(int, resources=["gpu"])
+        with self.assertRaises(TypeError):
+            RegisteredTask(int, resources=Resource.DISK)
+
+    def test_constructor_invalid_batching(self):
+        with self.assertRaises(TypeError):
+            RegisteredTask(int, batch_key="key")
+        with self.assertRaises(ValueError):
+            RegisteredTask(int, merge_fn=lambda queued_job, job: ((), {}))
+
+    def test__ready_job_batch_key(self):
+        registered_task = RegisteredTask(
+            int, batch_key=lambda x, base=10: "base{}".format(base)
+        )
+        job = registered_task._ready_job(args=("10",), kwargs=dict(base=2))
+        self.assertEqual(job.batch_key, "base2")
+
+    @mock.patch("kolibri.core.tasks.registry.RegisteredTask._ready_job")
+    @mock.patch("kolibri.core.tasks.registry.job_storage")
+    def test_enqueue_batched(self, job_storage_mock, _ready_job_mock):
+        def merge_fn(queued_job, job):
+            return queued_job.args, queued_job.kwargs
+
+        self.registered_task.batch_key = lambda *args, **kwargs: "key"
+        self.registered_task.merge_fn = merge_fn
+        _ready_job_mock.return_value = "job"
+
+        self.registered_task.enqueue(args=("10",))
+
+        job_storage_mock.enqueue_job.assert_not_called()
+        job_storage_mock.enqueue_job_or_merge.assert_called_once_with(
+            "job",
+            merge_fn=merge_fn,
+            queue=self.registered_task.queue,
+            priority=self.registered_task.priority,
+            retry_interval=None,
+        )
 
     @mock.patch("kolibri.core.tasks.registry.Job", spec=True)
     def test__ready_job(self, MockJob):
@@ -401,6 +538,7 @@ class TestRegisteredTask(TestCase):
             cancellable=True,
             track_progress=True,
             long_running=True,
+            resources=[Resource.DISK],
             kwargs=dict(base=10),  # kwarg that was passed to _ready_job()
         )
 
@@ -1,7 +1,9 @@
 import concurrent.futures
+import json
 import logging
 import os
 import sqlite3
+import threading
 import time
 import uuid
 from threading import Thread
@@ -38,6 +40,27 @@ def get_current_job():
     return getattr(current_state_tracker, "job", None)
 
 
+# The ids of the jobs running in this process that the worker has been asked to cancel,
+# so that running jobs can check whether they have been canceled without a query.
+_cancel_requests = set()
+
+_cancel_requests_lock = threading.Lock()
+
+
+def request_cancel(job_id):
+    with _cancel_requests_lock:
+        _cancel_requests.add(job_id)
+
+
+def clear_cancel_request(job_id):
+    with _cancel_requests_lock:
+        _cancel_requests.discard(job_id)
+
+
+def is_cancel_requested(job_id):
+    return job_id in _cancel_requests
+
+
 def callable_to_import_path(func):
     if callable(func):
         funcstring = "{module}.{funcname}".format(
@@ -51,6 +74,13 @@ def callable_to_import_path(func):
     return funcstring
 
 
+def arguments_batch_key(*args, **kwargs):
+    """
+    A batch_key for tasks whose queued jobs can be merged when they have the same arguments.
+    """
+    return json.dumps([args, kwargs], sort_keys=True, separators=(",", ":"))
+
+
 def import_path_to_callable(funcstring):
     """
     Import a string that represents a module and function, e.g. {module}.{funcname}.
@@ -196,10 +226,10 @@ def make_connection(db_type, url):
     return connection
 
 
-def db_connection():
+def db_connection(path=None):
     db_url = create_db_url(
         conf.OPTIONS["Database"]["DATABASE_ENGINE"],
-        path=conf.OPTIONS["Tasks"]["JOB_STORAGE_FILEPATH"],
+        path=path or conf.OPTIONS["Tasks"]["JOB_STORAGE_FILEPATH"],
         name=conf.OPTIONS["Database"]["DATABASE_NAME"],
         password=conf.OPTIONS["Database"]["DATABASE_PASSWORD"],
         user=conf.OPTIONS["Database"]["DATABASE_USER"],
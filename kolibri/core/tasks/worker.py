@@ -1,13 +1,27 @@
 import logging
+from collections import Counter
 from concurrent.futures import CancelledError
+from datetime import datetime
 
+import django
+from django.apps import apps
 from django.db import connection as django_connection
+from django.db import connections as django_connections
 
+from kolibri.core.tasks.constants import Execution
 from kolibri.core.tasks.constants import Priority
+from kolibri.core.tasks.notifications import Listener
 from kolibri.core.tasks.storage import Storage
+from kolibri.core.tasks.utils import clear_cancel_request
 from kolibri.core.tasks.utils import db_connection
 from kolibri.core.tasks.utils import InfiniteLoopThread
+from kolibri.core.tasks.utils import request_cancel
+from kolibri.utils.logger import setup_process_queue_logging
+from kolibri.utils.logger import setup_worker_logging
 from kolibri.utils.multiprocessing_compat import PoolExecutor
+from kolibri.utils.multiprocessing_compat import ProcessPoolExecutor
+from kolibri.utils.multiprocessing_compat import use_multiprocessing
+from kolibri.utils.multiprocessing_compat import use_process_pool
 
 logger = logging.getLogger(__name__)
 
@@ -19,13 +33,14 @@ def execute_job(
     worker_thread=None,
     worker_extra=None,
     log_queue=None,
+    job_storage_filepath=None,
 ):
     """
     Call the function stored in the job.func.
     :return: None
     """
 
-    connection = db_connection()
+    connection = db_connection(path=job_storage_filepath)
 
     storage = Storage(connection)
 
@@ -41,7 +56,7 @@ def execute_job(
     django_connection.close()
 
 
-def execute_job_with_python_worker(job_id, log_queue=None):
+def execute_job_with_python_worker(job_id, log_queue=None, job_storage_filepath=None):
     """
     Call execute_job but additionally with the current host, process and thread information taken
     directly from python internals.
@@ -56,11 +71,40 @@ def execute_job_with_python_worker(job_id, log_queue=None):
         worker_process=str(os.getpid()),
         worker_thread=str(threading.get_ident()),
         log_queue=log_queue,
+        job_storage_filepath=job_storage_filepath,
     )
 
 
+def initialize_process_worker(log_queue=None):
+    """
+    Sets up a process of the process pool to forward its logging to log_queue.
+    The process is started from a fork server rather than forked from the server process,
+    so Django is set up here, and no database connections are carried over.
+    """
+    if not apps.ready:
+        django.setup()
+
+    from kolibri.core.content.utils.sqlalchemybridge import clear_bridge_caches
+
+    django_connections.close_all()
+    clear_bridge_caches()
+    if log_queue is not None:
+        setup_worker_logging(log_queue)
+
+
 class Worker(object):
-    def __init__(self, connection, regular_workers=2, high_workers=1, log_queue=None):
+    # The job checker waits to be notified of changes to the job storage, and only checks it
+    # without a notification this often, in seconds, in case a notification was missed.
+    fallback_interval = 5
+
+    def __init__(
+        self,
+        connection,
+        regular_workers=2,
+        high_workers=1,
+        log_queue=None,
+        resource_limits=None,
+    ):
         # Internally, we use concurrent.future.Future to run and track
         # job executions. We need to keep track of which future maps to which
         # job they were made from, and we use the job_future_mapping dict to do
@@ -82,8 +126,15 @@ class Worker(object):
         self.max_workers = regular_workers + high_workers
         # Track any log queue that is passed in
         self.log_queue = log_queue
+        # Key: resource, Value: the maximum number of running jobs that use it
+        self.resource_limits = resource_limits or {}
 
         self.workers = self.start_workers()
+        # Jobs of tasks with PROCESS execution are run in a pool of processes, when the
+        # workers are threads. This is only started once there is such a job to run.
+        self.process_workers = None
+        self.process_log_listener = None
+        self.listener = Listener(self.storage.engine)
         self.job_checker = self.start_job_checker()
 
     def requeue_stalled_jobs(self):
@@ -103,11 +154,48 @@ class Worker(object):
                 self.storage.mark_job_as_canceled(job.job_id)
         # Now shutdown the workers
         self.workers.shutdown(wait=wait)
+        if self.process_workers is not None:
+            self.process_workers.shutdown(wait=wait)
+        if self.process_log_listener is not None:
+            self.process_log_listener.stop()
 
     def start_workers(self):
         pool = PoolExecutor(max_workers=self.max_workers)
         return pool
 
+    def start_process_workers(self):
+        log_queue = self.log_queue
+        if log_queue is not None:
+            # The log queue is not a multiprocessing queue, so records are forwarded to it.
+            self.process_log_listener = setup_process_queue_logging(log_queue)
+            log_queue = self.process_log_listener.queue
+        pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            initializer=initialize_process_worker,
+            initargs=(log_queue,),
+        )
+        return pool
+
+    def get_execution(self, job):
+        try:
+            return getattr(job.task, "execution", Execution.THREAD)
+        except ImportError:
+            return Execution.THREAD
+
+    def get_workers(self, job):
+        """
+        Returns the pool to run the job in, according to the execution of its task.
+        """
+        if (
+            self.get_execution(job) != Execution.PROCESS
+            or use_multiprocessing()
+            or not use_process_pool()
+        ):
+            return self.workers
+        if self.process_workers is None:
+            self.process_workers = self.start_process_workers()
+        return self.process_workers
+
     def handle_finished_future(self, future):
         try:
             # get back the job assigned to the future
@@ -115,6 +203,7 @@ class Worker(object):
             # Clean up tracking of this job and its future
             del self.job_future_mapping[future]
             del self.future_job_mapping[job.job_id]
+            clear_cancel_request(job.job_id)
 
             try:
                 future.result()
@@ -122,15 +211,19 @@ class Worker(object):
                 self.storage.mark_job_as_canceled(job.job_id)
         except KeyError:
             pass
+        # A worker is free, so check for the next job to start.
+        self.listener.wake()
 
     def shutdown(self, wait=True):
         logger.info("Asking job schedulers to shut down.")
         self.job_checker.stop()
+        self.listener.wake()
         # Wait for the job checker to finish
         # before attempting to pause any running jobs
         if wait:
             self.job_checker.join()
         self.shutdown_workers(wait=wait)
+        self.listener.close()
 
     def start_job_checker(self):
         """
@@ -139,11 +232,31 @@ class Worker(object):
         Returns: the Thread object.
         """
         t = InfiniteLoopThread(
-            self.check_jobs, thread_name="JOBCHECKER", wait_between_runs=0.2
+            self.check_jobs_and_wait, thread_name="JOBCHECKER", wait_between_runs=0
         )
         t.start()
         return t
 
+    def check_jobs_and_wait(self):
+        """
+        Checks jobs, then waits until notified of a change to the job storage, a worker
+        becoming free, or the next scheduled job being due.
+        """
+        self.check_jobs()
+        self.listener.wait(self.get_wait_time())
+
+    def get_wait_time(self):
+        """
+        Returns how long to wait before checking jobs again without a notification.
+        """
+        next_scheduled_time = self.storage.get_next_scheduled_time()
+        if next_scheduled_time is not None:
+            delay = (next_scheduled_time - datetime.utcnow()).total_seconds()
+            # A job that is already due is waiting for a free worker, which notifies when it is.
+            if delay > 0:
+                return min(delay, self.fallback_interval)
+        return self.fallback_interval
+
     def check_jobs(self):
         """
         Checks for the next job to run and also checks for jobs that should be cancelled.
@@ -175,31 +288,64 @@ class Worker(object):
 
         This algorithm will make sure 'high' jobs don't wait :)
 
+        Jobs that use a resource already used by as many running jobs as its limit are skipped,
+        so that they wait for one of those jobs to finish, while other jobs can still start.
+
         Returns the job object if a job is available based on the above algorithm else None.
         """
         job = None
         workers_currently_busy = len(self.future_job_mapping)
 
         if workers_currently_busy < self.regular_workers:
-            job = self.storage.get_next_queued_job()
+            job = self.storage.get_next_queued_job(
+                exclude_resources=self.get_busy_resources()
+            )
         elif workers_currently_busy < self.max_workers:
-            job = self.storage.get_next_queued_job(priority=Priority.HIGH)
+            job = self.storage.get_next_queued_job(
+                priority=Priority.HIGH, exclude_resources=self.get_busy_resources()
+            )
         else:
             logger.debug("All workers busy.")
             return None
 
         return job
 
+    def get_busy_resources(self):
+        """
+        Returns the resources that are used by as many running jobs as their limit.
+        """
+        running = Counter(
+            resource
+            for job in list(self.job_future_mapping.values())
+            for resource in job.resources
+        )
+        return [
+            resource
+            for resource, limit in self.resource_limits.items()
+            if running[resource] >= limit
+        ]
+
     def start_next_job(self, job):
         """
-        start the next scheduled job to the type of workers spawned by self.start_workers.
+        start the next scheduled job in the pool of workers for the execution of its task.
 
         :return future:
         """
-        future = self.workers.submit(
-            execute_job_with_python_worker,
-            job_id=job.job_id,
-            log_queue=self.log_queue,
+        workers = self.get_workers(job)
+        clear_cancel_request(job.job_id)
+        if workers is self.workers:
+            kwargs = {"log_queue": self.log_queue}
+        else:
+            # Processes of the process pool log to the queue they were initialized with.
+            # They connect to the job storage from the options, but with the same SQLite
+            # file as this worker, in case this worker was not given the one in the options.
+            kwargs = {
+                "job_storage_filepath": self.storage.engine.url.database
+                if self.storage.engine.name == "sqlite"
+                else None
+            }
+        future = workers.submit(
+            execute_job_with_python_worker, job_id=job.job_id, **kwargs
         )
 
         # Check if the job ID already exists in the future_job_mapping dictionary
@@ -226,6 +372,10 @@ class Worker(object):
         try:
             future = self.future_job_mapping[job_id]
             is_future_cancelled = future.cancel()
+            if not is_future_cancelled:
+                # The job is already running, so tell it that it has been canceled, for
+                # jobs running in threads of this process to see the next time they check.
+                request_cancel(job_id)
         except KeyError:
             # In the case that the future does not even exist, say it has been cancelled.
             is_future_cancelled = True
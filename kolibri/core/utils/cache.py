@@ -18,6 +18,20 @@ def __get_process_cache():
 process_cache = SimpleLazyObject(__get_process_cache)
 
 
+def get_contentnode_cache():
+    try:
+        return caches["contentnode_cache"]
+    except InvalidCacheBackendError:
+        return caches["default"]
+
+
+def get_metadata_cache():
+    try:
+        return caches["metadata_cache"]
+    except InvalidCacheBackendError:
+        return caches["default"]
+
+
 class RedisSettingsHelper(object):
     """
     Small wrapper for the Redis client to explicitly get/set values from the client
@@ -77,6 +91,5 @@ try:
             """
             super(RedisCache, self).set(*args, **kwargs)
 
-
 except (ImportError, InvalidCacheBackendError):
     pass
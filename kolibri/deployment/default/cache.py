@@ -35,6 +35,21 @@ process_cache = {
     },
 }
 
+# A cache of the responses of the content metadata endpoints, shared across processes
+# so that a response rendered in one process can be returned by any other.
+metadata_cache = copy.deepcopy(process_cache)
+metadata_cache["LOCATION"] = os.path.join(KOLIBRI_HOME, "metadata_cache")
+
+# A cache of serialized ContentNodes, kept in memory in each process whatever the cache
+# backend, and separately from the default cache, as there are many more of them
+# than of any other cached item.
+contentnode_cache = {
+    "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    "LOCATION": "contentnode_cache",
+    "TIMEOUT": None,
+    "OPTIONS": {"MAX_ENTRIES": cache_options["CONTENTNODE_CACHE_MAX_ENTRIES"]},
+}
+
 
 if cache_options["CACHE_BACKEND"] == "redis":
     base_cache = {
@@ -56,10 +71,13 @@ if cache_options["CACHE_BACKEND"] == "redis":
     }
     default_cache = copy.deepcopy(base_cache)
     default_cache["OPTIONS"]["DB"] = cache_options["CACHE_REDIS_DB"]
+    metadata_cache = copy.deepcopy(default_cache)
 
 CACHES = {
     # Default cache
     "default": default_cache,
+    "contentnode_cache": contentnode_cache,
+    "metadata_cache": metadata_cache,
 }
 
 if cache_options["CACHE_BACKEND"] != "redis":
@@ -10,3 +10,7 @@ CACHES["default"]["TIMEOUT"] = 0  # noqa
 
 if "process_cache" in CACHES:  # noqa
     CACHES["process_cache"]["TIMEOUT"] = 0  # noqa
+
+CACHES["contentnode_cache"]["TIMEOUT"] = 0  # noqa
+
+CACHES["metadata_cache"]["TIMEOUT"] = 0  # noqa
@@ -17,6 +17,7 @@ from kolibri.core.discovery.models import ConnectionStatus
 from kolibri.core.discovery.models import NetworkLocation
 from kolibri.core.discovery.utils.network.client import NetworkClient
 from kolibri.core.discovery.utils.network.errors import NetworkLocationResponseFailure
+from kolibri.core.tasks.constants import Resource
 from kolibri.core.tasks.decorators import register_task
 from kolibri.core.tasks.job import JobStatus
 from kolibri.core.tasks.job import Priority
@@ -144,6 +145,7 @@ class IsSelf(BasePermission):
         PermissionsFromAny(IsSelf(), IsSuperAdmin(), IsFacilityAdmin())
     ],
     status_fn=status_fn,
+    resources=[Resource.NETWORK, Resource.DB_WRITE],
 )
 def mergeuser(
     command, local_user_id, new_superuser_id=None, set_as_super_user=False, **kwargs
@@ -0,0 +1,790 @@
+"""
+An asyncio based engine for downloading files over HTTP.
+
+Each FileDownload run by the import managers occupies a thread (and a requests session) for
+the whole of its transfer, which limits how many files can be in flight at once on devices
+with little memory. The AsyncTransferEngine instead runs every download as a coroutine on a
+single event loop thread, sharing a pool of keep-alive connections per host, with writes to
+disk handed off to a small thread pool through a bounded queue, so that a slow disk stops
+reads from the network rather than buffering the file in memory.
+
+Downloads are written into the same ChunkedFile chunk directories as FileDownload, so a
+download interrupted in one engine can be resumed by the other, and errors are raised as the
+same requests exceptions as FileDownload, so the existing handling for retrying or skipping
+files applies.
+
+Only the standard library is used for HTTP, so this supports plain HTTP/1.1 with range
+requests, chunked transfer encoding and redirects, but not proxies or compressed responses.
+"""
+import asyncio
+import logging
+import os
+import ssl
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import urljoin
+from urllib.parse import urlsplit
+
+import requests
+from requests.exceptions import ConnectionError
+from requests.exceptions import HTTPError
+from requests.exceptions import Timeout
+from requests.exceptions import TooManyRedirects
+
+from kolibri.utils.bandwidth import bandwidth_governor as default_bandwidth_governor
+from kolibri.utils.file_transfer import ChunkedFile
+from kolibri.utils.file_transfer import ChunkedFileDoesNotExist
+from kolibri.utils.file_transfer import retry_import
+from kolibri.utils.file_transfer import TransferCanceled
+from kolibri.utils.file_transfer import TransferFailed
+
+logger = logging.getLogger(__name__)
+
+REDIRECT_STATUS_CODES = {301, 302, 303, 307, 308}
+
+MAX_REDIRECTS = 10
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+class HTTPConnection(object):
+    def __init__(self, key, reader, writer):
+        self.key = key
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        self.writer.close()
+
+
+class ConnectionPool(object):
+    """
+    A pool of keep-alive connections, limited to max_connections_per_host open connections
+    to each scheme, host and port.
+    Must only be used from the event loop thread.
+    """
+
+    def __init__(self, max_connections_per_host=8, timeout=60):
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout = timeout
+        self._idle = defaultdict(list)
+        self._semaphores = {}
+        self._ssl_context = None
+
+    def _get_ssl_context(self):
+        if self._ssl_context is None:
+            # Use the same certificate bundle as requests does.
+            self._ssl_context = ssl.create_default_context(
+                cafile=requests.certs.where()
+            )
+        return self._ssl_context
+
+    async def acquire(self, scheme, host, port):
+        """
+        Returns a connection to the host, and whether it is a reused connection.
+        """
+        key = (scheme, host, port)
+        if key not in self._semaphores:
+            self._semaphores[key] = asyncio.Semaphore(self.max_connections_per_host)
+        await self._semaphores[key].acquire()
+        try:
+            idle = self._idle[key]
+            while idle:
+                connection = idle.pop()
+                if not connection.reader.at_eof():
+                    return connection, True
+                connection.close()
+            if scheme == "https":
+                ssl_context = self._get_ssl_context()
+                server_hostname = host
+            else:
+                ssl_context = None
+                server_hostname = None
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(
+                    host, port, ssl=ssl_context, server_hostname=server_hostname
+                ),
+                self.timeout,
+            )
+            return HTTPConnection(key, reader, writer), False
+        except BaseException:
+            self._semaphores[key].release()
+            raise
+
+    def release(self, connection, reusable=False):
+        if reusable:
+            self._idle[connection.key].append(connection)
+        else:
+            connection.close()
+        self._semaphores[connection.key].release()
+
+    def close(self):
+        for connections in self._idle.values():
+            for connection in connections:
+                connection.close()
+        self._idle.clear()
+
+
+class HTTPResponse(object):
+    """
+    A response with a body that is read incrementally from its connection.
+    The connection is returned to the pool once the body has been read,
+    or closed if the response is released before then.
+    """
+
+    def __init__(
+        self,
+        url,
+        version,
+        status,
+        reason,
+        headers,
+        connection,
+        pool,
+        timeout,
+        body=True,
+    ):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.connection = connection
+        self.pool = pool
+        self.timeout = timeout
+        connection_header = headers.get("connection", "").lower()
+        if version == "HTTP/1.0":
+            self.keep_alive = "keep-alive" in connection_header
+        else:
+            self.keep_alive = "close" not in connection_header
+        self._chunked = (
+            body and "chunked" in headers.get("transfer-encoding", "").lower()
+        )
+        self._chunk_remaining = 0
+        self._remaining = None
+        self._done = False
+        if not body:
+            self._remaining = 0
+            self._finish()
+        elif not self._chunked and "content-length" in headers:
+            self._remaining = int(headers["content-length"])
+        elif not self._chunked:
+            # The body is delimited by the server closing the connection.
+            self.keep_alive = False
+
+    async def _readline(self):
+        line = await asyncio.wait_for(self.connection.reader.readline(), self.timeout)
+        if not line.endswith(b"\n"):
+            raise asyncio.IncompleteReadError(line, None)
+        return line
+
+    async def _read_chunked(self, size):
+        if self._chunk_remaining == 0:
+            line = await self._readline()
+            self._chunk_remaining = int(line.split(b";")[0].strip(), 16)
+            if self._chunk_remaining == 0:
+                # Consume any trailers up to the final blank line.
+                while (await self._readline()).strip():
+                    pass
+                return b""
+        data = await asyncio.wait_for(
+            self.connection.reader.read(min(size, self._chunk_remaining)),
+            self.timeout,
+        )
+        if not data:
+            raise asyncio.IncompleteReadError(data, self._chunk_remaining)
+        self._chunk_remaining -= len(data)
+        if self._chunk_remaining == 0:
+            await self._readline()
+        return data
+
+    async def _read(self, size):
+        if self._chunked:
+            return await self._read_chunked(size)
+        if self._remaining is not None:
+            if self._remaining == 0:
+                return b""
+            size = min(size, self._remaining)
+        data = await asyncio.wait_for(self.connection.reader.read(size), self.timeout)
+        if self._remaining is not None:
+            if not data:
+                raise asyncio.IncompleteReadError(data, self._remaining)
+            self._remaining -= len(data)
+        return data
+
+    async def read(self, size=ChunkedFile.chunk_size):
+        """
+        Read up to size bytes of the body, returns an empty bytestring once it has all been read.
+        """
+        if self._done:
+            return b""
+        try:
+            data = await self._read(size)
+        except asyncio.TimeoutError:
+            self.release()
+            raise Timeout("Read timed out for url: {}".format(self.url))
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+            self.release()
+            raise ConnectionError(
+                "Connection broken while reading {}: {!r}".format(self.url, e)
+            )
+        if not data:
+            self._finish()
+        return data
+
+    async def read_exactly(self, size):
+        """
+        Read size bytes of the body, or fewer only if the end of the body is reached.
+        """
+        data = b""
+        while len(data) < size:
+            block = await self.read(size - len(data))
+            if not block:
+                break
+            data += block
+        return data
+
+    async def read_all(self):
+        data = b""
+        while True:
+            block = await self.read()
+            if not block:
+                return data
+            data += block
+
+    def _finish(self):
+        if not self._done:
+            self._done = True
+            self.pool.release(self.connection, reusable=self.keep_alive)
+
+    def release(self):
+        """
+        Release the connection, closing it if the body has not been read in full.
+        """
+        if not self._done:
+            self._done = True
+            self.pool.release(self.connection, reusable=False)
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            # Use a requests Response, so that errors can be handled in the same way
+            # as errors from requests.
+            response = requests.Response()
+            response.status_code = self.status
+            response.reason = self.reason
+            response.url = self.url
+            self.release()
+            raise HTTPError(
+                "{} Error: {} for url: {}".format(self.status, self.reason, self.url),
+                response=response,
+            )
+
+
+class AsyncTransferEngine(object):
+    """
+    Runs file downloads as coroutines on an event loop in a background thread.
+
+    :param max_concurrency: The maximum number of files to download at once
+    :param max_connections_per_host: The maximum number of connections to open to each host
+    :param timeout: The timeout in seconds for connecting and for each read
+    :param retry_wait: How long to wait in seconds before retrying a failed download
+    :param write_queue_size: The number of chunks of each file to buffer while waiting to write them
+    :param io_workers: The number of threads for writing to disk
+    :param bandwidth_governor: The BandwidthGovernor to limit the rate of downloads with
+    """
+
+    def __init__(
+        self,
+        max_concurrency=50,
+        max_connections_per_host=8,
+        timeout=60,
+        retry_wait=30,
+        write_queue_size=4,
+        io_workers=2,
+        cancel_check_interval=1,
+        bandwidth_governor=default_bandwidth_governor,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout = timeout
+        self.retry_wait = retry_wait
+        self.write_queue_size = write_queue_size
+        self.io_workers = io_workers
+        self.cancel_check_interval = cancel_check_interval
+        self.bandwidth_governor = bandwidth_governor
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+
+    def _run_loop(self, loop, started):
+        asyncio.set_event_loop(loop)
+        # Create these in the event loop thread, as on older versions of Python
+        # asyncio primitives are bound to the event loop of the current thread.
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._pool = ConnectionPool(
+            max_connections_per_host=self.max_connections_per_host,
+            timeout=self.timeout,
+        )
+        started.set()
+        try:
+            loop.run_forever()
+        finally:
+            self._pool.close()
+            loop.close()
+
+    def start(self):
+        with self._lock:
+            if self._loop is not None:
+                return
+            self._io_executor = ThreadPoolExecutor(max_workers=self.io_workers)
+            loop = asyncio.new_event_loop()
+            started = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run_loop,
+                args=(loop, started),
+                name="AsyncTransferEngine",
+            )
+            self._thread.daemon = True
+            self._thread.start()
+            started.wait()
+            self._loop = loop
+
+    def shutdown(self):
+        with self._lock:
+            if self._loop is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._io_executor.shutdown()
+            self._loop = None
+            self._thread = None
+
+    def submit(self, coroutine):
+        """
+        Schedule a coroutine on the event loop from any thread.
+        Returns a concurrent.futures.Future for its result, cancelling the future cancels the coroutine.
+        """
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def run_io(self, func, *args):
+        """
+        Run a blocking function on the disk writing thread pool.
+        """
+        return asyncio.get_event_loop().run_in_executor(self._io_executor, func, *args)
+
+    def _build_request(self, method, parsed, headers):
+        path = parsed.path or "/"
+        if parsed.query:
+            path += "?" + parsed.query
+        request_headers = {
+            "Host": parsed.netloc.rpartition("@")[2],
+            "User-Agent": requests.utils.default_user_agent(),
+            # Compressed responses could not be written into chunks by byte range.
+            "Accept-Encoding": "identity",
+            "Connection": "keep-alive",
+        }
+        request_headers.update(headers or {})
+        return "{} {} HTTP/1.1\r\n{}\r\n".format(
+            method,
+            path,
+            "".join("{}: {}\r\n".format(k, v) for k, v in request_headers.items()),
+        ).encode("latin-1")
+
+    async def _read_response_head(self, connection):
+        """
+        Read the status line and headers of a response, returns the HTTP version,
+        status code, reason and a dict of the headers with lower case names.
+        """
+        status_line = await asyncio.wait_for(connection.reader.readline(), self.timeout)
+        if not status_line:
+            raise asyncio.IncompleteReadError(status_line, None)
+        version, status, reason = (
+            status_line.decode("latin-1").rstrip("\r\n").split(" ", 2) + [""]
+        )[:3]
+        if not version.startswith("HTTP/"):
+            raise ValueError("Invalid status line {!r}".format(status_line))
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(connection.reader.readline(), self.timeout)
+            if not line.endswith(b"\n"):
+                raise asyncio.IncompleteReadError(line, None)
+            line = line.decode("latin-1").strip()
+            if not line:
+                return version, int(status), reason, headers
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    async def _connect(self, url, scheme, host, port):
+        try:
+            return await self._pool.acquire(scheme, host, port)
+        except asyncio.TimeoutError:
+            raise Timeout("Connection timed out for url: {}".format(url))
+        except OSError as e:
+            raise ConnectionError("Failed to connect for url: {}: {!r}".format(url, e))
+
+    async def _send(self, method, url, headers):
+        parsed = urlsplit(url)
+        scheme = parsed.scheme.lower()
+        if scheme not in DEFAULT_PORTS:
+            raise requests.exceptions.InvalidSchema(
+                "No connection adapters were found for {}".format(url)
+            )
+        port = parsed.port or DEFAULT_PORTS[scheme]
+        request = self._build_request(method, parsed, headers)
+
+        while True:
+            connection, reused = await self._connect(url, scheme, parsed.hostname, port)
+            try:
+                connection.writer.write(request)
+                await asyncio.wait_for(connection.writer.drain(), self.timeout)
+                (
+                    version,
+                    status,
+                    reason,
+                    response_headers,
+                ) = await self._read_response_head(connection)
+            except asyncio.TimeoutError:
+                self._pool.release(connection)
+                raise Timeout("Read timed out for url: {}".format(url))
+            except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                self._pool.release(connection)
+                if reused:
+                    # The server closed the idle connection, so retry on a new one.
+                    continue
+                raise ConnectionError(
+                    "Connection broken while requesting {}: {!r}".format(url, e)
+                )
+            except BaseException:
+                self._pool.release(connection)
+                raise
+            return HTTPResponse(
+                url,
+                version,
+                status,
+                reason,
+                response_headers,
+                connection,
+                self._pool,
+                self.timeout,
+                body=method != "HEAD" and status not in (204, 304),
+            )
+
+    async def request(self, method, url, headers=None):
+        """
+        Make a request, following any redirects, and return the HTTPResponse.
+        The caller must read the body of the response or release it.
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            response = await self._send(method, url, headers)
+            if (
+                response.status in REDIRECT_STATUS_CODES
+                and "location" in response.headers
+            ):
+                # Read any body so that the connection can be reused.
+                await response.read_all()
+                logger.debug(
+                    "Redirected from {} to {}".format(url, response.headers["location"])
+                )
+                url = urljoin(url, response.headers["location"])
+                continue
+            return response
+        raise TooManyRedirects("Exceeded {} redirects.".format(MAX_REDIRECTS))
+
+    async def download(
+        self,
+        url,
+        dest,
+        checksum=None,
+        file_size=None,
+        cancel_check=None,
+        progress_update=None,
+        bandwidth_key=None,
+    ):
+        """
+        Download the file at url to dest, verifying it against the md5 checksum if given.
+        Waits while max_concurrency other downloads are in progress, and retries on
+        errors that FileDownload would retry on.
+
+        :param url: The url of the file
+        :param dest: The path to write the file to
+        :param checksum: The md5 checksum of the file
+        :param file_size: The expected size of the file, if known, to avoid a HEAD request
+        :param cancel_check: A callable that returns True if the download should be canceled
+        :param progress_update: A callable that is passed the number of bytes written
+        :param bandwidth_key: The key to share the bandwidth of the download under
+        """
+        async with self._semaphore:
+            last_cancel_check = [0]
+
+            async def check_for_cancel():
+                # Checking for cancellation may require a database query,
+                # so do it off the event loop, and only every so often.
+                now = time.time()
+                if cancel_check and (
+                    now - last_cancel_check[0] >= self.cancel_check_interval
+                ):
+                    last_cancel_check[0] = now
+                    if await self.run_io(cancel_check):
+                        raise TransferCanceled("The transfer was canceled.")
+
+            chunk_read = self._chunk_reader(progress_update, bandwidth_key)
+
+            while True:
+                try:
+                    return await self._download(
+                        url,
+                        dest,
+                        checksum,
+                        file_size,
+                        check_for_cancel,
+                        chunk_read,
+                    )
+                except Exception as e:
+                    if not retry_import(e):
+                        raise
+                    logger.error("Error reading download stream: {}".format(e))
+                logger.info(
+                    "Waiting {}s before retrying import: {}".format(
+                        self.retry_wait, url
+                    )
+                )
+                for _ in range(self.retry_wait):
+                    last_cancel_check[0] = 0
+                    await check_for_cancel()
+                    await asyncio.sleep(1)
+
+    def _chunk_reader(self, progress_update, bandwidth_key):
+        """
+        Returns a coroutine function to call with the size of each chunk read, that reports
+        progress and waits for the bandwidth governor to allow the download to continue.
+        """
+
+        async def chunk_read(size):
+            if callable(progress_update):
+                progress_update(size)
+            await self.bandwidth_governor.throttle_async(size, key=bandwidth_key)
+
+        return chunk_read
+
+    def _prepare_chunked_file(self, dest, file_size):
+        """
+        Returns the chunked file for dest, and whether its size is known.
+        The size of a partial download is kept, in case it differs from file_size.
+        """
+        chunked_file = ChunkedFile(dest)
+        try:
+            chunked_file.file_size
+        except ValueError:
+            if not file_size:
+                return chunked_file, False
+            chunked_file.file_size = file_size
+        return chunked_file, True
+
+    async def _download(
+        self, url, dest, checksum, file_size, check_for_cancel, chunk_read
+    ):
+        chunked_file, size_known = await self.run_io(
+            self._prepare_chunked_file, dest, file_size
+        )
+        await check_for_cancel()
+        try:
+            if not size_known:
+                await self._download_unknown_size(
+                    url, chunked_file, check_for_cancel, chunk_read
+                )
+            else:
+                await self._download_ranges(
+                    url, chunked_file, check_for_cancel, chunk_read
+                )
+            await self.run_io(self._finalize, chunked_file, checksum, url)
+        except ChunkedFileDoesNotExist:
+            # A simultaneous download has already completed and finalized the file.
+            if not await self.run_io(os.path.exists, dest):
+                raise
+        except TransferCanceled:
+            await self.run_io(self._delete, chunked_file)
+            raise
+
+    async def _download_unknown_size(
+        self, url, chunked_file, check_for_cancel, chunk_read
+    ):
+        response = await self.request("HEAD", url)
+        response.raise_for_status()
+        if "content-length" in response.headers and not response.headers.get(
+            "content-encoding"
+        ):
+            await self.run_io(
+                setattr,
+                chunked_file,
+                "file_size",
+                int(response.headers["content-length"]),
+            )
+            return await self._download_ranges(
+                url, chunked_file, check_for_cancel, chunk_read
+            )
+        # Without the size of the file, it cannot be split into chunks
+        # until it has been read in full.
+        response = await self.request("GET", url)
+        response.raise_for_status()
+        data = await response.read_all()
+        await self.run_io(setattr, chunked_file, "file_size", len(data))
+        await self._write_chunks(
+            chunked_file,
+            0,
+            _iterate_async(chunked_file.chunk_generator(data)),
+            check_for_cancel,
+            chunk_read,
+        )
+
+    async def _download_ranges(self, url, chunked_file, check_for_cancel, chunk_read):
+        while True:
+            indices, start, end = await self.run_io(
+                partial(chunked_file.get_next_missing_range, full_range=True)
+            )
+            if indices is None:
+                return
+            response = await self.request(
+                "GET", url, headers={"Range": "bytes={}-{}".format(start, end)}
+            )
+            response.raise_for_status()
+            content_range = response.headers.get("content-range", "")
+            if response.status == 206 and content_range == "bytes {}-{}/{}".format(
+                start, end, chunked_file.file_size
+            ):
+                first_index = indices[0]
+            elif response.status == 206:
+                # The size of the file on the server does not match the size we
+                # were given, so use the size from the server and try again.
+                response.release()
+                total = content_range.rpartition("/")[2]
+                if not total.isdigit() or int(total) == chunked_file.file_size:
+                    raise ConnectionError(
+                        "Invalid content range {} for url: {}".format(
+                            content_range, url
+                        )
+                    )
+                await self.run_io(setattr, chunked_file, "file_size", int(total))
+                continue
+            else:
+                # The server ignored the range request, and is sending the whole file.
+                first_index = 0
+            await self._write_chunks(
+                chunked_file,
+                first_index,
+                _iterate_response(response, chunked_file.chunk_size),
+                check_for_cancel,
+                chunk_read,
+            )
+
+    async def _write_chunks(
+        self, chunked_file, first_index, chunks, check_for_cancel, chunk_read
+    ):
+        """
+        Read chunks from the async iterator, and write them to the chunked file from first_index.
+
+        Chunks are passed to a writer through a bounded queue, so that reads from the network
+        can continue while a chunk is written to disk, but only so far ahead of the disk.
+        """
+        queue = asyncio.Queue(maxsize=self.write_queue_size)
+        errors = []
+        writer_task = asyncio.ensure_future(
+            self._chunk_writer(queue, chunked_file, errors)
+        )
+        try:
+            index = first_index
+            async for data in chunks:
+                await check_for_cancel()
+                await queue.put((index, data))
+                if errors:
+                    raise errors[0]
+                await chunk_read(len(data))
+                index += 1
+        finally:
+            await chunks.aclose()
+            # Let the writer finish the chunks already read, so they are kept
+            # for resuming the download if it is interrupted.
+            await queue.put(None)
+            await writer_task
+        if errors:
+            raise errors[0]
+
+    async def _chunk_writer(self, queue, chunked_file, errors):
+        """
+        Write the (index, data) chunks from the queue to the chunked file until None is received,
+        any error is added to errors for the reader to raise.
+        """
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            if errors:
+                # Keep draining the queue after an error, so the reader is not blocked.
+                continue
+            try:
+                await self.run_io(chunked_file.write_chunk, *item)
+            except Exception as e:
+                errors.append(e)
+
+    def _finalize(self, chunked_file, checksum, url):
+        if not chunked_file.is_complete():
+            raise ConnectionError("Incomplete download of url: {}".format(url))
+        if checksum and chunked_file.md5_checksum() != checksum:
+            logger.error(
+                "An error occurred during content import: File {} is corrupted.".format(
+                    url
+                )
+            )
+            self._delete(chunked_file)
+            raise TransferFailed(
+                "Transferred file checksums did not match for {}".format(url)
+            )
+        chunked_file.finalize_file()
+        chunked_file.delete()
+
+    def _delete(self, chunked_file):
+        try:
+            chunked_file.delete()
+        except OSError:
+            pass
+
+
+async def _iterate_async(iterable):
+    for item in iterable:
+        yield item
+
+
+async def _iterate_response(response, chunk_size):
+    try:
+        while True:
+            data = await response.read_exactly(chunk_size)
+            if not data:
+                return
+            yield data
+    finally:
+        response.release()
+
+
+_engine = None
+
+_engine_lock = threading.Lock()
+
+
+def get_transfer_engine():
+    """
+    Returns the engine shared by all imports in this process, so that the limit on
+    concurrent downloads applies across all of them.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            from kolibri.utils import conf
+
+            _engine = AsyncTransferEngine(
+                max_concurrency=conf.OPTIONS["Deployment"][
+                    "ASYNC_FILE_TRANSFER_CONCURRENCY"
+                ]
+            )
+        return _engine
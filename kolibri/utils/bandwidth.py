@@ -0,0 +1,213 @@
+"""
+Rate limiting of the bandwidth used by file transfers.
+
+All downloads draw from a single BandwidthGovernor, so that content imports do not saturate a
+shared network link. The limit is shared fairly between the jobs that are transferring at the
+time, each getting an equal share, and is re-evaluated as transfers run, so moving into a
+different time window of the schedule applies to transfers that are already in progress.
+"""
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+def get_scheduled_limit(schedule, default_limit, now=None):
+    """
+    Return the bandwidth limit in bytes per second for the time window of the schedule
+    that contains now, or default_limit if there is none.
+
+    :param schedule: A list of (start minute, end minute, limit) tuples, in local time,
+        windows that end before they start wrap around midnight.
+    :param default_limit: The limit outside of the scheduled windows, 0 for no limit.
+    :param now: The datetime to get the limit for, defaults to the current local time.
+    """
+    now = now or datetime.now()
+    minute = now.hour * 60 + now.minute
+    for start, end, limit in schedule:
+        if start <= end:
+            in_window = start <= minute < end
+        else:
+            in_window = minute >= start or minute < end
+        if in_window:
+            return limit
+    return default_limit
+
+
+def get_configured_limit():
+    from kolibri.utils.conf import OPTIONS
+
+    return get_scheduled_limit(
+        OPTIONS["Deployment"]["FILE_TRANSFER_BANDWIDTH_SCHEDULE"],
+        OPTIONS["Deployment"]["FILE_TRANSFER_BANDWIDTH_LIMIT"],
+    )
+
+
+class TokenBucket(object):
+    """
+    A token bucket that lets callers reserve tokens ahead of them being available.
+    The bucket can go into debt, and a reservation returns how long the caller must wait
+    before using the tokens, so that it can be used from threads and coroutines alike.
+    """
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.clock = clock
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_update = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.last_update) * self.rate
+        )
+        self.last_update = now
+
+    def set_rate(self, rate, capacity):
+        # Refill at the old rate up to now, so that the new rate only applies from now on.
+        self._refill()
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = min(self.tokens, capacity)
+
+    def reserve(self, tokens):
+        """
+        Take tokens from the bucket, returns the number of seconds to wait before using them.
+        """
+        self._refill()
+        self.tokens -= tokens
+        if self.tokens >= 0:
+            return 0
+        return -self.tokens / float(self.rate)
+
+
+class BandwidthGovernor(object):
+    """
+    Limits the combined rate of transfers, sharing the limit equally between keys.
+
+    Each transfer reserves bandwidth under a key, normally that of the job it is running for,
+    and every key that has transferred within the last idle_timeout seconds gets an equal share
+    of the limit in its own token bucket, so one job with many concurrent transfers cannot
+    starve another job.
+
+    :param limit_provider: A callable returning the limit in bytes per second, 0 for no limit
+    :param refresh_interval: How often in seconds to call the limit_provider
+    :param idle_timeout: How long in seconds before a key that is not transferring stops
+        taking a share of the limit
+    :param burst: The number of seconds of transfer that a bucket can accumulate while idle
+    """
+
+    # Buckets always hold at least this many bytes, so that a whole chunk of a
+    # transfer can be reserved at once even at very low limits.
+    min_capacity = 128 * 1024
+
+    # The longest time to sleep between checks for cancellation and changes to the limit.
+    max_sleep = 0.5
+
+    def __init__(
+        self,
+        limit_provider=get_configured_limit,
+        refresh_interval=1,
+        idle_timeout=2,
+        burst=1,
+        clock=time.monotonic,
+    ):
+        self.limit_provider = limit_provider
+        self.refresh_interval = refresh_interval
+        self.idle_timeout = idle_timeout
+        self.burst = burst
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._limit = 0
+        self._last_refresh = None
+        self._buckets = {}
+        # The time until which each key has reserved bandwidth.
+        self._busy_until = {}
+
+    @property
+    def limit(self):
+        with self._lock:
+            self._refresh_limit(self.clock())
+            return self._limit
+
+    def _refresh_limit(self, now):
+        if (
+            self._last_refresh is not None
+            and now - self._last_refresh < self.refresh_interval
+        ):
+            return
+        self._last_refresh = now
+        try:
+            limit = self.limit_provider()
+        except Exception as e:
+            logger.error("Error getting the bandwidth limit: {}".format(e))
+            limit = self._limit
+        if limit != self._limit:
+            logger.info(
+                "File transfer bandwidth limit set to {}".format(
+                    "{} bytes per second".format(limit) if limit else "unlimited"
+                )
+            )
+            self._limit = limit
+
+    def _update_shares(self, now, key):
+        for idle_key in list(self._busy_until):
+            if self._busy_until[idle_key] + self.idle_timeout < now:
+                del self._busy_until[idle_key]
+                del self._buckets[idle_key]
+        if key not in self._buckets:
+            self._buckets[key] = TokenBucket(
+                self._limit, self.min_capacity, clock=self.clock
+            )
+            self._busy_until[key] = now
+        share = float(self._limit) / len(self._buckets)
+        capacity = max(share * self.burst, self.min_capacity)
+        for bucket in self._buckets.values():
+            if bucket.rate != share or bucket.capacity != capacity:
+                bucket.set_rate(share, capacity)
+
+    def reserve(self, size, key=None):
+        """
+        Reserve size bytes of bandwidth for key, returns the number of seconds to wait
+        before transferring them.
+        """
+        with self._lock:
+            now = self.clock()
+            self._refresh_limit(now)
+            if not self._limit:
+                self._buckets.clear()
+                self._busy_until.clear()
+                return 0
+            self._update_shares(now, key)
+            delay = self._buckets[key].reserve(size)
+            self._busy_until[key] = max(self._busy_until[key], now + delay)
+            return delay
+
+    def throttle(self, size, key=None, cancel_check=None):
+        """
+        Block until size bytes may be transferred for key.
+
+        :param cancel_check: A callable called while waiting, that raises to stop waiting
+        """
+        delay = self.reserve(size, key=key)
+        deadline = self.clock() + delay
+        while delay > 0:
+            if cancel_check:
+                cancel_check()
+            time.sleep(min(delay, self.max_sleep))
+            delay = deadline - self.clock()
+
+    async def throttle_async(self, size, key=None):
+        """
+        Wait until size bytes may be transferred for key, from a coroutine.
+        """
+        delay = self.reserve(size, key=key)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+bandwidth_governor = BandwidthGovernor()
@@ -4,8 +4,10 @@ import math
 import os
 import shutil
 import sys
+import threading
 from abc import ABCMeta
 from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from io import BufferedIOBase
 from sqlite3 import OperationalError
@@ -19,6 +21,7 @@ from requests.exceptions import ConnectionError
 from requests.exceptions import HTTPError
 from requests.exceptions import Timeout
 
+from kolibri.utils.bandwidth import bandwidth_governor as default_bandwidth_governor
 from kolibri.utils.filesystem import mkdirp
 
 
@@ -77,6 +80,15 @@ class TransferFailed(Exception):
     pass
 
 
+class SegmentStopped(Exception):
+    """
+    Raised inside a segment of a segmented download when another segment has failed,
+    so that the remaining segments stop promptly.
+    """
+
+    pass
+
+
 def retry_import(e):
     """
     When an exception occurs during channel/content import, if
@@ -471,10 +483,16 @@ class Transfer(metaclass=ABCMeta):
         dest,
         checksum=None,
         cancel_check=None,
+        bandwidth_governor=None,
+        bandwidth_key=None,
     ):
         self.source = source
         self.dest = dest
         self.checksum = checksum
+        # The BandwidthGovernor to limit the rate of this transfer with, if any,
+        # and the key to share its bandwidth under, normally the id of the job.
+        self.bandwidth_governor = bandwidth_governor
+        self.bandwidth_key = bandwidth_key
         # Set block size to 128KB
         # the previous value of 2MB was set to avoid frequent progress
         # updates during file transfer, but since file transfers
@@ -510,6 +528,17 @@ class Transfer(metaclass=ABCMeta):
         if self._cancel_check and self._cancel_check():
             self._kill_gracefully()
 
+    def throttle(self, bytes_transferred):
+        """
+        Wait until the bandwidth governor allows the transfer of bytes_transferred bytes.
+        """
+        if self.bandwidth_governor is not None:
+            self.bandwidth_governor.throttle(
+                bytes_transferred,
+                key=self.bandwidth_key,
+                cancel_check=self.cancel_check,
+            )
+
     def complete_close_and_finalize(self):
         # If there are no more chunks, mark the transfer as completed
         self.completed = True
@@ -595,6 +624,10 @@ class Transfer(metaclass=ABCMeta):
 
 
 class FileDownload(Transfer):
+    # The smallest number of bytes that will be given to each concurrent segment
+    # of a segmented download, so that small files are still fetched in one request.
+    MIN_SEGMENT_SIZE = 2 * 1024 * 1024
+
     def __init__(
         self,
         source,
@@ -608,6 +641,9 @@ class FileDownload(Transfer):
         timeout=Transfer.DEFAULT_TIMEOUT,
         retry_wait=30,
         full_ranges=True,
+        segments=1,
+        bandwidth_governor=default_bandwidth_governor,
+        bandwidth_key=None,
     ):
 
         # allow an existing requests.Session instance to be passed in, so it can be reused for speed
@@ -622,6 +658,11 @@ class FileDownload(Transfer):
         # chunks of the file.
         self.full_ranges = full_ranges
 
+        # The maximum number of byte ranges of the file to download concurrently,
+        # only used when full ranges are being downloaded and the server supports
+        # range requests.
+        self.segments = max(1, segments)
+
         self.set_range(start_range, end_range)
 
         self.timeout = timeout
@@ -636,7 +677,12 @@ class FileDownload(Transfer):
         self.transfer_size = None
 
         super(FileDownload, self).__init__(
-            source, dest, checksum=checksum, cancel_check=cancel_check
+            source,
+            dest,
+            checksum=checksum,
+            cancel_check=cancel_check,
+            bandwidth_governor=bandwidth_governor,
+            bandwidth_key=bandwidth_key,
         )
 
         self._initialize_chunked_file()
@@ -794,9 +840,17 @@ class FileDownload(Transfer):
             self._set_headers()
         self.started = True
 
-    def _run_byte_range_download(self, progress_callback):
+    def _run_byte_range_download(self, progress_callback, start=None, end=None):
+        """
+        Download all missing chunks between the start and end bytes, defaulting to
+        the range of this download. Returns False if the server ignored the range
+        request and the whole file was written instead.
+        """
+        start = self.range_start if start is None else start
+        end = self.range_end if end is None else end
+        range_response_supported = True
         chunk_indices, start_byte, end_byte = self.dest_file_obj.get_next_missing_range(
-            start=self.range_start, end=self.range_end, full_range=self.full_ranges
+            start=start, end=end, full_range=self.full_ranges
         )
         while chunk_indices is not None:
             with self.dest_file_obj.lock_chunks(*chunk_indices):
@@ -842,10 +896,96 @@ class FileDownload(Transfer):
                     start_byte,
                     end_byte,
                 ) = self.dest_file_obj.get_next_missing_range(
-                    start=self.range_start,
-                    end=self.range_end,
+                    start=start,
+                    end=end,
                     full_range=self.full_ranges,
                 )
+        return range_response_supported
+
+    def _get_download_segments(self):
+        """
+        Split the missing chunks of this download into at most self.segments
+        contiguous byte ranges, each at least MIN_SEGMENT_SIZE bytes long.
+        """
+        missing_chunks = [
+            chunk_index
+            for chunk_index, _, _ in self.dest_file_obj.missing_chunks_generator(
+                start=self.range_start, end=self.range_end
+            )
+        ]
+        chunk_size = self.dest_file_obj.chunk_size
+        chunks_per_segment = max(
+            int(math.ceil(float(len(missing_chunks)) / self.segments)),
+            self.MIN_SEGMENT_SIZE // chunk_size,
+            1,
+        )
+        segments = []
+        for i in range(0, len(missing_chunks), chunks_per_segment):
+            segment_chunks = missing_chunks[i : i + chunks_per_segment]
+            segments.append(
+                (
+                    segment_chunks[0] * chunk_size,
+                    min((segment_chunks[-1] + 1) * chunk_size, self.total_size) - 1,
+                )
+            )
+        return segments
+
+    def _run_segmented_download(self, progress_callback):
+        """
+        Download the missing chunks of the file over several concurrent range requests.
+        Each segment writes directly into the chunked file, so an interrupted download
+        resumes from whichever chunks are still missing.
+        """
+        # Download the first missing chunk on its own, to check that the server
+        # actually honours range requests before opening any more connections.
+        chunk_indices, start_byte, end_byte = self.dest_file_obj.get_next_missing_range(
+            start=self.range_start, end=self.range_end
+        )
+        if chunk_indices is None or not self._run_byte_range_download(
+            progress_callback, start=start_byte, end=end_byte
+        ):
+            return
+
+        segments = self._get_download_segments()
+        if len(segments) < 2:
+            self._run_byte_range_download(progress_callback)
+            return
+
+        self._run_download_segments(segments, progress_callback)
+
+    def _run_download_segments(self, segments, progress_callback):
+        """
+        Download each of the (start, end) byte range segments on its own thread,
+        stopping the others promptly if any of them fails.
+        """
+        lock = threading.Lock()
+        stopped = threading.Event()
+        errors = []
+
+        def segment_progress_callback(bytes_to_write):
+            if stopped.is_set():
+                raise SegmentStopped()
+            progress_callback(bytes_to_write)
+
+        def run_segment(start, end):
+            try:
+                self._run_byte_range_download(
+                    segment_progress_callback, start=start, end=end
+                )
+            except SegmentStopped:
+                pass
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+                stopped.set()
+
+        with ThreadPoolExecutor(max_workers=len(segments)) as executor:
+            for start, end in segments:
+                executor.submit(run_segment, start, end)
+
+        if errors:
+            # Raise the first error, so that it can be handled by the retry logic.
+            raise errors[0]
 
     def _run_no_byte_range_download(self, progress_callback):
         with self.dest_file_obj.lock_chunks(self.dest_file_obj.all_chunks()):
@@ -870,17 +1010,26 @@ class FileDownload(Transfer):
         if not self.started:
             raise AssertionError("File download must be started before it can be run.")
 
+        progress_lock = threading.Lock()
+
         def progress_callback(bytes_to_write):
             if progress_update:
-                progress_update(len(bytes_to_write))
+                # The segments of a segmented download report progress from several threads.
+                with progress_lock:
+                    progress_update(len(bytes_to_write))
             self.cancel_check()
+            # Wait for bandwidth outside of the lock, so that other segments are not held up.
+            self.throttle(len(bytes_to_write))
 
         # Some Kolibri versions do support range requests, but fail to properly report this fact
         # from their Accept-Ranges header. So we need to check if the server supports range requests
         # by trying to make a range request, and if it fails, we need to fall back to the old
         # behavior of downloading the whole file.
         if self.content_length_header and not self.compressed:
-            self._run_byte_range_download(progress_callback)
+            if self.segments > 1 and self.full_ranges:
+                self._run_segmented_download(progress_callback)
+            else:
+                self._run_byte_range_download(progress_callback)
         elif self.total_size:
             self._run_no_byte_range_download(progress_callback)
         else:
@@ -933,6 +1082,9 @@ class FileCopy(Transfer):
             self.hasher.update(block)
             if callable(progress_update):
                 progress_update(len(block))
+            # Copies are only limited when given a bandwidth governor, for example
+            # when the source is on a network share.
+            self.throttle(len(block))
         self.complete_close_and_finalize()
 
     def close(self):
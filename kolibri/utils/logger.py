@@ -439,11 +439,48 @@ def setup_queue_logging() -> LoggerAwareQueueListener:
 
 
 def setup_worker_logging(queue) -> None:
-    """Sets up logging in a worker to use the queue if not already configured."""
+    """
+    Sets up logging in a worker to use the queue. A worker process forked from a process
+    that already uses queue logging has inherited its queue handlers, so these are pointed
+    at the queue instead.
+    """
     try:
         _replace_handlers_with_queue(queue)
     except QueueLoggingInitializedError:
-        pass
+        for logger_name in list(logging.root.manager.loggerDict.keys()) + [""]:
+            for handler in logging.getLogger(logger_name).handlers:
+                if isinstance(handler, LoggerAwareQueueHandler):
+                    handler.queue = queue
+
+
+class QueueForwardingHandler(logging.Handler):
+    """
+    A handler that puts records, already prepared by a LoggerAwareQueueHandler,
+    as they are on another queue.
+    """
+
+    def __init__(self, queue):
+        super().__init__()
+        self.queue = queue
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except Exception:
+            self.handleError(record)
+
+
+def setup_process_queue_logging(queue) -> QueueListener:
+    """
+    Sets up forwarding of records from worker processes to queue, for when queue
+    cannot be shared with them, as it is not a multiprocessing queue.
+    Returns the queue listener, whose queue the worker processes should log to.
+    """
+    from kolibri.utils.multiprocessing_compat import ProcessQueue
+
+    listener = QueueListener(ProcessQueue(), QueueForwardingHandler(queue))
+    listener.start()
+    return listener
 
 
 def cleanup_queue_logging(listener: Optional[LoggerAwareQueueListener]) -> None:
@@ -57,3 +57,31 @@ def PoolExecutor(*args, **kwargs):
     if use_multiprocessing():
         return futures.ProcessPoolExecutor(*args, **kwargs)
     return futures.ThreadPoolExecutor(*args, **kwargs)
+
+
+def use_process_pool():
+    """
+    Whether jobs can be run in a separate process from a pool, even when multiprocessing
+    is not used for the worker pools. Only supported where processes can be started from
+    a fork server, so that they are not forked from the server process along with its
+    threads and database connections, and set up Django and logging themselves.
+    """
+    try:
+        # Import in order to check if multiprocessing is supported on this platform
+        from multiprocessing import synchronize  # noqa
+
+        return "forkserver" in multiprocessing.get_all_start_methods()
+    except ImportError:
+        return False
+
+
+def _process_context():
+    return multiprocessing.get_context("forkserver")
+
+
+def ProcessQueue(*args, **kwargs):
+    return _process_context().Queue(*args, **kwargs)
+
+
+def ProcessPoolExecutor(*args, **kwargs):
+    return futures.ProcessPoolExecutor(*args, mp_context=_process_context(), **kwargs)
@@ -247,6 +247,65 @@ def validate_bytes(value):
     return value
 
 
+def _parse_time_of_day(value):
+    hours, minutes = value.strip().split(":")
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or hours * 60 + minutes > 24 * 60:
+        raise ValueError(value)
+    return hours * 60 + minutes
+
+
+def bandwidth_schedule(value):
+    """
+    Check that the supplied value is a comma separated list of time windows with a
+    bandwidth limit for each, e.g. "08:00-15:30=256KB,15:30-17:00=1MB".
+    Returns a list of (start minute, end minute, limit in bytes) tuples.
+    """
+    value = _process_list(value)
+    out = []
+    errors = []
+    for entry in value:
+        try:
+            window, limit = entry.split("=")
+            start, end = window.split("-")
+            out.append(
+                (
+                    _parse_time_of_day(start),
+                    _parse_time_of_day(end),
+                    bytes_from_humans(limit.strip()),
+                )
+            )
+        except ValueError:
+            errors.append(entry)
+    if errors:
+        raise VdtValueError(errors)
+    return out
+
+
+def resource_limits(value):
+    """
+    Check that the supplied value is a comma separated list of resource tags with the
+    maximum number of tasks using each that can run at the same time, e.g. "disk=1,cpu=2".
+    Returns a list of (tag, limit) tuples.
+    """
+    value = _process_list(value)
+    out = []
+    errors = []
+    for entry in value:
+        try:
+            tag, limit = entry.split("=")
+            tag = tag.strip()
+            limit = int(limit)
+            if not tag or limit < 1:
+                raise ValueError()
+            out.append((tag, limit))
+        except ValueError:
+            errors.append(entry)
+    if errors:
+        raise VdtValueError(errors)
+    return out
+
+
 def url_prefix(value):
     if not isinstance(value, str):
         raise VdtValueError(value)
@@ -378,6 +437,31 @@ def lazy_import_callback_list(value):
     return out
 
 
+def import_path_list(value):
+    """
+    Check that the supplied value is a list of import paths, without importing them.
+
+    :param list[str] value: A list of strings that are valid import paths
+    """
+    value = _process_list(value)
+
+    out = []
+    errors = []
+    for entry in value:
+        entry = entry.strip() if isinstance(entry, str) else entry
+        if not entry:
+            continue
+        try:
+            lazy_import_callback(entry)
+            out.append(entry)
+        except ValueError:
+            errors.append(entry)
+    if errors:
+        raise VdtValueError(errors)
+
+    return out
+
+
 def _process_csp_source(value):
     if not isinstance(value, str):
         raise VdtValueError(value)
@@ -464,6 +548,14 @@ base_option_spec = {
             "default": 1000,
             "description": "Maximum number of entries to maintain in the cache at once.",
         },
+        "CONTENTNODE_CACHE_MAX_ENTRIES": {
+            "type": "integer",
+            "default": 10000,
+            "description": """
+                Maximum number of serialized content nodes to keep in the in-memory cache
+                of each process, to serve content node API requests from.
+            """,
+        },
         "CACHE_PASSWORD": {
             "type": "string",
             "default": "",
@@ -520,6 +612,24 @@ base_option_spec = {
                 Value can either be a number suffixed with a unit (e.g. MB, GB, TB) or an integer number of bytes.
             """,
         },
+        "ZIP_CONTENT_CACHE_MEMORY_SIZE": {
+            "type": "bytes",
+            "default": "32MB",
+            "description": """
+                Memory to be used in each Kolibri process for caching the rewritten HTML files and the file listings
+                of zip files served by the zip content server.
+                Value can either be a number suffixed with a unit (e.g. MB, GB, TB) or an integer number of bytes.
+            """,
+        },
+        "ZIP_CONTENT_CACHE_DISK_SIZE": {
+            "type": "bytes",
+            "default": "200MB",
+            "description": """
+                Disk space to be used for caching the rewritten HTML files and the file listings of zip files
+                served by the zip content server, shared between Kolibri processes. Set to 0 to disable the disk cache.
+                Value can either be a number suffixed with a unit (e.g. MB, GB, TB) or an integer number of bytes.
+            """,
+        },
     },
     "Database": {
         "DATABASE_ENGINE": {
@@ -750,6 +860,54 @@ base_option_spec = {
                 Value can either be a number suffixed with a unit (e.g. MB, GB, TB) or an integer number of bytes.
             """,
         },
+        "FILE_DOWNLOAD_SEGMENTS": {
+            "type": "integer",
+            "default": 4,
+            "description": """
+                The maximum number of byte ranges of a single large file that will be downloaded concurrently
+                during content import, to make better use of the available bandwidth. Files are only split
+                when the server supports range requests, and each range is at least 2MB. Set to 1 to download
+                each file over a single connection.
+            """,
+        },
+        "FILE_TRANSFER_BANDWIDTH_LIMIT": {
+            "type": "bytes",
+            "default": 0,
+            "description": """
+                The maximum bandwidth in bytes per second that file downloads in each Kolibri process may
+                use, shared equally between the jobs that are downloading at the time. Set to 0 for no limit.
+                Value can either be a number suffixed with a unit (e.g. KB, MB) or an integer number of bytes.
+            """,
+        },
+        "FILE_TRANSFER_BANDWIDTH_SCHEDULE": {
+            "type": "bandwidth_schedule",
+            "default": "",
+            "description": """
+                Bandwidth limits for file downloads during particular times of day, in local time, which take
+                precedence over FILE_TRANSFER_BANDWIDTH_LIMIT within their time windows. A comma separated list
+                of windows and limits in bytes per second, for example "08:00-15:30=256KB,15:30-17:00=1MB".
+                Windows that end before they start extend past midnight, and a limit of 0 means no limit.
+            """,
+        },
+        "FILE_TRANSFER_ENGINE": {
+            "type": "option",
+            "options": ("threaded", "asyncio"),
+            "default": "threaded",
+            "description": """
+                How files are downloaded during content import from other Kolibri instances and Studio.
+                'threaded' downloads each file in its own thread. 'asyncio' downloads all files on a single
+                event loop, sharing keep-alive connections, which allows many more files to be downloaded
+                concurrently on devices with little memory.
+            """,
+        },
+        "ASYNC_FILE_TRANSFER_CONCURRENCY": {
+            "type": "integer",
+            "default": 50,
+            "description": """
+                The maximum number of files that will be downloaded concurrently in each Kolibri process
+                when FILE_TRANSFER_ENGINE is set to 'asyncio'.
+            """,
+        },
         "LISTEN_ADDRESS": {
             "type": "ip_addr",
             "default": "0.0.0.0",
@@ -816,6 +974,41 @@ base_option_spec = {
                 The number of workers to spin up for high priority asynchronous tasks.
             """,
         },
+        "RESOURCE_LIMITS": {
+            "type": "resource_limits",
+            "default": "disk=1,cpu=2",
+            "description": """
+                A comma separated list of the maximum number of tasks using a resource that can run at the same time,
+                e.g. "disk=1,network=4,cpu=2,db-write=1". Tasks declare the resources they use, out of disk, network,
+                cpu and db-write, and a task is only started if none of its resources is at its limit, so that tasks
+                that would compete for a resource, like two imports writing to the same SD card, run one after the
+                other, while tasks that do not can run alongside each other. Resources that are not listed are not limited.
+            """,
+        },
+        "JOB_RETENTION_DAYS": {
+            "type": "integer",
+            "default": 30,
+            "description": """
+                The number of days to keep finished jobs for, before they are removed from the task list,
+                and only a summary of them is kept in the job history.
+            """,
+        },
+        "JOB_RETENTION_COUNT": {
+            "type": "integer",
+            "default": 100,
+            "description": """
+                The maximum number of finished jobs to keep for each task, older finished jobs are removed
+                from the task list, and only a summary of them is kept in the job history.
+            """,
+        },
+        "PROFILE_TASKS": {
+            "type": "import_path_list",
+            "default": "",
+            "description": """
+                A list of the import paths of tasks to profile, e.g. "kolibri.core.content.tasks.remotechannelimport".
+                A cProfile profile of each run of these tasks is saved in the task_profiles directory in KOLIBRI_HOME.
+            """,
+        },
         "JOB_STORAGE_FILEPATH": {
             "type": "path",
             "default": "job_storage.sqlite3",
@@ -837,10 +1030,13 @@ def _get_validator():
             "port": port,
             "url_prefix": url_prefix,
             "bytes": validate_bytes,
+            "bandwidth_schedule": bandwidth_schedule,
+            "resource_limits": resource_limits,
             "multiprocess_bool": multiprocess_bool,
             "storage_option": storage_option,
             "cache_option": cache_option,
             "lazy_import_callback_list": lazy_import_callback_list,
+            "import_path_list": import_path_list,
             "csp_source_list": csp_source_list,
         }
     )
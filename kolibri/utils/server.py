@@ -264,6 +264,7 @@ class ZipContentServerPlugin(ServerPlugin):
 class DefaultScheduledTasksPlugin(SimplePlugin):
     def START(self):
         from kolibri.core.analytics.tasks import schedule_ping
+        from kolibri.core.deviceadmin.tasks import schedule_job_storage_compaction
         from kolibri.core.deviceadmin.tasks import schedule_vacuum
         from kolibri.core.deviceadmin.tasks import schedule_streamed_cache_cleanup
 
@@ -276,6 +277,9 @@ class DefaultScheduledTasksPlugin(SimplePlugin):
         # schedule the streamed cache cleanup job if not already scheduled
         schedule_streamed_cache_cleanup()
 
+        # schedule the job storage compaction job if not already scheduled
+        schedule_job_storage_compaction()
+
 
 class ServicesPlugin(SimplePlugin):
     def __init__(self, bus):
@@ -0,0 +1,98 @@
+"""
+A local HTTP server standing in for a remote Kolibri, for the tests of file transfers.
+"""
+import re
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import HTTPServer
+from socketserver import ThreadingMixIn
+
+
+class ContentRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self._respond(body=False)
+
+    def do_GET(self):
+        self._respond()
+
+    def _respond(self, body=True):
+        server = self.server
+        with server.lock:
+            server.connections.add(self.client_address)
+            server.requests.append((self.command, self.path, self.headers["Range"]))
+        if self.path in server.redirects:
+            self.send_response(302)
+            self.send_header("Location", server.redirects[self.path])
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        data = server.files.get(self.path)
+        if data is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        match = re.match(r"bytes=(\d+)-(\d+)", self.headers["Range"] or "")
+        if match and server.range_support:
+            start, end = int(match.group(1)), int(match.group(2))
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", "bytes {}-{}/{}".format(start, end, len(data))
+            )
+            data = data[start : end + 1]
+        else:
+            self.send_response(200)
+        if server.chunked_encoding:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if not body:
+            return
+        if server.chunked_encoding:
+            for i in range(0, len(data), 50000):
+                block = data[i : i + 50000]
+                self.wfile.write(
+                    "{:x}\r\n".format(len(block)).encode() + block + b"\r\n"
+                )
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self.wfile.write(data)
+
+
+class LocalContentServer(ThreadingMixIn, HTTPServer):
+    """
+    A stand in for a remote Kolibri serving files with keep-alive connections and range requests.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ("127.0.0.1", 0), ContentRequestHandler)
+        self.lock = threading.Lock()
+        self.files = {}
+        self.redirects = {}
+        self.connections = set()
+        self.requests = []
+        self.range_support = True
+        self.chunked_encoding = False
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    @property
+    def base_url(self):
+        return "http://127.0.0.1:{}/".format(self.server_address[1])
+
+    def add_file(self, path, data):
+        self.files[path] = data
+        return self.base_url + path.lstrip("/")
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
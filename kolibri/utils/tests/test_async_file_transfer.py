@@ -0,0 +1,256 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.exceptions import HTTPError
+
+from kolibri.utils.async_file_transfer import AsyncTransferEngine
+from kolibri.utils.file_transfer import ChunkedFile
+from kolibri.utils.file_transfer import FileDownload
+from kolibri.utils.file_transfer import TransferCanceled
+from kolibri.utils.file_transfer import TransferFailed
+from kolibri.utils.tests.content_server import LocalContentServer
+
+logger = logging.getLogger(__name__)
+
+
+class TestAsyncTransferEngine(unittest.TestCase):
+    def setUp(self):
+        self.server = LocalContentServer()
+        self.engine = AsyncTransferEngine(retry_wait=0, max_connections_per_host=4)
+        self.destdir = tempfile.mkdtemp()
+        self.data = os.urandom(ChunkedFile.chunk_size * 5 + 731)
+        self.checksum = hashlib.md5(self.data).hexdigest()
+        self.url = self.server.add_file("/file", self.data)
+        self.dest = os.path.join(self.destdir, "file")
+
+    def tearDown(self):
+        self.engine.shutdown()
+        self.server.stop()
+        shutil.rmtree(self.destdir, ignore_errors=True)
+
+    def _download(self, url=None, **kwargs):
+        kwargs.setdefault("checksum", self.checksum)
+        kwargs.setdefault("file_size", len(self.data))
+        return self.engine.submit(
+            self.engine.download(url or self.url, self.dest, **kwargs)
+        ).result(timeout=30)
+
+    def _assert_downloaded(self):
+        with open(self.dest, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertFalse(os.path.exists(self.dest + ".chunks"))
+
+    def test_download(self):
+        progress = []
+        self._download(progress_update=progress.append)
+        self._assert_downloaded()
+        self.assertEqual(sum(progress), len(self.data))
+        # The known file size means that no HEAD request is needed,
+        # and the whole file is fetched in a single range request.
+        self.assertEqual(
+            self.server.requests,
+            [("GET", "/file", "bytes=0-{}".format(len(self.data) - 1))],
+        )
+
+    def test_download_resumes_chunked_file(self):
+        chunked_file = ChunkedFile(self.dest)
+        chunked_file.file_size = len(self.data)
+        chunk_size = chunked_file.chunk_size
+        for index in (0, 1, 4):
+            chunked_file.write_chunk(
+                index, self.data[index * chunk_size : (index + 1) * chunk_size]
+            )
+        self._download()
+        self._assert_downloaded()
+        self.assertEqual(
+            [r[2] for r in self.server.requests],
+            [
+                "bytes={}-{}".format(chunk_size * 2, chunk_size * 4 - 1),
+                "bytes={}-{}".format(chunk_size * 5, len(self.data) - 1),
+            ],
+        )
+
+    def test_download_no_range_support(self):
+        self.server.range_support = False
+        self._download()
+        self._assert_downloaded()
+
+    def test_download_unknown_size_chunked_encoding(self):
+        self.server.range_support = False
+        self.server.chunked_encoding = True
+        self._download(file_size=None)
+        self._assert_downloaded()
+
+    def test_download_unknown_size_head_request(self):
+        self._download(file_size=None)
+        self._assert_downloaded()
+        self.assertEqual(self.server.requests[0][0], "HEAD")
+
+    def test_download_wrong_file_size(self):
+        self._download(file_size=len(self.data) - 100)
+        self._assert_downloaded()
+
+    def test_download_redirect(self):
+        self.server.redirects["/redirect"] = self.url
+        self._download(url=self.server.base_url + "redirect")
+        self._assert_downloaded()
+
+    def test_download_not_found(self):
+        with self.assertRaises(HTTPError) as cm:
+            self._download(url=self.server.base_url + "missing")
+        self.assertEqual(cm.exception.response.status_code, 404)
+
+    def test_download_checksum_mismatch(self):
+        with self.assertRaises(TransferFailed):
+            self._download(checksum=hashlib.md5(b"other").hexdigest())
+        self.assertFalse(os.path.exists(self.dest))
+        self.assertFalse(os.path.exists(self.dest + ".chunks"))
+
+    def test_download_canceled(self):
+        with self.assertRaises(TransferCanceled):
+            self._download(cancel_check=lambda: True)
+        self.assertFalse(os.path.exists(self.dest))
+
+    def test_connections_reused(self):
+        urls = [
+            self.server.add_file("/file_{}".format(i), self.data) for i in range(20)
+        ]
+        futures = [
+            self.engine.submit(
+                self.engine.download(
+                    url,
+                    os.path.join(self.destdir, "file_{}".format(i)),
+                    checksum=self.checksum,
+                    file_size=len(self.data),
+                )
+            )
+            for i, url in enumerate(urls)
+        ]
+        for future in futures:
+            future.result(timeout=30)
+        self.assertEqual(len(self.server.requests), 20)
+        self.assertLessEqual(len(self.server.connections), 4)
+
+
+class TestAsyncTransferEngineBenchmark(unittest.TestCase):
+    """
+    Compares downloading many files with the asyncio engine against running a FileDownload
+    per file on a thread pool, as content import does, from a local server.
+    """
+
+    file_count = 60
+
+    file_size = 3 * ChunkedFile.chunk_size + 100
+
+    def setUp(self):
+        self.server = LocalContentServer()
+        self.destdir = tempfile.mkdtemp()
+        self.files = []
+        for i in range(self.file_count):
+            data = os.urandom(self.file_size)
+            self.files.append(
+                (
+                    self.server.add_file("/file_{}".format(i), data),
+                    hashlib.md5(data).hexdigest(),
+                )
+            )
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.destdir, ignore_errors=True)
+
+    def _measure(self, download_all):
+        """
+        Returns the time taken by download_all, and the most threads running at once.
+        """
+        baseline_threads = threading.active_count()
+        peak_threads = [baseline_threads]
+        done = threading.Event()
+
+        def sample_threads():
+            while not done.is_set():
+                peak_threads[0] = max(peak_threads[0], threading.active_count())
+                time.sleep(0.005)
+
+        sampler = threading.Thread(target=sample_threads)
+        sampler.start()
+        start = time.time()
+        try:
+            download_all()
+        finally:
+            elapsed = time.time() - start
+            done.set()
+            sampler.join()
+        # Exclude the sampling thread, this includes the server's thread for each connection.
+        threads = peak_threads[0] - baseline_threads - 1
+        return elapsed, threads
+
+    def _dest(self, engine, i):
+        return os.path.join(self.destdir, engine, "file_{}".format(i))
+
+    def _assert_downloaded(self, engine):
+        for i, (url, checksum) in enumerate(self.files):
+            with open(self._dest(engine, i), "rb") as f:
+                self.assertEqual(hashlib.md5(f.read()).hexdigest(), checksum)
+
+    def test_benchmark(self):
+        def threaded_download_all():
+            def download(i):
+                url, checksum = self.files[i]
+                with FileDownload(url, self._dest("threaded", i), checksum) as download:
+                    download.run()
+
+            with ThreadPoolExecutor(max_workers=10) as executor:
+                list(executor.map(download, range(self.file_count)))
+
+        engine = AsyncTransferEngine(max_concurrency=50)
+
+        def async_download_all():
+            futures = [
+                engine.submit(
+                    engine.download(
+                        url,
+                        self._dest("asyncio", i),
+                        checksum=checksum,
+                        file_size=self.file_size,
+                    )
+                )
+                for i, (url, checksum) in enumerate(self.files)
+            ]
+            for future in futures:
+                future.result(timeout=60)
+
+        connections_before = len(self.server.connections)
+        threaded_time, threaded_threads = self._measure(threaded_download_all)
+        threaded_connections = len(self.server.connections) - connections_before
+        self._assert_downloaded("threaded")
+
+        connections_before = len(self.server.connections)
+        try:
+            async_time, async_threads = self._measure(async_download_all)
+        finally:
+            engine.shutdown()
+        async_connections = len(self.server.connections) - connections_before
+        self._assert_downloaded("asyncio")
+
+        logger.info(
+            "Downloaded {} files: threaded {:.2f}s, {} connections; asyncio {:.2f}s, {} connections".format(
+                self.file_count,
+                threaded_time,
+                threaded_connections,
+                async_time,
+                async_connections,
+            )
+        )
+        # The engine runs with a fixed number of threads however many files
+        # are in flight, and reuses its connections to the server.
+        self.assertLessEqual(async_connections, engine.max_connections_per_host)
+        self.assertLess(async_connections, threaded_connections)
+        self.assertLess(async_threads, threaded_threads)
@@ -0,0 +1,228 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+from mock import MagicMock
+from mock import patch
+from validate import VdtValueError
+
+from kolibri.utils.bandwidth import BandwidthGovernor
+from kolibri.utils.bandwidth import get_scheduled_limit
+from kolibri.utils.bandwidth import TokenBucket
+from kolibri.utils.file_transfer import FileCopy
+from kolibri.utils.file_transfer import FileDownload
+from kolibri.utils.file_transfer import TransferCanceled
+from kolibri.utils.options import bandwidth_schedule
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestTokenBucket(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(100, 100, clock=self.clock)
+
+    def test_reserve_within_capacity(self):
+        self.assertEqual(self.bucket.reserve(60), 0)
+        self.assertEqual(self.bucket.reserve(40), 0)
+
+    def test_reserve_goes_into_debt(self):
+        self.bucket.reserve(100)
+        self.assertEqual(self.bucket.reserve(50), 0.5)
+        self.assertEqual(self.bucket.reserve(50), 1)
+
+    def test_refill(self):
+        self.bucket.reserve(100)
+        self.clock.sleep(0.5)
+        self.assertEqual(self.bucket.reserve(50), 0)
+        self.clock.sleep(10)
+        # The bucket only refills up to its capacity.
+        self.assertEqual(self.bucket.reserve(200), 1)
+
+    def test_set_rate(self):
+        self.bucket.reserve(100)
+        self.bucket.set_rate(200, 200)
+        self.assertEqual(self.bucket.reserve(100), 0.5)
+
+
+class TestBandwidthGovernor(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limit = 1024 * 1024
+        self.governor = BandwidthGovernor(
+            limit_provider=lambda: self.limit, clock=self.clock
+        )
+
+    def _transfer(self, key, size, seconds, chunk=64 * 1024):
+        """
+        Transfer size bytes for key for the given number of seconds, returns the bytes transferred.
+        """
+        transferred = 0
+        end = self.clock() + seconds
+        while self.clock() < end and transferred < size:
+            self.clock.sleep(self.governor.reserve(chunk, key=key))
+            transferred += chunk
+        return transferred
+
+    def test_no_limit(self):
+        self.limit = 0
+        self.assertEqual(self.governor.reserve(100 * 1024 * 1024, key="a"), 0)
+
+    def test_limits_rate(self):
+        transferred = self._transfer("a", float("inf"), 10)
+        # Allow for the initial burst of the bucket.
+        self.assertLessEqual(transferred, self.limit * 10 + self.governor.min_capacity)
+        self.assertGreaterEqual(transferred, self.limit * 9)
+
+    def test_fair_share(self):
+        delays = {"a": 0, "b": 0}
+        transferred = {"a": 0, "b": 0}
+        # Interleave two jobs, where job a asks for four times as much at a time.
+        for _ in range(200):
+            for key, chunk in (("a", 256 * 1024), ("b", 64 * 1024)):
+                if delays[key] <= self.clock():
+                    delays[key] = self.clock() + self.governor.reserve(chunk, key=key)
+                    transferred[key] += chunk
+            self.clock.sleep(0.05)
+        self.assertAlmostEqual(
+            float(transferred["a"]) / transferred["b"], 1, delta=0.15
+        )
+        self.assertLessEqual(
+            transferred["a"] + transferred["b"],
+            self.limit * 10 + 2 * 256 * 1024,
+        )
+
+    def test_idle_key_releases_share(self):
+        self.governor.reserve(64 * 1024, key="a")
+        self.governor.reserve(64 * 1024, key="b")
+        self.assertEqual(self.governor._buckets["a"].rate, self.limit / 2)
+        self.clock.sleep(self.governor.idle_timeout + 1)
+        self.governor.reserve(64 * 1024, key="a")
+        self.assertNotIn("b", self.governor._buckets)
+        self.assertEqual(self.governor._buckets["a"].rate, self.limit)
+
+    def test_limit_provider_refreshed(self):
+        self.governor.reserve(64 * 1024, key="a")
+        self.limit = 2048
+        self.assertNotEqual(self.governor.limit, 2048)
+        self.clock.sleep(self.governor.refresh_interval)
+        self.assertEqual(self.governor.limit, 2048)
+
+    def test_limit_provider_error_keeps_limit(self):
+        self.assertEqual(self.governor.limit, self.limit)
+        self.governor.limit_provider = MagicMock(side_effect=KeyError)
+        self.clock.sleep(self.governor.refresh_interval)
+        self.assertEqual(self.governor.limit, self.limit)
+
+    def test_throttle_checks_for_cancel(self):
+        self.limit = 1024
+        cancel_check = MagicMock(side_effect=TransferCanceled)
+        with patch("kolibri.utils.bandwidth.time.sleep", self.clock.sleep):
+            self.governor.throttle(self.governor.min_capacity, key="a")
+            with self.assertRaises(TransferCanceled):
+                self.governor.throttle(1024, key="a", cancel_check=cancel_check)
+
+    def test_throttle_async(self):
+        self.limit = 10 * 1024 * 1024
+        governor = BandwidthGovernor(limit_provider=lambda: self.limit)
+
+        async def transfer():
+            for _ in range(20):
+                await governor.throttle_async(128 * 1024, key="a")
+
+        loop = asyncio.new_event_loop()
+        try:
+            start = loop.time()
+            loop.run_until_complete(transfer())
+            elapsed = loop.time() - start
+        finally:
+            loop.close()
+        # 2.5MB at 10MB/s, less the initial burst.
+        self.assertGreaterEqual(elapsed, 0.2)
+
+
+class TestBandwidthSchedule(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(
+            bandwidth_schedule("08:00-15:30=256KB, 22:00-06:00=0"),
+            [(480, 930, 256000), (1320, 360, 0)],
+        )
+
+    def test_parse_empty(self):
+        self.assertEqual(bandwidth_schedule(""), [])
+
+    def test_parse_invalid(self):
+        for value in ("08:00=1MB", "08:00-25:00=1MB", "08:00-09:00=lots", "8-9=1MB"):
+            with self.assertRaises(VdtValueError):
+                bandwidth_schedule(value)
+
+    def test_scheduled_limit(self):
+        schedule = [(480, 930, 1000), (1320, 360, 2000)]
+        for hour, minute, limit in (
+            (8, 0, 1000),
+            (15, 29, 1000),
+            (15, 30, 5),
+            (23, 0, 2000),
+            (3, 0, 2000),
+            (6, 0, 5),
+        ):
+            self.assertEqual(
+                get_scheduled_limit(
+                    schedule, 5, now=datetime(2020, 1, 1, hour, minute)
+                ),
+                limit,
+            )
+
+
+class TestTransferThrottling(unittest.TestCase):
+    def setUp(self):
+        self.destdir = tempfile.mkdtemp()
+        self.source = os.path.join(self.destdir, "source")
+        with open(self.source, "wb") as f:
+            f.write(os.urandom(300 * 1024))
+        self.governor = MagicMock()
+
+    def tearDown(self):
+        shutil.rmtree(self.destdir, ignore_errors=True)
+
+    def test_file_copy_throttled(self):
+        with FileCopy(
+            self.source,
+            os.path.join(self.destdir, "dest"),
+            bandwidth_governor=self.governor,
+            bandwidth_key="job",
+        ) as copy:
+            copy.run()
+        self.assertEqual(
+            sum(c[0][0] for c in self.governor.throttle.call_args_list), 300 * 1024
+        )
+        for c in self.governor.throttle.call_args_list:
+            self.assertEqual(c[1]["key"], "job")
+
+    def test_file_copy_not_throttled_by_default(self):
+        with FileCopy(self.source, os.path.join(self.destdir, "dest")) as copy:
+            self.assertIsNone(copy.bandwidth_governor)
+
+    def test_file_download_uses_default_governor(self):
+        from kolibri.utils.bandwidth import bandwidth_governor
+
+        download = FileDownload(
+            "http://example.com/file",
+            os.path.join(self.destdir, "download"),
+            bandwidth_key="job",
+        )
+        self.assertIs(download.bandwidth_governor, bandwidth_governor)
+        download.throttle(1024)
+        download.close()
@@ -916,6 +916,156 @@ class TestTransferNoFullRangesDownloadByteRangeSupportNotReported(
         return True
 
 
+class TestTransferSegmentedDownload(BaseTestTransfer):
+    HEADERS = TestTransferDownloadByteRangeSupport.HEADERS
+    byte_range_support = TestTransferDownloadByteRangeSupport.byte_range_support
+    get_headers = TestTransferDownloadByteRangeSupport.get_headers
+    mock_get_request = TestTransferDownloadByteRangeSupport.mock_get_request
+    mock_head_request = TestTransferDownloadByteRangeSupport.mock_head_request
+    set_session_mock = TestTransferDownloadByteRangeSupport.set_session_mock
+
+    def setUp(self):
+        super(TestTransferSegmentedDownload, self).setUp()
+        self.source = "http://example.com/testfile"
+        self.set_session_mock()
+        patcher = patch.object(FileDownload, "MIN_SEGMENT_SIZE", ChunkedFile.chunk_size)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get_requested_ranges(self):
+        return sorted(
+            tuple(
+                map(
+                    int,
+                    c[1]["headers"]["Range"].replace("bytes=", "").split("-"),
+                )
+            )
+            for c in self.mock_session.get.call_args_list
+        )
+
+    def _assert_downloaded_content(self):
+        with open(self.dest, "rb") as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_segmented_download_run(self):
+        with FileDownload(
+            self.source,
+            self.dest,
+            self.checksum,
+            session=self.mock_session,
+            segments=3,
+        ) as fd:
+            fd.run()
+        self._assert_downloaded_content()
+        # The first chunk is requested alone, then the remaining 8 chunks
+        # are split across 3 concurrent segments.
+        chunk_size = ChunkedFile.chunk_size
+        self.assertEqual(
+            self._get_requested_ranges(),
+            [
+                (0, chunk_size - 1),
+                (chunk_size, 4 * chunk_size - 1),
+                (4 * chunk_size, 7 * chunk_size - 1),
+                (7 * chunk_size, self.file_size - 1),
+            ],
+        )
+
+    def test_segmented_download_progress(self):
+        progress = []
+        with FileDownload(
+            self.source,
+            self.dest,
+            self.checksum,
+            session=self.mock_session,
+            segments=4,
+        ) as fd:
+            fd.run(progress_update=progress.append)
+        self.assertEqual(sum(progress), self.file_size)
+
+    def test_segmented_download_resumes_missing_chunks(self):
+        self.set_test_data(partial=True)
+        with FileDownload(
+            self.source,
+            self.dest,
+            self.checksum,
+            session=self.mock_session,
+            segments=3,
+        ) as fd:
+            fd.run()
+        self._assert_downloaded_content()
+        requested_chunks = set()
+        for start, end in self._get_requested_ranges():
+            requested_chunks.update(
+                range(
+                    start // ChunkedFile.chunk_size, end // ChunkedFile.chunk_size + 1
+                )
+            )
+        self.assertEqual(requested_chunks, set(self.chunks_to_download))
+
+    def test_segmented_download_small_file_not_split(self):
+        with patch.object(FileDownload, "MIN_SEGMENT_SIZE", self.file_size):
+            with FileDownload(
+                self.source,
+                self.dest,
+                self.checksum,
+                session=self.mock_session,
+                segments=3,
+            ) as fd:
+                fd.run()
+        self._assert_downloaded_content()
+        self.assertEqual(
+            self._get_requested_ranges(),
+            [
+                (0, ChunkedFile.chunk_size - 1),
+                (ChunkedFile.chunk_size, self.file_size - 1),
+            ],
+        )
+
+    def test_segmented_download_no_byte_range_support(self):
+        with patch.object(TestTransferSegmentedDownload, "byte_range_support", False):
+            with FileDownload(
+                self.source,
+                self.dest,
+                self.checksum,
+                session=self.mock_session,
+                segments=3,
+            ) as fd:
+                fd.run()
+        self._assert_downloaded_content()
+        # The whole file was returned for the first range request, so no
+        # further segments were requested.
+        self.assertEqual(self.mock_session.get.call_count, 1)
+
+    def test_segmented_download_retry_resume(self):
+        failed = []
+
+        def mock_get_request(url, headers=None, **kwargs):
+            response = self.mock_get_request(url, headers=headers, **kwargs)
+            if (
+                headers["Range"].startswith(
+                    "bytes={}-".format(4 * ChunkedFile.chunk_size)
+                )
+                and not failed
+            ):
+                failed.append(True)
+                response.raise_for_status.side_effect = ConnectionError
+            return response
+
+        self.mock_session.get.side_effect = mock_get_request
+
+        with FileDownload(
+            self.source,
+            self.dest,
+            self.checksum,
+            session=self.mock_session,
+            segments=3,
+            retry_wait=0,
+        ) as fd:
+            fd.run()
+        self._assert_downloaded_content()
+        self.assertEqual(failed, [True])
+
+
 class TestTransferCopy(BaseTestTransfer):
     def setUp(self):
         super(TestTransferCopy, self).setUp()
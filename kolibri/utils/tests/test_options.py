@@ -9,6 +9,7 @@ from contextlib import contextmanager
 
 import mock
 import pytest
+from validate import VdtValueError
 
 from kolibri.utils import options
 
@@ -354,3 +355,14 @@ def test_lazy_function_import():
         pass
 
     assert "kolibri.utils.tests.do_not_import" in sys.modules
+
+
+def test_resource_limits():
+    assert options.resource_limits("disk=1, db-write=2") == [
+        ("disk", 1),
+        ("db-write", 2),
+    ]
+    assert options.resource_limits("") == []
+    for value in ("disk", "disk=0", "disk=many", "=1"):
+        with pytest.raises(VdtValueError):
+            options.resource_limits(value)